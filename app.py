@@ -1,35 +1,162 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from sdk import PYSGFPLib
+from sdk import PYSGFPLib, PYSGFPMDevice, SDK_BACKEND
+from sdk.consolidation import Consolidator, match_merged
+from sdk.crossmatch import CrossMatchJob
+from sdk.devicepool import DevicePool
+from sdk.duplicates import DEFAULT_BUDGET_MS, DEFAULT_CANDIDATES, DUPLICATE_POLICIES, DuplicateStats
+from sdk.gallery import Gallery
+from sdk.identities import FINGER_UNKNOWN, FUSION_METHODS, IdentityRegistry, fuse_scores
+from sdk.binarycodes import BinaryCodeGallery, BinaryCoder
+from sdk.matchcache import MatchCache, digest as template_digest
+from sdk.matcherpool import SG400_TEMPLATE_SIZE, MatcherPool, match_templates, template_buffer
+from sdk.minutiaeindex import MinutiaeIndex
+from sdk.minutiaematcher import MatcherGallery, MinutiaeMatcher, threshold
+from sdk.persistence import OP_ASSIGN, OP_DELETE, OP_PUT, GalleryStore
+from sdk.scanorder import ScanOrder
 from sdk.sgfdxerrorcode import SGFDxErrorCode
+from sdk.sgfdxstructs import SGDeviceInfoParam
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat, TEMPLATE_FORMATS, TEMPLATE_FORMAT_NAMES
+from sdk.templateparser import TemplateFormatError, parse_template
+from sdk.templatearena import MAX_TEMPLATE_BYTES, TemplateArena
+from sdk.templatestream import (BINARY_MIMETYPE, NDJSON_MIMETYPE, TemplateStreamError, read_binary, read_ndjson,
+                                write_stream)
+from sdk.templatetier import TemplateTier
+from concurrent.futures import as_completed
+from datetime import datetime
 import base64
+import binascii
+import json
+import numpy as np
 from ctypes import c_int, byref, c_long, c_ubyte, POINTER, c_bool
 import time
 import sys
 import os
 
-app = Flask(__name__)
+# Rutas explícitas: como __mp_main__ (procesos del cruce N×N) Flask no las encuentra
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+app = Flask(__name__, root_path=APP_DIR, instance_path=os.path.join(APP_DIR, 'instance'))
 CORS(app)
 
 class SecugenController:
-    def __init__(self):
+    def __init__(self, background=False, device_pool=False):
         self.sgfp = None
+        self.sdk_handle = None   # objeto PYSGFPLib sobre el que ya se hicieron Create + Init
         self.initialized = False
         self.init_error = None
-        self.stored_templates = {}  # Para almacenar templates de referencia
+        self.initializing = False  # Inicialización en segundo plano en curso
+        self.init_thread = None
+        # Templates de referencia con su formato y digest (clave de match_cache) en una
+        # galería copy-on-write: cada lectura trabaja sobre gallery.snapshot() sin lock.
+        # Con SECUGEN_TEMPLATE_MEMORY_MB solo los más usados quedan en memoria y el resto
+        # se lee de un archivo en SECUGEN_SPILL_DIR (sdk/templatetier.py).
+        # SECUGEN_GALLERY_LAYOUT=compact guarda templates y metadatos en huecos de tamaño
+        # fijo de bloques NumPy (sdk/templatearena.py) en lugar de un objeto por template
+        self.gallery_layout = 'compact' if os.environ.get('SECUGEN_GALLERY_LAYOUT', '').lower() == 'compact' \
+            else 'objects'
+        self.template_tier = None
+        template_memory_mb = float(os.environ.get('SECUGEN_TEMPLATE_MEMORY_MB', '0'))
+        if template_memory_mb > 0 and self.gallery_layout == 'compact':
+            print("SECUGEN_TEMPLATE_MEMORY_MB no se aplica a la galería compacta (SECUGEN_GALLERY_LAYOUT=compact)")
+        elif template_memory_mb > 0:
+            spill_dir = os.environ.get('SECUGEN_SPILL_DIR') or (
+                os.path.join(os.environ['SECUGEN_DATA_DIR'], 'spill') if os.environ.get('SECUGEN_DATA_DIR')
+                else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spill'))
+            self.template_tier = TemplateTier(spill_dir, int(template_memory_mb * 1024 * 1024))
+        self.gallery = Gallery(tier=self.template_tier, arena=self._new_arena())
+        self.identities = IdentityRegistry()  # persona -> dedo -> muestras (template_ids)
+        # Super-templates por persona y dedo (MergeMultipleAnsiTemplate), rehechos en
+        # segundo plano cuando cambian sus muestras. Opcional (SECUGEN_CONSOLIDATE=1):
+        # no ahorra comparaciones y se guardan además de las muestras sueltas
+        self.consolidate = os.environ.get('SECUGEN_CONSOLIDATE', '0') == '1'
+        self.consolidator = Consolidator(PYSGFPMDevice, self._finger_samples,
+                                         float(os.environ.get('SECUGEN_CONSOLIDATE_INTERVAL', '5')))
+        # Resultados de comparación recientes por digest de ambos templates y nivel de seguridad
+        self.match_cache = MatchCache(int(os.environ.get('SECUGEN_MATCH_CACHE_SIZE', '4096')))
+        # Índice de minucias de los templates ANSI/ISO para podar la identificación 1:N
+        self.template_index = MinutiaeIndex()
+        # Templates fuera del índice (SG400 o ilegibles), en orden de alta: se comparan siempre
+        self.unindexed = {}
+        self.index_min_gallery = int(os.environ.get('SECUGEN_INDEX_MIN_GALLERY', '1000'))
+        self.index_candidates = int(os.environ.get('SECUGEN_INDEX_CANDIDATES', '50'))
+        # Códigos binarios de longitud fija (Hamming sobre una matriz uint64)
+        self.binary_coder = BinaryCoder(bits=int(os.environ.get('SECUGEN_CODE_BITS', '4096')))
+        self.binary_codes = BinaryCodeGallery(self.binary_coder.words)
+        self.code_candidates = int(os.environ.get('SECUGEN_CODE_CANDIDATES', '50'))
+        # Preselección de candidatos: 'index', 'codes' o 'both' (unión)
+        self.shortlist_source = os.environ.get('SECUGEN_SHORTLIST', 'both').lower()
+        # Matcher NumPy (sdk/minutiaematcher.py) para ANSI/ISO: primer filtro de
+        # la identificación y respaldo sin libsgfplib. SECUGEN_MATCHER: 'auto'
+        # (SDK, NumPy si el SDK no está listo), 'sdk' o 'numpy' (nodos sin SDK)
+        self.matcher = MinutiaeMatcher()
+        self.matcher_gallery = MatcherGallery(self.matcher)
+        self.matcher_mode = os.environ.get('SECUGEN_MATCHER', 'auto').lower()
+        self.prescreen_candidates = int(os.environ.get('SECUGEN_PRESCREEN_CANDIDATES', '25'))
+        # Orden de recorrido por frecuencia y recencia de aciertos (sdk/scanorder.py).
+        # Con salida temprana la identificación para en el primer score >= confident_score
+        self.scan_order = ScanOrder(int(os.environ.get('SECUGEN_HOT_PROTECTED', '64')),
+                                    int(os.environ.get('SECUGEN_HOT_PROBATION', '64')))
+        self.early_exit = os.environ.get('SECUGEN_EARLY_EXIT', '0') == '1'
+        self.confident_score = int(os.environ.get('SECUGEN_CONFIDENT_SCORE', '100'))
+        # Comprobación de duplicados al dar de alta (sdk/duplicates.py): política por
+        # defecto ('reject', 'link' u 'off'), presupuesto en ms y candidatos para el SDK
+        self.duplicate_policy = os.environ.get('SECUGEN_DUPLICATE_CHECK', 'off').lower()
+        if self.duplicate_policy not in DUPLICATE_POLICIES:
+            self.duplicate_policy = None
+        self.duplicate_budget_ms = float(os.environ.get('SECUGEN_DUPLICATE_BUDGET_MS', str(DEFAULT_BUDGET_MS)))
+        self.duplicate_candidates = int(os.environ.get('SECUGEN_DUPLICATE_CANDIDATES', str(DEFAULT_CANDIDATES)))
+        self.duplicate_security_level = int(os.environ.get('SECUGEN_DUPLICATE_SECURITY_LEVEL', '5'))
+        self.duplicate_stats = DuplicateStats()
+        # Objetos SGFPM solo de matching para /comparar-huellas/lote (se crean
+        # con el primer lote; 0 desactiva el pool y el lote se compara en serie)
+        self.matcher_pool = None
+        self.matcher_pool_size = int(os.environ.get('SECUGEN_MATCHER_POOL_SIZE', str(os.cpu_count() or 1)))
+        self.batch_max_pairs = int(os.environ.get('SECUGEN_BATCH_MAX_PAIRS', '1000'))
+        # Cruce N×N de la galería en procesos aparte (sdk/crossmatch.py); checkpoints
+        # y resultados en crossmatch_dir para reanudar un cruce interrumpido
+        self.crossmatch = None
+        self.crossmatch_dir = os.environ.get('SECUGEN_CROSSMATCH_DIR',
+                                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crossmatch'))
+        self.crossmatch_processes = int(os.environ.get('SECUGEN_CROSSMATCH_PROCESSES', str(os.cpu_count() or 1)))
+        # Persistencia de la galería (sdk/persistence.py): WAL de altas y bajas más
+        # instantáneas periódicas en SECUGEN_DATA_DIR; sin él solo vive en memoria
+        self.store = None
+        self.data_dir = os.environ.get('SECUGEN_DATA_DIR') or None
+        self.snapshot_interval = float(os.environ.get('SECUGEN_SNAPSHOT_INTERVAL', '300'))
+        self.snapshot_min_records = int(os.environ.get('SECUGEN_SNAPSHOT_MIN_RECORDS', '1000'))
+        self.snapshot_thread = None
+        self.restore_stats = None
+        # Importación masiva (POST /templates/importar) y reaplicación del WAL en lotes
+        self.bulk_batch_size = int(os.environ.get('SECUGEN_IMPORT_BATCH', '1000'))
         self.device_opened = False
         self.current_device_id = None
+        self.device_info = None  # SGDeviceInfoParam del lector abierto, leído una vez por apertura
+        self.last_probe = None   # Resultado de la última sonda de vida del lector
         self.recovery_attempts = 0
         self.max_recovery_attempts = 3
         self.last_error_time = None
+        # Modo pool: cada lector conectado con su propio objeto SGFPM e hilo
+        self.device_pool = DevicePool(PYSGFPMDevice) if device_pool else None
         
         # PREVENCIÓN: Control de recursos y operaciones
         import threading
-        self.operation_lock = threading.Lock()  # Prevenir operaciones concurrentes
+        self.operation_lock = threading.RLock()  # Prevenir operaciones concurrentes (reentrante: captura -> led_control)
+        self.template_lock = threading.Lock()  # SetTemplateFormat cambia el formato de todo el objeto SGFPM
+        self.matcher_pool_lock = threading.Lock()  # Creación perezosa de matcher_pool
+        self.crossmatch_lock = threading.Lock()  # Un solo cruce N×N a la vez
+        self.write_lock = threading.RLock()  # Altas y bajas en memoria en el mismo orden que en el WAL
+        self.snapshot_lock = threading.Lock()  # Una instantánea de la galería a la vez
+        self.sdk_ready_event = threading.Event()  # SDK cargado y algoritmo inicializado (Create + Init)
         self.operation_count = 0  # Contador de operaciones para limpieza preventiva
         self.max_operations_before_refresh = 50  # Límite antes de refrescar SDK
         self.last_successful_operation = time.time()
         self.device_health_threshold = 300  # 5 minutos sin problemas = sano
+        self.sdk_wait_timeout = 10  # Espera máxima de matching mientras carga el SDK
+        if self.data_dir:
+            self.open_store(self.data_dir)
+        if background:
+            self.start_background_init()
+            return
         try:
             self.sgfp = PYSGFPLib()
             self.initializeDevice()
@@ -37,6 +164,60 @@ class SecugenController:
             self.init_error = str(e)
             print(f"Error al crear instancia de SecugenController: {e}")
 
+    @property
+    def stored_templates(self):
+        """Versión actual de la galería (template_id -> template); no cambia aunque haya altas o bajas"""
+        return self.gallery.snapshot()
+
+    @property
+    def sdk_ready(self):
+        return self.sdk_ready_event.is_set()
+
+    def start_background_init(self, retry_interval=None):
+        """Carga el SDK y abre el lector en segundo plano para no retrasar el arranque"""
+        import threading
+        if retry_interval is None:
+            retry_interval = float(os.environ.get('SECUGEN_INIT_RETRY_INTERVAL', '5'))
+        self.initializing = True
+        self.init_thread = threading.Thread(target=self._background_init, args=(retry_interval,),
+                                            name='secugen-init', daemon=True)
+        self.init_thread.start()
+
+    def _background_init(self, retry_interval):
+        """Reintenta abrir el lector hasta conseguirlo (retry_interval <= 0: un solo intento)
+
+        El SDK se crea e inicializa en el primer intento; los siguientes solo
+        repiten OpenDevice (o el arranque del pool de lectores)."""
+        try:
+            while True:
+                with self.operation_lock:
+                    if self.initialized:
+                        return
+                    try:
+                        if self.sgfp is None:
+                            self.sgfp = PYSGFPLib()
+                        if self.initializeDevice():
+                            return
+                    except Exception as e:
+                        self.init_error = str(e)
+                        print(f"Error en inicialización en segundo plano: {e}")
+                if retry_interval <= 0:
+                    return
+                print(f"Lector no disponible, reintentando en {retry_interval} segundos...")
+                time.sleep(retry_interval)
+        finally:
+            self.initializing = False
+
+    def wait_until_ready(self, timeout=None):
+        """Espera a que termine la inicialización en segundo plano; devuelve si el lector está abierto"""
+        if self.init_thread is not None:
+            self.init_thread.join(timeout)
+        return self.initialized
+
+    def _wait_sdk_ready(self):
+        """El matching no necesita el lector abierto, solo el SDK inicializado"""
+        return self.sdk_ready_event.wait(self.sdk_wait_timeout if self.initializing else 0)
+
     def preventive_maintenance(self):
         """Mantenimiento preventivo del SDK para evitar acumulación de recursos"""
         try:
@@ -64,17 +245,43 @@ class SecugenController:
     
     def _health_check(self):
         """Verificación rápida de salud del dispositivo"""
+        return self.probe_device()
+
+    def _load_device_info(self):
+        """Lee y guarda en caché la información del lector recién abierto"""
+        info = SGDeviceInfoParam()
+        err = self.sgfp.GetDeviceInfoParam(info)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            raise Exception(f"Error al obtener información del dispositivo: {err}")
+
+        # Validar dimensiones antes de usarlas para los buffers (SEGURIDAD)
+        width, height = info.ImageWidth, info.ImageHeight
+        if width <= 0 or height <= 0 or width > 1000 or height > 1000:
+            raise Exception(f"Dimensiones del sensor inválidas: {width}x{height}")
+        if width * height > 1000000:  # Máximo 1MB de buffer
+            raise Exception(f"Buffer de imagen demasiado grande: {width * height} bytes")
+
+        self.device_info = info.as_dict()
+        print(f"Lector {self.device_info['serial']}: {width}x{height} a {info.ImageDPI} dpi, firmware {self.device_info['firmware']}")
+        return self.device_info
+
+    def probe_device(self):
+        """Sonda de vida: una consulta GetDeviceInfo al lector, sin captura de imagen"""
+        error = None
         try:
-            if not self.initialized:
-                return False
-                
-            # Test simple: obtener info del dispositivo
-            width = c_long(0)
-            height = c_long(0)
-            result = self.sgfp.GetDeviceInfo(width, height)
-            return result == SGFDxErrorCode.SGFDX_ERROR_NONE
-        except:
-            return False
+            if not self.initialized or not self.sgfp:
+                error = 'Dispositivo no inicializado'
+            else:
+                info = SGDeviceInfoParam()
+                err = self.sgfp.GetDeviceInfoParam(info)
+                if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                    error = f'Error GetDeviceInfo: {err}'
+                elif self.device_info and info.serial != self.device_info['serial']:
+                    error = f"Lector cambiado: {self.device_info['serial']} -> {info.serial}"
+        except Exception as e:
+            error = str(e)
+        self.last_probe = {'ok': error is None, 'error': error, 'timestamp': time.time()}
+        return error is None
     
     def _refresh_sdk_connection(self):
         """Refresca la conexión del SDK sin perder el estado inicializado"""
@@ -99,6 +306,7 @@ class SecugenController:
             if self.current_device_id is not None:
                 result = self.sgfp.OpenDevice(self.current_device_id)
                 if result == SGFDxErrorCode.SGFDX_ERROR_NONE:
+                    self._load_device_info()
                     print("Conexión SDK refrescada exitosamente")
                     self.last_successful_operation = time.time()
                     return True
@@ -117,6 +325,7 @@ class SecugenController:
                 result = self.sgfp.OpenDevice(device_id)
                 if result == SGFDxErrorCode.SGFDX_ERROR_NONE:
                     self.current_device_id = device_id
+                    self._load_device_info()
                     print(f"Dispositivo reconectado exitosamente con ID: {device_id}")
                     self.last_successful_operation = time.time()
                     return True
@@ -331,14 +540,24 @@ class SecugenController:
     def initializeDevice(self):
         try:
             print("Iniciando dispositivo...")
-            err = self.sgfp.Create()
-            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
-                raise Exception(f"Error al crear la instancia: {err}")
+            # Create + Init una sola vez por objeto PYSGFPLib: los reintentos solo
+            # vuelven a abrir el lector, sin tocar el SGFPM que ya usa el matching
+            if self.sdk_handle is not self.sgfp:
+                self.sdk_ready_event.clear()
+                err = self.sgfp.Create()
+                if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                    raise Exception(f"Error al crear la instancia: {err}")
+
+                print("Inicializando...")
+                err = self.sgfp.Init(1)
+                if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                    raise Exception(f"Error al inicializar: {err}")
+                self.sdk_handle = self.sgfp
+                # Templates y matching ya son utilizables aunque el lector no abra
+                self.sdk_ready_event.set()
 
-            print("Inicializando...")
-            err = self.sgfp.Init(1)
-            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
-                raise Exception(f"Error al inicializar: {err}")
+            if self.device_pool is not None:
+                return self._start_device_pool()
 
             print("Abriendo dispositivo...")
             # Intentar con diferentes IDs de dispositivo
@@ -359,6 +578,9 @@ class SecugenController:
             if not device_opened:
                 raise Exception(f"No se pudo abrir el dispositivo con ningún ID")
 
+            # Geometría, DPI, serie y firmware: una sola consulta por apertura
+            self._load_device_info()
+
             self.initialized = True
             self.last_successful_operation = time.time()  # PREVENCIÓN: Actualizar tiempo de éxito
             print("Dispositivo inicializado correctamente")
@@ -368,6 +590,16 @@ class SecugenController:
             print(f"Error en initializeDevice: {str(e)}")
             return False
     
+    def _start_device_pool(self):
+        """Modo pool: DevicePool abre todos los lectores; el objeto global queda para matching"""
+        opened = self.device_pool.start()
+        if opened == 0:
+            raise Exception("No se pudo abrir ningún lector del pool")
+        self.initialized = True
+        self.last_successful_operation = time.time()
+        print(f"Pool de lectores iniciado: {opened} lector(es) abierto(s)")
+        return True
+
     def led_control(self, state):
         with self.operation_lock:  # PREVENCIÓN: Evitar operaciones concurrentes
             try:
@@ -415,17 +647,14 @@ class SecugenController:
                 print(f"Error en led_control: {str(e)}")
                 return {"success": False, "error": str(e)}
 
-    def create_template(self, image_buffer):
-        """Crear template a partir de una imagen de huella"""
+    def create_template(self, image_buffer, template_format=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400):
+        """Crear template a partir de una imagen de huella (SG400, ANSI378 o ISO19794)"""
         try:
-            if not self.initialized:
-                print("Dispositivo no inicializado")
+            if not self._wait_sdk_ready():
+                print("SDK no inicializado")
                 return None
             
-            from ctypes import c_char
-            
-            # Crear buffer para el template (SG400 template size = 400 bytes)
-            template_buffer = (c_char * self.sgfp.constant_sg400_template_size)()
+            from ctypes import c_char, c_ulong
             
             # Convertir image_buffer a formato ctypes si es necesario
             if isinstance(image_buffer, bytearray):
@@ -433,102 +662,1073 @@ class SecugenController:
             else:
                 image_data = image_buffer
             
-            print("Creando template desde imagen...")
-            result = self.sgfp.CreateSG400Template(image_data, template_buffer)
+            print(f"Creando template {TEMPLATE_FORMAT_NAMES.get(template_format, template_format)} desde imagen...")
+            # El formato es estado del objeto SGFPM compartido: se cambia y se
+            # restaura a SG400 sin que otra extracción se cuele en medio
+            with self.template_lock:
+                if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+                    template_buffer = (c_char * self.sgfp.constant_sg400_template_size)()
+                    result = self.sgfp.CreateSG400Template(image_data, template_buffer)
+                    template_size = len(template_buffer)
+                else:
+                    result = self.sgfp.SetTemplateFormat(template_format)
+                    if result != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                        print(f"Formato de template no soportado: {result}")
+                        return None
+                    try:
+                        max_size = c_ulong(0)
+                        self.sgfp.GetMaxTemplateSize(byref(max_size))
+                        template_buffer = (c_char * max_size.value)()
+                        result = self.sgfp.CreateTemplate(None, image_data, template_buffer)
+                        size = c_ulong(0)
+                        if result == SGFDxErrorCode.SGFDX_ERROR_NONE:
+                            result = self.sgfp.GetTemplateSize(template_buffer, byref(size))
+                        template_size = size.value
+                    finally:
+                        self.sgfp.SetTemplateFormat(SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400)
             
             if result != SGFDxErrorCode.SGFDX_ERROR_NONE:
                 print(f"Error al crear template: {result}")
                 return None
             
             print("Template creado exitosamente")
-            return bytearray(template_buffer)
+            # Tamaño real del template (ANSI/ISO son de longitud variable)
+            return bytearray(template_buffer[:template_size])
             
         except Exception as e:
             print(f"Error en create_template: {str(e)}")
             return None
 
-    def compare_templates(self, template1, template2, security_level=5):
-        """Comparar dos templates de huellas usando el SDK de SecuGen"""
+    def compare_templates(self, template1, template2, security_level=5,
+                          format1=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400,
+                          format2=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400, digest1=None, digest2=None, sgfp=None):
+        """Comparar dos templates de huellas usando el SDK de SecuGen (o el matcher NumPy)
+
+        digest1/digest2: digest del contenido si ya se conoce (templates
+        almacenados), para consultar match_cache sin volver a calcularlo.
+        sgfp: objeto SGFPM con el que comparar (uno de matcher_pool); por
+        defecto el del controlador."""
         try:
-            if not self.initialized:
-                print("Dispositivo no inicializado")
-                return {'success': False, 'error': 'Dispositivo no inicializado'}
-            
-            from ctypes import c_char, c_bool, c_int, byref
-            from sdk.sgfdxsecuritylevel import SGFDxSecurityLevel
-            
-            # Convertir templates a formato ctypes
-            template1_buffer = (c_char * self.sgfp.constant_sg400_template_size)()
-            template2_buffer = (c_char * self.sgfp.constant_sg400_template_size)()
-            
-            # Copiar los datos de los templates
-            if isinstance(template1, bytearray):
-                for i, byte in enumerate(template1[:self.sgfp.constant_sg400_template_size]):
-                    template1_buffer[i] = byte
-            else:
-                template1_bytes = bytes(template1)
-                for i, byte in enumerate(template1_bytes[:self.sgfp.constant_sg400_template_size]):
-                    template1_buffer[i] = byte
+            cache_key = None
+            if self.match_cache.capacity > 0:
+                cache_key = MatchCache.key(digest1 or template_digest(template1), format1,
+                                           digest2 or template_digest(template2), format2, security_level)
+                cached = self.match_cache.get(cache_key)
+                if cached is not None:
+                    return dict(cached, cached=True)
+            numpy_capable = SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400 not in (format1, format2)
+            if numpy_capable and self._numpy_only():
+                return self._compare_numpy(template1, template2, security_level, format1, format2)
+            if not self._wait_sdk_ready():
+                print("SDK no inicializado")
+                return {'success': False, 'error': 'SDK no inicializado'}
             
-            if isinstance(template2, bytearray):
-                for i, byte in enumerate(template2[:self.sgfp.constant_sg400_template_size]):
-                    template2_buffer[i] = byte
-            else:
-                template2_bytes = bytes(template2)
-                for i, byte in enumerate(template2_bytes[:self.sgfp.constant_sg400_template_size]):
-                    template2_buffer[i] = byte
-            
-            # Realizar la comparación usando el SDK
-            matched = c_bool(False)
+            # Funciones con formato explícito: MatchTemplate depende de
+            # SetTemplateFormat, que create_template cambia temporalmente
             print(f"Comparando templates con nivel de seguridad: {security_level}")
-            
-            result = self.sgfp.MatchTemplate(
-                template1_buffer, 
-                template2_buffer, 
-                security_level, 
-                byref(matched)
-            )
+            result, matched, final_score = match_templates(sgfp or self.sgfp, template1, template2,
+                                                           security_level, format1, format2)
             
             if result != SGFDxErrorCode.SGFDX_ERROR_NONE:
                 print(f"Error en MatchTemplate: {result}")
                 return {'success': False, 'error': f'Error en comparación: {result}'}
             
-            # Obtener el score de matching
-            score = c_int(0)
-            score_result = self.sgfp.GetMatchingScore(
-                template1_buffer,
-                template2_buffer, 
-                byref(score)
-            )
-            
-            final_score = score.value if score_result == SGFDxErrorCode.SGFDX_ERROR_NONE else 0
-            
-            print(f"Resultado de comparación: {'MATCH' if matched.value else 'NO MATCH'}, Score: {final_score}")
+            print(f"Resultado de comparación: {'MATCH' if matched else 'NO MATCH'}, Score: {final_score}")
             
-            return {
+            result = {
                 'success': True,
-                'matched': bool(matched.value),
+                'matched': matched,
                 'score': final_score,
+                'matcher': 'sdk',
+                'cached': False,
                 'message': f'Comparación exitosa usando SDK SecuGen'
             }
+            # Solo se guardan resultados del SDK: los del matcher NumPy ya son baratos
+            if cache_key is not None:
+                self.match_cache.put(cache_key, result)
+            return result
             
         except Exception as e:
             print(f"Error en compare_templates: {str(e)}")
             return {'success': False, 'error': str(e)}
 
-    def store_template(self, template_id, template_data):
-        """Almacenar template de referencia"""
+    def _numpy_only(self):
+        """Si el matching ANSI/ISO debe hacerse sin el SDK"""
+        if self.matcher_mode == 'numpy':
+            return True
+        return self.matcher_mode == 'auto' and not self._wait_sdk_ready()
+
+    def _compare_numpy(self, template1, template2, security_level, format1, format2):
+        """Comparación con el matcher NumPy, en la escala de score del SDK"""
+        try:
+            matched, score = self.matcher.match(template1, template2, security_level, format1, format2)
+        except TemplateFormatError as e:
+            return {'success': False, 'error': f'Template no válido: {e}'}
+        print(f"Resultado de comparación (NumPy): {'MATCH' if matched else 'NO MATCH'}, Score: {score}")
+        return {
+            'success': True,
+            'matched': matched,
+            'score': score,
+            'matcher': 'numpy',
+            'cached': False,
+            'message': 'Comparación exitosa usando el matcher de minucias NumPy'
+        }
+
+    def _get_matcher_pool(self):
+        """matcher_pool, creándolo la primera vez; None si está desactivado o no se pudo crear"""
+        if self.matcher_pool_size <= 0:
+            return None
+        with self.matcher_pool_lock:
+            if self.matcher_pool is None:
+                pool = MatcherPool(PYSGFPMDevice, self.matcher_pool_size)
+                try:
+                    err = pool.start()
+                except OSError as e:
+                    err = str(e)
+                if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                    print(f"Pool de matching no disponible ({err}); los lotes se comparan en serie")
+                    self.matcher_pool_size = 0
+                    return None
+                print(f"Pool de matching con {pool.size} objetos SGFPM")
+                self.matcher_pool = pool
+            return self.matcher_pool
+
+    def compare_batch(self, pairs):
+        """Compara una lista de pares; genera (índice, resultado) según terminan
+
+        Cada par es un dict con los argumentos de compare_templates
+        (template1, template2, security_level, format1, format2, digest1,
+        digest2). Con el SDK listo y más de un par, los pares se reparten
+        entre los objetos de matcher_pool; si no, se comparan en serie
+        (matcher NumPy o SDK del controlador)."""
+        pool = None
+        if len(pairs) > 1 and self.matcher_mode != 'numpy' and self._wait_sdk_ready():
+            pool = self._get_matcher_pool()
+        if pool is None:
+            for index, pair in enumerate(pairs):
+                yield index, self.compare_templates(**pair)
+            return
+
+        futures = {pool.submit(lambda sgfp, pair: self.compare_templates(sgfp=sgfp, **pair), pair): index
+                   for index, pair in enumerate(pairs)}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Cliente desconectado a mitad del streaming: no seguir comparando
+            for future in futures:
+                future.cancel()
+
+    def start_crossmatch(self, security_level=5, min_score=None, processes=None, resume=True):
+        """Lanza en segundo plano el cruce N×N de los templates almacenados
+
+        Trabaja sobre una copia de la galería en el momento de lanzarlo.
+        Devuelve el CrossMatchJob, o None si ya hay un cruce en curso."""
+        with self.crossmatch_lock:
+            if self.crossmatch is not None and self.crossmatch.state in ('pending', 'running'):
+                return None
+            templates = [(template_id, entry.read(), entry.template_format)
+                         for template_id, entry in self.gallery.snapshot().entries()]
+            job = CrossMatchJob(PYSGFPMDevice, templates, self.crossmatch_dir, security_level, min_score,
+                                processes or self.crossmatch_processes)
+            self.crossmatch = job
+        job.start(resume)
+        return job
+
+    def open_store(self, directory):
+        """Recupera la galería de directory y registra desde entonces cada alta y baja
+
+        Carga la última instantánea (galería, identidades e índices) y
+        reaplica solo los registros del WAL posteriores. Si los índices de la
+        instantánea son de otra configuración se rehacen desde los templates."""
+        import threading
+        store = GalleryStore(directory, os.environ.get('SECUGEN_WAL_FSYNC', '1') != '0')
+        start = time.perf_counter()
+        state = store.load_snapshot()
+        reindexed = state is not None and not self._load_state(state)
+        snapshot_templates = len(self.gallery)
+        loaded = time.perf_counter()
+        replayed = 0
+        pending = []
+        for record in store.replay():
+            pending.append(record)
+            if len(pending) >= self.bulk_batch_size:
+                replayed += self._apply_records(pending)
+                pending = []
+        replayed += self._apply_records(pending)
+        store.open()
+        self.store = store
+        # Los super-templates no se guardan: se rehacen en segundo plano
+        for person_id in self.identities.person_ids():
+            for finger, samples in (self.identities.fingers(person_id) or {}).items():
+                if len(samples) > 1:
+                    self._samples_changed(person_id, finger)
+        self.restore_stats = {
+            'snapshot_seq': store.snapshot_seq,
+            'snapshot_templates': snapshot_templates,
+            'reindexed': reindexed,
+            'replayed': replayed,
+            'templates': len(self.gallery),
+            'snapshot_ms': (loaded - start) * 1000,
+            'replay_ms': (time.perf_counter() - loaded) * 1000,
+            'elapsed_ms': (time.perf_counter() - start) * 1000,
+        }
+        print(f"Galería recuperada de {directory}: {len(self.gallery)} templates "
+              f"({snapshot_templates} de la instantánea, {replayed} registros del WAL) "
+              f"en {self.restore_stats['elapsed_ms']:.0f} ms")
+        if self.snapshot_interval > 0:
+            self.snapshot_thread = threading.Thread(target=self._snapshot_loop, name='gallery-snapshot', daemon=True)
+            self.snapshot_thread.start()
+
+    def _new_arena(self):
+        return TemplateArena() if self.gallery_layout == 'compact' else None
+
+    def _load_state(self, state):
+        """Adopta la galería de una instantánea; False si hubo que reindexarla"""
+        self.gallery = state['gallery']
+        if (self.gallery.arena is not None) != (self.gallery_layout == 'compact'):
+            print(f"Instantánea con otra representación de la galería: se pasa a '{self.gallery_layout}'")
+            self.gallery = self.gallery.relayout(self._new_arena())
+        if self.template_tier is not None:
+            self.gallery.set_tier(self.template_tier)
+        self.identities = state['identities']
+        self.unindexed = {}
+        if state['derived'] != self._derived_signature():
+            print("Instantánea con índices de otra configuración: se reindexa la galería")
+            self._index_templates([(template_id, entry.read(), entry.template_format)
+                                   for template_id, entry in self.gallery.snapshot().entries()])
+            return False
+        self.template_index = state['template_index']
+        self.binary_codes = state['binary_codes']
+        self.matcher_gallery = state['matcher_gallery']
+        self.matcher_gallery.matcher = self.matcher
+        self.unindexed = dict.fromkeys(template_id for template_id in self.gallery.snapshot()
+                                       if template_id not in self.template_index)
+        return True
+
+    def _derived_signature(self):
+        """Parámetros de los que dependen el índice, los códigos y la galería del matcher"""
+        index = self.template_index
+        coder = self.binary_coder
+        return {
+            'index': [index.neighbours, index.distance_bin, index.angle_bin, index.probe_spread],
+            'codes': [coder.bits, coder.neighbours, coder.radius, coder.distance_bin, coder.direction_bin,
+                      coder.orientation_bin],
+            'matcher': [self.matcher.neighbours],
+        }
+
+    def _apply_records(self, records):
+        """Reaplica registros del WAL en orden (con store aún sin abrir: no se
+        vuelven a registrar); las altas consecutivas van en un solo store_templates"""
+        puts = []
+        enrolled = None
+        for record in records + [None]:
+            if record is not None and record.op == OP_PUT and (not puts or record.enrolled == enrolled):
+                puts.append((record.template_id, bytearray(record.template), record.template_format,
+                             record.person_id, record.finger))
+                enrolled = record.enrolled  # un lote por hora de alta: cada uno conserva la suya
+                continue
+            if puts:
+                try:
+                    self.store_templates(puts, enrolled)
+                except Exception as e:
+                    # Un registro que no vale no arrastra al resto del lote
+                    print(f"WAL: lote de {len(puts)} templates no aplicado ({e}), se reaplican uno a uno")
+                    for put in puts:
+                        try:
+                            self.store_templates([put], enrolled)
+                        except Exception as e:
+                            print(f"WAL: template {put[0]} no recuperado: {e}")
+                puts = []
+            if record is None:
+                break
+            if record.op == OP_PUT:
+                puts.append((record.template_id, bytearray(record.template), record.template_format,
+                             record.person_id, record.finger))
+                enrolled = record.enrolled
+            elif record.op == OP_DELETE:
+                self.delete_template(record.template_id)
+            elif record.op == OP_ASSIGN:
+                self._assign_identity(record.template_id, record.person_id, record.finger)
+        return len(records)
+
+    def save_snapshot(self):
+        """Instantánea de la galería y las identidades; borra el WAL que cubre
+
+        Las altas y bajas solo esperan (blocked_ms) a que se tome la versión
+        publicada de la galería, una copia de los dueños de cada template y
+        la seq del WAL; la serialización y el volcado a disco se hacen ya sin
+        bloquearlas. El índice, los códigos y la galería del matcher se copian
+        al serializarlos, cada uno con su lock: pueden traer altas y bajas
+        posteriores a la seq, que al cargar se reaplican igual desde el WAL
+        (reaplicarlas deja el mismo resultado)."""
+        if self.store is None:
+            return None
+        with self.snapshot_lock:
+            start = time.perf_counter()
+            with self.write_lock:
+                gallery = self.gallery.snapshot()
+                next_seq = self.gallery.next_seq
+                owners = self.identities.owners_copy()
+                pending = self.store.begin_snapshot()
+            blocked = time.perf_counter() - start
+            templates = len(gallery)
+            snapshot = self.store.finish_snapshot(pending, {
+                'gallery': self.gallery.frozen(gallery, next_seq),
+                'identities': IdentityRegistry.from_owners(owners),
+                'template_index': self.template_index,
+                'binary_codes': self.binary_codes,
+                'matcher_gallery': self.matcher_gallery,
+                'derived': self._derived_signature(),
+            })
+            snapshot.update(templates=templates, blocked_ms=blocked * 1000)
+        print(f"Instantánea de la galería: {templates} templates, {snapshot['bytes'] / 1e6:.1f} MB "
+              f"en {snapshot['elapsed_ms']:.0f} ms")
+        return snapshot
+
+    def _snapshot_loop(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            if self.store.records_since_snapshot < self.snapshot_min_records:
+                continue
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                print(f"Error al guardar la instantánea de la galería: {e}")
+
+    def persistence_status(self):
+        if self.store is None:
+            return None
+        return dict(self.store.stats(), restore=self.restore_stats, snapshot_interval_s=self.snapshot_interval,
+                    snapshot_min_records=self.snapshot_min_records)
+
+    def store_template(self, template_id, template_data, template_format=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400,
+                       person_id=None, finger=None):
+        """Almacenar template de referencia con su formato
+
+        person_id/finger lo asignan como muestra de un dedo de una persona;
+        sin finger se usa la posición de dedo del template ANSI/ISO. Sin
+        person_id un template ya asignado conserva su persona."""
         try:
-            self.stored_templates[template_id] = template_data
+            self.store_templates([(template_id, template_data, template_format, person_id, finger)])
             return {'success': True, 'message': f'Template {template_id} almacenado'}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def store_templates(self, records, enrolled=None):
+        """Almacenar un lote [(template_id, template, formato, person_id, finger)]
+
+        Como store_template con cada uno, pero con un solo fsync del WAL, una
+        sola versión nueva de la galería y las claves del índice de todo el
+        lote calculadas a la vez. enrolled es la hora de alta (por defecto
+        ahora; la del WAL al reaplicarlo). Lanza la excepción si falla.
+
+        Todo el lote se valida antes de escribirlo en el WAL: un registro que
+        la galería rechazara después se reaplicaría y fallaría en cada
+        arranque. Los template_id quedan como texto."""
+        enrolled = time.time() if enrolled is None else enrolled
+        records = [self._checked_record(record) for record in records]
+        items = []
+        for template_id, template_data, template_format, person_id, finger in records:
+            views = self._template_views(template_data, template_format)
+            items.append((template_id, template_data, template_format, template_digest(template_data),
+                          finger if finger is not None else views[0].finger if views else FINGER_UNKNOWN,
+                          views[0].quality if views else None))
+        with self.write_lock:
+            if self.store is not None:
+                self.store.log_put_many(records, enrolled)
+            previous = self.gallery.put_many(items, enrolled)
+            digests = [digest for _, _, _, digest, _, _ in items]
+            for entry, digest in zip(previous, digests):
+                if entry is not None and entry.digest != digest:
+                    self.match_cache.invalidate(entry.digest)  # template reemplazado
+            self._index_templates([(template_id, template_data, template_format)
+                                   for template_id, template_data, template_format, _, _ in records])
+            owners = set()
+            for (template_id, _, _, person_id, _), (_, _, _, _, finger, _) in zip(records, items):
+                owners.add(self.identities.owner(template_id))
+                if person_id is not None:
+                    self.identities.add(template_id, person_id, finger)
+                    owners.add((person_id, finger))
+            owners.discard(None)
+        for owner in owners:
+            self._samples_changed(*owner)
+
+    def check_template(self, template_data, template_format):
+        """ValueError si el template no se puede almacenar: vacío, formato
+        desconocido, mayor que MAX_TEMPLATE_BYTES o SG400 que no mide 400 bytes"""
+        if template_format not in TEMPLATE_FORMAT_NAMES:
+            raise ValueError(f"Formato de template no soportado: {template_format}")
+        if not template_data:
+            raise ValueError("Template vacío")
+        if len(template_data) > MAX_TEMPLATE_BYTES:
+            raise ValueError(f"Template de {len(template_data)} bytes (máximo {MAX_TEMPLATE_BYTES})")
+        if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400 and len(template_data) != SG400_TEMPLATE_SIZE:
+            raise ValueError(f"Template SG400 de {len(template_data)} bytes (debe tener {SG400_TEMPLATE_SIZE})")
+
+    def _checked_record(self, record):
+        """Registro de store_templates validado, con template_id como texto; ValueError si no vale"""
+        template_id, template_data, template_format, person_id, finger = record
+        if isinstance(template_id, bool) or not isinstance(template_id, (str, int)) or template_id == '':
+            raise ValueError(f"template_id no válido: {template_id!r}")
+        if isinstance(person_id, bool) or not isinstance(person_id, (str, int, type(None))):
+            raise ValueError(f"person_id no válido: {person_id!r}")
+        if finger is not None and (isinstance(finger, bool) or not isinstance(finger, int) or not 0 <= finger <= 10):
+            raise ValueError(f"Dedo no válido: {finger!r}")
+        self.check_template(template_data, template_format)
+        return str(template_id), template_data, template_format, person_id, finger
+
+    def enroll_template(self, template_id, template_data, template_format=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400,
+                        person_id=None, finger=None, policy=None):
+        """store_template precedido de la comprobación de duplicados
+
+        policy (por defecto duplicate_policy): 'reject' no almacena un
+        template cuyo dedo ya está en la galería con otro ID y de otra persona;
+        'link' lo almacena como muestra de la persona y dedo del existente (si
+        el existente no tenía persona, ambos pasan a una nueva con person_id o
+        el ID del existente). 'off' almacena sin comprobar."""
+        policy = self.duplicate_policy if policy is None else policy
+        if policy in (None, 'off'):
+            return self.store_template(template_id, template_data, template_format, person_id, finger)
+        check = self.check_duplicate(template_data, template_format, exclude_id=template_id, exclude_person=person_id)
+        if not check['success']:
+            return check
+        duplicate = check['duplicate']
+        action = policy if duplicate else None
+        if duplicate and policy == 'reject':
+            result = {'success': False, 'rejected': True,
+                      'error': f"Huella ya registrada como {duplicate['template_id']}"
+                               + (f" (persona {duplicate['person_id']})" if duplicate['person_id'] else '')}
+        else:
+            if duplicate:
+                if duplicate['person_id'] is None:
+                    person_id = person_id if person_id is not None else duplicate['template_id']
+                    self._assign_identity(duplicate['template_id'], person_id, duplicate['finger'])
+                else:
+                    person_id = duplicate['person_id']
+                finger = duplicate['finger']
+            result = self.store_template(template_id, template_data, template_format, person_id, finger)
+            result['person_id'] = person_id
+        self.duplicate_stats.record(check['elapsed_ms'], check['compared'], duplicate is not None, check['complete'],
+                                    action)
+        result['duplicate_check'] = check
+        return result
+
+    def check_duplicate(self, template_data, template_format, security_level=None, exclude_id=None,
+                        exclude_person=None, budget_ms=None, max_candidates=None):
+        """Búsqueda 1:N acotada de un template antes de darlo de alta
+
+        Preselección como en identify_template (índice/códigos en galerías
+        grandes y el matcher NumPy, que deja los max_candidates mejores) y
+        comparación con el SDK de mejor a peor hasta la primera coincidencia.
+        Se omiten exclude_id (el propio template al reemplazarlo) y las
+        muestras de exclude_person. Al agotarse budget_ms se para y
+        'complete' es False: el coste no depende del tamaño de la galería."""
+        start = time.perf_counter()
+        security_level = self.duplicate_security_level if security_level is None else security_level
+        budget_ms = self.duplicate_budget_ms if budget_ms is None else budget_ms
+        deadline = start + budget_ms / 1000
+
+        gallery = self.gallery.snapshot()
+        probe_record, probe_set = self._prepare_probe(template_data, template_format)
+        template_ids, indexed = self._candidate_ids(probe_record, True, gallery)
+        excluded = {template_id for samples in (self.identities.fingers(exclude_person) or {}).values()
+                    for template_id in samples} if exclude_person is not None else set()
+        excluded.add(exclude_id)
+        template_ids = [template_id for template_id in template_ids if template_id not in excluded]
+        prescreened = False
+        matcher = 'sdk'
+        best = None
+        compared = 0
+        complete = True
+        if probe_set is not None and self._numpy_only():
+            ids, scores = self.matcher_gallery.scores(probe_set, template_ids if indexed else None)
+            scores = [(int(score), template_id) for template_id, score in zip(ids, scores.tolist())
+                      if template_id not in excluded]
+            compared = len(scores)
+            matcher = 'numpy'
+            score, template_id = max(scores, default=(0, None))
+            if template_id is not None and score >= threshold(security_level):
+                best = (template_id, score)
+        else:
+            if probe_set is not None:
+                # Sin índice se puntúa toda la galería: los excluidos se quitan después
+                limit = (max_candidates or self.duplicate_candidates) + (0 if indexed else len(excluded))
+                template_ids, prescreened = self._prescreen(probe_set, template_ids, indexed, limit)
+                template_ids = [template_id for template_id in template_ids if template_id not in excluded]
+            probe_digest = template_digest(template_data)
+            for template_id in template_ids:
+                if time.perf_counter() >= deadline:
+                    complete = False
+                    break
+                entry = gallery.entry(template_id)
+                if entry is None:  # no indexado aún en esta versión
+                    continue
+                result = self.compare_templates(template_data, entry.buffer(), security_level, template_format,
+                                                entry.template_format, probe_digest, entry.digest)
+                if not result['success']:
+                    return result
+                compared += 1
+                if result['matched']:
+                    best = (template_id, result['score'])
+                    break
+
+        duplicate = None
+        if best is not None:
+            owner = self.identities.owner(best[0])
+            duplicate = {
+                'template_id': best[0],
+                'person_id': owner[0] if owner else None,
+                'finger': owner[1] if owner else self._template_finger(gallery.get(best[0], b''),
+                                                                       gallery.template_format(best[0])),
+                'score': best[1]
+            }
+        return {
+            'success': True,
+            'duplicate': duplicate,
+            'compared': compared,
+            'complete': complete,
+            'elapsed_ms': (time.perf_counter() - start) * 1000,
+            'budget_ms': budget_ms,
+            'indexed': indexed,
+            'prescreened': prescreened,
+            'matcher': matcher
+        }
+
+    def _index_templates(self, items):
+        """Indexa las minucias de templates ANSI/ISO [(template_id, template, formato)]
+        (índice y galería del matcher NumPy); SG400 no se puede leer y queda
+        fuera. Las claves del índice se calculan para todos a la vez"""
+        latest = {}
+        for template_id, template_data, template_format in items:
+            latest[template_id] = (template_data, template_format)  # un ID repetido cuenta su última versión
+        parsed = []
+        for template_id, (template_data, template_format) in latest.items():
+            if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+                self._unindex_template(template_id)
+                self.unindexed[template_id] = None
+                continue
+            try:
+                parsed.append((template_id, parse_template(template_data, template_format)))
+                self.unindexed.pop(template_id, None)
+            except TemplateFormatError as e:
+                # Sin índice el template se sigue comparando en todas las identificaciones
+                self._unindex_template(template_id)
+                self.unindexed[template_id] = None
+                print(f"Template {template_id} no indexado: {e}")
+        if parsed:
+            self.template_index.add_many(parsed)
+            self.binary_codes.add_many([(template_id, self.binary_coder.encode(record))
+                                        for template_id, record in parsed])
+            self.matcher_gallery.add_many([(template_id, self.matcher.prepare(record))
+                                           for template_id, record in parsed])
+
+    def _samples_changed(self, person_id, finger):
+        """Las muestras de un dedo cambiaron: rehacer su super-template"""
+        if self.consolidate:
+            self.consolidator.invalidate(person_id, finger)
+            self.consolidator.start()
+
+    def _finger_samples(self, person_id, finger):
+        """[(template_id, template, formato)] de un dedo de una persona (para consolidator)"""
+        template_ids = (self.identities.fingers(person_id) or {}).get(finger, [])
+        gallery = self.gallery.snapshot()
+        return [(template_id, entry.read(), entry.template_format)
+                for template_id, entry in ((template_id, gallery.entry(template_id)) for template_id in template_ids)
+                if entry is not None]
+
+    def _template_views(self, template_data, template_format):
+        """Vistas de un template ANSI/ISO; [] si es SG400 o no se puede leer"""
+        if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+            return []
+        try:
+            return parse_template(template_data, template_format).views
+        except TemplateFormatError:
+            return []
+
+    def _template_finger(self, template_data, template_format):
+        """Posición de dedo de la primera vista de un template ANSI/ISO (0 si no se conoce)"""
+        views = self._template_views(template_data, template_format)
+        return views[0].finger if views else FINGER_UNKNOWN
+
+    def _unindex_template(self, template_id):
+        self.template_index.remove(template_id)
+        self.binary_codes.remove(template_id)
+        self.matcher_gallery.remove(template_id)
+
+    def _assign_identity(self, template_id, person_id, finger):
+        """Asigna un template ya almacenado a una persona y dedo"""
+        with self.write_lock:
+            if self.store is not None:
+                self.store.log_assign(template_id, person_id, finger)
+            self.identities.add(template_id, person_id, finger)
+        self._samples_changed(person_id, finger)
+
+    def delete_template(self, template_id):
+        """Eliminar un template almacenado; False si no existía"""
+        with self.write_lock:
+            if template_id not in self.gallery.snapshot():
+                return False
+            if self.store is not None:
+                self.store.log_delete(template_id)
+            removed = self.gallery.remove(template_id)
+            self.match_cache.invalidate(removed.digest)
+            self._unindex_template(template_id)
+            self.unindexed.pop(template_id, None)
+            owner = self.identities.owner(template_id)
+            self.identities.remove(template_id)
+        if owner is not None:
+            self._samples_changed(*owner)
+        self.scan_order.remove(template_id)
+        return True
+
+    def delete_person(self, person_id):
+        """Eliminar una persona y todas sus muestras; None si no existía"""
+        with self.write_lock:
+            fingers = self.identities.fingers(person_id) or {}
+            template_ids = self.identities.remove_person(person_id)
+            if not template_ids:
+                return None
+            for template_id in template_ids:
+                self.delete_template(template_id)
+        for finger in fingers:
+            self._samples_changed(person_id, finger)
+        return template_ids
+
+    def get_template_format(self, template_id):
+        return self.gallery.snapshot().template_format(template_id)
+
     def get_stored_templates(self):
         """Obtener lista de templates almacenados"""
-        return list(self.stored_templates.keys())
+        return list(self.gallery.snapshot())
+
+    def list_templates(self, gallery, after=0, prefix=None, person_id=None, finger=None, template_format=None,
+                       enrolled_from=None, enrolled_to=None, min_quality=None, max_quality=None):
+        """(cursor, metadatos) de los templates de gallery (una instantánea) que cumplen los filtros
+
+        En orden de alta a partir del cursor after, sin copiar la galería:
+        se puede cortar en cualquier punto y seguir después con el último
+        cursor. El dedo es el asignado a la persona o, si no tiene, el del
+        template."""
+        for template_id, entry in gallery.entries(after):
+            if prefix is not None and not str(template_id).startswith(prefix):
+                continue
+            if template_format is not None and entry.template_format != template_format:
+                continue
+            if enrolled_from is not None and (entry.enrolled is None or entry.enrolled < enrolled_from):
+                continue
+            if enrolled_to is not None and (entry.enrolled is None or entry.enrolled >= enrolled_to):
+                continue
+            if min_quality is not None and (entry.quality is None or entry.quality < min_quality):
+                continue
+            if max_quality is not None and (entry.quality is None or entry.quality > max_quality):
+                continue
+            owner = self.identities.owner(template_id)
+            owner_id, template_finger = owner if owner is not None else (None, entry.finger)
+            if person_id is not None and (owner_id is None or str(owner_id) != str(person_id)):
+                continue
+            if finger is not None and template_finger != finger:
+                continue
+            yield entry.seq, {
+                'template_id': template_id,
+                'template_format': TEMPLATE_FORMAT_NAMES.get(entry.template_format),
+                'person_id': owner_id,
+                'finger': template_finger,
+                'quality': entry.quality,
+                'enrolled': entry.enrolled,
+            }
+
+    def identify_template(self, probe_template, security_level=5, top_k=1,
+                          probe_format=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400, use_index=True, prescreen=True,
+                          early_exit=None):
+        """Identificación 1:N del template contra los almacenados
+
+        Con una sonda ANSI/ISO:
+          - en galerías de al menos index_min_gallery templates solo se
+            consideran los index_candidates más votados por el índice de
+            minucias y/o los code_candidates de código binario más
+            parecido (shortlist_source), más los no indexados (SG400);
+          - el matcher NumPy puntúa esos candidatos en lote y solo los
+            prescreen_candidates mejores (más los SG400) pasan al SDK;
+          - sin SDK (SECUGEN_MATCHER=numpy o SDK no listo) el score NumPy es
+            el resultado y los templates SG400 no se comparan.
+
+        Con early_exit (por defecto SECUGEN_EARLY_EXIT) y top_k 1 los
+        candidatos se recorren primero por scan_order y la búsqueda para en
+        la primera coincidencia con score >= confident_score. Sin salida
+        temprana se comparan todos en su orden original."""
+        gallery = self.gallery.snapshot()  # altas y bajas durante la búsqueda no la afectan
+        probe_record, probe_set = self._prepare_probe(probe_template, probe_format)
+        template_ids, indexed = self._candidate_ids(probe_record, use_index, gallery)
+
+        if probe_set is not None and self._numpy_only():
+            return self._identify_numpy(probe_set, template_ids if indexed else None, security_level, top_k, indexed)
+
+        prescreened = False
+        if prescreen and probe_set is not None:
+            template_ids, prescreened = self._prescreen(probe_set, template_ids, indexed)
+
+        early_exit = (self.early_exit if early_exit is None else early_exit) and top_k <= 1
+        confident = max(threshold(security_level), self.confident_score)
+        if early_exit:
+            template_ids = self.scan_order.order(template_ids)
+
+        candidates = []
+        comparisons = 0
+        stopped = False
+        probe_digest = template_digest(probe_template)
+        for template_id in template_ids:
+            entry = gallery.entry(template_id)
+            if entry is None:  # el índice ya lo tiene pero esta versión de la galería no
+                continue
+            result = self.compare_templates(probe_template, entry.buffer(), security_level,
+                                            probe_format, entry.template_format, probe_digest, entry.digest)
+            comparisons += 1
+            if not result['success']:
+                return result
+            candidates.append({
+                'template_id': template_id,
+                'matched': result['matched'],
+                'score': result['score']
+            })
+            if early_exit and result['matched'] and result['score'] >= confident:
+                stopped = True
+                break
+        return self._identification_result(candidates, top_k, comparisons, indexed, prescreened, 'sdk', stopped)
+
+    def identify_person(self, probes, security_level=5, top_k=1, fusion='max', early_exit=True,
+                        use_index=True, prescreen=True, consolidated=True):
+        """Identificación 1:N por persona (solo templates asignados a una persona)
+
+        probes: [(template, formato, dedo)], uno o varios dedos de la persona
+        buscada (FINGER_UNKNOWN si no se conoce el dedo). Cada sonda se
+        preselecciona como en identify_template y sus candidatos se agrupan
+        por persona, comparando solo las muestras del mismo dedo. Las
+        muestras de una persona se comparan en orden de candidato y, con
+        early_exit, se deja de comparar en cuanto una coincide: con fusión
+        'max' se pasa a la siguiente persona; con 'mean', a la siguiente sonda.
+        El score de la persona es fuse_scores del mejor score de cada sonda.
+
+        Con consolidated, los dedos con super-template (consolidator) se
+        comparan vista a vista contra él en lugar de muestra a muestra."""
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Fusión no soportada: {fusion} (use {', '.join(FUSION_METHODS)})")
+        numpy_only = self._numpy_only()
+        gallery = self.gallery.snapshot()
+        searches = []
+        indexed = prescreened = False
+        for probe_template, probe_format, finger in probes:
+            probe_record, probe_set = self._prepare_probe(probe_template, probe_format)
+            template_ids, probe_indexed = self._candidate_ids(probe_record, use_index, gallery)
+            template_ids = [template_id for template_id in template_ids
+                            if self.identities.owner(template_id) is not None]
+            scores = None
+            if probe_set is not None and numpy_only:
+                ids, values = self.matcher_gallery.scores(probe_set, template_ids)
+                scores = dict(zip(ids, values.tolist()))
+                template_ids = ids
+            elif prescreen and probe_set is not None:
+                template_ids, probe_prescreened = self._prescreen(probe_set, template_ids)
+                prescreened = prescreened or probe_prescreened
+            indexed = indexed or probe_indexed
+            searches.append({
+                'template': probe_template,
+                'buffer': template_buffer(probe_template, probe_format),
+                'format': probe_format,
+                'digest': template_digest(probe_template),
+                'samples': self.identities.group(template_ids, finger),
+                'scores': scores,  # scores NumPy ya calculados (sin SDK)
+            })
+
+        person_ids = list(dict.fromkeys(person_id for search in searches for person_id in search['samples']))
+        minimum = threshold(security_level)
+        merged_ready = consolidated and self.consolidate and self.sdk_ready_event.is_set()
+        candidates = []
+        comparisons = skipped = 0
+        for person_id in person_ids:
+            fingers = []
+            person_matched = False
+            for probe_number, search in enumerate(searches):
+                samples = search['samples'].get(person_id, [])
+                if person_matched and fusion == 'max' and early_exit:
+                    skipped += len(samples)
+                    continue
+                best, compared, error = self._best_sample(gallery, search, samples, security_level, minimum, early_exit,
+                                                          merged_ready and search['scores'] is None)
+                if error is not None:
+                    return error
+                comparisons += compared
+                skipped += len(samples) - compared
+                if best is not None:
+                    best['probe'] = probe_number
+                    fingers.append(best)
+                    person_matched = person_matched or best['matched']
+            score = fuse_scores([finger['score'] for finger in fingers] + [0] * (len(searches) - len(fingers)),
+                                fusion)
+            candidates.append({
+                'person_id': person_id,
+                'matched': person_matched if fusion == 'max' else score >= minimum,
+                'score': score,
+                'fingers': fingers
+            })
+
+        candidates.sort(key=lambda c: c['score'], reverse=True)
+        best = candidates[0] if candidates and candidates[0]['matched'] else None
+        return {
+            'success': True,
+            'identified': best is not None,
+            'person_id': best['person_id'] if best else None,
+            'score': best['score'] if best else 0,
+            'candidates': candidates[:max(1, top_k)],
+            'persons': len(person_ids),
+            'comparisons': comparisons,
+            'skipped': skipped,
+            'fusion': fusion,
+            'consolidated': merged_ready,
+            'indexed': indexed,
+            'prescreened': prescreened,
+            'matcher': 'numpy' if numpy_only and all(search['scores'] is not None for search in searches) else 'sdk'
+        }
+
+    def _best_sample(self, gallery, search, samples, security_level, minimum, early_exit, consolidated=False):
+        """(mejor muestra, comparaciones, error) de una persona para una sonda;
+        error es el resultado de compare_templates si el SDK falla"""
+        # Muestras sueltas (template_id, None) o super-templates (None, MergedTemplate), en orden de candidato
+        units = []
+        merged_seen = set()
+        for template_id in samples:
+            owner = self.identities.owner(template_id)
+            merged = self.consolidator.get(*owner) if consolidated and owner is not None else None
+            if merged is not None and template_id in merged.template_ids:
+                if owner not in merged_seen:
+                    merged_seen.add(owner)
+                    units.append((None, merged))
+            else:
+                units.append((template_id, None))
+
+        best = None
+        compared = 0
+        for template_id, merged in units:
+            if merged is not None:
+                err, sample, matched, score, views = match_merged(self.sgfp, search['buffer'], search['format'],
+                                                                  merged, security_level, early_exit)
+                compared += views
+                if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                    return None, compared, {'success': False, 'error': f'Error en comparación: {err}'}
+                template_id = merged.template_ids[sample]
+            elif search['scores'] is not None:
+                score = int(search['scores'][template_id])
+                matched = score >= minimum
+                compared += 1
+            else:
+                entry = gallery.entry(template_id)
+                if entry is None:  # el índice ya lo tiene pero esta versión de la galería no
+                    continue
+                result = self.compare_templates(search['template'], entry.buffer(), security_level,
+                                                search['format'], entry.template_format,
+                                                search['digest'], entry.digest)
+                if not result['success']:
+                    return None, compared, result
+                score, matched = result['score'], result['matched']
+                compared += 1
+            if best is None or score > best['score']:
+                owner = self.identities.owner(template_id)
+                best = {
+                    'template_id': template_id,
+                    'finger': owner[1] if owner else FINGER_UNKNOWN,
+                    'matched': matched,
+                    'score': score
+                }
+            if matched and early_exit:
+                break
+        return best, compared, None
+
+    def _prepare_probe(self, probe_template, probe_format):
+        """(TemplateRecord, MinutiaeSet) de una sonda ANSI/ISO; (None, None) si es SG400 o ilegible"""
+        if probe_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+            return None, None
+        try:
+            probe_record = parse_template(probe_template, probe_format)
+            return probe_record, self.matcher.prepare(probe_record)
+        except TemplateFormatError as e:
+            print(f"Sonda no legible, búsqueda exhaustiva con el SDK: {e}")
+            return None, None
+
+    def _candidate_ids(self, probe_record, use_index=True, gallery=None):
+        """(template_ids, indexed): preselección en galerías de al menos
+        index_min_gallery templates (más los no indexados); si no, todos"""
+        gallery = self.gallery.snapshot() if gallery is None else gallery
+        if use_index and probe_record is not None and len(gallery) >= self.index_min_gallery:
+            template_ids = self._shortlist(probe_record)
+            # tuple() copia las claves sin soltar el GIL: las altas lo cambian sin esperar a las lecturas
+            template_ids += [template_id for template_id in tuple(self.unindexed) if template_id in gallery]
+            return template_ids, True
+        return list(gallery), False
+
+    def _prescreen(self, probe_set, template_ids, indexed=True, limit=None):
+        """(template_ids, prescreened): los prescreen_candidates (o limit) mejores
+        según el matcher NumPy, de mejor a peor, más los que no puede puntuar (SG400)"""
+        limit = self.prescreen_candidates if limit is None else limit
+        if not 0 < limit < len(template_ids):
+            return template_ids, False
+        ids, raw = self.matcher_gallery.raw_scores(probe_set, template_ids if indexed else None)
+        best = np.argsort(-raw, kind='stable')[:limit]
+        return [ids[position] for position in best.tolist()] \
+            + [template_id for template_id in template_ids if template_id not in self.matcher_gallery], True
 
-controller = SecugenController()
+    def _shortlist(self, probe_record):
+        """Candidatos del índice de minucias y/o de los códigos binarios, sin repetir"""
+        template_ids = []
+        if self.shortlist_source in ('index', 'both'):
+            template_ids += [template_id for template_id, _ in
+                             self.template_index.candidates(probe_record, max_candidates=self.index_candidates)]
+        if self.shortlist_source in ('codes', 'both'):
+            template_ids += [template_id for template_id, _ in
+                             self.binary_codes.candidates(self.binary_coder.encode(probe_record),
+                                                          max_candidates=self.code_candidates)]
+        return list(dict.fromkeys(template_ids))
+
+    def _identify_numpy(self, probe_set, template_ids, security_level, top_k, indexed):
+        """Identificación solo con el matcher NumPy, en lote"""
+        ids, scores = self.matcher_gallery.scores(probe_set, template_ids)
+        minimum = threshold(security_level)
+        candidates = [{'template_id': template_id, 'matched': bool(score >= minimum), 'score': int(score)}
+                      for template_id, score in zip(ids, scores.tolist())]
+        return self._identification_result(candidates, top_k, len(ids), indexed, False, 'numpy')
+
+    def _identification_result(self, candidates, top_k, comparisons, indexed, prescreened, matcher,
+                               early_exit=False):
+        candidates.sort(key=lambda c: c['score'], reverse=True)
+        best = candidates[0] if candidates and candidates[0]['matched'] else None
+        hot = best is not None and best['template_id'] in self.scan_order
+        self.scan_order.record(comparisons, best is not None, early_exit, hot)
+        if best is not None:
+            self.scan_order.hit(best['template_id'])
+        return {
+            'success': True,
+            'identified': best is not None,
+            'template_id': best['template_id'] if best else None,
+            'score': best['score'] if best else 0,
+            'candidates': candidates[:max(1, top_k)],
+            'comparisons': comparisons,
+            'indexed': indexed,
+            'prescreened': prescreened,
+            'early_exit': early_exit,
+            'matcher': matcher
+        }
+
+# Arranque rápido: Flask atiende peticiones mientras el SDK se carga y el
+# lector se abre en segundo plano (SECUGEN_LAZY_INIT=0 para hacerlo al importar)
+# SECUGEN_DEVICE_POOL=1 abre todos los lectores conectados (ver sdk/devicepool.py)
+# Los procesos del cruce N×N (forkserver/spawn, sdk/crossmatch.py) vuelven a
+# ejecutar este script como __mp_main__: ahí no se abre el lector ni la galería
+if __name__ == '__mp_main__':
+    controller = None
+else:
+    controller = SecugenController(background=os.environ.get('SECUGEN_LAZY_INIT', '1') != '0',
+                                   device_pool=os.environ.get('SECUGEN_DEVICE_POOL', '0') == '1')
+
+def parse_template_format(value, default=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400):
+    """Formato de template de la petición: 'sg400', 'ansi378' o 'iso19794'"""
+    if value is None or value == '':
+        return default
+    template_format = TEMPLATE_FORMATS.get(str(value).lower())
+    if template_format is None:
+        raise ValueError(f"Formato de template no soportado: {value} (use {', '.join(TEMPLATE_FORMATS)})")
+    return template_format
+
+def parse_finger(value):
+    """Posición de dedo de la petición: 0 (desconocido) o 1-10 como en ANSI/ISO; None si no se indica"""
+    if value is None or value == '':
+        return None
+    try:
+        finger = int(value)
+    except (TypeError, ValueError):
+        finger = -1
+    if not 0 <= finger <= 10:
+        raise ValueError(f"Dedo no válido: {value} (use 0-10)")
+    return finger
+
+def parse_duplicate_policy(value):
+    """Política de duplicados de la petición: 'reject', 'link', 'off'/false (no comprobar) o None (la del servidor)"""
+    if value is None or value == '':
+        return None
+    if value is False or str(value).lower() == 'off':
+        return 'off'
+    policy = str(value).lower()
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Política de duplicados no soportada: {value} (use {', '.join(DUPLICATE_POLICIES)} u off)")
+    return policy
+
+LIST_PAGE_SIZE = 1000  # templates por página de GET /templates
+LIST_MAX_PAGE = 10000
+
+def parse_timestamp(value):
+    """Instante de la petición en segundos epoch o ISO 8601 (sin zona: hora local); None si no se indica"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Fecha no válida: {value} (use segundos epoch o ISO 8601)")
+
+def parse_list_filters(args):
+    """Cursor y filtros de GET /templates como argumentos de list_templates"""
+    cursor = args.get('cursor') or '0'
+    if not cursor.isdigit():
+        raise ValueError(f"Cursor no válido: {cursor}")
+    quality = {}
+    for name in ('min_quality', 'max_quality'):
+        value = args.get(name)
+        quality[name] = None if value in (None, '') else int(value)
+    template_format = args.get('template_format')
+    return dict(after=int(cursor), prefix=args.get('prefix') or None, person_id=args.get('person_id') or None,
+                finger=parse_finger(args.get('finger')),
+                template_format=parse_template_format(template_format) if template_format else None,
+                enrolled_from=parse_timestamp(args.get('enrolled_from')),
+                enrolled_to=parse_timestamp(args.get('enrolled_to')), **quality)
+
+MAX_IMPORT_ERRORS = 100  # errores detallados en la respuesta de POST /templates/importar
+
+def parse_bulk_record(fields, default_format):
+    """(template_id, template, formato, person_id, finger) de un registro de importación; ValueError si no vale
+
+    template_id queda como texto, igual que en las altas de una en una."""
+    template_id = fields.get('template_id')
+    if isinstance(template_id, bool) or not isinstance(template_id, (str, int)) or template_id == '':
+        raise ValueError("template_id debe ser un texto o un entero")
+    person_id = fields.get('person_id')
+    if isinstance(person_id, bool) or not isinstance(person_id, (str, int, type(None))):
+        raise ValueError("person_id debe ser un texto o un entero")
+    template = fields.get('template')
+    if not template:
+        raise ValueError("Falta template_data")
+    template_format = parse_template_format(fields.get('template_format'), default_format)
+    controller.check_template(template, template_format)  # tamaño máximo de la arena, SG400 de 400 bytes
+    if template_format != SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+        parse_template(template, template_format)  # TemplateFormatError (ValueError) si está dañado
+    return str(template_id), bytearray(template), template_format, person_id, parse_finger(fields.get('finger'))
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: el proceso está vivo y atiende peticiones"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: el lector está abierto y listo para capturar"""
+    status = {
+        'ready': controller.initialized,
+        'sdk_ready': controller.sdk_ready,
+        'initializing': controller.initializing
+    }
+    if not controller.initialized and controller.init_error:
+        status['error'] = controller.init_error
+    return jsonify(status), 200 if controller.initialized else 503
 
 @app.route('/initialize', methods=['POST'])
 def initialize_device():
@@ -539,7 +1739,8 @@ def initialize_device():
                 "message": "Dispositivo ya está inicializado correctamente"
             })
         
-        result = controller.initializeDevice()
+        with controller.operation_lock:
+            result = controller.initializeDevice() if not controller.initialized else True
         if result:
             return jsonify({
                 "success": True,
@@ -564,6 +1765,13 @@ def control_led():
             raise Exception("No se recibieron datos JSON")
         
         state = data.get('state', False)
+        if controller.device_pool is not None:
+            controller.device_pool.led(bool(state), serial=data.get('device_serial'))
+            return jsonify({
+                "success": True,
+                "message": f"LED del lector {'encendido' if state else 'apagado'}"
+            })
+
         result = controller.led_control(state)
         
         if not result['success']:
@@ -592,6 +1800,17 @@ def control_led():
 
 @app.route('/capturar-huella', methods=['POST'])
 def capturar_huella():
+    if controller.device_pool is not None:
+        return capturar_huella_pool()
+
+    try:
+        request_data = request.get_json(silent=True) or {}
+        template_format = parse_template_format(request_data.get('template_format'))
+        finger = parse_finger(request_data.get('finger'))
+        duplicate_policy = parse_duplicate_policy(request_data.get('duplicate_check'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
     with controller.operation_lock:  # PREVENCIÓN: Evitar operaciones concurrentes críticas
         try:
             # PREVENCIÓN: Mantenimiento preventivo antes de operaciones críticas
@@ -601,10 +1820,7 @@ def capturar_huella():
             save_image = data.get('save_image', False)  # Por defecto no guardar
             create_template = data.get('create_template', False)  # Por defecto no crear template
             template_id = data.get('template_id', None)  # ID para almacenar template
-            
-            # Inicializar variables para width y height
-            width = c_long(258)    # Ancho típico del sensor
-            height = c_long(336)   # Alto típico del sensor
+            person_id = data.get('person_id', None)  # Persona a la que pertenece la muestra
             
             # Verificar estado del dispositivo antes de continuar
             if not controller.initialized:
@@ -612,30 +1828,13 @@ def capturar_huella():
                 if not controller.auto_recovery():
                     raise Exception("No se pudo inicializar el dispositivo tras múltiples intentos")
             
-            print("Obteniendo información del dispositivo...")
-            err = controller.sgfp.GetDeviceInfo(width, height)
-            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
-                # Intentar recuperación automática si falla GetDeviceInfo
-                print(f"Error al obtener info del dispositivo: {err}, intentando recuperación...")
-                if controller.auto_recovery():
-                    # Reintentar después de recuperación
-                    err = controller.sgfp.GetDeviceInfo(width, height)
-                    if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
-                        raise Exception(f'Error al obtener información del dispositivo tras recuperación: {err}')
-                else:
-                    raise Exception(f'Error al obtener información del dispositivo: {err}')
-            
+            # Geometría en caché desde la apertura del lector (sin tráfico USB)
+            device_info = controller.device_info or controller._load_device_info()
+            width = c_long(device_info['width'])
+            height = c_long(device_info['height'])
             print(f"Dimensiones del sensor: {width.value}x{height.value}")
         
-            # Validar dimensiones antes de crear buffer (SEGURIDAD)
-            if width.value <= 0 or height.value <= 0 or width.value > 1000 or height.value > 1000:
-                raise Exception(f"Dimensiones del sensor inválidas: {width.value}x{height.value}")
-        
-            # Crear buffer del tamaño correcto con protección
             buffer_size = width.value * height.value
-            if buffer_size > 1000000:  # Máximo 1MB de buffer
-                raise Exception(f"Buffer de imagen demasiado grande: {buffer_size} bytes")
-        
             try:
                 imageBuffer = bytearray(buffer_size)
             except MemoryError:
@@ -675,6 +1874,12 @@ def capturar_huella():
                         print("Error de acceso detectado, intentando recuperación...")
                         if controller.auto_recovery():
                             print("Recuperación exitosa, reintentando captura...")
+                            # El lector reabierto puede tener otra geometría
+                            device_info = controller.device_info
+                            if device_info['width'] * device_info['height'] != buffer_size:
+                                width.value, height.value = device_info['width'], device_info['height']
+                                buffer_size = width.value * height.value
+                                imageBuffer = bytearray(buffer_size)
                             continue
                         else:
                             print("Recuperación falló")
@@ -705,10 +1910,11 @@ def capturar_huella():
             # Crear template si se solicita (con manejo de errores mejorado)
             template_base64 = None
             template_created = False
+            store_result = None
             if create_template:
                 try:
                     print("Iniciando creación de template...")
-                    template_data = controller.create_template(imageBuffer)
+                    template_data = controller.create_template(imageBuffer, template_format)
                     if template_data and len(template_data) > 0:
                         template_base64 = base64.b64encode(bytes(template_data)).decode('utf-8')
                         template_created = True
@@ -717,7 +1923,9 @@ def capturar_huella():
                         # Almacenar template si se proporciona ID
                         if template_id:
                             try:
-                                store_result = controller.store_template(template_id, template_data)
+                                # Con duplicate_check se busca antes el mismo dedo en la galería
+                                store_result = controller.enroll_template(template_id, template_data, template_format,
+                                                                          person_id, finger, duplicate_policy)
                                 print(f"Template almacenado con ID {template_id}: {store_result}")
                             except Exception as store_error:
                                 print(f"Advertencia: Error al almacenar template: {store_error}")
@@ -741,23 +1949,30 @@ def capturar_huella():
             controller.last_successful_operation = time.time()
             controller.operation_count += 1
         
+            stored = bool(store_result and store_result.get('success'))
+            rejected = bool(store_result and store_result.get('rejected'))
             return jsonify({
-                'success': True,
+                'success': not rejected,
+                **({'error': store_result['error']} if rejected else {}),
                 'data': {
                     'imagen': imagen_base64,
                     'template': template_base64,
                     'template_created': template_created,
+                    'template_format': TEMPLATE_FORMAT_NAMES[template_format] if template_created else None,
+                    'template_size': len(template_data) if template_created else 0,
                     'width': width.value,
                     'height': height.value,
                     'buffer_size': buffer_size,
                     'mensaje': 'Huella capturada exitosamente',
-                    'template_stored': template_id if template_id and template_created else None,
+                    'template_stored': template_id if stored else None,
+                    'person_id': store_result.get('person_id', person_id) if stored else None,
+                    'duplicate_check': store_result.get('duplicate_check') if store_result else None,
                     'capture_attempts': max_attempts,
                     'device_status': 'responsive',
                     'operation_count': controller.operation_count,  # DIAGNÓSTICO: Mostrar contador de operaciones
                     'last_maintenance': controller.operation_count >= controller.max_operations_before_refresh - 10  # Advertir si se acerca mantenimiento
                 }
-            })
+            }), 409 if rejected else 200
 
         except Exception as e:
             # Asegurarse de apagar el LED en caso de error
@@ -782,6 +1997,79 @@ def capturar_huella():
             
             return jsonify(diagnostic_info), 500
 
+def capturar_huella_pool():
+    """Captura en modo pool: lector pedido por 'device_serial' o el menos ocupado"""
+    data = request.get_json(silent=True) or {}
+    device_serial = data.get('device_serial')
+    create_template = data.get('create_template', False)
+    template_id = data.get('template_id', None)
+    person_id = data.get('person_id', None)
+    try:
+        template_format = parse_template_format(data.get('template_format'))
+        finger = parse_finger(data.get('finger'))
+        duplicate_policy = parse_duplicate_policy(data.get('duplicate_check'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        # El hilo del lector captura y extrae el template con su propio objeto SGFPM
+        result = controller.device_pool.capture(serial=device_serial, create_template=create_template,
+                                                template_format=template_format)
+    except KeyError:
+        return jsonify({
+            'success': False,
+            'error': f'Lector {device_serial} no encontrado',
+            'devices': [reader['device_serial'] for reader in controller.device_pool.status()]
+        }), 404
+    except Exception as e:
+        print(f"Error en capturar_huella (pool): {e}")
+        return jsonify({
+            'error': str(e),
+            'device_serial': device_serial,
+            'devices': controller.device_pool.status(),
+            'timestamp': time.time(),
+            'suggestion': 'Verifique la conexión del lector o use otro número de serie'
+        }), 500
+
+    image = result['image']
+    template_data = result['template']
+    imagen_base64 = base64.b64encode(bytes(image)).decode('utf-8')
+    template_base64 = base64.b64encode(bytes(template_data)).decode('utf-8') if template_data else None
+    store_result = None
+    if template_data and template_id:
+        store_result = controller.enroll_template(template_id, template_data, template_format, person_id, finger,
+                                                  duplicate_policy)
+        print(f"Template almacenado con ID {template_id}: {store_result}")
+    stored = bool(store_result and store_result.get('success'))
+    rejected = bool(store_result and store_result.get('rejected'))
+
+    if data.get('save_image', False):
+        try:
+            with open('/app/images/huella.png', 'wb') as f:
+                f.write(bytes(image))
+        except Exception as e:
+            print(f"Error al guardar imagen: {e}")
+
+    return jsonify({
+        'success': not rejected,
+        **({'error': store_result['error']} if rejected else {}),
+        'data': {
+            'imagen': imagen_base64,
+            'template': template_base64,
+            'template_created': template_data is not None,
+            'template_format': TEMPLATE_FORMAT_NAMES[template_format] if template_data else None,
+            'template_size': len(template_data) if template_data else 0,
+            'width': result['width'],
+            'height': result['height'],
+            'buffer_size': len(image),
+            'mensaje': 'Huella capturada exitosamente',
+            'template_stored': template_id if stored else None,
+            'person_id': store_result.get('person_id', person_id) if stored else None,
+            'duplicate_check': store_result.get('duplicate_check') if store_result else None,
+            'device_serial': result['device_serial'],
+            'device_status': 'responsive'
+        }
+    }), 409 if rejected else 200
+
 @app.route('/comparar-huellas', methods=['POST'])
 def comparar_huellas():
     try:
@@ -795,34 +2083,47 @@ def comparar_huellas():
         template1_data = data.get('template1_data')  # Base64
         template2_data = data.get('template2_data')  # Base64
         security_level = data.get('security_level', 5)  # SL_NORMAL por defecto
+        # Formato de los templates enviados en base64 (los almacenados guardan el suyo)
+        default_format = parse_template_format(data.get('template_format'))
         
         # Obtener templates para comparar
-        if template1_id and template1_id in controller.stored_templates:
-            template1 = controller.stored_templates[template1_id]
+        gallery = controller.gallery.snapshot()
+        entry1 = gallery.entry(template1_id) if template1_id else None
+        entry2 = gallery.entry(template2_id) if template2_id else None
+        digest1 = digest2 = None
+        if entry1 is not None:
+            template1, format1, digest1 = entry1.template, entry1.template_format, entry1.digest
         elif template1_data:
             template1 = bytearray(base64.b64decode(template1_data))
+            format1 = parse_template_format(data.get('template1_format'), default_format)
         else:
             raise Exception("No se proporcionó template1 válido")
         
-        if template2_id and template2_id in controller.stored_templates:
-            template2 = controller.stored_templates[template2_id]
+        if entry2 is not None:
+            template2, format2, digest2 = entry2.template, entry2.template_format, entry2.digest
         elif template2_data:
             template2 = bytearray(base64.b64decode(template2_data))
+            format2 = parse_template_format(data.get('template2_format'), default_format)
         else:
             raise Exception("No se proporcionó template2 válido")
         
         # Comparar templates
-        result = controller.compare_templates(template1, template2, security_level)
+        result = controller.compare_templates(template1, template2, security_level, format1, format2,
+                                              digest1, digest2)
         
         if result['success']:
             return jsonify({
                 'success': True,
                 'matched': result['matched'],
                 'score': result['score'],
+                'matcher': result['matcher'],
+                'cached': result['cached'],
                 'message': result['message'],
                 'comparison_info': {
                     'template1_source': template1_id if template1_id else 'data',
                     'template2_source': template2_id if template2_id else 'data',
+                    'template1_format': TEMPLATE_FORMAT_NAMES[format1],
+                    'template2_format': TEMPLATE_FORMAT_NAMES[format2],
                     'security_level': security_level
                 }
             })
@@ -832,28 +2133,503 @@ def comparar_huellas():
                 'error': result['error']
             }), 500
             
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error en comparar_huellas: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def resolve_batch_template(pair, n, default_format):
+    """(template, formato, digest, origen) del template n (1 o 2) de un par del lote"""
+    template_id = pair.get(f'template{n}_id')
+    template_data = pair.get(f'template{n}_data')  # Base64
+    if template_id:
+        entry = controller.gallery.snapshot().entry(template_id)
+        if entry is None:
+            raise ValueError(f"Template no encontrado: {template_id}")
+        return entry.template, entry.template_format, entry.digest, template_id
+    if template_data:
+        template_format = parse_template_format(pair.get(f'template{n}_format'), default_format)
+        try:
+            template = bytearray(base64.b64decode(template_data, validate=True))
+        except binascii.Error:
+            raise ValueError(f"template{n}_data no es base64 válido")
+        return template, template_format, None, 'data'
+    raise ValueError(f"No se proporcionó template{n} válido")
+
+@app.route('/comparar-huellas/lote', methods=['POST'])
+def comparar_huellas_lote():
+    """Compara muchos pares en una petición
+
+    Cuerpo: {"pairs": [{template1_id | template1_data [+ template1_format],
+    template2_id | template2_data [+ template2_format], security_level?}, ...],
+    "security_level", "template_format", "stream"}. Con "stream": true la
+    respuesta es NDJSON: una línea por par según terminan y una última línea
+    con el resumen."""
+    try:
+        data = request.get_json()
+        if not data:
+            raise Exception("No se recibieron datos JSON")
+        pairs = data.get('pairs')
+        if not isinstance(pairs, list) or not pairs:
+            raise ValueError("pairs debe ser una lista no vacía de pares")
+        if len(pairs) > controller.batch_max_pairs:
+            raise ValueError(f"Demasiados pares: {len(pairs)} (máximo {controller.batch_max_pairs})")
+        security_level = data.get('security_level', 5)  # SL_NORMAL por defecto
+        default_format = parse_template_format(data.get('template_format'))
+        stream = data.get('stream', False) is True
+
+        # Los pares mal formados fallan solos, sin invalidar el resto del lote
+        jobs = []
+        invalid = {}
+        for index, pair in enumerate(pairs):
+            try:
+                if not isinstance(pair, dict):
+                    raise ValueError("cada par debe ser un objeto")
+                template1, format1, digest1, _ = resolve_batch_template(pair, 1, default_format)
+                template2, format2, digest2, _ = resolve_batch_template(pair, 2, default_format)
+                jobs.append((index, {
+                    'template1': template1, 'template2': template2,
+                    'security_level': pair.get('security_level', security_level),
+                    'format1': format1, 'format2': format2, 'digest1': digest1, 'digest2': digest2,
+                }))
+            except (ValueError, TypeError) as e:
+                invalid[index] = {'success': False, 'error': str(e)}
+
+        def results():
+            for index, result in invalid.items():
+                yield index, result
+            indexes = [index for index, _ in jobs]
+            for position, result in controller.compare_batch([job for _, job in jobs]):
+                yield indexes[position], result
+
+        def entry(index, result):
+            item = {'index': index, 'success': result['success']}
+            if result['success']:
+                item.update(matched=result['matched'], score=result['score'],
+                            matcher=result['matcher'], cached=result['cached'])
+            else:
+                item['error'] = result['error']
+            return item
+
+        started = time.perf_counter()
+        summary = {'pairs': len(pairs), 'matched': 0, 'errors': 0, 'cached': 0}
+
+        def count(item):
+            summary['matched'] += bool(item.get('matched'))
+            summary['errors'] += not item['success']
+            summary['cached'] += bool(item.get('cached'))
+
+        if stream:
+            def generate():
+                for index, result in results():
+                    item = entry(index, result)
+                    count(item)
+                    yield json.dumps(item) + '\n'
+                summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                yield json.dumps({'summary': summary}) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        items = [None] * len(pairs)
+        for index, result in results():
+            items[index] = entry(index, result)
+            count(items[index])
+        summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return jsonify({'success': True, 'results': items, 'summary': summary})
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error en comparar_huellas_lote: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cruce-galeria', methods=['POST'])
+def lanzar_cruce_galeria():
+    """Cruce N×N de la galería en segundo plano para auditar duplicados
+
+    Cuerpo opcional: {"security_level", "min_score", "processes", "resume"}.
+    Solo se guardan los pares con score >= min_score (por defecto el umbral
+    del nivel de seguridad). Con "resume" (por defecto) un cruce interrumpido
+    sobre la misma galería continúa desde su último checkpoint."""
+    try:
+        data = request.get_json(silent=True) or {}
+        security_level = int(data.get('security_level', 5))
+        min_score = data.get('min_score')
+        min_score = None if min_score is None else int(min_score)
+        processes = data.get('processes')
+        processes = None if processes is None else int(processes)
+        if len(controller.gallery) < 2:
+            raise ValueError("Se necesitan al menos dos templates almacenados")
+        job = controller.start_crossmatch(security_level, min_score, processes, data.get('resume', True) is not False)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Ya hay un cruce en curso',
+                            'status': controller.crossmatch.status()}), 409
+        return jsonify({'success': True, 'status': job.status()}), 202
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error en lanzar_cruce_galeria: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cruce-galeria', methods=['GET'])
+def estado_cruce_galeria():
+    """Progreso del último cruce: pares hechos, pares/s, ETA y coincidencias"""
+    if controller.crossmatch is None:
+        return jsonify({'success': False, 'error': 'No se ha lanzado ningún cruce'}), 404
+    return jsonify({'success': True, 'status': controller.crossmatch.status()})
+
+@app.route('/cruce-galeria/resultados', methods=['GET'])
+def resultados_cruce_galeria():
+    """Pares encontrados hasta ahora en NDJSON, también con el cruce en curso"""
+    job = controller.crossmatch
+    if job is None:
+        return jsonify({'success': False, 'error': 'No se ha lanzado ningún cruce'}), 404
+
+    def generate():
+        for hit in job.results():
+            yield json.dumps(hit) + '\n'
+        yield json.dumps({'summary': job.status()}) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/cruce-galeria', methods=['DELETE'])
+def cancelar_cruce_galeria():
+    """Para el cruce tras la unidad en curso; se puede reanudar con POST"""
+    if controller.crossmatch is None:
+        return jsonify({'success': False, 'error': 'No se ha lanzado ningún cruce'}), 404
+    controller.crossmatch.cancel()
+    return jsonify({'success': True, 'status': controller.crossmatch.status()})
+
+@app.route('/instantanea-galeria', methods=['POST'])
+def guardar_instantanea_galeria():
+    """Instantánea de la galería ahora (además de las periódicas); vacía el WAL"""
+    if controller.store is None:
+        return jsonify({'success': False, 'error': 'Persistencia desactivada (SECUGEN_DATA_DIR)'}), 409
+    try:
+        return jsonify({'success': True, 'snapshot': controller.save_snapshot(),
+                        'persistence': controller.persistence_status()})
+    except Exception as e:
+        print(f"Error en guardar_instantanea_galeria: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/identificar-huella', methods=['POST'])
+def identificar_huella():
+    try:
+        data = request.get_json()
+        if not data:
+            raise Exception("No se recibieron datos JSON")
+
+        template_id = data.get('template_id')
+        template_data = data.get('template_data')  # Base64
+        security_level = data.get('security_level', 5)  # SL_NORMAL por defecto
+        top_k = int(data.get('top_k', 1))
+        use_index = data.get('use_index', True) is not False  # false fuerza la búsqueda exhaustiva
+        prescreen = data.get('prescreen', True) is not False  # false: todos los candidatos al SDK
+        early_exit = data.get('early_exit')  # true: parar en la primera coincidencia segura (top_k 1)
+
+        entry = controller.gallery.snapshot().entry(template_id) if template_id else None
+        if entry is not None:
+            probe, probe_format = entry.template, entry.template_format
+        elif template_data:
+            probe = bytearray(base64.b64decode(template_data))
+            probe_format = parse_template_format(data.get('template_format'))
+        else:
+            raise Exception("No se proporcionó template válido")
+
+        result = controller.identify_template(probe, security_level, top_k, probe_format, use_index, prescreen,
+                                              None if early_exit is None else early_exit is True)
+
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'identified': result['identified'],
+                'template_id': result['template_id'],
+                'score': result['score'],
+                'candidates': result['candidates'],
+                'comparisons': result['comparisons'],
+                'indexed': result['indexed'],
+                'prescreened': result['prescreened'],
+                'early_exit': result['early_exit'],
+                'matcher': result['matcher'],
+                'template_format': TEMPLATE_FORMAT_NAMES[probe_format],
+                'security_level': security_level
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 500
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error en identificar_huella: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/identificar-persona', methods=['POST'])
+def identificar_persona():
+    """Identificación 1:N por persona
+
+    Cuerpo: una sonda (template_id | template_data [+ template_format],
+    finger) o varias en "probes": [{...}, ...], y security_level, top_k,
+    fusion ('max' o 'mean'), early_exit, use_index, prescreen."""
+    try:
+        data = request.get_json()
+        if not data:
+            raise Exception("No se recibieron datos JSON")
+
+        security_level = data.get('security_level', 5)  # SL_NORMAL por defecto
+        top_k = int(data.get('top_k', 1))
+        fusion = data.get('fusion', 'max')
+        early_exit = data.get('early_exit', True) is not False  # false compara todas las muestras
+        use_index = data.get('use_index', True) is not False
+        prescreen = data.get('prescreen', True) is not False
+        consolidated = data.get('consolidated', True) is not False  # false: muestra a muestra
+        default_format = parse_template_format(data.get('template_format'))
+
+        probes = []
+        for probe in data.get('probes') or [data]:
+            template_id = probe.get('template_id')
+            template_data = probe.get('template_data')  # Base64
+            entry = controller.gallery.snapshot().entry(template_id) if template_id else None
+            if entry is not None:
+                template, template_format = entry.template, entry.template_format
+            elif template_data:
+                template = bytearray(base64.b64decode(template_data))
+                template_format = parse_template_format(probe.get('template_format'), default_format)
+            else:
+                raise ValueError("No se proporcionó template válido")
+            finger = parse_finger(probe.get('finger'))
+            probes.append((template, template_format, FINGER_UNKNOWN if finger is None else finger))
+
+        result = controller.identify_person(probes, security_level, top_k, fusion, early_exit, use_index, prescreen,
+                                            consolidated)
+
+        if result['success']:
+            return jsonify(dict(result, security_level=security_level))
+        else:
+            return jsonify({
+                'success': False,
+                'error': result['error']
+            }), 500
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error en identificar_persona: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/personas', methods=['GET'])
+def listar_personas():
+    try:
+        persons = controller.identities.person_ids()
+        return jsonify({
+            'success': True,
+            'persons': persons,
+            'count': len(persons)
+        })
+    except Exception as e:
+        print(f"Error en listar_personas: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/personas/<person_id>', methods=['GET'])
+def obtener_persona(person_id):
+    fingers = controller.identities.fingers(person_id)
+    if fingers is None:
+        return jsonify({
+            'success': False,
+            'error': 'Persona no encontrada'
+        }), 404
+    return jsonify({
+        'success': True,
+        'person_id': person_id,
+        'fingers': {str(finger): samples for finger, samples in fingers.items()},
+        'templates': sum(len(samples) for samples in fingers.values())
+    })
+
+@app.route('/personas/<person_id>', methods=['DELETE'])
+def eliminar_persona(person_id):
+    try:
+        template_ids = controller.delete_person(person_id)
+        if template_ids is None:
+            return jsonify({
+                'success': False,
+                'error': 'Persona no encontrada'
+            }), 404
+        return jsonify({
+            'success': True,
+            'message': f'Persona {person_id} eliminada',
+            'templates_deleted': template_ids
+        })
+    except Exception as e:
+        print(f"Error en eliminar_persona: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/templates', methods=['GET'])
 def listar_templates():
+    """Templates almacenados en orden de alta, todos o por páginas
+
+    Sin limit ni cursor devuelve todos los que cumplan los filtros, como
+    antes de la paginación. Con alguno de los dos pagina: limit
+    (LIST_PAGE_SIZE por defecto, hasta LIST_MAX_PAGE) y cursor (next_cursor
+    de la página anterior). Filtros: prefix, person_id, finger,
+    template_format, enrolled_from/enrolled_to (segundos epoch o ISO 8601)
+    y min_quality/max_quality. "templates" son los IDs, o
+    sus metadatos con details=true. "count" es el total de la galería (un
+    contador, no se recorre). format=ndjson devuelve en streaming un objeto
+    por línea, todos los que cumplan los filtros salvo que se indique limit,
+    y una línea final con el resumen."""
+    try:
+        stream = request.args.get('format', 'json') == 'ndjson'
+        limit = request.args.get('limit')
+        paged = limit is not None or 'cursor' in request.args
+        if limit is not None or (paged and not stream):
+            limit = int(limit or LIST_PAGE_SIZE)
+            if limit < 1 or (limit > LIST_MAX_PAGE and not stream):
+                raise ValueError(f"limit debe estar entre 1 y {LIST_MAX_PAGE}")
+        filters = parse_list_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    gallery = controller.gallery.snapshot()
+    templates = controller.list_templates(gallery, **filters)
+    if stream:
+        def generate():
+            returned = 0
+            cursor = None
+            for cursor, info in templates:
+                yield json.dumps(info) + '\n'
+                returned += 1
+                if returned == limit:
+                    break
+            yield json.dumps({'summary': {'returned': returned, 'count': len(gallery),
+                                          'next_cursor': str(cursor) if returned == limit else None}}) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     try:
-        templates = controller.get_stored_templates()
+        details = request.args.get('details', '').lower() in ('1', 'true', 'yes')
+        page = []
+        cursor = None
+        for cursor, info in templates:
+            page.append(info if details else info['template_id'])
+            if len(page) == limit:
+                break
         return jsonify({
             'success': True,
-            'templates': templates,
-            'count': len(templates)
+            'templates': page,
+            'count': len(gallery),
+            'returned': len(page),
+            'next_cursor': str(cursor) if len(page) == limit else None
         })
     except Exception as e:
         print(f"Error en listar_templates: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/templates/importar', methods=['POST'])
+def importar_templates():
+    """Importación masiva de templates desde un stream NDJSON o binario (ver sdk/templatestream.py)
+
+    El cuerpo se lee por trozos según llega (admite Transfer-Encoding:
+    chunked): Content-Type application/octet-stream es el formato binario y
+    cualquier otro NDJSON. Cada registro se valida por separado y los válidos
+    se almacenan en lotes de batch_size (store_templates). Parámetros:
+    template_format (el de los registros que no lo indican) y batch_size.
+    Un template con un ID existente se reemplaza; no se comprueban duplicados
+    (POST /cruce-galeria para auditarlos después). Si se rechaza algún
+    registro la respuesta es 400 con el número de registro (línea en NDJSON)
+    del primero; los válidos quedan almacenados."""
+    try:
+        binary = request.args.get('format', 'binary' if request.mimetype == BINARY_MIMETYPE else 'ndjson') == 'binary'
+        default_format = parse_template_format(request.args.get('template_format'))
+        batch_size = int(request.args.get('batch_size', controller.bulk_batch_size))
+        if batch_size < 1:
+            raise ValueError("batch_size debe ser mayor que 0")
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    start = time.perf_counter()
+    records = read_binary(request.stream) if binary else read_ndjson(request.stream)
+    imported = rejected = batches = 0
+    errors = []
+    batch = []
+    stream_error = None
+    try:
+        for number, fields, error in records:
+            if error is None:
+                try:
+                    batch.append(parse_bulk_record(fields, default_format))
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                rejected += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({'record': number, 'template_id': (fields or {}).get('template_id'), 'error': error})
+            elif len(batch) >= batch_size:
+                controller.store_templates(batch)
+                imported += len(batch)
+                batches += 1
+                batch = []
+    except TemplateStreamError as e:
+        stream_error = str(e)  # los lotes ya almacenados se quedan
+    except Exception as e:
+        print(f"Error en importar_templates: {str(e)}")
+        return jsonify({'success': False, 'error': str(e), 'imported': imported}), 500
+    try:
+        if batch:
+            controller.store_templates(batch)
+            imported += len(batch)
+            batches += 1
+    except Exception as e:
+        print(f"Error en importar_templates: {str(e)}")
+        return jsonify({'success': False, 'error': str(e), 'imported': imported}), 500
+    elapsed = time.perf_counter() - start
+    result = {
+        'success': stream_error is None,
+        'imported': imported,
+        'rejected': rejected,
+        'errors': errors,
+        'batches': batches,
+        'elapsed_s': elapsed,
+        'templates_per_second': imported / elapsed if elapsed > 0 else 0.0,
+        'gallery': len(controller.gallery),
+    }
+    if stream_error is not None:
+        result['error'] = stream_error
+        return jsonify(result), 400
+    if rejected:
+        result['success'] = False
+        result['error'] = f"{rejected} registro(s) rechazado(s); registro {errors[0]['record']}: {errors[0]['error']}"
+        return jsonify(result), 400
+    return jsonify(result)
+
+@app.route('/templates/exportar', methods=['GET'])
+def exportar_templates():
+    """Exportación de toda la galería con su persona y dedo, en streaming
+
+    format=ndjson (por defecto) o binary, los mismos formatos que acepta
+    POST /templates/importar. Se exporta la versión de la galería del
+    momento de la petición aunque entretanto haya altas o bajas."""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'binary'):
+        return jsonify({'success': False, 'error': f"Formato de exportación no soportado: {export_format} "
+                                                   "(use ndjson o binary)"}), 400
+    gallery = controller.gallery.snapshot()
+
+    def records():
+        for template_id, entry in gallery.entries():
+            person_id, finger = controller.identities.owner(template_id) or (None, None)
+            yield (template_id, entry.read(), TEMPLATE_FORMAT_NAMES.get(entry.template_format), person_id, finger)
+
+    binary = export_format == 'binary'
+    response = Response(stream_with_context(write_stream(records(), binary)),
+                        mimetype=BINARY_MIMETYPE if binary else NDJSON_MIMETYPE)
+    response.headers['Content-Disposition'] = f"attachment; filename=templates.{'sgtpl' if binary else 'ndjson'}"
+    response.headers['X-Template-Count'] = str(len(gallery))
+    return response
+
 @app.route('/templates/<template_id>', methods=['DELETE'])
 def eliminar_template(template_id):
     try:
-        if template_id in controller.stored_templates:
-            del controller.stored_templates[template_id]
+        if controller.delete_template(template_id):
             return jsonify({
                 'success': True,
                 'message': f'Template {template_id} eliminado'
@@ -926,29 +2702,47 @@ def device_status():
     """Obtener el estado actual del dispositivo"""
     try:
         status = {
+            'backend': SDK_BACKEND,
             'initialized': controller.initialized,
+            'sdk_ready': controller.sdk_ready,
+            'initializing': controller.initializing,
             'device_opened': hasattr(controller, 'device_opened') and controller.device_opened,
-            'current_device_id': getattr(controller, 'current_device_id', None)
+            'current_device_id': getattr(controller, 'current_device_id', None),
+            'match_cache': controller.match_cache.stats(),
+            'gallery': controller.gallery.stats(),
+            'identities': controller.identities.stats(),
+            'scan_order': controller.scan_order.stats(),
+            'consolidation': controller.consolidator.stats(),
+            'duplicates': dict(controller.duplicate_stats.stats(), policy=controller.duplicate_policy or 'off'),
+            'matcher_pool': controller.matcher_pool.status() if controller.matcher_pool else None,
+            'crossmatch': controller.crossmatch.status() if controller.crossmatch else None,
+            'persistence': controller.persistence_status()
         }
         
-        # Intentar obtener info del dispositivo para verificar si está realmente funcionando
-        try:
-            if controller.initialized and controller.sgfp:
-                from ctypes import c_long
-                width = c_long(0)
-                height = c_long(0)
-                err = controller.sgfp.GetDeviceInfo(width, height)
-                if err == 0:  # SGFDxErrorCode.SGFDX_ERROR_NONE
-                    status['device_responsive'] = True
-                    status['image_dimensions'] = {'width': width.value, 'height': height.value}
-                else:
-                    status['device_responsive'] = False
-                    status['last_error'] = f'Error GetDeviceInfo: {err}'
-            else:
-                status['device_responsive'] = False
-        except Exception as e:
-            status['device_responsive'] = False
-            status['last_error'] = str(e)
+        if controller.device_pool is not None:
+            status['devices'] = controller.device_pool.status()
+            status['device_responsive'] = controller.device_pool.ready
+            return jsonify({
+                'success': True,
+                'status': status
+            })
+        
+        # Información en caché desde la apertura (sin tráfico USB); con
+        # ?probe=1 se consulta además el lector
+        if request.args.get('probe') in ('1', 'true'):
+            with controller.operation_lock:
+                controller.probe_device()
+        probe = controller.last_probe
+        status['device_info'] = controller.device_info
+        status['device_responsive'] = controller.initialized and (probe is None or probe['ok'])
+        status['last_probe'] = probe
+        if controller.device_info:
+            status['image_dimensions'] = {
+                'width': controller.device_info['width'],
+                'height': controller.device_info['height']
+            }
+        if probe and not probe['ok']:
+            status['last_error'] = probe['error']
         
         return jsonify({
             'success': True,
@@ -960,6 +2754,25 @@ def device_status():
             'success': False,
             'error': str(e)
         }), 500
+
+@app.route('/devices', methods=['GET'])
+def listar_lectores():
+    """Lectores del pool con su carga y estado"""
+    if controller.device_pool is None:
+        return jsonify({
+            'success': True,
+            'pool': False,
+            'devices': [{
+                'device_id': controller.current_device_id,
+                'opened': controller.initialized
+            }]
+        })
+    return jsonify({
+        'success': True,
+        'pool': True,
+        'devices': controller.device_pool.status()
+    })
+
 #test
 @app.route('/force-usb-reset', methods=['POST'])
 def force_usb_reset():
@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks de los caminos de CPU: templates, matching y codificación
+
+Mide ops/seg y memoria asignada por operación de:
+  - SecugenController.compare_templates / create_template
+  - aciertos de la caché de resultados de comparación (sdk/matchcache.py)
+  - altas y lecturas de la galería copy-on-write (sdk/gallery.py)
+  - codificación y decodificación base64 de imágenes y templates
+  - serialización JSON de la respuesta de /capturar-huella
+  - sobrecarga de llamada de PYSGFPLib (ctypes) frente a la llamada directa
+
+Usa los fixtures de java/ (left thumb*.raw, *.sg400, *.ansi378, *.iso19794).
+Por defecto se ejecuta con el lector simulado (SECUGEN_BACKEND=simulator) para
+no necesitar hardware; el matching usa el algoritmo real de libsgfplib si
+LD_LIBRARY_PATH incluye lib/linux3.
+
+    python3 benchmark_hotpaths.py                      # todo, guarda en benchmark_results/
+    python3 benchmark_hotpaths.py -k base64 -k json    # solo los que contienen esos textos
+    python3 benchmark_hotpaths.py --compare last       # comparar con la ejecución anterior
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault('SECUGEN_BACKEND', 'simulator')
+# compare_templates/* mide el SDK: la caché de resultados solo en match_cache/*
+os.environ.setdefault('SECUGEN_MATCH_CACHE_SIZE', '0')
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(REPO_DIR, 'java')
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Registra una función de preparación que devuelve el callable a medir"""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+class BenchmarkFailed(Exception):
+    """La operación medida devolvió un error: su tiempo no se publica"""
+
+
+def checked(call, ok):
+    """call comprobando en cada ejecución que ok(resultado) es cierto"""
+    def run():
+        result = call()
+        if not ok(result):
+            raise BenchmarkFailed(repr(result)[:200])
+        return result
+    return run
+
+
+def compared(call):
+    """compare_templates con success comprobado (un error del SDK es mucho más rápido)"""
+    return checked(call, lambda result: result.get('success'))
+
+
+def sdk_ok(call):
+    """Llamada a PYSGFPLib que debe devolver SGFDX_ERROR_NONE"""
+    return checked(call, lambda err: err == 0)
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class Context:
+    """Objetos compartidos por los benchmarks (se crean una sola vez)"""
+
+    def __init__(self):
+        import app  # crea el controlador global con el backend configurado
+        self.app_module = app
+        self.controller = app.controller
+        if not self.controller.wait_until_ready(30):
+            raise RuntimeError(f"Controlador no inicializado: {self.controller.init_error}")
+        self.raw_images = [bytearray(fixture(name)) for name in
+                           ('left thumb1.raw', 'left thumb2.raw', 'left thumb_ex.raw')]
+        self.sg400 = bytearray(fixture('left thumb1.sg400'))
+        self.ansi378 = [fixture('left thumb1.ansi378'), fixture('left thumb2.ansi378')]
+        self.iso19794 = [fixture('left thumb1.iso19794'), fixture('left thumb2.iso19794')]
+        self.templates = [self.controller.create_template(image) for image in self.raw_images]
+        if any(t is None for t in self.templates):
+            raise RuntimeError("No se pudieron crear templates a partir de los fixtures .raw")
+
+
+# Matching y extracción -----------------------------------------------------
+
+@benchmark('compare_templates/sg400_genuino')
+def bench_compare_genuine(ctx):
+    t1, t2 = ctx.templates[0], ctx.templates[1]
+    return compared(lambda: ctx.controller.compare_templates(t1, t2, 5))
+
+
+@benchmark('compare_templates/sg400_bytes')
+def bench_compare_bytes(ctx):
+    t1, t2 = bytes(ctx.sg400), bytes(ctx.templates[1])
+    return compared(lambda: ctx.controller.compare_templates(t1, t2, 5))
+
+
+@benchmark('compare_templates/ansi378_genuino')
+def bench_compare_ansi(ctx):
+    from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+    ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+    t1, t2 = ctx.ansi378
+    return compared(lambda: ctx.controller.compare_templates(t1, t2, 5, ansi, ansi))
+
+
+@benchmark('compare_batch/ansi378_lote_64')
+def bench_compare_batch(ctx):
+    # Un lote de 64 pares por el pool de matching: ops/s x 64 = pares/s
+    from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+    ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+    t1, t2 = ctx.ansi378
+    pairs = [{'template1': t1, 'template2': t2, 'security_level': 5, 'format1': ansi, 'format2': ansi}] * 64
+    return checked(lambda: list(ctx.controller.compare_batch(pairs)),
+                   lambda results: all(result.get('success') for _, result in results))
+
+
+def cached_controller(ctx):
+    """Copia del controlador con su propia caché de resultados"""
+    import copy
+    from sdk.matchcache import MatchCache
+    controller = copy.copy(ctx.controller)
+    controller.match_cache = MatchCache()
+    return controller
+
+
+@benchmark('match_cache/acierto_ids')
+def bench_cache_hit_ids(ctx):
+    # Templates almacenados: el digest ya está calculado, solo queda la búsqueda
+    from sdk.matchcache import digest
+    from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+    ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+    controller = cached_controller(ctx)
+    t1, t2 = ctx.ansi378
+    d1, d2 = digest(t1), digest(t2)
+    controller.compare_templates(t1, t2, 5, ansi, ansi, d1, d2)
+    return compared(lambda: controller.compare_templates(t1, t2, 5, ansi, ansi, d1, d2))
+
+
+@benchmark('match_cache/acierto_bytes')
+def bench_cache_hit_bytes(ctx):
+    # Templates en base64 ya decodificados: digest de ambos en cada llamada
+    from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+    ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+    controller = cached_controller(ctx)
+    t1, t2 = ctx.ansi378
+    controller.compare_templates(t1, t2, 5, ansi, ansi)
+    return compared(lambda: controller.compare_templates(t1, t2, 5, ansi, ansi))
+
+
+@benchmark('create_template/raw_260x300')
+def bench_create_template(ctx):
+    image = ctx.raw_images[0]
+    return checked(lambda: ctx.controller.create_template(image), lambda template: template is not None)
+
+
+# Codificación ----------------------------------------------------------------
+
+@benchmark('base64/encode_imagen')
+def bench_b64_encode_image(ctx):
+    image = ctx.raw_images[0]
+    return lambda: base64.b64encode(bytes(image)).decode('utf-8')
+
+
+@benchmark('base64/encode_template')
+def bench_b64_encode_template(ctx):
+    template = ctx.sg400
+    return lambda: base64.b64encode(bytes(template)).decode('utf-8')
+
+
+@benchmark('base64/decode_template_sg400')
+def bench_b64_decode_sg400(ctx):
+    encoded = base64.b64encode(bytes(ctx.sg400)).decode('utf-8')
+    return lambda: bytearray(base64.b64decode(encoded))
+
+
+@benchmark('base64/decode_template_ansi378')
+def bench_b64_decode_ansi(ctx):
+    encoded = base64.b64encode(ctx.ansi378[0]).decode('utf-8')
+    return lambda: bytearray(base64.b64decode(encoded))
+
+
+@benchmark('base64/decode_template_iso19794')
+def bench_b64_decode_iso(ctx):
+    encoded = base64.b64encode(ctx.iso19794[0]).decode('utf-8')
+    return lambda: bytearray(base64.b64decode(encoded))
+
+
+def capture_response(ctx):
+    image = ctx.raw_images[0]
+    return {
+        'success': True,
+        'data': {
+            'imagen': base64.b64encode(bytes(image)).decode('utf-8'),
+            'template': base64.b64encode(bytes(ctx.sg400)).decode('utf-8'),
+            'template_created': True,
+            'width': 260,
+            'height': 300,
+            'buffer_size': len(image),
+            'mensaje': 'Huella capturada exitosamente',
+            'template_stored': 'bench',
+            'capture_attempts': 3,
+            'device_status': 'responsive',
+            'operation_count': 1,
+            'last_maintenance': False
+        }
+    }
+
+
+@benchmark('json/respuesta_captura_dumps')
+def bench_json_dumps(ctx):
+    payload = capture_response(ctx)
+    return lambda: json.dumps(payload)
+
+
+@benchmark('json/respuesta_captura_jsonify')
+def bench_jsonify(ctx):
+    payload = capture_response(ctx)
+    flask_app = ctx.app_module.app
+    jsonify = ctx.app_module.jsonify
+
+    def run():
+        with flask_app.app_context():
+            return jsonify(payload)
+    return run
+
+
+# Sobrecarga de llamada a PYSGFPLib -----------------------------------------
+
+@benchmark('pysgfplib/GetMatchingScore_wrapper')
+def bench_wrapper_score(ctx):
+    from ctypes import c_char, c_int, byref
+    sgfp = ctx.controller.sgfp
+    size = sgfp.constant_sg400_template_size
+    t1 = (c_char * size).from_buffer_copy(bytes(ctx.templates[0]))
+    t2 = (c_char * size).from_buffer_copy(bytes(ctx.templates[1]))
+    score = c_int(0)
+    return sdk_ok(lambda: sgfp.GetMatchingScore(t1, t2, byref(score)))
+
+
+def native_pysgfplib():
+    """PYSGFPLib real (libpysgfplib.so) con el algoritmo inicializado sin lector"""
+    # La biblioteca se carga en Create(): sin libusb/libsgfplib el OSError sale de ahí
+    try:
+        from sdk.pysgfplib import PYSGFPLib as NativePYSGFPLib
+        sgfp = NativePYSGFPLib()
+        if sgfp.Create() != 0 or sgfp.Init(0x04) != 0:  # SG_DEV_FDU03: no requiere hardware
+            return None
+    except OSError:
+        return None
+    return sgfp
+
+
+@benchmark('pysgfplib/GetMatchingScore_PYSGFPLib')
+def bench_native_wrapper_score(ctx):
+    from ctypes import c_char, c_int, byref
+    sgfp = native_pysgfplib()
+    if sgfp is None:
+        return None
+    t1 = (c_char * 400).from_buffer_copy(bytes(ctx.templates[0]))
+    t2 = (c_char * 400).from_buffer_copy(bytes(ctx.templates[1]))
+    score = c_int(0)
+    return sdk_ok(lambda: sgfp.GetMatchingScore(t1, t2, byref(score)))
+
+
+@benchmark('pysgfplib/GetMatchingScore_ctypes_directo')
+def bench_native_direct_score(ctx):
+    from ctypes import c_char, c_int, byref
+    sgfp = native_pysgfplib()
+    if sgfp is None:
+        return None
+    function = sgfp.hlib.PY_SGFPM_GetMatchingScore
+    t1 = (c_char * 400).from_buffer_copy(bytes(ctx.templates[0]))
+    t2 = (c_char * 400).from_buffer_copy(bytes(ctx.templates[1]))
+    score = c_int(0)
+    score_ref = byref(score)
+    return sdk_ok(lambda: function(t1, t2, score_ref))
+
+
+@benchmark('pysgfplib/GetImageQuality_wrapper')
+def bench_wrapper_quality(ctx):
+    from ctypes import c_char, c_int, byref
+    sgfp = ctx.controller.sgfp
+    image = (c_char * len(ctx.raw_images[0])).from_buffer_copy(bytes(ctx.raw_images[0]))
+    quality = c_int(0)
+    return sdk_ok(lambda: sgfp.GetImageQuality(260, 300, image, byref(quality)))
+
+
+@benchmark('pysgfplib/copia_template_bucle')
+def bench_template_copy_loop(ctx):
+    # Copia byte a byte que hace compare_templates antes de llamar al SDK
+    from ctypes import c_char
+    size = ctx.controller.sgfp.constant_sg400_template_size
+    template = ctx.templates[0]
+
+    def run():
+        buffer = (c_char * size)()
+        for i, byte in enumerate(template[:size]):
+            buffer[i] = byte
+        return buffer
+    return run
+
+
+@benchmark('pysgfplib/copia_template_from_buffer_copy')
+def bench_template_copy_direct(ctx):
+    from ctypes import c_char
+    size = ctx.controller.sgfp.constant_sg400_template_size
+    template = bytes(ctx.templates[0])
+    return lambda: (c_char * size).from_buffer_copy(template)
+
+
+# Lectura de templates ANSI/ISO ----------------------------------------------
+
+@benchmark('templateparser/ansi378')
+def bench_parse_ansi(ctx):
+    from sdk.templateparser import parse_template
+    template = ctx.ansi378[1]
+    return lambda: parse_template(template)
+
+
+@benchmark('templateparser/ansi378_decodificado')
+def bench_parse_ansi_minutiae(ctx):
+    from sdk.templateparser import parse_template
+    template = ctx.ansi378[1]
+    return lambda: parse_template(template).views[0].minutiae()
+
+
+@benchmark('templateparser/lote_1000_mixto')
+def bench_parse_batch(ctx):
+    # Un lote de 1000 templates: ops/s x 1000 = templates/s
+    from sdk.templateparser import parse_templates
+    batch = (ctx.ansi378 + ctx.iso19794) * 250
+    return lambda: parse_templates(batch)
+
+
+@benchmark('templateparser/GetAnsiTemplateInfo_sdk')
+def bench_sdk_template_info(ctx):
+    from ctypes import c_char
+    from sdk.sgfdxstructs import SGANSITemplateInfo
+    sgfp = ctx.controller.sgfp
+    template = (c_char * len(ctx.ansi378[1])).from_buffer_copy(ctx.ansi378[1])
+    info = SGANSITemplateInfo()
+    if sgfp.GetAnsiTemplateInfo(template, info) != 0:
+        return None
+    return sdk_ok(lambda: sgfp.GetAnsiTemplateInfo(template, info))
+
+
+# Galería copy-on-write -----------------------------------------------------
+
+def filled_gallery(size):
+    from sdk.gallery import Gallery
+    from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+    gallery = Gallery()
+    ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+    for n in range(size):
+        gallery.put(f'huella_{n}', b'\0' * 300, ansi, f'{n:040x}')
+    return gallery
+
+
+@benchmark('gallery/alta_cow_100000')
+def bench_gallery_put(ctx):
+    # Reemplazo en una galería de 100000: copia un trozo y un shard, no la galería
+    gallery = filled_gallery(100000)
+    template = b'\0' * 300
+    ids = [f'huella_{n}' for n in range(0, 100000, 997)]
+    position = [0]
+
+    def run():
+        position[0] = (position[0] + 1) % len(ids)
+        gallery.put(ids[position[0]], template, 0x0100, 'digest')
+    return run
+
+
+@benchmark('gallery/alta_copia_dict_100000')
+def bench_gallery_dict_copy(ctx):
+    # Referencia: copy-on-write ingenuo copiando el dict entero en cada alta
+    snapshot = dict.fromkeys((f'huella_{n}' for n in range(100000)), b'\0' * 300)
+
+    def run():
+        copy = dict(snapshot)
+        copy['huella_0'] = b'\0' * 300
+        return copy
+    return run
+
+
+@benchmark('gallery/lectura_snapshot_entry')
+def bench_gallery_entry(ctx):
+    gallery = filled_gallery(100000)
+    return lambda: gallery.snapshot().entry('huella_5000')
+
+
+@benchmark('gallery/lectura_dict_get')
+def bench_gallery_dict_get(ctx):
+    # Referencia: el dict de antes (stored_templates[template_id])
+    templates = dict.fromkeys((f'huella_{n}' for n in range(100000)), b'\0' * 300)
+    return lambda: templates.get('huella_5000')
+
+
+# Medición ------------------------------------------------------------------
+
+def calibrate(func, min_time):
+    """Número de iteraciones para que una muestra dure al menos min_time"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 24:
+            return loops
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+
+def measure(func, repeat, min_time, alloc_loops):
+    func()  # calentamiento
+    loops = calibrate(func, min_time)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+
+    # Memoria: pico asignado durante una operación y bloques que quedan vivos
+    tracemalloc.start()
+    peaks = []
+    start_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    for _ in range(alloc_loops):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+    end_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    best = min(samples)
+    median = statistics.median(samples)
+    return {
+        'loops': loops,
+        'repeat': repeat,
+        'ops_per_sec': 1.0 / median if median > 0 else 0.0,
+        'best_ops_per_sec': 1.0 / best if best > 0 else 0.0,
+        'mean_us': statistics.mean(samples) * 1e6,
+        'median_us': median * 1e6,
+        'stdev_us': statistics.stdev(samples) * 1e6 if len(samples) > 1 else 0.0,
+        'alloc_peak_bytes_per_op': statistics.median(peaks),
+        'retained_blocks_per_op': (end_blocks - start_blocks) / alloc_loops,
+    }
+
+
+def latest_result():
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, 'hotpaths_*.json')))
+    return files[-1] if files else None
+
+
+def print_results(results, previous=None):
+    print(f"\n{'benchmark':<42} {'ops/s':>12} {'mediana':>11} {'±':>9} {'bytes/op':>10}", end='')
+    print(f" {'Δ ops/s':>9}" if previous else "")
+    print("-" * (88 + (10 if previous else 0)))
+    for name, data in results.items():
+        line = (f"{name:<42} {data['ops_per_sec']:>12,.0f} {data['median_us']:>9.2f}us "
+                f"{data['stdev_us']:>7.2f}us {data['alloc_peak_bytes_per_op']:>10,.0f}")
+        if previous:
+            before = previous.get(name)
+            if before and before['ops_per_sec'] > 0:
+                delta = (data['ops_per_sec'] / before['ops_per_sec'] - 1) * 100
+                line += f" {delta:>+8.1f}%"
+            else:
+                line += f" {'nuevo':>9}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks de templates, matching y codificación')
+    parser.add_argument('-k', dest='filters', action='append', default=[],
+                        help='Ejecutar solo benchmarks cuyo nombre contenga este texto')
+    parser.add_argument('--repeat', type=int, default=7, help='Muestras por benchmark')
+    parser.add_argument('--min-time', type=float, default=0.1, help='Duración mínima de cada muestra (s)')
+    parser.add_argument('--alloc-loops', type=int, default=50, help='Operaciones medidas con tracemalloc')
+    parser.add_argument('--compare', help="Resultado previo a comparar ('last' = el más reciente)")
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    parser.add_argument('--list', action='store_true', help='Listar benchmarks y salir')
+    args = parser.parse_args()
+
+    selected = [(name, setup) for name, setup in BENCHMARKS
+                if not args.filters or any(f in name for f in args.filters)]
+    if args.list:
+        for name, _ in selected:
+            print(name)
+        return
+
+    previous_file = latest_result() if args.compare == 'last' else args.compare
+
+    print("⏱️  MICROBENCHMARKS - CAMINOS CRÍTICOS DE CPU")
+    print("=" * 50)
+    ctx = Context()
+    from sdk import SDK_BACKEND
+    print(f"Backend SDK: {SDK_BACKEND} ({type(ctx.controller.sgfp).__name__})")
+
+    # El controlador imprime en cada operación; se silencia durante la medición
+    results = {}
+    failed = {}
+    real_stdout = sys.stdout
+    for name, setup in selected:
+        func = setup(ctx)
+        if func is None:
+            print(f"  ⏭️  {name} (no disponible en este entorno)")
+            continue
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            results[name] = measure(func, args.repeat, args.min_time, args.alloc_loops)
+        except BenchmarkFailed as e:
+            failed[name] = str(e)
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+        if name in failed:
+            print(f"  ❌ {name} (la operación falla: {failed[name]})")
+        else:
+            print(f"  ✅ {name}")
+
+    previous = None
+    if previous_file:
+        with open(previous_file) as f:
+            previous = json.load(f)['results']
+        print(f"\nComparando con: {previous_file}")
+    print_results(results, previous)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"hotpaths_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now().isoformat(),
+                    'backend': SDK_BACKEND,
+                    'sgfp_class': type(ctx.controller.sgfp).__name__,
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'node': platform.node(),
+                    'failed': failed,
+                },
+                'results': results
+            }, f, indent=2)
+        print(f"\n📁 Resultados guardados en: {output}")
+
+
+if __name__ == "__main__":
+    main()
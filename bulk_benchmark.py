@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la importación masiva de templates (POST /templates/importar)
+
+Genera --count templates sintéticos (sdk/syntheticminutiae.py) y mide, sobre
+una galería vacía cada vez:
+
+  - alta template a template con store_template (lo que hace hoy un cliente
+    que llama a /capturar-huella o migra con un bucle);
+  - POST /templates/importar con el stream NDJSON y con el binario, para cada
+    tamaño de lote de --batch;
+  - GET /templates/exportar en los dos formatos.
+
+Las peticiones van por el cliente de pruebas de Flask (sin red): se mide el
+coste del servicio, no el de la conexión.
+
+    python3 bulk_benchmark.py
+    python3 bulk_benchmark.py --count 20000 --batch 100,1000,5000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+os.environ['SECUGEN_CONSOLIDATE'] = '0'
+os.environ.setdefault('SECUGEN_LAZY_INIT', '0')
+
+from sdk.templatestream import BINARY_MAGIC, BINARY_MIMETYPE, NDJSON_MIMETYPE, binary_record, ndjson_record
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def clear(controller):
+    """Galería vacía sin reiniciar el proceso"""
+    for template_id in list(controller.gallery.snapshot()):
+        controller.delete_template(template_id)
+
+
+def row(method, batch, count, elapsed, size=None):
+    return {'method': method, 'batch': batch, 'templates': count, 'elapsed_s': elapsed,
+            'templates_per_second': count / elapsed if elapsed > 0 else 0.0,
+            'us_per_template': elapsed / count * 1e6, 'bytes': size}
+
+
+def print_results(results):
+    print(f"\n{'método':<22} {'lote':>6} {'templates':>10} {'s':>8} {'templates/s':>12} {'µs/template':>12} {'MB':>7}")
+    for r in results['rows']:
+        size = f"{r['bytes'] / 1e6:>7.1f}" if r['bytes'] else f"{'-':>7}"
+        print(f"{r['method']:<22} {r['batch'] or '-':>6} {r['templates']:>10} {r['elapsed_s']:>8.2f} "
+              f"{r['templates_per_second']:>12.0f} {r['us_per_template']:>12.0f} {size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importación masiva frente a altas template a template')
+    parser.add_argument('--count', type=int, default=5000, help='Templates a importar')
+    parser.add_argument('--batch', default='100,1000', help='Tamaños de lote de la importación')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+
+    print("📦 IMPORTACIÓN MASIVA DE TEMPLATES")
+    print("=" * 50)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app
+    controller = app.controller
+    client = app.app.test_client()
+
+    fingers = SyntheticFingers(seed=args.seed)
+    records = [(f'masivo_{n}', fingers.encode(fingers.impression(fingers.finger())), 'ansi378', f'persona_{n // 4}',
+                n % 4 + 1) for n in range(args.count)]
+    streams = {
+        'ndjson': (b''.join(ndjson_record(*record) for record in records), NDJSON_MIMETYPE),
+        'binary': (BINARY_MAGIC + b''.join(binary_record(*record) for record in records), BINARY_MIMETYPE),
+    }
+    results = {'count': args.count, 'rows': []}
+
+    clear(controller)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        start = time.perf_counter()
+        for template_id, template, _, person_id, finger in records:
+            controller.store_template(template_id, bytearray(template), ANSI, person_id, finger)
+        elapsed = time.perf_counter() - start
+    results['rows'].append(row('store_template', None, args.count, elapsed))
+    print(f"store_template: {args.count / elapsed:.0f} templates/s")
+
+    for batch in parse_list(args.batch):
+        for name, (body, mimetype) in streams.items():
+            clear(controller)
+            start = time.perf_counter()
+            response = client.post(f'/templates/importar?batch_size={batch}', input_stream=io.BytesIO(body),
+                                   content_type=mimetype, content_length=len(body))
+            elapsed = time.perf_counter() - start
+            summary = response.get_json()
+            if not summary.get('success') or summary['imported'] != args.count:
+                raise RuntimeError(f"Importación {name} incompleta: {summary}")
+            results['rows'].append(row(f'importar {name}', batch, args.count, elapsed, len(body)))
+            print(f"importar {name} (lote {batch}): {args.count / elapsed:.0f} templates/s")
+
+    for name in streams:
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in client.get(f'/templates/exportar?format={name}').response)
+        elapsed = time.perf_counter() - start
+        results['rows'].append(row(f'exportar {name}', None, args.count, elapsed, size))
+
+    print_results(results)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"bulk_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({'meta': {'timestamp': datetime.now().isoformat(), 'seed': args.seed}, 'results': results},
+                      f, indent=2, default=str)
+        print(f"\nResultados guardados en {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Cruce N×N fuera del servidor (sdk/crossmatch.py)
+
+Compara cada par de templates una vez (triángulo superior) repartiendo el
+trabajo en procesos. Escribe en --directory los pares con score >= min_score
+(results.ndjson) y un checkpoint para reanudar: si se interrumpe, volver a
+lanzarlo con la misma galería continúa donde se quedó.
+
+Templates de un directorio (formato por extensión: .ansi378, .iso19794,
+.sg400) o una galería sintética con duplicados conocidos para medir el
+rendimiento:
+
+    python3 crossmatch_job.py --templates java/
+    python3 crossmatch_job.py --synthetic 300 --duplicates 10 --processes 4
+    python3 crossmatch_job.py --synthetic 300 --duplicates 10 --fresh
+
+El servidor lanza el mismo trabajo sobre su galería con POST /cruce-galeria.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+from sdk import PYSGFPMDevice
+from sdk.crossmatch import DEFAULT_UNIT_PAIRS, CrossMatchJob
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat, TEMPLATE_FORMATS
+
+
+def load_directory(directory):
+    """[(template_id, template, formato)] de los archivos con extensión de formato"""
+    templates = []
+    for name in sorted(os.listdir(directory)):
+        template_format = TEMPLATE_FORMATS.get(os.path.splitext(name)[1].lstrip('.').lower())
+        if template_format is None:
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            templates.append((name, f.read(), template_format))
+    return templates
+
+
+def synthetic_gallery(size, duplicates, seed):
+    """Galería sintética ANSI con `duplicates` dedos registrados dos veces"""
+    from sdk.syntheticminutiae import SyntheticFingers
+    fingers = SyntheticFingers(seed=seed)
+    ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+    bases = [fingers.finger() for _ in range(size - duplicates)]
+    templates = [(f'sintetico_{n}', fingers.encode(fingers.impression(base)), ansi) for n, base in enumerate(bases)]
+    templates += [(f'duplicado_{n}', fingers.encode(fingers.impression(bases[n])), ansi) for n in range(duplicates)]
+    return templates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cruce N×N de una galería de templates')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--templates', help='Directorio con templates (.ansi378, .iso19794, .sg400)')
+    source.add_argument('--synthetic', type=int, help='Tamaño de una galería sintética ANSI')
+    parser.add_argument('--duplicates', type=int, default=10, help='Dedos duplicados en la galería sintética')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--security-level', type=int, default=5)
+    parser.add_argument('--min-score', type=int, help='Score mínimo de los pares guardados (por defecto el umbral)')
+    parser.add_argument('--unit-pairs', type=int, default=DEFAULT_UNIT_PAIRS, help='Pares por unidad de trabajo')
+    parser.add_argument('--directory', default=os.path.join(REPO_DIR, 'benchmark_results', 'crossmatch'),
+                        help='Directorio de checkpoint y resultados')
+    parser.add_argument('--fresh', action='store_true', help='Empezar de cero aunque haya checkpoint')
+    args = parser.parse_args()
+
+    templates = load_directory(args.templates) if args.templates else \
+        synthetic_gallery(args.synthetic, args.duplicates, args.seed)
+    if len(templates) < 2:
+        print("Se necesitan al menos dos templates")
+        return 1
+
+    print("🔀 CRUCE N×N DE LA GALERÍA")
+    print("=" * 50)
+    job = CrossMatchJob(PYSGFPMDevice, templates, args.directory, args.security_level, args.min_score,
+                        args.processes, args.unit_pairs)
+    print(f"{len(templates)} templates, {job.pairs_total:,} pares en {len(job.units)} unidades, "
+          f"{job.processes} procesos")
+    job.start(resume=not args.fresh)
+    try:
+        while job.thread.is_alive():
+            time.sleep(2)
+            status = job.status()
+            eta = f"{status['eta_s']:.0f} s" if status['eta_s'] is not None else '-'
+            print(f"  {status['progress']:6.1%}  {status['pairs_done']:,}/{status['pairs_total']:,} pares  "
+                  f"{status['pairs_per_second']:,.0f} pares/s  ETA {eta}  coincidencias {status['hits']}")
+    except KeyboardInterrupt:
+        print("Interrumpido: guardando checkpoint...")
+        job.cancel()
+        job.thread.join()
+
+    status = job.status()
+    if status['resumed_units']:
+        print(f"Reanudado: {status['resumed_units']} unidades ya hechas")
+    print(f"Estado: {status['state']}  {status['pairs_done']:,} pares  {status['elapsed_s']:.1f} s  "
+          f"{status['pairs_per_second']:,.0f} pares/s  errores {status['errors']}")
+    hits = sorted(job.results(), key=lambda hit: hit['score'], reverse=True)
+    print(f"Pares con score >= {status['min_score']}: {len(hits)} ({job.results_path})")
+    for hit in hits[:20]:
+        print(f"  {hit['template_id1']:<24} {hit['template_id2']:<24} {hit['score']:>4}")
+    return 0 if status['state'] == 'done' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
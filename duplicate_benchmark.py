@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la comprobación de duplicados al dar de alta (enroll_template)
+
+Hace crecer una galería sintética (sdk/syntheticminutiae.py) hasta cada
+tamaño pedido y en cada uno da de alta, con check_duplicate:
+
+  - duplicados: otra impresión de un dedo ya registrado con otro ID;
+  - altas nuevas: dedos que no están en la galería.
+
+Mide la latencia de la comprobación (media, p95, máximo) frente al
+presupuesto, las comparaciones del SDK, el recall de duplicados, las falsas
+alarmas en altas nuevas y cuántas comprobaciones agotaron el presupuesto. Como
+referencia estima lo que costaría comparar el alta con toda la galería.
+
+Necesita libsgfplib (sin lector).
+
+    python3 duplicate_benchmark.py
+    python3 duplicate_benchmark.py --gallery 1000,10000,100000 --budget 100
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+# Sin caché de resultados: cada comprobación llega al SDK
+os.environ.setdefault('SECUGEN_MATCH_CACHE_SIZE', '0')
+os.environ.setdefault('SECUGEN_LAZY_INIT', '0')
+
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+
+
+class BenchmarkFailed(Exception):
+    """Una comprobación o comparación devolvió un error: no hay tiempos que publicar"""
+
+
+def checked(result):
+    """El resultado si success; si no BenchmarkFailed con su error"""
+    if not result.get('success'):
+        raise BenchmarkFailed(result.get('error') or repr(result)[:200])
+    return result
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))] if values else 0.0
+
+
+def measure_size(controller, fingers, bases, probes, budget_ms, candidates):
+    """Comprobaciones de duplicados (genuinos y altas nuevas) con la galería actual"""
+    rng = fingers.rng
+    mates = rng.choice(len(bases), size=min(probes, len(bases)), replace=False).tolist()
+    genuine = [(mate, fingers.encode(fingers.impression(bases[mate]))) for mate in mates]
+    new = [fingers.encode(fingers.finger()) for _ in range(probes)]
+
+    latencies = []
+    compared = []
+    incomplete = found = false_alarms = 0
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for mate, probe in genuine:
+            check = checked(controller.check_duplicate(bytearray(probe), ANSI, budget_ms=budget_ms,
+                                                       max_candidates=candidates))
+            latencies.append(check['elapsed_ms'])
+            compared.append(check['compared'])
+            incomplete += not check['complete']
+            found += bool(check['duplicate']) and check['duplicate']['template_id'] == f'galeria_{mate}'
+        for probe in new:
+            check = checked(controller.check_duplicate(bytearray(probe), ANSI, budget_ms=budget_ms,
+                                                       max_candidates=candidates))
+            latencies.append(check['elapsed_ms'])
+            compared.append(check['compared'])
+            incomplete += not check['complete']
+            false_alarms += check['duplicate'] is not None
+    return {
+        'gallery': len(bases),
+        'checks': len(latencies),
+        'avg_ms': statistics.mean(latencies),
+        'p95_ms': percentile(latencies, 0.95),
+        'max_ms': max(latencies),
+        'avg_compared': statistics.mean(compared),
+        'duplicate_recall': found / len(genuine),
+        'false_alarms': false_alarms,
+        'incomplete': incomplete,
+    }
+
+
+def compare_cost(controller, fingers, samples=50):
+    """Coste medio (ms) de una comparación ANSI del SDK"""
+    pairs = [(bytearray(fingers.encode(fingers.finger())), bytearray(fingers.encode(fingers.finger())))
+             for _ in range(samples)]
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        start = time.perf_counter()
+        for template1, template2 in pairs:
+            checked(controller.compare_templates(template1, template2, 5, ANSI, ANSI))
+    return (time.perf_counter() - start) / samples * 1000
+
+
+def print_results(results):
+    print(f"\nPresupuesto {results['budget_ms']:.0f} ms, {results['candidates']} candidatos para el SDK, "
+          f"comparación del SDK {results['compare_ms']:.2f} ms")
+    print(f"{'galería':>8} {'media ms':>9} {'p95 ms':>8} {'máx ms':>8} {'comparaciones':>14} "
+          f"{'recall':>7} {'falsas':>7} {'agotadas':>9} {'exhaustiva ms':>14}")
+    for row in results['sizes']:
+        print(f"{row['gallery']:>8} {row['avg_ms']:>9.1f} {row['p95_ms']:>8.1f} {row['max_ms']:>8.1f} "
+              f"{row['avg_compared']:>14.1f} {row['duplicate_recall']:>7.0%} {row['false_alarms']:>7} "
+              f"{row['incomplete']:>9} {row['exhaustive_ms']:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latencia y recall de la comprobación de duplicados')
+    parser.add_argument('--gallery', default='1000,10000', help='Tamaños de galería')
+    parser.add_argument('--probes', type=int, default=20, help='Altas duplicadas (y otras tantas nuevas) por tamaño')
+    parser.add_argument('--budget', type=float, default=200, help='Presupuesto por comprobación (ms)')
+    parser.add_argument('--candidates', type=int, default=10, help='Candidatos que se comparan con el SDK')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+
+    print("👥 DUPLICADOS AL DAR DE ALTA")
+    print("=" * 50)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app  # controlador global con el backend configurado
+    controller = app.controller
+    if not controller.sdk_ready:
+        print("libsgfplib no disponible: no hay nada que comparar")
+        return 1
+
+    fingers = SyntheticFingers(seed=args.seed)
+    bases = []
+    sizes = []
+    try:
+        cost = compare_cost(controller, fingers)
+        for size in sorted(parse_list(args.gallery)):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                while len(bases) < size:
+                    base = fingers.finger()
+                    controller.store_template(f'galeria_{len(bases)}',
+                                              bytearray(fingers.encode(fingers.impression(base))), ANSI)
+                    bases.append(base)
+            print(f"Galería de {size} templates ({time.perf_counter() - start:.0f} s)")
+            row = measure_size(controller, fingers, bases, args.probes, args.budget, args.candidates)
+            row['exhaustive_ms'] = size * cost
+            sizes.append(row)
+    except BenchmarkFailed as e:
+        print(f"❌ {e}")
+        return 1
+
+    results = {'budget_ms': args.budget, 'candidates': args.candidates, 'compare_ms': cost, 'sizes': sizes}
+    print_results(results)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"duplicates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({'meta': {'timestamp': datetime.now().isoformat(), 'seed': args.seed}, 'results': results},
+                      f, indent=2, default=str)
+        print(f"\nResultados guardados en {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la preselección de candidatos 1:N: índice de minucias
+(sdk/minutiaeindex.py) y códigos binarios con Hamming (sdk/binarycodes.py)
+
+Construye galerías sintéticas (sdk/syntheticminutiae.py) de varios tamaños más
+el fixture real java/left thumb1.ansi378, y para cada sonda (otra impresión de
+un dedo de la galería, más java/left thumb2.ansi378) mide:
+
+  - recall@C: proporción de sondas cuyo dedo queda entre los C candidatos
+  - tiempo de consulta del índice
+  - speedup estimado: N comparaciones del SDK frente a consulta + C comparaciones
+  - speedup medido extremo a extremo en una muestra de sondas, y si la
+    identificación (mejor score del SDK) coincide con la búsqueda exhaustiva
+  - para los códigos binarios: tiempo de escaneo XOR + popcount, recall@C y
+    recall@C de la unión índice + códigos (SECUGEN_SHORTLIST=both)
+
+El coste de una comparación se mide con GetAnsiMatchingScore del SDK
+(libsgfplib, sin lector). Sin la librería solo se mide el índice.
+
+    python3 index_benchmark.py
+    python3 index_benchmark.py --gallery 1000,10000,50000 --candidates 10,50,200
+    python3 index_benchmark.py --neighbours 4 --distance-bin 10 --angle-bin 30
+    python3 index_benchmark.py --bits 2048
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(REPO_DIR, 'java')
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+
+from sdk.binarycodes import BinaryCodeGallery, BinaryCoder
+from sdk.minutiaeindex import MinutiaeIndex
+from sdk.syntheticminutiae import SyntheticFingers
+from sdk.templateparser import parse_template
+
+FIXTURE_ID = 'fixture:left thumb1'
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def load_matcher():
+    """GetAnsiMatchingScore del SDK, o None si libsgfplib no puede cargarse"""
+    from ctypes import c_int
+    try:
+        from sdk.pysgfplib import PYSGFPMDevice
+        sgfp = PYSGFPMDevice()
+        if sgfp.Create() != 0 or sgfp.Init(0x04) != 0:  # SG_DEV_FDU03: sin lector
+            return None
+    except OSError:
+        return None
+    score = c_int(0)
+
+    def match(template1, template2):
+        sgfp.GetAnsiMatchingScore(template1, 0, template2, 0, score)
+        return score.value
+    match.sgfp = sgfp
+    return match
+
+
+def build_gallery(size, probes, seed):
+    fingers = SyntheticFingers(seed=seed)
+    gallery = {}
+    bases = []
+    for i in range(size - 1):
+        base = fingers.finger()
+        bases.append(base)
+        gallery[f'sint:{i:06d}'] = fingers.encode(base)
+    gallery[FIXTURE_ID] = fixture('left thumb1.ansi378')
+
+    chosen = fingers.rng.choice(len(bases), size=min(probes - 1, len(bases)), replace=False)
+    probe_set = [(f'sint:{i:06d}', fingers.encode(fingers.impression(bases[i]))) for i in chosen.tolist()]
+    probe_set.append((FIXTURE_ID, fixture('left thumb2.ansi378')))
+    return gallery, probe_set
+
+
+def run_size(args, size, matcher, compare_cost):
+    gallery, probes = build_gallery(size, args.probes, args.seed)
+    index = MinutiaeIndex(neighbours=args.neighbours, distance_bin=args.distance_bin,
+                          angle_bin=args.angle_bin, probe_spread=not args.no_spread)
+    start = time.perf_counter()
+    records = {template_id: parse_template(data) for template_id, data in gallery.items()}
+    for template_id, record in records.items():
+        index.add(template_id, record)
+    build_s = time.perf_counter() - start
+
+    coder = BinaryCoder(bits=args.bits)
+    codes = BinaryCodeGallery(coder.words)
+    start = time.perf_counter()
+    for template_id, record in records.items():
+        codes.add(template_id, coder.encode(record))
+    codes_build_s = time.perf_counter() - start
+
+    max_c = max(args.candidates)
+    ranks = []
+    query_times = []
+    shortlists = []
+    code_ranks = []
+    scan_times = []
+    for mate, data in probes:
+        record = parse_template(data)
+        start = time.perf_counter()
+        candidates = index.candidates(record, max_candidates=max_c)
+        query_times.append(time.perf_counter() - start)
+        ids = [template_id for template_id, _ in candidates]
+        ranks.append(ids.index(mate) if mate in ids else None)
+
+        code = coder.encode(record)
+        start = time.perf_counter()
+        code_candidates = codes.candidates(code, max_candidates=max_c)
+        scan_times.append(time.perf_counter() - start)
+        code_ids = [template_id for template_id, _ in code_candidates]
+        code_ranks.append(code_ids.index(mate) if mate in code_ids else None)
+        shortlists.append((mate, ids, code_ids))
+
+    query_ms = statistics.median(query_times) * 1000
+    result = {
+        'gallery': size,
+        'probes': len(probes),
+        'build_s': build_s,
+        'build_templates_per_s': size / build_s,
+        'query_ms_p50': query_ms,
+        'query_ms_max': max(query_times) * 1000,
+        'fixture_rank': ranks[-1],
+        'index': index.stats(),
+        'codes': {
+            'build_s': codes_build_s,
+            'scan_ms_p50': statistics.median(scan_times) * 1000,
+            'scan_ms_max': max(scan_times) * 1000,
+            'fixture_rank': code_ranks[-1],
+            'stats': codes.stats(),
+        },
+        'cutoffs': [],
+    }
+    for c in args.candidates:
+        recall = sum(1 for rank in ranks if rank is not None and rank < c) / len(ranks)
+        union = sum(1 for mate, ids, code_ids in shortlists if mate in ids[:c] or mate in code_ids[:c])
+        entry = {
+            'candidates': c,
+            'recall': recall,
+            'recall_codes': sum(1 for rank in code_ranks if rank is not None and rank < c) / len(code_ranks),
+            'recall_union': union / len(shortlists),
+        }
+        if compare_cost:
+            exhaustive_ms = size * compare_cost * 1000
+            entry['speedup_estimated'] = exhaustive_ms / (query_ms + min(c, size) * compare_cost * 1000)
+        result['cutoffs'].append(entry)
+
+    if matcher and args.verify_probes:
+        result['end_to_end'] = end_to_end(args, gallery, probes[-args.verify_probes:], index, matcher)
+    return result
+
+
+def end_to_end(args, gallery, probes, index, matcher):
+    """Búsqueda exhaustiva frente a índice + SDK en una muestra de sondas"""
+    c = args.verify_candidates
+    agree = 0
+    exhaustive_s = indexed_s = 0.0
+    for mate, data in probes:
+        start = time.perf_counter()
+        best = max(((matcher(data, template), template_id) for template_id, template in gallery.items()))
+        exhaustive_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        candidates = index.candidates(parse_template(data), max_candidates=c)
+        best_indexed = max(((matcher(data, gallery[template_id]), template_id)
+                            for template_id, _ in candidates), default=(0, None))
+        indexed_s += time.perf_counter() - start
+        agree += best[1] == best_indexed[1]
+    return {
+        'probes': len(probes),
+        'candidates': c,
+        'identification_agreement': agree / len(probes),
+        'exhaustive_ms_per_probe': exhaustive_s / len(probes) * 1000,
+        'indexed_ms_per_probe': indexed_s / len(probes) * 1000,
+        'speedup_measured': exhaustive_s / indexed_s if indexed_s else None,
+    }
+
+
+def measure_compare_cost(matcher, samples=500):
+    fingers = SyntheticFingers(seed=12345)
+    pairs = [(fingers.encode(fingers.finger()), fingers.encode(fingers.finger())) for _ in range(20)]
+    start = time.perf_counter()
+    for i in range(samples):
+        matcher(*pairs[i % len(pairs)])
+    return (time.perf_counter() - start) / samples
+
+
+def print_results(results, compare_cost):
+    if compare_cost:
+        print(f"\nComparación del SDK (GetAnsiMatchingScore): {compare_cost * 1e6:.0f} us")
+    for result in results:
+        print(f"\nGalería {result['gallery']:,}: índice en {result['build_s']:.2f}s "
+              f"({result['build_templates_per_s']:,.0f} templates/s), {result['index']['keys']:,} claves, "
+              f"consulta p50 {result['query_ms_p50']:.2f} ms, fixture real en posición {result['fixture_rank']}")
+        codes = result['codes']
+        print(f"  Códigos de {codes['stats']['bits']} bits: {codes['stats']['bytes'] / 2**20:.1f} MiB, "
+              f"escaneo p50 {codes['scan_ms_p50']:.2f} ms, fixture real en posición {codes['fixture_rank']}")
+        print(f"  {'candidatos':>10} {'índice':>8} {'códigos':>8} {'unión':>8} {'speedup est.':>13}")
+        for entry in result['cutoffs']:
+            speedup = entry.get('speedup_estimated')
+            print(f"  {entry['candidates']:>10} {entry['recall'] * 100:>7.1f}% {entry['recall_codes'] * 100:>7.1f}% "
+                  f"{entry['recall_union'] * 100:>7.1f}% {'-' if speedup is None else f'{speedup:.1f}x':>13}")
+        e2e = result.get('end_to_end')
+        if e2e:
+            print(f"  Extremo a extremo ({e2e['probes']} sondas, {e2e['candidates']} candidatos): "
+                  f"{e2e['exhaustive_ms_per_probe']:.0f} ms -> {e2e['indexed_ms_per_probe']:.0f} ms "
+                  f"({e2e['speedup_measured']:.1f}x), misma identificación en "
+                  f"{e2e['identification_agreement'] * 100:.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recall y speedup del índice de minucias')
+    parser.add_argument('--gallery', default='1000,10000', help='Tamaños de galería')
+    parser.add_argument('--probes', type=int, default=200, help='Sondas por galería')
+    parser.add_argument('--candidates', default='5,10,25,50,100,200', help='Cortes de candidatos')
+    parser.add_argument('--neighbours', type=int, default=5, help='Vecinas por minucia en los triángulos')
+    parser.add_argument('--distance-bin', type=int, default=8, help='Ancho de celda de distancia (px)')
+    parser.add_argument('--angle-bin', type=int, default=45, help='Ancho de celda de ángulo (grados)')
+    parser.add_argument('--no-spread', action='store_true', help='Sin celdas vecinas en la sonda')
+    parser.add_argument('--bits', type=int, default=4096, help='Bits de los códigos binarios')
+    parser.add_argument('--verify-probes', type=int, default=5,
+                        help='Sondas con búsqueda exhaustiva real en el SDK (0 = ninguna)')
+    parser.add_argument('--verify-candidates', type=int, default=50, help='Candidatos en la verificación')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+    args.candidates = parse_list(args.candidates)
+
+    print("🗂️  BENCHMARK DE PRESELECCIÓN: ÍNDICE DE MINUCIAS Y CÓDIGOS BINARIOS")
+    print("=" * 50)
+    matcher = load_matcher()
+    compare_cost = measure_compare_cost(matcher) if matcher else None
+    if matcher is None:
+        print("libsgfplib no disponible: solo se mide el índice")
+
+    results = []
+    for size in parse_list(args.gallery):
+        print(f"Galería de {size:,} templates...")
+        results.append(run_size(args, size, matcher, compare_cost))
+    print_results(results, compare_cost)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"index_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now().isoformat(),
+                    'neighbours': args.neighbours,
+                    'distance_bin': args.distance_bin,
+                    'angle_bin': args.angle_bin,
+                    'probe_spread': not args.no_spread,
+                    'code_bits': args.bits,
+                    'seed': args.seed,
+                    'compare_cost_us': compare_cost * 1e6 if compare_cost else None,
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResultados guardados en {output}")
+
+
+if __name__ == '__main__':
+    main()
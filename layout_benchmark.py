@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la representación de la galería: un objeto por template
+(GalleryEntry + bytes en diccionarios) frente a la galería compacta
+(huecos de tamaño fijo en bloques NumPy, sdk/templatearena.py)
+
+Con la misma galería sintética (sdk/syntheticminutiae.py) en cada
+representación mide:
+
+  - la memoria de la galería por template (tracemalloc, sin los IDs, que
+    son los mismos en las dos);
+  - el recorrido completo leyendo cada template (listado, exportación);
+  - la lectura por ID (verificación 1:1);
+  - la entrega de los templates al SDK: buffer ctypes copiado con
+    template_buffer frente a la vista sobre el bloque de la arena;
+  - una identificación 1:N sin índice con el SDK sobre --identify-gallery
+    templates, alternando las dos representaciones con cada sonda (la
+    velocidad del equipo varía más que la diferencia entre ellas);
+  - la búsqueda de un digest en toda la galería: bucle de Python sobre las
+    entradas frente a una comparación NumPy por bloque.
+
+    python3 layout_benchmark.py
+    python3 layout_benchmark.py --gallery 100000 --identify-gallery 5000
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+os.environ['SECUGEN_MATCH_CACHE_SIZE'] = '0'  # cada comparación llega al SDK
+os.environ['SECUGEN_CONSOLIDATE'] = '0'
+os.environ.setdefault('SECUGEN_LAZY_INIT', '0')
+
+import numpy as np
+
+from sdk.gallery import Gallery
+from sdk.matchcache import digest as template_digest
+from sdk.matcherpool import template_buffer
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+from sdk.templatearena import TemplateArena
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+LAYOUTS = ('objects', 'compact')
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def build(templates, layout):
+    """(galería, bytes de memoria que ocupa) con todos los templates"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    gallery = Gallery(arena=TemplateArena() if layout == 'compact' else None)
+    for start in range(0, len(templates), 1000):
+        gallery.put_many([(template_id, template, ANSI, template_digest(template), 0, None)
+                          for template_id, template in templates[start:start + 1000]])
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return gallery, memory
+
+
+def digest_scan(gallery, digest):
+    """Templates con ese digest: NumPy por bloque en la arena (handles), bucle sobre las entradas si no (IDs)"""
+    if gallery.arena is not None:
+        return gallery.arena.find_digest(digest)
+    return [template_id for template_id, entry in gallery.snapshot().entries() if entry.digest == digest]
+
+
+def run(controller, templates, layout, args):
+    gallery, memory = build(templates, layout)
+    snapshot = gallery.snapshot()
+    rng = random.Random(args.seed)
+    ids = [template_id for template_id, _ in templates]
+
+    start = time.perf_counter()
+    scanned = sum(len(entry.read()) for _, entry in snapshot.entries())
+    scan_s = time.perf_counter() - start
+
+    lookups = []
+    for template_id in rng.choices(ids, k=args.lookups):
+        start = time.perf_counter()
+        snapshot.entry(template_id).template
+        lookups.append((time.perf_counter() - start) * 1e6)
+
+    start = time.perf_counter()
+    if layout == 'compact':
+        buffers = [entry.buffer() for _, entry in snapshot.entries()]
+    else:
+        buffers = [template_buffer(entry.template, entry.template_format) for _, entry in snapshot.entries()]
+    handoff_s = time.perf_counter() - start
+    del buffers
+
+    target = templates[rng.randrange(len(templates))]
+    start = time.perf_counter()
+    found = digest_scan(gallery, template_digest(target[1]))
+    digest_ms = (time.perf_counter() - start) * 1000
+    expected = snapshot.entry(target[0])._handle if layout == 'compact' else target[0]
+    if found != [expected]:
+        raise RuntimeError(f"Búsqueda por digest incorrecta: {found}")
+
+    return {
+        'layout': layout,
+        'gallery_memory_bytes': memory,
+        'memory_per_template': memory / len(templates),
+        'scan_templates_per_second': len(templates) / scan_s,
+        'scan_mb_per_second': scanned / scan_s / 1e6,
+        'lookup_us_p50': percentile(lookups, 50),
+        'lookup_us_p99': percentile(lookups, 99),
+        'handoff_us_per_template': handoff_s / len(templates) * 1e6,
+        'digest_scan_ms': digest_ms,
+        'arena': gallery.stats()['arena'],
+    }
+
+
+def identify(controller, templates, args):
+    """{representación: [ms de cada identificación 1:N]} con las mismas sondas"""
+    galleries = {layout: build(templates, layout)[0] for layout in LAYOUTS}
+    times = {layout: [] for layout in LAYOUTS}
+    for template_id, template in random.Random(args.seed).sample(templates, args.identify):
+        for layout in LAYOUTS:
+            controller.gallery = galleries[layout]
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                result = controller.identify_template(template, 5, 1, ANSI, use_index=False, prescreen=False)
+            times[layout].append((time.perf_counter() - start) * 1000)
+            if result.get('template_id') != template_id:
+                raise RuntimeError(f"Identificación fallida ({layout}): {result}")
+    return times
+
+
+def print_results(results):
+    print(f"\n{'galería':<8} {'MB':>7} {'B/template':>11} {'recorrido/s':>12} {'leer µs p50/p99':>16} "
+          f"{'al SDK µs':>10} {'digest ms':>10} {'1:N ms p50':>11}")
+    for row in results['rows']:
+        print(f"{row['layout']:<8} {row['gallery_memory_bytes'] / 1e6:>7.1f} {row['memory_per_template']:>11.0f} "
+              f"{row['scan_templates_per_second']:>12.0f} {row['lookup_us_p50']:>7.2f}/{row['lookup_us_p99']:<8.2f} "
+              f"{row['handoff_us_per_template']:>10.2f} {row['digest_scan_ms']:>10.2f} {row['identify_ms_p50']:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Galería compacta (arena) frente a un objeto por template')
+    parser.add_argument('--gallery', type=int, default=50000, help='Templates en la galería')
+    parser.add_argument('--lookups', type=int, default=20000, help='Lecturas por ID')
+    parser.add_argument('--identify-gallery', type=int, default=2000,
+                        help='Templates de la galería de la identificación 1:N con el SDK (0 = no medirla)')
+    parser.add_argument('--identify', type=int, default=5, help='Identificaciones 1:N por representación')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+
+    print("🧱 REPRESENTACIÓN DE LA GALERÍA")
+    print("=" * 50)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app
+    controller = app.controller
+
+    fingers = SyntheticFingers(seed=args.seed)
+    templates = [(f'layout_{n}', bytearray(fingers.encode(fingers.impression(fingers.finger()))))  # como llegan a la API
+                 for n in range(args.gallery)]
+    results = {'gallery': args.gallery, 'template_bytes': sum(len(template) for _, template in templates),
+               'rows': []}
+    for layout in LAYOUTS:
+        row = run(controller, templates, layout, args)
+        results['rows'].append(row)
+        print(f"{layout}: {row['memory_per_template']:.0f} B/template, "
+              f"recorrido {row['scan_templates_per_second']:.0f} templates/s")
+    times = identify(controller, templates[:args.identify_gallery], args) if args.identify_gallery else {}
+    for row in results['rows']:
+        row['identify_ms_p50'] = percentile(times.get(row['layout'], []), 50)
+        row['identify_ms_mean'] = statistics.mean(times[row['layout']]) if times else 0.0
+
+    print_results(results)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"layout_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({'meta': {'timestamp': datetime.now().isoformat(), 'seed': args.seed}, 'results': results},
+                      f, indent=2, default=str)
+        print(f"\nResultados guardados en {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
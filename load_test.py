@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Generador de carga unificado para la API de Huellas Digitales
+
+Sustituye a los scripts de stress con clientes de lazo cerrado (que esperan la
+respuesta antes de enviar la siguiente petición y ocultan las colas). Aquí las
+peticiones se lanzan según un calendario de llegadas (lazo abierto) y la
+latencia se mide desde el instante programado, de modo que el tiempo de espera
+en cola también cuenta.
+
+Uso:
+    # 20 peticiones/s durante 60 s con la mezcla por defecto
+    python3 load_test.py run --rps 20 --duration 60 --output resultado.json
+
+    # Rampa de 5 a 50 peticiones/s, solo verificación e identificación
+    python3 load_test.py run --profile ramp --start-rps 5 --rps 50 --duration 120 \\
+        --mix verify=6,identify=2,status=1
+
+    # Comparar contra una ejecución de referencia (código de salida 1 si hay regresión)
+    python3 load_test.py compare baseline.json resultado.json --tolerance 0.10
+"""
+
+import argparse
+import base64
+import concurrent.futures
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+ENDPOINTS = ('capture', 'verify', 'identify', 'led', 'status')
+DEFAULT_MIX = 'capture=1,verify=6,identify=2,led=1,status=2'
+PERCENTILES = (50.0, 90.0, 95.0, 99.0, 99.9)
+FIXTURE_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'java', 'left thumb1.sg400')
+
+
+class LatencyHistogram:
+    """Histograma log-lineal al estilo HdrHistogram (valores en microsegundos).
+
+    Cada potencia de 2 se divide en 2**sub_bucket_bits cubetas, así que el error
+    relativo de cualquier percentil es menor que 1 / 2**sub_bucket_bits
+    (<0.8% con el valor por defecto) y el tamaño no depende del número de
+    muestras.
+    """
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self.sub_buckets:
+            return value
+        exponent = value.bit_length() - 1 - self.sub_bucket_bits
+        return ((exponent + 1) << self.sub_bucket_bits) + (value >> exponent) - self.sub_buckets
+
+    def _upper_bound(self, index):
+        if index < self.sub_buckets:
+            return index
+        exponent = (index >> self.sub_bucket_bits) - 1
+        mantissa = (index & (self.sub_buckets - 1)) + self.sub_buckets
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, value_us):
+        value = max(0, int(value_us))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = max(1, int(math.ceil(self.count * p / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def summary_ms(self):
+        summary = {
+            'count': self.count,
+            'min': (self.min or 0) / 1000.0,
+            'mean': self.mean() / 1000.0,
+            'max': (self.max or 0) / 1000.0,
+        }
+        for p in PERCENTILES:
+            summary[f'p{p:g}'] = self.percentile(p) / 1000.0
+        return summary
+
+    def to_dict(self):
+        return {
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'counts': {str(k): v for k, v in sorted(self.counts.items())},
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(data['sub_bucket_bits'])
+        hist.counts = {int(k): v for k, v in data['counts'].items()}
+        hist.count = data['count']
+        hist.total = data['total']
+        hist.min = data['min']
+        hist.max = data['max']
+        return hist
+
+
+class EndpointStats:
+    """Resultados acumulados de un endpoint"""
+
+    def __init__(self):
+        self.response = LatencyHistogram()  # desde el instante programado
+        self.service = LatencyHistogram()   # desde el envío real
+        self.ok = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.error_messages = {}
+
+    def to_dict(self, duration):
+        total = self.ok + self.errors
+        return {
+            'requests': total,
+            'ok': self.ok,
+            'errors': self.errors,
+            'error_rate': self.errors / total if total else 0.0,
+            'throughput_rps': self.ok / duration if duration > 0 else 0.0,
+            'status_codes': self.status_codes,
+            'error_messages': dict(sorted(self.error_messages.items(), key=lambda e: -e[1])[:10]),
+            'latency_ms': self.response.summary_ms(),
+            'service_time_ms': self.service.summary_ms(),
+            'histogram': self.response.to_dict(),
+        }
+
+
+def parse_mix(text):
+    weights = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconocido en --mix: {name} (válidos: {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("--mix necesita al menos un endpoint con peso positivo")
+    return weights
+
+
+def arrival_schedule(profile, rps, start_rps, duration, arrivals, rng):
+    """Genera los instantes de llegada (segundos desde el inicio)"""
+    t = 0.0
+    while t < duration:
+        if profile == 'ramp':
+            rate = start_rps + (rps - start_rps) * (t / duration)
+        else:
+            rate = rps
+        rate = max(rate, 0.01)
+        if arrivals == 'poisson':
+            t += rng.expovariate(rate)
+        else:
+            t += 1.0 / rate
+        if t < duration:
+            yield t
+
+
+class LoadGenerator:
+    def __init__(self, base_url, weights, timeout=30, max_concurrency=256,
+                 security_level=5, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.weights = weights
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.security_level = security_level
+        self.rng = random.Random(seed)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {name: EndpointStats() for name in weights}
+        self.reference_ids = []
+        self.probe_template = None
+        self.led_state = False
+        self.late_dispatches = 0
+
+    def log(self, message):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        print(f"[{timestamp}] {message}", file=sys.stderr)
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    # Preparación ---------------------------------------------------------
+
+    def prepare(self, references=3):
+        """Comprueba la API y enrola templates de referencia para verify/identify"""
+        response = self.session().post(f"{self.base_url}/initialize", timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"La API no está lista: HTTP {response.status_code}")
+
+        if os.path.exists(FIXTURE_TEMPLATE):
+            with open(FIXTURE_TEMPLATE, 'rb') as f:
+                self.probe_template = base64.b64encode(f.read()).decode('utf-8')
+
+        needs_templates = any(name in self.weights for name in ('verify', 'identify'))
+        if not needs_templates:
+            return
+
+        for i in range(references):
+            template_id = f"carga_ref_{i + 1}"
+            response = self.session().post(f"{self.base_url}/capturar-huella", json={
+                'save_image': False,
+                'create_template': True,
+                'template_id': template_id
+            }, timeout=self.timeout)
+            data = response.json() if response.status_code == 200 else {}
+            if data.get('data', {}).get('template_stored'):
+                self.reference_ids.append(template_id)
+                if self.probe_template is None:
+                    self.probe_template = data['data']['template']
+            else:
+                self.log(f"⚠️ No se pudo enrolar {template_id}: HTTP {response.status_code}")
+
+        if not self.reference_ids and self.probe_template is None:
+            raise RuntimeError("No hay templates para verify/identify (sin capturas ni fixture)")
+        self.log(f"✅ Referencias enroladas: {len(self.reference_ids)}")
+
+    # Peticiones ----------------------------------------------------------
+
+    def build_request(self, name):
+        if name == 'capture':
+            return 'POST', '/capturar-huella', {'save_image': False, 'create_template': False}
+        if name == 'verify':
+            if len(self.reference_ids) >= 2:
+                first, second = self.rng.sample(self.reference_ids, 2)
+                return 'POST', '/comparar-huellas', {
+                    'template1_id': first,
+                    'template2_id': second,
+                    'security_level': self.security_level
+                }
+            return 'POST', '/comparar-huellas', {
+                'template1_data': self.probe_template,
+                'template2_data': self.probe_template,
+                'security_level': self.security_level
+            }
+        if name == 'identify':
+            return 'POST', '/identificar-huella', {
+                'template_data': self.probe_template,
+                'security_level': self.security_level
+            }
+        if name == 'led':
+            with self.lock:
+                self.led_state = not self.led_state
+                state = self.led_state
+            return 'POST', '/led', {'state': state}
+        return 'GET', '/device-status', None
+
+    def execute(self, name, method, path, payload, scheduled_at):
+        sent_at = time.perf_counter()
+        status = None
+        error = None
+        try:
+            response = self.session().request(method, f"{self.base_url}{path}",
+                                              json=payload, timeout=self.timeout)
+            status = response.status_code
+            if status != 200:
+                try:
+                    error = response.json().get('error', f"HTTP {status}")
+                except ValueError:
+                    error = f"HTTP {status}"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+
+        stats = self.stats[name]
+        with self.lock:
+            stats.response.record((finished - scheduled_at) * 1e6)
+            stats.service.record((finished - sent_at) * 1e6)
+            key = str(status) if status is not None else 'sin_respuesta'
+            stats.status_codes[key] = stats.status_codes.get(key, 0) + 1
+            if error is None:
+                stats.ok += 1
+            else:
+                stats.errors += 1
+                message = str(error)[:120]
+                stats.error_messages[message] = stats.error_messages.get(message, 0) + 1
+
+    def run(self, profile, rps, start_rps, duration, arrivals='uniform'):
+        names = list(self.weights)
+        weights = [self.weights[n] for n in names]
+        schedule = list(arrival_schedule(profile, rps, start_rps, duration, arrivals, self.rng))
+        self.log(f"🚀 {len(schedule)} peticiones programadas en {duration}s (perfil {profile})")
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency)
+        start = time.perf_counter()
+        next_report = start + 10
+        try:
+            for offset in schedule:
+                scheduled_at = start + offset
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -0.001:
+                    self.late_dispatches += 1
+                name = self.rng.choices(names, weights)[0]
+                method, path, payload = self.build_request(name)
+                executor.submit(self.execute, name, method, path, payload, scheduled_at)
+                if time.perf_counter() >= next_report:
+                    done = sum(s.ok + s.errors for s in self.stats.values())
+                    self.log(f"⏳ {done} respuestas, t={time.perf_counter() - start:.0f}s")
+                    next_report += 10
+        finally:
+            executor.shutdown(wait=True)
+        return time.perf_counter() - start
+
+    def report(self, elapsed, args):
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.response.merge(stats.response)
+            total.service.merge(stats.service)
+            total.ok += stats.ok
+            total.errors += stats.errors
+            for code, count in stats.status_codes.items():
+                total.status_codes[code] = total.status_codes.get(code, 0) + count
+            for message, count in stats.error_messages.items():
+                total.error_messages[message] = total.error_messages.get(message, 0) + count
+        return {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'base_url': self.base_url,
+                'profile': args.profile,
+                'rps': args.rps,
+                'start_rps': args.start_rps,
+                'duration_s': args.duration,
+                'arrivals': args.arrivals,
+                'mix': self.weights,
+                'elapsed_s': elapsed,
+                'late_dispatches': self.late_dispatches,
+                'references': self.reference_ids,
+            },
+            'total': total.to_dict(elapsed),
+            'endpoints': {name: stats.to_dict(elapsed) for name, stats in self.stats.items()},
+        }
+
+
+def print_report(result):
+    print("\n📊 RESULTADOS (latencia en ms, medida desde el instante programado)")
+    header = f"{'endpoint':<10} {'pet.':>7} {'err%':>6} {'rps':>7} " + \
+             " ".join(f"{'p' + format(p, 'g'):>8}" for p in PERCENTILES) + f" {'max':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result['endpoints'].items()) + [('TOTAL', result['total'])]
+    for name, data in rows:
+        latency = data['latency_ms']
+        print(f"{name:<10} {data['requests']:>7} {data['error_rate'] * 100:>5.1f}% "
+              f"{data['throughput_rps']:>7.2f} " +
+              " ".join(f"{latency['p' + format(p, 'g')]:>8.1f}" for p in PERCENTILES) +
+              f" {latency['max']:>8.1f}")
+    late = result['meta']['late_dispatches']
+    if late:
+        print(f"\n⚠️ {late} peticiones salieron con retraso: el generador no alcanzó la tasa pedida")
+
+
+# Comparación con una ejecución de referencia ------------------------------
+
+def compare_results(baseline, current, tolerance=0.10, min_delta_ms=1.0, error_tolerance=0.01):
+    """Devuelve la lista de regresiones de `current` respecto a `baseline`"""
+    regressions = []
+    sections = [('TOTAL', baseline.get('total'), current.get('total'))]
+    for name, data in current.get('endpoints', {}).items():
+        if name in baseline.get('endpoints', {}):
+            sections.append((name, baseline['endpoints'][name], data))
+
+    for name, base, cur in sections:
+        if not base or not cur:
+            continue
+        for p in PERCENTILES:
+            key = 'p' + format(p, 'g')
+            before = base['latency_ms'][key]
+            after = cur['latency_ms'][key]
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{name} {key}: {before:.1f}ms -> {after:.1f}ms "
+                                   f"(+{(after / before - 1) * 100 if before else 100:.0f}%)")
+        if cur['error_rate'] > base['error_rate'] + error_tolerance:
+            regressions.append(f"{name} error_rate: {base['error_rate'] * 100:.1f}% -> "
+                               f"{cur['error_rate'] * 100:.1f}%")
+        if cur['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name} throughput: {base['throughput_rps']:.2f} -> "
+                               f"{cur['throughput_rps']:.2f} rps")
+    return regressions
+
+
+def command_run(args):
+    weights = parse_mix(args.mix)
+    generator = LoadGenerator(args.url, weights, timeout=args.timeout,
+                              max_concurrency=args.max_concurrency,
+                              security_level=args.security_level, seed=args.seed)
+    try:
+        generator.prepare(args.references)
+    except (RuntimeError, requests.RequestException) as e:
+        print(f"❌ {e}")
+        return 2
+
+    elapsed = generator.run(args.profile, args.rps, args.start_rps, args.duration, args.arrivals)
+    result = generator.report(elapsed, args)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n📁 Resultados guardados en: {args.output}")
+
+    if args.baseline:
+        return command_compare(argparse.Namespace(baseline=args.baseline, current=None,
+                                                  tolerance=args.tolerance,
+                                                  min_delta_ms=args.min_delta_ms),
+                               current=result)
+    return 0
+
+
+def command_compare(args, current=None):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if current is None:
+        with open(args.current) as f:
+            current = json.load(f)
+
+    regressions = compare_results(baseline, current, args.tolerance, args.min_delta_ms)
+    print(f"\n🔍 Comparación con {args.baseline} (tolerancia {args.tolerance * 100:.0f}%)")
+    if regressions:
+        for regression in regressions:
+            print(f"   ❌ {regression}")
+        return 1
+    print("   ✅ Sin regresiones")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de carga de lazo abierto para la API de Huellas')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Ejecutar una prueba de carga')
+    run.add_argument('--url', default='http://localhost:5000', help='URL base de la API')
+    run.add_argument('--profile', choices=['constant', 'ramp'], default='constant',
+                     help='Perfil de llegadas: tasa constante o rampa lineal')
+    run.add_argument('--rps', type=float, default=10.0, help='Peticiones por segundo (final, en rampa)')
+    run.add_argument('--start-rps', type=float, default=1.0, help='Peticiones por segundo iniciales de la rampa')
+    run.add_argument('--duration', type=float, default=60.0, help='Duración en segundos')
+    run.add_argument('--arrivals', choices=['uniform', 'poisson'], default='uniform',
+                     help='Llegadas equiespaciadas o de Poisson')
+    run.add_argument('--mix', default=DEFAULT_MIX, help=f'Pesos por endpoint (por defecto: {DEFAULT_MIX})')
+    run.add_argument('--references', type=int, default=3, help='Templates de referencia a enrolar')
+    run.add_argument('--security-level', type=int, default=5, help='Nivel de seguridad para verify/identify')
+    run.add_argument('--max-concurrency', type=int, default=256, help='Peticiones simultáneas máximas del cliente')
+    run.add_argument('--timeout', type=float, default=30.0, help='Timeout por petición (s)')
+    run.add_argument('--seed', type=int, default=0, help='Semilla para la mezcla y las llegadas')
+    run.add_argument('--output', help='Guardar el resultado en JSON')
+    run.add_argument('--baseline', help='Comparar al terminar con este resultado de referencia')
+    run.add_argument('--tolerance', type=float, default=0.10, help='Tolerancia relativa de regresión')
+    run.add_argument('--min-delta-ms', type=float, default=1.0, help='Diferencia mínima de latencia a considerar')
+    run.set_defaults(func=command_run)
+
+    compare = subparsers.add_parser('compare', help='Comparar un resultado con una referencia')
+    compare.add_argument('baseline', help='JSON de la ejecución de referencia')
+    compare.add_argument('current', help='JSON de la ejecución actual')
+    compare.add_argument('--tolerance', type=float, default=0.10, help='Tolerancia relativa de regresión')
+    compare.add_argument('--min-delta-ms', type=float, default=1.0, help='Diferencia mínima de latencia a considerar')
+    compare.set_defaults(func=command_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
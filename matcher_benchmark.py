@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Benchmark y calibración del matcher NumPy (sdk/minutiaematcher.py) frente al SDK
+
+Compara el matcher vectorizado con GetAnsiMatchingScore/GetIsoMatchingScore de
+libsgfplib (sin lector) en:
+
+  - fixtures de java/: left thumb1 contra left thumb2 en ANSI, ISO y cruzados
+  - pares sintéticos (sdk/syntheticminutiae.py) genuinos de dificultad
+    creciente e impostores: distribución de scores de ambos, correlación,
+    error medio y acuerdo de la decisión en cada nivel de seguridad
+  - coste por comparación: SDK una a una, NumPy en lote contra la galería
+  - primer filtro: recall de la sonda correcta entre los P mejores del
+    matcher NumPy en galerías de varios tamaños
+
+--calibrate imprime los nodos CALIBRATION ajustados a estos pares para
+pegarlos en sdk/minutiaematcher.py.
+
+    python3 matcher_benchmark.py
+    python3 matcher_benchmark.py --gallery 1000,10000 --prescreen 10,25,50
+    python3 matcher_benchmark.py --calibrate --pairs 400
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(REPO_DIR, 'java')
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+from sdk.minutiaematcher import MatcherGallery, MinutiaeMatcher, SCORE_THRESHOLDS, fit_calibration
+from sdk.sgfdxsecuritylevel import SGFDxSecurityLevel
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+ISO = SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794
+
+# (pérdida, espurias, traslación, rotación) de las impresiones genuinas
+DIFFICULTIES = [(0.2, 0.1, 20, 20), (0.4, 0.3, 50, 30), (0.6, 0.5, 80, 45), (0.7, 0.6, 100, 60)]
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def load_sdk():
+    """Score del SDK para dos templates de formato conocido, o None sin libsgfplib"""
+    from ctypes import c_int
+    try:
+        from sdk.pysgfplib import PYSGFPMDevice
+        sgfp = PYSGFPMDevice()
+        if sgfp.Create() != 0 or sgfp.Init(0x04) != 0:  # SG_DEV_FDU03: sin lector
+            return None
+    except OSError:
+        return None
+    score = c_int(0)
+
+    def sdk_score(template1, template2, format1=ANSI, format2=ANSI):
+        if format1 == format2 == ANSI:
+            sgfp.GetAnsiMatchingScore(template1, 0, template2, 0, score)
+        elif format1 == format2 == ISO:
+            sgfp.GetIsoMatchingScore(template1, 0, template2, 0, score)
+        else:
+            sgfp.GetMatchingScoreEx(template1, format1, 0, template2, format2, 0, score)
+        return score.value
+    return sdk_score
+
+
+def synthetic_pairs(count, seed):
+    """Pares (template1, template2, genuino) repartidos entre las dificultades"""
+    pairs = []
+    for level, (drop, spurious, translation, rotation) in enumerate(DIFFICULTIES):
+        fingers = SyntheticFingers(seed=seed + level, drop_rate=drop, spurious_rate=spurious,
+                                   translation=translation, rotation=rotation)
+        bases = [fingers.finger() for _ in range(max(2, count // len(DIFFICULTIES)))]
+        for i, base in enumerate(bases):
+            pairs.append((fingers.encode(fingers.impression(base)), fingers.encode(base), True))
+            other = bases[(i + 1) % len(bases)]
+            pairs.append((fingers.encode(fingers.impression(base)), fingers.encode(other), False))
+    return pairs
+
+
+def calibration_report(matcher, sdk_score, pairs):
+    raw = []
+    sdk = []
+    for template1, template2, _ in pairs:
+        raw.append(float(matcher.raw_scores(matcher.prepare(template1), [matcher.prepare(template2)])[0]))
+        sdk.append(sdk_score(template1, template2))
+    raw = np.array(raw)
+    sdk = np.array(sdk)
+    genuine = np.array([is_genuine for _, _, is_genuine in pairs])
+    numpy_scores = matcher.calibrate(raw)
+    agreement = {}
+    for level in (SGFDxSecurityLevel.SL_LOW, SGFDxSecurityLevel.SL_NORMAL, SGFDxSecurityLevel.SL_HIGH,
+                  SGFDxSecurityLevel.SL_HIGHEST):
+        threshold = SCORE_THRESHOLDS[level]
+        agreement[level] = float(np.mean((numpy_scores >= threshold) == (sdk >= threshold)))
+
+    def percentiles(values):
+        return {p: float(np.percentile(values, p)) for p in (0, 5, 50, 95, 100)}
+    return raw, sdk, {
+        'pairs': len(pairs),
+        'correlation': float(np.corrcoef(numpy_scores, sdk)[0, 1]),
+        'mean_abs_error': float(np.mean(np.abs(numpy_scores - sdk))),
+        'decision_agreement': agreement,
+        'sdk_genuine': percentiles(sdk[genuine]),
+        'sdk_impostor': percentiles(sdk[~genuine]),
+        'numpy_genuine': percentiles(numpy_scores[genuine]),
+        'numpy_impostor': percentiles(numpy_scores[~genuine]),
+    }
+
+
+def fixture_report(matcher, sdk_score):
+    templates = {
+        'thumb1.ansi': (fixture('left thumb1.ansi378'), ANSI),
+        'thumb2.ansi': (fixture('left thumb2.ansi378'), ANSI),
+        'thumb1.iso': (fixture('left thumb1.iso19794'), ISO),
+        'thumb2.iso': (fixture('left thumb2.iso19794'), ISO),
+    }
+    rows = []
+    for name1, name2 in (('thumb1.ansi', 'thumb2.ansi'), ('thumb1.iso', 'thumb2.iso'),
+                         ('thumb1.ansi', 'thumb2.iso'), ('thumb1.ansi', 'thumb1.ansi')):
+        (data1, format1), (data2, format2) = templates[name1], templates[name2]
+        rows.append({
+            'pair': f'{name1} / {name2}',
+            'numpy': matcher.score(data1, data2, format1, format2),
+            'sdk': sdk_score(data1, data2, format1, format2) if sdk_score else None,
+        })
+    return rows
+
+
+def cost_report(matcher, sdk_score, gallery_size, seed, samples=200):
+    fingers = SyntheticFingers(seed=seed)
+    templates = [fingers.encode(fingers.finger()) for _ in range(gallery_size)]
+    gallery = MatcherGallery(matcher)
+    for i, data in enumerate(templates):
+        gallery.add(i, matcher.prepare(data))
+    probe = matcher.prepare(templates[0])
+    gallery.raw_scores(probe)  # apila los lotes
+
+    start = time.perf_counter()
+    rounds = max(1, 20000 // gallery_size)
+    for _ in range(rounds):
+        gallery.raw_scores(probe)
+    numpy_us = (time.perf_counter() - start) / (rounds * gallery_size) * 1e6
+
+    start = time.perf_counter()
+    for data in templates[:20]:
+        matcher.prepare(data)
+    prepare_us = (time.perf_counter() - start) / 20 * 1e6
+
+    sdk_us = None
+    if sdk_score:
+        start = time.perf_counter()
+        for i in range(samples):
+            sdk_score(templates[0], templates[i % len(templates)])
+        sdk_us = (time.perf_counter() - start) / samples * 1e6
+    return {'gallery': gallery_size, 'numpy_us_per_comparison': numpy_us, 'prepare_us': prepare_us,
+            'sdk_us_per_comparison': sdk_us}
+
+
+def prescreen_report(matcher, gallery_size, probes, cutoffs, seed):
+    fingers = SyntheticFingers(seed=seed)
+    bases = [fingers.finger() for _ in range(gallery_size)]
+    gallery = MatcherGallery(matcher)
+    for i, base in enumerate(bases):
+        gallery.add(i, matcher.prepare(fingers.encode(base)))
+    ranks = []
+    times = []
+    for mate in fingers.rng.choice(gallery_size, size=min(probes, gallery_size), replace=False).tolist():
+        probe = matcher.prepare(fingers.encode(fingers.impression(bases[mate])))
+        start = time.perf_counter()
+        ids, raw = gallery.raw_scores(probe)
+        times.append(time.perf_counter() - start)
+        ranks.append(int(np.sum(raw > raw[ids.index(mate)])))
+    return {
+        'gallery': gallery_size,
+        'probes': len(ranks),
+        'scan_ms_p50': statistics.median(times) * 1000,
+        'recall': {c: sum(1 for rank in ranks if rank < c) / len(ranks) for c in cutoffs},
+    }
+
+
+def print_results(results):
+    print("\nFixtures de java/ (score NumPy / SDK):")
+    for row in results['fixtures']:
+        sdk = '-' if row['sdk'] is None else row['sdk']
+        print(f"  {row['pair']:<28} {row['numpy']:>4} / {sdk}")
+    calibration = results.get('calibration')
+    if calibration:
+        print(f"\nPares sintéticos ({calibration['pairs']}): correlación {calibration['correlation']:.3f}, "
+              f"error medio {calibration['mean_abs_error']:.1f}")
+        for name in ('genuine', 'impostor'):
+            sdk = calibration[f'sdk_{name}']
+            numpy_scores = calibration[f'numpy_{name}']
+            print(f"  {name:<9} SDK p5/p50/p95 {sdk[5]:.0f}/{sdk[50]:.0f}/{sdk[95]:.0f}   "
+                  f"NumPy {numpy_scores[5]:.0f}/{numpy_scores[50]:.0f}/{numpy_scores[95]:.0f}")
+        for level, agreement in calibration['decision_agreement'].items():
+            print(f"  misma decisión con SL {level} (score >= {SCORE_THRESHOLDS[level]}): {agreement * 100:.1f}%")
+    print("\nCoste por comparación:")
+    for cost in results['cost']:
+        sdk = f"{cost['sdk_us_per_comparison']:.0f} us" if cost['sdk_us_per_comparison'] else '-'
+        print(f"  galería {cost['gallery']:>6,}: NumPy {cost['numpy_us_per_comparison']:.1f} us (en lote), "
+              f"SDK {sdk}, preparar template {cost['prepare_us']:.0f} us")
+    print("\nPrimer filtro (recall de la sonda correcta entre los P mejores):")
+    for prescreen in results['prescreen']:
+        recalls = '  '.join(f"P={c}: {r * 100:.1f}%" for c, r in prescreen['recall'].items())
+        print(f"  galería {prescreen['gallery']:>6,} ({prescreen['scan_ms_p50']:.1f} ms): {recalls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Matcher NumPy frente al SDK: calibración, coste y recall')
+    parser.add_argument('--pairs', type=int, default=400, help='Pares sintéticos genuinos (y otros tantos impostores)')
+    parser.add_argument('--gallery', default='1000,10000', help='Tamaños de galería para coste y recall')
+    parser.add_argument('--probes', type=int, default=100, help='Sondas por galería en el primer filtro')
+    parser.add_argument('--prescreen', default='5,10,25,50', help='Candidatos P que pasan el primer filtro')
+    parser.add_argument('--calibrate', action='store_true', help='Imprimir nodos CALIBRATION ajustados')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+
+    print("🧮 MATCHER NUMPY FRENTE AL SDK")
+    print("=" * 50)
+    matcher = MinutiaeMatcher()
+    sdk_score = load_sdk()
+    if sdk_score is None:
+        print("libsgfplib no disponible: sin calibración ni coste del SDK")
+
+    results = {'fixtures': fixture_report(matcher, sdk_score)}
+    if sdk_score:
+        raw, sdk, results['calibration'] = calibration_report(matcher, sdk_score,
+                                                              synthetic_pairs(args.pairs, args.seed + 100))
+        if args.calibrate:
+            print("\nCALIBRATION = (")
+            knots = fit_calibration(raw, sdk)
+            for start in range(0, len(knots), 6):
+                print("    " + ", ".join(f"({r}, {s})" for r, s in knots[start:start + 6]) + ",")
+            print(")")
+    results['cost'] = [cost_report(matcher, sdk_score, size, args.seed) for size in parse_list(args.gallery)]
+    results['prescreen'] = [prescreen_report(matcher, size, args.probes, parse_list(args.prescreen), args.seed)
+                            for size in parse_list(args.gallery)]
+    print_results(results)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"matcher_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({'meta': {'timestamp': datetime.now().isoformat(), 'seed': args.seed}, 'results': results},
+                      f, indent=2, default=str)
+        print(f"\nResultados guardados en {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark de super-templates por identidad (sdk/consolidation.py)
+
+Fusiona las muestras de un dedo con MergeMultipleAnsiTemplate /
+MergeMultipleIsoTemplate y compara contra el super-template vista a vista
+(MatchAnsiTemplate con sampleNum) en lugar de muestra a muestra:
+
+  - fixtures de java/: left thumb1 + left thumb2 fusionados en ANSI e ISO,
+    tamaño y score de cada vista frente al de la muestra suelta, con sondas
+    left thumb1/thumb2 y el template extraído de left thumb_ex.raw
+  - identidades sintéticas (sdk/syntheticminutiae.py): identify_person con y
+    sin super-templates sobre la misma galería; tiempo por identificación,
+    comparaciones del SDK y si cambia algún resultado (genuinos e impostores)
+
+Necesita libsgfplib (sin lector).
+
+    python3 merge_benchmark.py
+    python3 merge_benchmark.py --persons 200 --samples 5 --probes 50
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(REPO_DIR, 'java')
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+# Sin caché de resultados: cada identificación llega al SDK
+os.environ.setdefault('SECUGEN_MATCH_CACHE_SIZE', '0')
+os.environ.setdefault('SECUGEN_LAZY_INIT', '0')
+
+from sdk.consolidation import MergedTemplate, match_merged, merge_templates
+from sdk.matcherpool import match_templates
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+ISO = SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794
+FORMAT_NAMES = {ANSI: 'ansi378', ISO: 'iso19794'}
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def load_sdk():
+    """Objeto SGFPM propio sin lector, o None sin libsgfplib"""
+    try:
+        from sdk.pysgfplib import PYSGFPMDevice
+        sgfp = PYSGFPMDevice()
+        if sgfp.Create() != 0 or sgfp.Init(0x04) != 0:  # SG_DEV_FDU03: 260x300 sin lector
+            return None
+    except OSError:
+        return None
+    return sgfp
+
+
+def extract(sgfp, raw_image, template_format):
+    """Template ANSI/ISO de una imagen .raw con el extractor del SDK"""
+    from ctypes import c_char, c_ulong
+    sgfp.SetTemplateFormat(template_format)
+    size = c_ulong(0)
+    sgfp.GetMaxTemplateSize(size)
+    template = (c_char * size.value)()
+    if sgfp.CreateTemplate(None, (c_char * len(raw_image)).from_buffer_copy(raw_image), template) != 0:
+        return None
+    sgfp.GetTemplateSize(template, size)
+    return bytes(template[:size.value])
+
+
+def fixture_report(sgfp):
+    rows = []
+    for template_format, extension in ((ANSI, 'ansi378'), (ISO, 'iso19794')):
+        samples = [fixture(f'left thumb1.{extension}'), fixture(f'left thumb2.{extension}')]
+        err, template = merge_templates(sgfp, samples, template_format)
+        if template is None:
+            rows.append({'format': extension, 'error': err})
+            continue
+        merged = MergedTemplate(template, template_format, ['thumb1', 'thumb2'])
+        probes = {'thumb1': samples[0], 'thumb2': samples[1]}
+        probe_ex = extract(sgfp, fixture('left thumb_ex.raw'), template_format)
+        if probe_ex:
+            probes['thumb_ex'] = probe_ex
+        scores = {}
+        for name, probe in probes.items():
+            separate = [match_templates(sgfp, probe, sample, 5, template_format, template_format)[2]
+                        for sample in samples]
+            views = [match_templates(sgfp, probe, merged.buffer, 5, template_format, template_format, view)[2]
+                     for view in range(len(merged))]
+            scores[name] = {'separate': separate, 'merged': views}
+        rows.append({
+            'format': extension,
+            'sizes': [len(sample) for sample in samples],
+            'merged_size': len(template),
+            'scores': scores,
+        })
+    return rows
+
+
+def identity_report(persons, samples, probes, seed):
+    """identify_person con y sin super-templates sobre la misma galería sintética"""
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app  # controlador global con el backend configurado
+    controller = app.controller
+    controller.consolidate = True
+    fingers = SyntheticFingers(seed=seed)
+    bases = [fingers.finger() for _ in range(persons)]
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for person, base in enumerate(bases):
+            for sample in range(samples):
+                controller.store_template(f'persona_{person}_{sample}', bytearray(fingers.encode(fingers.impression(base))),
+                                          ANSI, f'persona_{person}', 1)
+        controller.consolidator.consolidate()
+    stats = controller.consolidator.stats()
+
+    queries = []
+    for mate in fingers.rng.choice(persons, size=min(probes, persons), replace=False).tolist():
+        queries.append((f'persona_{mate}', fingers.encode(fingers.impression(bases[mate]))))
+        queries.append((None, fingers.encode(fingers.finger())))  # impostor
+
+    # Los dos modos se alternan en cada sonda para que la deriva de la máquina afecte a ambos
+    modes = {name: {'times': [], 'comparisons': 0, 'genuine_correct': 0, 'false_matches': 0}
+             for name in ('separate', 'merged')}
+    same_decisions = 0
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for mate, probe in queries:
+            decisions = []
+            for name, consolidated in (('separate', False), ('merged', True)):
+                mode = modes[name]
+                start = time.perf_counter()
+                result = controller.identify_person([(probe, ANSI, 1)], 5, 1, 'max', True, False, False, consolidated)
+                mode['times'].append(time.perf_counter() - start)
+                mode['comparisons'] += result['comparisons']
+                decisions.append((result['person_id'], result['score']))
+                if mate is None:
+                    mode['false_matches'] += result['identified']
+                else:
+                    mode['genuine_correct'] += result['person_id'] == mate
+            same_decisions += decisions[0][0] == decisions[1][0]
+    for mode in modes.values():
+        times = mode.pop('times')
+        mode['ms_per_identification'] = statistics.mean(times) * 1000
+        mode['comparisons_per_identification'] = mode.pop('comparisons') / len(queries)
+    return {
+        'persons': persons,
+        'samples_per_finger': samples,
+        'queries': len(queries),
+        'consolidation': stats,
+        'template_bytes': sum(len(data) for data in controller.stored_templates.values()),
+        'modes': modes,
+        'same_decisions': same_decisions,
+    }
+
+
+def print_results(results):
+    print("\nFixtures de java/ (left thumb1 + left thumb2):")
+    for row in results['fixtures']:
+        if 'error' in row:
+            print(f"  {row['format']}: la fusión falló ({row['error']})")
+            continue
+        print(f"  {row['format']}: {' + '.join(map(str, row['sizes']))} bytes -> {row['merged_size']} bytes")
+        for probe, scores in row['scores'].items():
+            print(f"    sonda {probe:<9} muestras {scores['separate']}  vistas del super-template {scores['merged']}")
+    report = results.get('identities')
+    if report:
+        print(f"\nIdentidades sintéticas: {report['persons']} personas x {report['samples_per_finger']} muestras, "
+              f"{report['queries']} sondas (mitad impostores)")
+        stats = report['consolidation']
+        print(f"  super-templates: {stats['merged']} ({stats['bytes']:,} bytes; "
+              f"templates sueltos {report['template_bytes']:,} bytes)")
+        for name, mode in report['modes'].items():
+            print(f"  {name:<9} {mode['ms_per_identification']:7.1f} ms/identificación  "
+                  f"{mode['comparisons_per_identification']:6.1f} comparaciones  "
+                  f"genuinos correctos {mode['genuine_correct']}  falsas coincidencias {mode['false_matches']}")
+        print(f"  misma persona identificada en {report['same_decisions']}/{report['queries']} sondas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Super-templates por identidad: tamaño, coste y precisión')
+    parser.add_argument('--persons', type=int, default=100, help='Personas de la galería sintética')
+    parser.add_argument('--samples', type=int, default=3, help='Muestras por dedo')
+    parser.add_argument('--probes', type=int, default=20, help='Sondas genuinas (y otras tantas impostoras)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+
+    print("🧬 SUPER-TEMPLATES POR IDENTIDAD")
+    print("=" * 50)
+    sgfp = load_sdk()
+    if sgfp is None:
+        print("libsgfplib no disponible: no hay nada que fusionar")
+        return 1
+
+    results = {'fixtures': fixture_report(sgfp)}
+    results['identities'] = identity_report(args.persons, args.samples, args.probes, args.seed)
+    print_results(results)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"merge_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({'meta': {'timestamp': datetime.now().isoformat(), 'seed': args.seed}, 'results': results},
+                      f, indent=2, default=str)
+        print(f"\nResultados guardados en {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
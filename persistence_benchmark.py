@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark del arranque con la galería persistida (sdk/persistence.py)
+
+Hace crecer una galería sintética (sdk/syntheticminutiae.py) en un directorio
+de datos y en cada tamaño pedido:
+
+  - guarda una instantánea (tiempo, tamaño y tiempo con las altas bloqueadas);
+  - añade una cola de --tail altas al WAL;
+  - arranca un proceso nuevo con SECUGEN_DATA_DIR y mide la recuperación:
+    carga de la instantánea + reaplicación de la cola;
+  - como referencia arranca otro proceso con un WAL de toda la historia y sin
+    instantánea, que reconstruye la galería alta por alta.
+
+También mide el coste de registrar un alta en el WAL (con y sin fsync).
+
+    python3 persistence_benchmark.py
+    python3 persistence_benchmark.py --gallery 1000,10000,50000 --tail 1000
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+os.environ['SECUGEN_SNAPSHOT_INTERVAL'] = '0'   # instantáneas solo cuando las pide el benchmark
+os.environ['SECUGEN_CONSOLIDATE'] = '0'
+os.environ.setdefault('SECUGEN_LAZY_INIT', '0')
+
+from sdk.persistence import GalleryStore
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+
+# Proceso hijo: arranque del servicio con el directorio de datos dado
+RESTORE_SCRIPT = '''
+import contextlib, json, os, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(open(os.devnull, 'w')):
+    import app
+print(json.dumps(dict(app.controller.restore_stats or {}, startup_ms=(time.perf_counter() - start) * 1000)))
+'''
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def restart(data_dir):
+    """restore_stats de un proceso nuevo que arranca con data_dir (y su tiempo total de import app)"""
+    env = dict(os.environ, SECUGEN_DATA_DIR=data_dir, SECUGEN_LAZY_INIT='1')
+    output = subprocess.run([sys.executable, '-c', RESTORE_SCRIPT], cwd=REPO_DIR, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def wal_cost(directory, templates, fsync):
+    """µs por registro de alta en el WAL"""
+    store = GalleryStore(directory, fsync)
+    store.open()
+    start = time.perf_counter()
+    for n, template in enumerate(templates):
+        store.log_put(f'coste_{n}', template, ANSI)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed / len(templates) * 1e6
+
+
+def print_results(results):
+    print(f"\nWAL: {results['wal_us_fsync']:.0f} µs por alta con fsync, {results['wal_us_no_fsync']:.0f} µs sin fsync")
+    print(f"{'galería':>8} {'instantánea':>12} {'MB':>7} {'bloqueo ms':>11} {'cola':>6} "
+          f"{'carga ms':>9} {'cola ms':>8} {'recuperación ms':>16} {'solo WAL ms':>12} {'ganancia':>9}")
+    for row in results['sizes']:
+        restore = row['restore']
+        rebuild = row.get('rebuild')
+        rebuild_ms = f"{rebuild['elapsed_ms']:>12.0f}" if rebuild else f"{'-':>12}"
+        speedup = f"{rebuild['elapsed_ms'] / restore['elapsed_ms']:>8.1f}x" if rebuild else f"{'-':>9}"
+        print(f"{row['gallery']:>8} {row['snapshot_ms']:>10.0f}ms {row['snapshot_bytes'] / 1e6:>7.1f} "
+              f"{row['blocked_ms']:>11.0f} {restore['replayed']:>6} {restore['snapshot_ms']:>9.0f} "
+              f"{restore['replay_ms']:>8.0f} {restore['elapsed_ms']:>16.0f} {rebuild_ms} {speedup}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de arranque con instantánea + WAL frente a reconstruir')
+    parser.add_argument('--gallery', default='1000,10000', help='Tamaños de galería')
+    parser.add_argument('--tail', type=int, default=500, help='Altas en el WAL después de cada instantánea')
+    parser.add_argument('--no-rebuild', action='store_true', help='No medir la reconstrucción solo con WAL')
+    parser.add_argument('--no-fsync', action='store_true', help='WAL sin fsync al construir la galería')
+    parser.add_argument('--directory', help='Directorio de datos (por defecto uno temporal que se borra)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+
+    work_dir = args.directory or tempfile.mkdtemp(prefix='secugen_persistence_')
+    data_dir = os.path.join(work_dir, 'datos')
+    wal_only_dir = os.path.join(work_dir, 'solo_wal')
+    shutil.rmtree(data_dir, ignore_errors=True)
+    shutil.rmtree(wal_only_dir, ignore_errors=True)
+    os.environ['SECUGEN_DATA_DIR'] = data_dir
+    os.environ['SECUGEN_WAL_FSYNC'] = '0' if args.no_fsync else '1'
+
+    print("💾 ARRANQUE CON LA GALERÍA PERSISTIDA")
+    print("=" * 50)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app  # controlador global con el directorio de datos del benchmark
+    controller = app.controller
+    # Misma historia en un WAL sin instantáneas: la referencia de reconstruir desde cero
+    wal_only = GalleryStore(wal_only_dir, fsync=False)
+    wal_only.open()
+
+    fingers = SyntheticFingers(seed=args.seed)
+    sample = [fingers.encode(fingers.finger()) for _ in range(200)]
+    results = {
+        'tail': args.tail,
+        'fsync': not args.no_fsync,
+        'wal_us_fsync': wal_cost(os.path.join(work_dir, 'coste_fsync'), sample, True),
+        'wal_us_no_fsync': wal_cost(os.path.join(work_dir, 'coste'), sample, False),
+        'sizes': [],
+    }
+    count = 0
+
+    def enroll(total):
+        nonlocal count
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            while count < total:
+                template = bytearray(fingers.encode(fingers.impression(fingers.finger())))
+                controller.store_template(f'galeria_{count}', template, ANSI)
+                wal_only.log_put(f'galeria_{count}', template, ANSI)
+                count += 1
+
+    try:
+        for size in sorted(parse_list(args.gallery)):
+            start = time.perf_counter()
+            enroll(size)
+            print(f"Galería de {size} templates ({time.perf_counter() - start:.0f} s)")
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                snapshot = controller.save_snapshot()
+            enroll(size + args.tail)
+            row = {
+                'gallery': size,
+                'snapshot_ms': snapshot['elapsed_ms'],
+                'snapshot_bytes': snapshot['bytes'],
+                'blocked_ms': snapshot['blocked_ms'],
+                'restore': restart(data_dir),
+            }
+            if not args.no_rebuild:
+                row['rebuild'] = restart(wal_only_dir)
+            print(f"  recuperación {row['restore']['elapsed_ms']:.0f} ms"
+                  + (f", solo WAL {row['rebuild']['elapsed_ms']:.0f} ms" if 'rebuild' in row else ''))
+            results['sizes'].append(row)
+    finally:
+        controller.store.close()
+        wal_only.close()
+        if not args.directory:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"persistence_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({'meta': {'timestamp': datetime.now().isoformat(), 'seed': args.seed}, 'results': results},
+                      f, indent=2, default=str)
+        print(f"\nResultados guardados en {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
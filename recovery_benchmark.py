@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia de recuperación (MTTR) del lector
+
+Inyecta un fallo en una llamada del SDK (sdk/faultinjection.py), fuerza el
+nivel de recuperación de SecugenController y mide el tiempo desde el primer
+fallo hasta la primera captura exitosa de /capturar-huella. Cada escenario se
+repite escalando las pausas fijas de la recuperación (time.sleep de
+_basic_recovery 2 s, _extended_recovery 5 s, _deep_recovery 8 s + 3x2 s,
+_emergency_usb_reset 2 s + 5 s) para ver qué parte de cada pausa hace falta.
+
+Por defecto usa el lector simulado. Con --backend hardware el fallo es
+sintético pero el cierre/reapertura del lector es real, que es justo lo que
+decide cuánto hay que esperar.
+
+    python3 recovery_benchmark.py                                   # todos los niveles
+    python3 recovery_benchmark.py --levels basic,deep --outages 0,3
+    python3 recovery_benchmark.py --backend hardware --calls GetImage --scales 1,0.5,0.25,0.1,0
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+
+def _backend_from_argv():
+    for i, arg in enumerate(sys.argv):
+        if arg == '--backend' and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+        if arg.startswith('--backend='):
+            return arg.split('=', 1)[1]
+    return 'simulator'
+
+
+# El backend se fija antes de importar sdk/app
+os.environ['SECUGEN_BACKEND'] = _backend_from_argv()
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+# Nivel -> (valor de recovery_attempts que fuerza ese nivel, método, pausa configurada en s)
+LEVELS = {
+    'basic': (0, '_basic_recovery', 2.0),
+    'extended': (1, '_extended_recovery', 5.0),
+    'deep': (2, '_deep_recovery', 8.0 + 3 * 2.0),
+    'emergency': (3, '_emergency_usb_reset', 2.0 + 5.0),
+}
+
+RECOVERY_FUNCTIONS = ('_basic_recovery', '_extended_recovery', '_deep_recovery',
+                      '_emergency_usb_reset', '_refresh_sdk_connection')
+
+DEFAULT_CALLS = 'GetImage,SetLedOn,OpenDevice,GetDeviceInfoParam,Init,Create'
+DEFAULT_SCALES = '1,0.5,0.25,0'
+
+
+class SleepRecorder:
+    """Sustituye time.sleep: registra y escala las pausas de la recuperación"""
+
+    def __init__(self, real_sleep):
+        self.real_sleep = real_sleep
+        self.scale = 1.0
+        self.reset()
+
+    def reset(self, scale=1.0):
+        self.scale = scale
+        self.requested = defaultdict(float)
+        self.slept = defaultdict(float)
+
+    def __call__(self, seconds):
+        caller = sys._getframe(1).f_code.co_name
+        if caller not in RECOVERY_FUNCTIONS:
+            return self.real_sleep(seconds)
+        actual = seconds * self.scale
+        self.requested[caller] += seconds
+        self.slept[caller] += actual
+        if actual > 0:
+            self.real_sleep(actual)
+
+
+class FakeUSB:
+    """Sustituye subprocess.run del reset USB: el 'echo 1' re-enumera el lector simulado"""
+
+    LSUSB = "Bus 001 Device 004: ID 1162:2200 Secugen Corp.\n"
+
+    def __init__(self, real_run, plan_ref, enum_delay):
+        self.real_run = real_run
+        self.plan_ref = plan_ref
+        self.enum_delay = enum_delay
+
+    def __call__(self, cmd, *args, **kwargs):
+        import subprocess
+        if cmd == ['lsusb']:
+            return subprocess.CompletedProcess(cmd, 0, stdout=self.LSUSB, stderr='')
+        if cmd[:1] == ['sudo']:
+            if cmd[-1].startswith('echo 1') and self.plan_ref[0] is not None:
+                self.plan_ref[0].reenumerate(self.enum_delay)
+            return subprocess.CompletedProcess(cmd, 0, stdout=b'', stderr=b'')
+        return self.real_run(cmd, *args, **kwargs)
+
+
+class RecoveryBenchmark:
+
+    def __init__(self, args):
+        import subprocess
+        import sdk
+        import app  # crea el controlador global con el backend configurado
+        from sdk.faultinjection import FaultPlan, fault_injecting_factory
+
+        self.args = args
+        self.sdk = sdk
+        self.app = app
+        self.FaultPlan = FaultPlan
+        self.fault_injecting_factory = fault_injecting_factory
+        self.backend_class = sdk.PYSGFPLib
+        self.client = app.app.test_client()
+
+        # El controlador global no debe retener el lector durante las pruebas
+        app.controller.wait_until_ready(30)
+        self._shutdown(app.controller)
+
+        self.recorder = SleepRecorder(time.sleep)
+        time.sleep = self.recorder
+        self.plan_ref = [None]
+        if not args.real_usb_reset:
+            subprocess.run = FakeUSB(subprocess.run, self.plan_ref, args.usb_enum_delay)
+
+    def _shutdown(self, controller):
+        try:
+            if controller and controller.sgfp:
+                controller.sgfp.CloseDevice()
+                controller.sgfp.Terminate()
+        except Exception:
+            pass
+
+    def _capture(self):
+        response = self.client.post('/capturar-huella', json={})
+        return response.status_code == 200
+
+    def run_scenario(self, level, call, outage, scale):
+        from sdk.faultinjection import DEVICE_IO_CALLS
+        attempts, method, configured = LEVELS[level]
+
+        plan = self.FaultPlan()
+        self.plan_ref[0] = plan
+        factory = self.fault_injecting_factory(self.backend_class, plan)
+        self.sdk.PYSGFPLib = factory
+        self.app.PYSGFPLib = factory
+
+        controller = self.app.SecugenController()
+        self.app.controller = controller
+        result = {'level': level, 'call': call, 'outage_s': outage, 'scale': scale,
+                  'configured_sleep_s': configured}
+        if not controller.initialized:
+            result.update(recovered=False, error=f"no se pudo inicializar: {controller.init_error}")
+            return result
+
+        # Registrar el resultado de cada invocación de los niveles de recuperación
+        outcomes = defaultdict(list)
+        for name in RECOVERY_FUNCTIONS:
+            original = getattr(controller, name)
+
+            def counted(*a, _name=name, _original=original, **kw):
+                ok = _original(*a, **kw)
+                outcomes[_name].append(bool(ok))
+                return ok
+            setattr(controller, name, counted)
+
+        controller.recovery_attempts = attempts
+        controller.last_error_time = None
+        self.recorder.reset(scale)
+
+        # Las llamadas de inicialización solo fallan durante la caída; el
+        # disparador es la sesión de captura rota (GetImage)
+        calls = {call} if call in DEVICE_IO_CALLS else {call, 'GetImage'}
+        plan.outage(outage, calls=calls, require_reopen=True)
+
+        requests_made = 0
+        recovered = False
+        deadline = time.monotonic() + self.args.max_wait
+        while time.monotonic() < deadline:
+            requests_made += 1
+            if self._capture():
+                recovered = True
+                break
+            self.recorder.real_sleep(self.args.retry_interval)
+        finished = time.monotonic()
+
+        first_failure = plan.first_failure_at
+        result.update(
+            recovered=recovered,
+            mttr_s=round(finished - first_failure, 3) if recovered and first_failure else None,
+            requests=requests_made,
+            invocations={name: len(results) for name, results in outcomes.items()},
+            escalated=any(name != method for name in outcomes),
+            first_level_ok=recovered and dict(outcomes) == {method: [True]},
+            requested_sleep_s=round(sum(self.recorder.requested.values()), 3),
+            slept_s=round(sum(self.recorder.slept.values()), 3),
+            injected_failures=len(plan.events),
+        )
+        self._shutdown(controller)
+        self.plan_ref[0] = None
+        return result
+
+
+def summarize(results):
+    """Por nivel y llamada: menor escala con la que el propio nivel basta"""
+    summary = []
+    groups = defaultdict(list)
+    for r in results:
+        groups[(r['level'], r['call'], r['outage_s'])].append(r)
+    for (level, call, outage), rows in groups.items():
+        configured = LEVELS[level][2]
+        ok = [r for r in rows if r.get('first_level_ok')]
+        full = next((r for r in rows if r['scale'] == 1.0), None)
+        best = min(ok, key=lambda r: r['scale']) if ok else None
+        summary.append({
+            'level': level, 'call': call, 'outage_s': outage,
+            'configured_sleep_s': configured,
+            'needed_scale': best['scale'] if best else None,
+            'needed_sleep_s': round(configured * best['scale'], 3) if best else None,
+            'mttr_full_s': full.get('mttr_s') if full else None,
+            'mttr_needed_s': best.get('mttr_s') if best else None,
+        })
+    return summary
+
+
+def print_results(results, summary):
+    print(f"\n{'nivel':<10} {'llamada':<20} {'caída':>6} {'escala':>7} {'ok':>3} {'MTTR(s)':>8} "
+          f"{'pausa(s)':>9} {'dormido':>8} {'pet.':>5}  niveles")
+    print("-" * 104)
+    for r in results:
+        if 'error' in r:
+            print(f"{r['level']:<10} {r['call']:<20} {r['outage_s']:>6.1f} {r['scale']:>7.2f}   ❌ {r['error']}")
+            continue
+        mttr = f"{r['mttr_s']:.2f}" if r['mttr_s'] is not None else '-'
+        levels = ','.join(f"{name.strip('_').replace('_recovery', '')}x{n}"
+                          for name, n in r['invocations'].items())
+        print(f"{r['level']:<10} {r['call']:<20} {r['outage_s']:>6.1f} {r['scale']:>7.2f} "
+              f"{'✅' if r['recovered'] else '❌':>3} {mttr:>8} {r['requested_sleep_s']:>9.2f} "
+              f"{r['slept_s']:>8.2f} {r['requests']:>5}  {levels}")
+
+    print("\nPAUSA NECESARIA POR NIVEL (menor escala que recupera sin escalar de nivel)")
+    print(f"{'nivel':<10} {'llamada':<20} {'caída':>6} {'config(s)':>10} {'necesaria(s)':>13} "
+          f"{'MTTR 1.0':>9} {'MTTR mín':>9}")
+    print("-" * 84)
+    for s in summary:
+        needed = f"{s['needed_sleep_s']:.2f}" if s['needed_sleep_s'] is not None else 'n/d'
+        full = f"{s['mttr_full_s']:.2f}" if s['mttr_full_s'] is not None else '-'
+        best = f"{s['mttr_needed_s']:.2f}" if s['mttr_needed_s'] is not None else '-'
+        print(f"{s['level']:<10} {s['call']:<20} {s['outage_s']:>6.1f} {s['configured_sleep_s']:>10.1f} "
+              f"{needed:>13} {full:>9} {best:>9}")
+
+
+def parse_list(value, cast=str):
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de latencia de recuperación del lector')
+    parser.add_argument('--backend', default='simulator', choices=['simulator', 'hardware'],
+                        help='Backend del SDK (por defecto el lector simulado)')
+    parser.add_argument('--levels', default=','.join(LEVELS), help='Niveles de recuperación a medir')
+    parser.add_argument('--calls', default=DEFAULT_CALLS, help='Llamadas del SDK donde se inyecta el fallo')
+    parser.add_argument('--outages', default='0', help='Duración de la caída del lector en segundos')
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help='Factores aplicados a las pausas de recuperación')
+    parser.add_argument('--max-wait', type=float, default=60.0, help='Tiempo máximo por escenario (s)')
+    parser.add_argument('--retry-interval', type=float, default=0.2,
+                        help='Pausa del cliente entre capturas fallidas (s)')
+    parser.add_argument('--usb-enum-delay', type=float, default=1.0,
+                        help='Re-enumeración simulada tras el reset USB (s)')
+    parser.add_argument('--real-usb-reset', action='store_true',
+                        help='Ejecutar el reset USB real (lsusb/sudo) en el nivel de emergencia')
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    parser.add_argument('--verbose', action='store_true', help='Mostrar la salida del controlador')
+    args = parser.parse_args()
+
+    levels = parse_list(args.levels)
+    unknown = [level for level in levels if level not in LEVELS]
+    if unknown:
+        parser.error(f"niveles desconocidos: {', '.join(unknown)}")
+    calls = parse_list(args.calls)
+    outages = parse_list(args.outages, float)
+    scales = sorted(parse_list(args.scales, float), reverse=True)
+
+    print("🩺 BENCHMARK DE RECUPERACIÓN DEL LECTOR")
+    print("=" * 50)
+
+    real_stdout = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        bench = RecoveryBenchmark(args)
+    finally:
+        if not args.verbose:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+    print(f"Backend SDK: {args.backend} ({bench.backend_class.__name__})")
+
+    results = []
+    for level in levels:
+        for call in calls:
+            for outage in outages:
+                for scale in scales:
+                    if not args.verbose:
+                        sys.stdout = open(os.devnull, 'w')
+                    try:
+                        result = bench.run_scenario(level, call, outage, scale)
+                    finally:
+                        if not args.verbose:
+                            sys.stdout.close()
+                            sys.stdout = real_stdout
+                    results.append(result)
+                    status = '✅' if result.get('recovered') else '❌'
+                    mttr = result.get('mttr_s')
+                    print(f"  {status} {level:<10} {call:<20} caída={outage:.1f}s escala={scale:.2f} "
+                          f"MTTR={'-' if mttr is None else f'{mttr:.2f}s'}")
+
+    summary = summarize(results)
+    print_results(results, summary)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"recovery_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now().isoformat(),
+                    'backend': args.backend,
+                    'max_wait_s': args.max_wait,
+                    'usb_enum_delay_s': args.usb_enum_delay,
+                    'real_usb_reset': args.real_usb_reset,
+                },
+                'results': results,
+                'summary': summary,
+            }, f, indent=2)
+        print(f"\n📁 Resultados guardados en: {output}")
+
+
+if __name__ == "__main__":
+    main()
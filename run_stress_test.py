@@ -1,24 +1,88 @@
 #!/usr/bin/env python3
 """
-Script para ejecutar directamente una prueba de stress intensa
+Calificación de releases con el generador de carga de lazo abierto (load_test.py)
+
+Ejecuta una rampa de calentamiento y una fase a tasa constante con la mezcla de
+endpoints por defecto, guarda el resultado en JSON y lo compara con la
+referencia de la última release aprobada. Sale con código 1 si hay regresión.
+
+    python3 run_stress_test.py                       # calificar contra baselines/release.json
+    python3 run_stress_test.py --update-baseline     # aprobar este resultado como referencia
 """
 
-from simple_stress_test import SimpleStressTest
+import argparse
+import json
+import os
+import shutil
 import sys
+from datetime import datetime
+
+from load_test import DEFAULT_MIX, LoadGenerator, parse_mix, print_report, compare_results
+
+DEFAULT_BASELINE = os.path.join('baselines', 'release.json')
+
 
 def main():
-    print("🚀 EJECUTANDO PRUEBA DE STRESS INTENSA")
+    parser = argparse.ArgumentParser(description='Calificación de releases de la API de Huellas')
+    parser.add_argument('--url', default='http://localhost:5000', help='URL base de la API')
+    parser.add_argument('--rps', type=float, default=10.0, help='Tasa de la fase constante')
+    parser.add_argument('--warmup', type=float, default=30.0, help='Duración de la rampa de calentamiento (s)')
+    parser.add_argument('--duration', type=float, default=120.0, help='Duración de la fase constante (s)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Pesos por endpoint')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Resultado de referencia')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Tolerancia relativa de regresión')
+    parser.add_argument('--output', help='Archivo JSON de salida')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Guardar este resultado como nueva referencia')
+    args = parser.parse_args()
+
+    print("🚀 CALIFICACIÓN DE RELEASE")
     print("=" * 50)
-    
-    tester = SimpleStressTest()
-    
-    # Verificar que la API esté funcionando
-    if not tester.test_api_health():
-        print("❌ La API no está disponible. Verifica que esté ejecutándose.")
+
+    generator = LoadGenerator(args.url, parse_mix(args.mix))
+    try:
+        generator.prepare()
+    except Exception as e:
+        print(f"❌ La API no está disponible: {e}")
+        sys.exit(2)
+
+    if args.warmup > 0:
+        generator.run('ramp', args.rps, 1.0, args.warmup)
+        # Solo se califica la fase constante
+        generator = LoadGenerator(args.url, parse_mix(args.mix))
+        generator.prepare()
+
+    elapsed = generator.run('constant', args.rps, args.rps, args.duration)
+    run_args = argparse.Namespace(profile='constant', rps=args.rps, start_rps=args.rps,
+                                  duration=args.duration, arrivals='uniform')
+    result = generator.report(elapsed, run_args)
+    print_report(result)
+
+    output = args.output or f"release_qualification_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\n📁 Resultados guardados en: {output}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        shutil.copyfile(output, args.baseline)
+        print(f"📌 Referencia actualizada: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ No existe {args.baseline}; use --update-baseline para crear la referencia")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_results(baseline, result, args.tolerance)
+    if regressions:
+        print("\n❌ RELEASE NO CALIFICADA:")
+        for regression in regressions:
+            print(f"   {regression}")
         sys.exit(1)
-    
-    # Ejecutar prueba de 25 llamadas API
-    tester.run_api_stress_test(25)
+    print("\n✅ RELEASE CALIFICADA: sin regresiones respecto a la referencia")
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
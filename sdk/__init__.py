@@ -1,8 +1,21 @@
 # Importar todas las dependencias necesarias
+import os
 from .sgfdxerrorcode import *
 from .sgfdxdevicename import *
 from .sgfdxsecuritylevel import *
-from .pysgfplib import PYSGFPLib
+from .sgfdxstructs import *
+from .sgfdxtemplateformat import *
+
+# Backend seleccionable por configuración: 'hardware' (libpysgfplib.so, por
+# defecto) o 'simulator' (lector simulado, ver sdk/simulator.py)
+SDK_BACKEND = os.environ.get('SECUGEN_BACKEND', 'hardware').lower()
+
+if SDK_BACKEND == 'simulator':
+    from .simulator import SimulatedSGFPLib as PYSGFPLib
+    # Cada instancia simulada ya es independiente: sirve como lector del pool
+    PYSGFPMDevice = PYSGFPLib
+else:
+    from .pysgfplib import PYSGFPLib, PYSGFPMDevice
 
 # Hacer disponible PYSGFPLib en el namespace principal
-__all__ = ['PYSGFPLib'] 
\ No newline at end of file
+__all__ = ['PYSGFPLib', 'PYSGFPMDevice', 'SDK_BACKEND']
@@ -0,0 +1,232 @@
+#! /usr/bin/env python
+'''
+ * binarycodes.py
+ * Códigos binarios de longitud fija por template y búsqueda por distancia de
+ * Hamming (XOR + popcount) sobre una matriz uint64 contigua.
+ *
+ * Cada minucia describe su entorno al estilo MCC (Minutia Cylinder-Code): sus
+ * vecinas más cercanas en el sistema de referencia de la propia minucia
+ * (distancia, dirección y orientación relativa, cuantizadas). Cada par de
+ * vecinas de un mismo cilindro se resume en un hash que pone un bit del
+ * código, así que el código no depende de la rotación ni de la traslación.
+ * Dos impresiones del mismo dedo comparten muchos bits y dos dedos distintos
+ * pocos; la similitud es |A∩B| / sqrt(|A|·|B|), con
+ * |A∩B| = (|A| + |B| - hamming(A, B)) / 2.
+ *
+ *   coder = BinaryCoder()
+ *   codes = BinaryCodeGallery(coder.words)
+ *   codes.add('huella_1', coder.encode(parse_template(data)))
+ *   codes.candidates(coder.encode(parse_template(probe)), max_candidates=50)
+'''
+
+from .templateparser import parse_template
+import threading
+import numpy as np
+
+DEFAULT_BITS = 4096          # potencia de 2; 512 bytes por template
+DEFAULT_NEIGHBOURS = 5       # vecinas por cilindro
+DEFAULT_RADIUS = 100         # radio del cilindro (px)
+DEFAULT_DISTANCE_BIN = 20    # px
+DEFAULT_DIRECTION_BIN = 45   # grados
+DEFAULT_ORIENTATION_BIN = 60 # grados
+INITIAL_CAPACITY = 1024      # filas reservadas de la matriz; se duplica al llenarse
+
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # hash multiplicativo de Fibonacci
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(words):
+        """Bits a 1 de cada fila de una matriz uint64"""
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int32)
+else:
+    _M1 = np.uint64(0x5555555555555555)
+    _M2 = np.uint64(0x3333333333333333)
+    _M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+    _H01 = np.uint64(0x0101010101010101)
+
+    def popcount(words):
+        """Bits a 1 de cada fila de una matriz uint64 (SWAR, NumPy < 2.0)"""
+        x = words - ((words >> np.uint64(1)) & _M1)
+        x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+        x = (x + (x >> np.uint64(4))) & _M4
+        return ((x * _H01) >> np.uint64(56)).sum(axis=-1, dtype=np.int32)
+
+
+class BinaryCoder:
+    """Template ANSI/ISO -> código binario de bits bits"""
+
+    def __init__(self, bits=DEFAULT_BITS, neighbours=DEFAULT_NEIGHBOURS, radius=DEFAULT_RADIUS,
+                 distance_bin=DEFAULT_DISTANCE_BIN, direction_bin=DEFAULT_DIRECTION_BIN,
+                 orientation_bin=DEFAULT_ORIENTATION_BIN):
+        if bits < 64 or bits & (bits - 1):
+            raise ValueError("bits debe ser una potencia de 2 >= 64")
+        if 360 % direction_bin or 360 % orientation_bin:
+            raise ValueError("direction_bin y orientation_bin deben dividir 360")
+        self.bits = bits
+        self.words = bits // 64
+        self.neighbours = neighbours
+        self.radius = radius
+        self.distance_bin = distance_bin
+        self.direction_bin = direction_bin
+        self.orientation_bin = orientation_bin
+        self.shift = np.uint64(64 - (bits.bit_length() - 1))
+        self.cells = (-(-radius // distance_bin)) * (360 // direction_bin) * (360 // orientation_bin)
+
+    def cylinder_keys(self, record):
+        """Claves de los pares de vecinas de cada cilindro, de todas las vistas"""
+        keys = []
+        for view in record.views:
+            n = len(view)
+            k = min(self.neighbours, n - 1)
+            if k < 2:
+                continue
+            x = view.x.astype(np.float32)
+            y = -view.y.astype(np.float32)  # eje Y hacia arriba: ángulos antihorarios
+            angle = np.radians(view.angle)
+            distance = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+            np.fill_diagonal(distance, np.inf)
+            nearest = np.argsort(distance, axis=1)[:, :k]
+            distance = np.take_along_axis(distance, nearest, axis=1)
+            direction = np.degrees(np.arctan2(y[nearest] - y[:, None], x[nearest] - x[:, None])
+                                   - angle[:, None]) % 360
+            orientation = np.degrees(angle[nearest] - angle[:, None]) % 360
+            cell = ((distance // self.distance_bin).astype(np.int64) * (360 // self.direction_bin)
+                    + (direction // self.direction_bin).astype(np.int64)) * (360 // self.orientation_bin) \
+                + (orientation // self.orientation_bin).astype(np.int64)
+            cell[distance >= self.radius] = -1  # fuera del cilindro
+
+            p, q = np.triu_indices(k, 1)
+            first = np.minimum(cell[:, p], cell[:, q])
+            second = np.maximum(cell[:, p], cell[:, q])
+            inside = first >= 0
+            keys.append(first[inside] * self.cells + second[inside])
+        return np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+
+    def encode(self, record):
+        """Código de un template (bytes o TemplateRecord) como array uint64 de words palabras"""
+        if not hasattr(record, 'views'):
+            record = parse_template(record)
+        code = np.zeros(self.words, dtype=np.uint64)
+        keys = self.cylinder_keys(record)
+        if len(keys):
+            bit = (keys.astype(np.uint64) * _HASH_MULTIPLIER) >> self.shift
+            np.bitwise_or.at(code, (bit >> np.uint64(6)).astype(np.intp), np.uint64(1) << (bit & np.uint64(63)))
+        return code
+
+
+class BinaryCodeGallery:
+    """Códigos de la galería en una matriz uint64 contigua (una fila por template)
+
+    Una baja mueve la última fila al hueco, así que las filas 0..len-1 están
+    siempre ocupadas y el escaneo no salta huecos."""
+
+    def __init__(self, words, capacity=INITIAL_CAPACITY):
+        self.words = words
+        self.lock = threading.Lock()
+        self.codes = np.zeros((capacity, words), dtype=np.uint64)
+        self.counts = np.zeros(capacity, dtype=np.int32)  # popcount de cada fila
+        self.ids = []                                      # fila -> template_id
+        self.rows = {}                                     # template_id -> fila
+
+    def __getstate__(self):
+        # Copia con el lock: la instantánea se serializa mientras hay altas
+        with self.lock:
+            state = self.__dict__.copy()
+            del state['lock']
+            state.update(codes=self.codes.copy(), counts=self.counts.copy(), ids=list(self.ids), rows=dict(self.rows))
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add(self, template_id, code):
+        with self.lock:
+            row = self.rows.get(template_id)
+            if row is None:
+                row = len(self.ids)
+                if row == len(self.codes):
+                    self._grow_locked()
+                self.ids.append(template_id)
+                self.rows[template_id] = row
+            self.codes[row] = code
+            self.counts[row] = popcount(code)
+
+    def add_many(self, items):
+        """add de varios (template_id, código): la matriz crece y se cuenta una vez"""
+        with self.lock:
+            rows = []
+            for template_id, _ in items:
+                row = self.rows.get(template_id)
+                if row is None:
+                    row = len(self.ids)
+                    self.ids.append(template_id)
+                    self.rows[template_id] = row
+                rows.append(row)
+            while len(self.ids) > len(self.codes):
+                self._grow_locked()
+            if rows:
+                codes = np.array([code for _, code in items], dtype=np.uint64).reshape(len(rows), self.words)
+                self.codes[rows] = codes
+                self.counts[rows] = popcount(codes)
+
+    def _grow_locked(self):
+        capacity = len(self.codes) * 2
+        codes = np.zeros((capacity, self.words), dtype=np.uint64)
+        codes[:len(self.codes)] = self.codes
+        counts = np.zeros(capacity, dtype=np.int32)
+        counts[:len(self.counts)] = self.counts
+        self.codes = codes
+        self.counts = counts
+
+    def remove(self, template_id):
+        with self.lock:
+            row = self.rows.pop(template_id, None)
+            if row is None:
+                return False
+            last = len(self.ids) - 1
+            if row != last:
+                moved = self.ids[last]
+                self.codes[row] = self.codes[last]
+                self.counts[row] = self.counts[last]
+                self.ids[row] = moved
+                self.rows[moved] = row
+            self.ids.pop()
+            return True
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, template_id):
+        return template_id in self.rows
+
+    def similarities(self, code):
+        """(ids, similitud 0-1) de toda la galería"""
+        code = np.asarray(code, dtype=np.uint64)
+        probe_count = int(popcount(code))
+        with self.lock:
+            size = len(self.ids)
+            ids = list(self.ids)
+            hamming = popcount(self.codes[:size] ^ code)
+            counts = self.counts[:size].astype(np.float32)
+        common = (counts + probe_count - hamming) * np.float32(0.5)
+        norm = np.sqrt(counts * probe_count)
+        return ids, np.divide(common, norm, out=np.zeros(size, dtype=np.float32), where=norm > 0)
+
+    def candidates(self, code, max_candidates=50):
+        """Los max_candidates templates más parecidos: [(template_id, similitud)]"""
+        ids, scores = self.similarities(code)
+        count = min(max_candidates, len(ids))
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(ids[row], float(scores[row])) for row in top.tolist()]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'templates': len(self.ids),
+                'capacity': len(self.codes),
+                'bits': self.words * 64,
+                'bytes': int(self.codes.nbytes),
+            }
@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+'''
+ * consolidation.py
+ * Super-templates por identidad: las muestras ANSI-378 (o ISO 19794-2) de un
+ * dedo de una persona se fusionan con MergeMultipleAnsiTemplate
+ * (MergeMultipleIsoTemplate) en un único template de varias vistas.
+ *
+ * La fusión de libsgfplib conserva cada muestra como una vista (cabecera
+ * común, mismas minucias), así que comparar con la vista n del
+ * super-template (MatchAnsiTemplate con sampleNum n) da el mismo score que
+ * comparar con la muestra n. El SDK compara una vista por llamada: lo que se
+ * ahorra es el trabajo por muestra fuera del SDK (buffer, digest y caché por
+ * cada una) y un template por dedo en lugar de uno por muestra.
+ *
+ * Un hilo en segundo plano rehace los super-templates de los dedos
+ * modificados (invalidate) con su propio objeto SGFPM, porque la fusión
+ * depende de SetTemplateFormat:
+ *
+ *   consolidator = Consolidator(PYSGFPMDevice, samples_of)  # samples_of(persona, dedo)
+ *   consolidator.start()
+ *   consolidator.invalidate('persona_7', 2)
+ *   merged = consolidator.get('persona_7', 2)   # MergedTemplate o None
+ *   match_merged(sgfp, probe, ANSI, merged, security_level)
+'''
+
+from ctypes import c_char
+from .matcherpool import SG_DEV_FDU03, match_templates
+from .sgfdxerrorcode import *
+from .sgfdxtemplateformat import *
+from .templateparser import TemplateFormatError, parse_template
+import threading
+
+DEFAULT_INTERVAL = 5.0  # segundos entre pasadas del hilo
+MERGEABLE_FORMATS = (SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378, SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+
+
+class MergedTemplate:
+    """Super-template de un dedo: vista n = muestra template_ids[n]"""
+
+    __slots__ = ('template', 'template_format', 'template_ids', 'buffer')
+
+    def __init__(self, template, template_format, template_ids):
+        self.template = template
+        self.template_format = template_format
+        self.template_ids = template_ids
+        self.buffer = (c_char * len(template)).from_buffer_copy(template)  # se reutiliza en cada comparación
+
+    def __len__(self):
+        return len(self.template_ids)
+
+
+def merge_templates(sgfp, templates, template_format):
+    """(error, bytes) de fusionar varios templates ANSI o ISO en uno de varias vistas
+
+    Cambia el formato de sgfp con SetTemplateFormat; usar un objeto propio."""
+    merge = sgfp.MergeMultipleIsoTemplate if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794 \
+        else sgfp.MergeMultipleAnsiTemplate
+    err = sgfp.SetTemplateFormat(template_format)
+    if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+        return err, None
+    data = b''.join(bytes(template) for template in templates)
+    source = (c_char * len(data)).from_buffer_copy(data)
+    out = (c_char * len(data))()  # la cabecera es común: la fusión nunca ocupa más
+    err = merge(source, len(templates), out)
+    if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+        return err, None
+    try:
+        length = parse_template(out, template_format).length
+    except TemplateFormatError:
+        return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE1, None
+    return SGFDxErrorCode.SGFDX_ERROR_NONE, bytes(out[:length])
+
+
+def match_merged(sgfp, probe, probe_format, merged, security_level, early_exit=True):
+    """(error, mejor vista, coinciden, score, vistas comparadas) de una sonda contra un super-template
+
+    Con early_exit se para en la primera vista que coincide."""
+    best = None
+    compared = 0
+    for sample in range(len(merged)):
+        err, matched, score = match_templates(sgfp, probe, merged.buffer, security_level,
+                                              probe_format, merged.template_format, sample)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err, None, False, 0, compared
+        compared += 1
+        if best is None or score > best[2]:
+            best = (sample, matched, score)
+        if matched and early_exit:
+            break
+    return (SGFDxErrorCode.SGFDX_ERROR_NONE,) + best + (compared,)
+
+
+class Consolidator:
+    """Super-templates por (persona, dedo), rehechos en segundo plano
+
+    samples_of(person_id, finger) devuelve [(template_id, template, formato)]
+    con las muestras actuales del dedo. Solo se fusionan dedos con al menos
+    dos muestras del mismo formato ANSI/ISO."""
+
+    def __init__(self, sgfp_factory, samples_of, interval=DEFAULT_INTERVAL, dev_name=SG_DEV_FDU03):
+        self.sgfp_factory = sgfp_factory
+        self.samples_of = samples_of
+        self.interval = interval
+        self.dev_name = dev_name
+        self.sgfp = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.merged = {}    # (person_id, finger) -> MergedTemplate
+        self.dirty = set()  # dedos pendientes de fusionar
+        self.versions = {}  # (person_id, finger) -> versión; descarta fusiones de muestras ya cambiadas
+        self.merges = 0
+        self.errors = 0
+        self.last_error = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='consolidation', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.sgfp is not None:
+            self.sgfp.Terminate()
+            self.sgfp = None
+
+    def invalidate(self, person_id, finger):
+        """Las muestras de un dedo cambiaron: deja de usar su super-template y lo rehace"""
+        key = (person_id, finger)
+        with self.lock:
+            self.merged.pop(key, None)
+            self.versions[key] = self.versions.get(key, 0) + 1
+            self.dirty.add(key)
+        self.wakeup.set()
+
+    def get(self, person_id, finger):
+        return self.merged.get((person_id, finger))
+
+    def _run(self):
+        while not self.stopping:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            if not self.stopping:
+                self.consolidate()
+
+    def _device(self):
+        if self.sgfp is None:
+            sgfp = self.sgfp_factory()
+            err = sgfp.Create()
+            if err == SGFDxErrorCode.SGFDX_ERROR_NONE:
+                err = sgfp.Init(self.dev_name)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                raise OSError(f"No se pudo inicializar el objeto SGFPM de consolidación: {err}")
+            self.sgfp = sgfp
+        return self.sgfp
+
+    def consolidate(self):
+        """Fusiona ahora los dedos pendientes; devuelve cuántos super-templates se crearon"""
+        with self.lock:
+            pending = list(self.dirty)
+            self.dirty.clear()
+        created = 0
+        for key in pending:
+            with self.lock:
+                version = self.versions.get(key)
+            samples = self.samples_of(*key)
+            formats = {template_format for _, _, template_format in samples}
+            if len(samples) < 2 or len(formats) != 1 or not formats <= set(MERGEABLE_FORMATS):
+                continue
+            template_format = formats.pop()
+            try:
+                err, template = merge_templates(self._device(), [template for _, template, _ in samples],
+                                                template_format)
+            except OSError as e:
+                err, template = str(e), None
+            if template is None:
+                self.errors += 1
+                self.last_error = err
+                print(f"No se pudo consolidar {key[0]} (dedo {key[1]}): {err}")
+                continue
+            merged = MergedTemplate(template, template_format, [template_id for template_id, _, _ in samples])
+            with self.lock:
+                if self.versions.get(key) != version:
+                    continue  # muestras modificadas durante la fusión: ya está pendiente otra vez
+                self.merged[key] = merged
+            self.merges += 1
+            created += 1
+        return created
+
+    def stats(self):
+        with self.lock:
+            return {
+                'merged': len(self.merged),
+                'samples': sum(len(merged) for merged in self.merged.values()),
+                'bytes': sum(len(merged.template) for merged in self.merged.values()),
+                'pending': len(self.dirty),
+                'merges': self.merges,
+                'errors': self.errors,
+                'last_error': self.last_error,
+            }
@@ -0,0 +1,319 @@
+#! /usr/bin/env python
+'''
+ * crossmatch.py
+ * Cruce N×N de la galería para auditar altas duplicadas o que colisionan:
+ * triángulo superior de la matriz de scores (cada par una vez) repartido en
+ * procesos, cada uno con su objeto SGFPM y la misma comparación que
+ * compare_templates (matcherpool.match_templates).
+ *
+ * El trabajo se divide en unidades de filas: la fila i compara el template i
+ * con los j > i. Las filas se agrupan plegadas (i con N-1-i) para que las
+ * unidades tengan un número de pares parecido. Cada proceso copia los
+ * templates a buffers ctypes una sola vez y solo devuelve los pares con
+ * score >= min_score.
+ *
+ * En el directorio del trabajo:
+ *   - results.ndjson: un par por línea según terminan las unidades;
+ *   - checkpoint.json: unidades terminadas y bytes válidos de results.ndjson.
+ * Al reanudar con la misma galería se descartan las líneas posteriores al
+ * último checkpoint y solo se calculan las unidades pendientes.
+ *
+ *   job = CrossMatchJob(PYSGFPMDevice, [(template_id, template, formato)], '/tmp/cruce')
+ *   job.run()                 # o job.start() en segundo plano
+ *   job.status()              # progreso, pares/s, ETA
+ *   for hit in job.results(): ...
+'''
+
+from .matcherpool import SG_DEV_FDU03, SG400_TEMPLATE_SIZE, match_templates, template_buffer
+from .minutiaematcher import threshold
+from .sgfdxerrorcode import *
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+DEFAULT_UNIT_PAIRS = 20000        # pares por unidad de trabajo
+DEFAULT_CHECKPOINT_INTERVAL = 5.0  # segundos entre checkpoints
+CHECKPOINT_FILE = 'checkpoint.json'
+RESULTS_FILE = 'results.ndjson'
+
+
+def triangle_units(count, unit_pairs=DEFAULT_UNIT_PAIRS):
+    """Filas del triángulo superior agrupadas en unidades de ~unit_pairs pares
+
+    La fila i tiene count-1-i pares; se toman alternando por delante y por
+    detrás (0, N-1, 1, N-2, ...) para mezclar filas largas y cortas."""
+    order = []
+    low, high = 0, count - 1
+    while low <= high:
+        order.append(low)
+        if low != high:
+            order.append(high)
+        low += 1
+        high -= 1
+    units = []
+    rows = []
+    pairs = 0
+    for row in order:
+        row_pairs = count - 1 - row
+        if row_pairs == 0:
+            continue
+        rows.append(row)
+        pairs += row_pairs
+        if pairs >= unit_pairs:
+            units.append(rows)
+            rows = []
+            pairs = 0
+    if rows:
+        units.append(rows)
+    return units
+
+
+def gallery_fingerprint(templates):
+    """Huella de la galería (IDs, formatos y contenido) para reanudar solo sobre la misma"""
+    digest = hashlib.sha1()
+    for template_id, template, template_format in templates:
+        digest.update(f'{template_id}\0{template_format}\0'.encode())
+        digest.update(hashlib.sha1(bytes(template)).digest())
+    return digest.hexdigest()
+
+
+# Estado de cada proceso de trabajo (initializer del pool)
+_worker = {}
+
+
+def _init_worker(sgfp_factory, dev_name, templates, security_level, min_score):
+    sgfp = sgfp_factory()
+    err = sgfp.Create()
+    if err == SGFDxErrorCode.SGFDX_ERROR_NONE:
+        err = sgfp.Init(dev_name)
+    if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+        raise OSError(f"No se pudo inicializar el objeto SGFPM del cruce: {err}")
+    sg400_size = getattr(sgfp, 'constant_sg400_template_size', SG400_TEMPLATE_SIZE)
+    _worker.update({
+        'sgfp': sgfp,
+        'buffers': [template_buffer(template, template_format, sg400_size) for _, template, template_format in templates],
+        'formats': [template_format for _, _, template_format in templates],
+        'security_level': security_level,
+        'min_score': min_score,
+    })
+
+
+def _init_pool_worker(*args):
+    # Ctrl+C lo atiende el proceso principal: cancela y guarda el checkpoint
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_worker(*args)
+
+
+def _run_unit(unit):
+    """(número de unidad, [(i, j, score, coinciden)], pares, errores) de una unidad de filas"""
+    number, rows = unit
+    sgfp = _worker['sgfp']
+    buffers = _worker['buffers']
+    formats = _worker['formats']
+    security_level = _worker['security_level']
+    min_score = _worker['min_score']
+    count = len(buffers)
+    hits = []
+    pairs = errors = 0
+    for i in rows:
+        for j in range(i + 1, count):
+            err, matched, score = match_templates(sgfp, buffers[i], buffers[j], security_level, formats[i], formats[j])
+            pairs += 1
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                errors += 1
+            elif score >= min_score:
+                hits.append((i, j, score, matched))
+    return number, hits, pairs, errors
+
+
+class CrossMatchJob:
+    """Cruce N×N de templates [(template_id, template, formato)] con checkpoints en directory"""
+
+    def __init__(self, sgfp_factory, templates, directory, security_level=5, min_score=None, processes=None,
+                 unit_pairs=DEFAULT_UNIT_PAIRS, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+                 dev_name=SG_DEV_FDU03):
+        self.sgfp_factory = sgfp_factory
+        # Orden estable para reanudar; str porque una galería antigua puede mezclar IDs de texto y enteros
+        self.templates = sorted(((template_id, bytes(template), template_format)
+                                 for template_id, template, template_format in templates), key=lambda t: str(t[0]))
+        self.directory = directory
+        self.security_level = security_level
+        self.min_score = threshold(security_level) if min_score is None else min_score
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.unit_pairs = unit_pairs
+        self.checkpoint_interval = checkpoint_interval
+        self.dev_name = dev_name
+        self.units = triangle_units(len(self.templates), unit_pairs)
+        self.fingerprint = gallery_fingerprint(self.templates)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.cancelled = False
+        self.state = 'pending'
+        self.error = None
+        self.done = set()
+        self.resumed_units = 0
+        self.pairs_total = len(self.templates) * (len(self.templates) - 1) // 2
+        self.pairs_done = 0
+        self.pairs_run = 0           # pares de esta ejecución (para pares/s)
+        self.hits = 0
+        self.errors = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.directory, CHECKPOINT_FILE)
+
+    @property
+    def results_path(self):
+        return os.path.join(self.directory, RESULTS_FILE)
+
+    def start(self, resume=True):
+        """Ejecuta run() en un hilo en segundo plano"""
+        self.thread = threading.Thread(target=self.run, args=(resume,), name='crossmatch', daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        """Para tras la unidad en curso; el checkpoint permite reanudar"""
+        self.cancelled = True
+
+    def run(self, resume=True):
+        """Cruza las unidades pendientes; devuelve status()"""
+        os.makedirs(self.directory, exist_ok=True)
+        offset = self._load_checkpoint() if resume else 0
+        with self.lock:
+            self.state = 'running'
+            self.started = time.time()
+        pending = [(number, rows) for number, rows in enumerate(self.units) if number not in self.done]
+        pool = None
+        try:
+            with open(self.results_path, 'ab') as results:
+                results.truncate(offset)  # líneas escritas después del último checkpoint
+                if self.processes > 1 and len(pending) > 1:
+                    # Sin fork: el servidor tiene otros hilos y el hijo heredaría sus locks
+                    # tomados. forkserver/spawn vuelven a importar el script principal como
+                    # __mp_main__ (app.py no crea el controlador en ese caso)
+                    context = multiprocessing.get_context(
+                        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+                    pool = context.Pool(self.processes, _init_pool_worker, self._worker_args())
+                    outcomes = pool.imap_unordered(_run_unit, pending)
+                else:
+                    _init_worker(*self._worker_args())
+                    outcomes = map(_run_unit, pending)
+                last_checkpoint = time.time()
+                for number, hits, pairs, errors in outcomes:
+                    for i, j, score, matched in hits:
+                        results.write(json.dumps({'template_id1': self.templates[i][0],
+                                                  'template_id2': self.templates[j][0],
+                                                  'score': score, 'matched': matched}).encode() + b'\n')
+                    with self.lock:
+                        self.done.add(number)
+                        self.pairs_done += pairs
+                        self.pairs_run += pairs
+                        self.hits += len(hits)
+                        self.errors += errors
+                    if time.time() - last_checkpoint >= self.checkpoint_interval:
+                        self._save_checkpoint(results)
+                        last_checkpoint = time.time()
+                    if self.cancelled:
+                        break
+                self._save_checkpoint(results)
+            with self.lock:
+                self.state = 'cancelled' if self.cancelled and len(self.done) < len(self.units) else 'done'
+        except Exception as e:
+            with self.lock:
+                self.state = 'error'
+                self.error = str(e)
+            print(f"Error en el cruce de la galería: {e}")
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            _worker.clear()
+            self.finished = time.time()
+        return self.status()
+
+    def _worker_args(self):
+        return (self.sgfp_factory, self.dev_name, self.templates, self.security_level, self.min_score)
+
+    def _load_checkpoint(self):
+        """Recupera las unidades terminadas; devuelve los bytes válidos de results.ndjson"""
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if (checkpoint.get('fingerprint') != self.fingerprint or checkpoint.get('unit_pairs') != self.unit_pairs
+                or checkpoint.get('min_score') != self.min_score
+                or checkpoint.get('security_level') != self.security_level):
+            print("Checkpoint de otra galería o configuración: el cruce empieza de cero")
+            return 0
+        self.done = set(checkpoint['done'])
+        self.resumed_units = len(self.done)
+        self.pairs_done = checkpoint['pairs_done']
+        self.hits = checkpoint['hits']
+        self.errors = checkpoint['errors']
+        return checkpoint['results_bytes']
+
+    def _save_checkpoint(self, results):
+        """Escribe checkpoint.json (renombrado atómico) tras volcar results.ndjson"""
+        results.flush()
+        os.fsync(results.fileno())
+        with self.lock:
+            checkpoint = {
+                'fingerprint': self.fingerprint,
+                'templates': len(self.templates),
+                'unit_pairs': self.unit_pairs,
+                'security_level': self.security_level,
+                'min_score': self.min_score,
+                'done': sorted(self.done),
+                'pairs_done': self.pairs_done,
+                'hits': self.hits,
+                'errors': self.errors,
+                'results_bytes': results.tell(),
+            }
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temporary, self.checkpoint_path)
+
+    def results(self):
+        """Pares con score >= min_score escritos hasta ahora (dicts de results.ndjson)"""
+        try:
+            with open(self.results_path, 'rb') as f:
+                for line in f:
+                    if line.endswith(b'\n'):  # una línea a medio escribir se lee en la próxima consulta
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def status(self):
+        with self.lock:
+            now = self.finished or time.time()
+            elapsed = now - self.started if self.started else 0.0
+            rate = self.pairs_run / elapsed if elapsed > 0 else 0.0
+            remaining = self.pairs_total - self.pairs_done
+            return {
+                'state': self.state,
+                'error': self.error,
+                'templates': len(self.templates),
+                'security_level': self.security_level,
+                'min_score': self.min_score,
+                'processes': self.processes,
+                'units': len(self.units),
+                'units_done': len(self.done),
+                'resumed_units': self.resumed_units,
+                'pairs_total': self.pairs_total,
+                'pairs_done': self.pairs_done,
+                'progress': self.pairs_done / self.pairs_total if self.pairs_total else 1.0,
+                'hits': self.hits,
+                'errors': self.errors,
+                'elapsed_s': elapsed,
+                'pairs_per_second': rate,
+                'eta_s': remaining / rate if rate > 0 and self.state == 'running' else None,
+                'directory': self.directory,
+            }
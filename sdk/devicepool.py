@@ -0,0 +1,321 @@
+#! /usr/bin/env python
+'''
+ * devicepool.py
+ * Pool de lectores: abre todos los lectores conectados y asigna a cada uno un
+ * hilo de trabajo propio con su objeto SGFPM (ver multidev/main.cpp).
+ *
+ * Las capturas se envían a un lector concreto por número de serie o al menos
+ * ocupado. Las llamadas a la librería nativa liberan el GIL, así que la
+ * capacidad de captura crece con el número de lectores.
+ *
+ *   pool = DevicePool(PYSGFPMDevice)
+ *   pool.start()
+ *   result = pool.capture(serial=None, create_template=True)
+'''
+
+from ctypes import POINTER, c_char, c_ulong
+from concurrent.futures import Future
+from .sgfdxerrorcode import *
+from .sgfdxstructs import *
+from .sgfdxtemplateformat import *
+import queue
+import threading
+import time
+
+SG_DEV_AUTO = 0xFF        # Init() para enumerar, como multidev/main.cpp
+MAX_IMAGE_SIZE = 1000000  # Máximo 1MB de buffer, igual que /capturar-huella
+
+
+class ReaderWorker:
+    """Un lector abierto con su propio hilo de trabajo y cola de peticiones"""
+
+    def __init__(self, device_id, serial, sgfp_factory, dev_name):
+        self.device_id = device_id
+        self.serial = serial
+        self.sgfp_factory = sgfp_factory
+        self.dev_name = dev_name
+        self.sgfp = None
+        self.opened = False
+        self.info = None
+        self.width = 0
+        self.height = 0
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.captures = 0
+        self.errors = 0
+        self.last_error = None
+        self.thread = None
+
+    # Hilo de trabajo -----------------------------------------------------
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=f'lector-{self.serial}', daemon=True)
+        self.thread.start()
+        return self.submit(self._open)
+
+    def stop(self, timeout=5):
+        self.jobs.put(None)
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def submit(self, job):
+        """Encola job() para el hilo del lector y devuelve un Future con su resultado"""
+        future = Future()
+        with self.lock:
+            self.pending += 1
+        self.jobs.put((job, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                break
+            job, future = item
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(job())
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                    self.last_error = str(e)
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.pending -= 1
+        self._close()
+
+    # Operaciones (solo desde el hilo del lector) ---------------------------
+
+    def _open(self):
+        if self.sgfp is None:
+            self.sgfp = self.sgfp_factory()
+            err = self.sgfp.Create()
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                self.sgfp = None
+                raise Exception(f"Error al crear la instancia del lector {self.serial}: {err}")
+            err = self.sgfp.Init(self.dev_name)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                self.sgfp = None
+                raise Exception(f"Error al inicializar el lector {self.serial}: {err}")
+
+        err = self.sgfp.OpenDevice(self.device_id)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            self.opened = False
+            raise Exception(f"No se pudo abrir el lector {self.serial} (ID {self.device_id}): {err}")
+
+        # Geometría, DPI y firmware: una consulta por apertura, luego en caché
+        info = SGDeviceInfoParam()
+        err = self.sgfp.GetDeviceInfoParam(info)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            raise Exception(f"Error al obtener información del lector {self.serial}: {err}")
+        if info.ImageWidth <= 0 or info.ImageHeight <= 0 or info.ImageWidth * info.ImageHeight > MAX_IMAGE_SIZE:
+            raise Exception(f"Dimensiones del sensor inválidas: {info.ImageWidth}x{info.ImageHeight}")
+        self.info = info.as_dict()
+        self.width = info.ImageWidth
+        self.height = info.ImageHeight
+        self.opened = True
+        return True
+
+    def _reopen(self):
+        try:
+            self.sgfp.CloseDevice()
+        except Exception:
+            pass
+        self.opened = False
+        return self._open()
+
+    def _close(self):
+        if self.sgfp is None:
+            return
+        try:
+            self.sgfp.SetLedOn(False)
+            self.sgfp.CloseDevice()
+            self.sgfp.Terminate()
+        except Exception:
+            pass
+        self.opened = False
+        self.sgfp = None
+
+    def _capture(self, create_template=False, template_format=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400):
+        if not self.opened:
+            self._reopen()
+
+        image = bytearray(self.width * self.height)
+        self.sgfp.SetLedOn(True)
+        try:
+            err = self.sgfp.GetImage(image)
+            if err == SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED:
+                # Error de acceso: reabrir el lector una vez y reintentar
+                self._reopen()
+                self.sgfp.SetLedOn(True)
+                err = self.sgfp.GetImage(image)
+        finally:
+            try:
+                self.sgfp.SetLedOn(False)
+            except Exception:
+                pass
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            raise Exception(f"Error al capturar en el lector {self.serial}: {err}")
+
+        template = None
+        if create_template:
+            template = self._extract(image, template_format)
+
+        with self.lock:
+            self.captures += 1
+        return {
+            'image': image,
+            'template': template,
+            'width': self.width,
+            'height': self.height,
+            'device_serial': self.serial,
+            'device_id': self.device_id,
+        }
+
+    def _extract(self, image, template_format):
+        """Template del tamaño real; el objeto SGFPM del lector vuelve a SG400"""
+        image_data = (c_char * len(image)).from_buffer(image)
+        if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+            buffer = (c_char * self.sgfp.constant_sg400_template_size)()
+            err = self.sgfp.CreateSG400Template(image_data, buffer)
+            return bytearray(buffer) if err == SGFDxErrorCode.SGFDX_ERROR_NONE else None
+
+        err = self.sgfp.SetTemplateFormat(template_format)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return None
+        try:
+            max_size = c_ulong(0)
+            self.sgfp.GetMaxTemplateSize(max_size)
+            buffer = (c_char * max_size.value)()
+            err = self.sgfp.CreateTemplate(None, image_data, buffer)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                return None
+            size = c_ulong(0)
+            err = self.sgfp.GetTemplateSize(buffer, size)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                return None
+            return bytearray(buffer[:size.value])
+        finally:
+            self.sgfp.SetTemplateFormat(SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400)
+
+    def _led(self, state):
+        if not self.opened:
+            self._reopen()
+        err = self.sgfp.SetLedOn(state)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            raise Exception(f"Error al controlar el LED del lector {self.serial}: {err}")
+        return True
+
+    def status(self):
+        with self.lock:
+            return {
+                'device_serial': self.serial,
+                'device_id': self.device_id,
+                'opened': self.opened,
+                'width': self.width,
+                'height': self.height,
+                'dpi': self.info['dpi'] if self.info else None,
+                'firmware': self.info['firmware'] if self.info else None,
+                'pending': self.pending,
+                'captures': self.captures,
+                'errors': self.errors,
+                'last_error': self.last_error,
+            }
+
+
+class DevicePool:
+    """Todos los lectores conectados, cada uno con su ReaderWorker"""
+
+    def __init__(self, sgfp_factory, open_timeout=15):
+        self.sgfp_factory = sgfp_factory
+        self.open_timeout = open_timeout
+        self.readers = {}  # número de serie -> ReaderWorker
+        self.lock = threading.Lock()
+        self.started_at = None
+
+    def enumerate(self):
+        """Lista (device_id, número de serie, tipo SG_DEV_*) de los lectores conectados"""
+        sgfp = self.sgfp_factory()
+        try:
+            err = sgfp.Create()
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                raise Exception(f"Error al crear la instancia: {err}")
+            err = sgfp.Init(SG_DEV_AUTO)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                raise Exception(f"Error al inicializar: {err}")
+            ndevs = c_ulong(0)
+            dev_list = POINTER(SGDeviceList)()
+            err = sgfp.EnumerateDevice(ndevs, dev_list)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                raise Exception(f"Error en EnumerateDevice: {err}")
+            devices = []
+            for i in range(ndevs.value):
+                entry = dev_list[i]
+                devices.append((int(entry.DevID), entry.serial or f'ID{entry.DevID}', int(entry.DevName)))
+            return devices
+        finally:
+            try:
+                sgfp.Terminate()
+            except Exception:
+                pass
+
+    def start(self):
+        """Abre todos los lectores; devuelve cuántos quedaron abiertos"""
+        self.stop()
+        workers = [ReaderWorker(device_id, serial, self.sgfp_factory, dev_name)
+                   for device_id, serial, dev_name in self.enumerate()]
+        opening = [(worker, worker.start()) for worker in workers]
+        for worker, future in opening:
+            try:
+                future.result(self.open_timeout)
+                print(f"Lector {worker.serial} (ID {worker.device_id}) abierto: {worker.width}x{worker.height}")
+            except Exception as e:
+                print(f"Advertencia: {e}")
+        with self.lock:
+            self.readers = {worker.serial: worker for worker in workers}
+            self.started_at = time.time()
+        return self.open_count()
+
+    def stop(self):
+        with self.lock:
+            workers = list(self.readers.values())
+            self.readers = {}
+        for worker in workers:
+            worker.stop()
+
+    def open_count(self):
+        with self.lock:
+            return sum(1 for worker in self.readers.values() if worker.opened)
+
+    @property
+    def ready(self):
+        return self.open_count() > 0
+
+    def select(self, serial=None):
+        """Lector pedido por número de serie, o el abierto con menos trabajo pendiente"""
+        with self.lock:
+            if serial:
+                worker = self.readers.get(serial)
+                if worker is None:
+                    raise KeyError(serial)
+                return worker
+            candidates = [worker for worker in self.readers.values() if worker.opened]
+            if not candidates:
+                raise Exception("Ningún lector disponible en el pool")
+            return min(candidates, key=lambda w: (w.pending, w.captures))
+
+    def capture(self, serial=None, create_template=False, timeout=30,
+                template_format=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400):
+        worker = self.select(serial)
+        return worker.submit(lambda: worker._capture(create_template, template_format)).result(timeout)
+
+    def led(self, state, serial=None, timeout=10):
+        worker = self.select(serial)
+        return worker.submit(lambda: worker._led(state)).result(timeout)
+
+    def status(self):
+        with self.lock:
+            workers = list(self.readers.values())
+        return [worker.status() for worker in workers]
@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+'''
+ * duplicates.py
+ * Detección de altas duplicadas: antes de almacenar un template nuevo se
+ * busca el mismo dedo en la galería con una identificación 1:N acotada.
+ *
+ * La búsqueda usa la preselección de la identificación (índice de minucias
+ * y códigos binarios, después el matcher NumPy) y solo compara con el SDK
+ * unos pocos candidatos, de mejor a peor, hasta la primera coincidencia o
+ * hasta agotar el presupuesto de tiempo. Con el presupuesto agotado el alta
+ * continúa y la comprobación queda marcada como incompleta.
+ *
+ * Políticas:
+ *   - 'reject': no se almacena el template duplicado;
+ *   - 'link': se almacena como otra muestra de la persona (y dedo) del
+ *     template existente.
+ *
+ *   stats = DuplicateStats()
+ *   stats.record(elapsed_ms=12.5, compared=3, duplicate=True, complete=True, action='reject')
+'''
+
+from collections import deque
+import threading
+
+DUPLICATE_POLICIES = ('reject', 'link')
+DEFAULT_BUDGET_MS = 200     # presupuesto de la comprobación por alta
+DEFAULT_CANDIDATES = 10     # candidatos que se comparan con el SDK
+LATENCY_WINDOW = 1000       # comprobaciones recientes para el percentil 95
+
+
+class DuplicateStats:
+    """Métricas de las comprobaciones de duplicados"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checks = 0
+        self.duplicates = 0
+        self.incomplete = 0         # presupuesto agotado antes de terminar
+        self.compared = 0
+        self.actions = {policy: 0 for policy in DUPLICATE_POLICIES}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, elapsed_ms, compared, duplicate, complete, action=None):
+        with self.lock:
+            self.checks += 1
+            self.duplicates += bool(duplicate)
+            self.incomplete += not complete
+            self.compared += compared
+            if action in self.actions:
+                self.actions[action] += 1
+            self.latencies.append(elapsed_ms)
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                'checks': self.checks,
+                'duplicates': self.duplicates,
+                'rejected': self.actions['reject'],
+                'linked': self.actions['link'],
+                'incomplete': self.incomplete,
+                'avg_compared': self.compared / self.checks if self.checks else 0.0,
+                'avg_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+                'p95_ms': latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+                'max_ms': latencies[-1] if latencies else 0.0,
+            }
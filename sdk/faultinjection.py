@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+'''
+ * faultinjection.py
+ * Envoltorio de inyección de fallos para PYSGFPLib (o el lector simulado).
+ *
+ * FaultPlan representa el estado del lector físico y es compartido por todas
+ * las instancias envueltas, igual que el dispositivo USB es compartido por las
+ * instancias que la recuperación automática crea con PYSGFPLib().
+ *
+ *   plan = FaultPlan()
+ *   factory = fault_injecting_factory(PYSGFPLib, plan)
+ *   sgfp = factory()
+ *   plan.outage(5.0, calls={'GetImage', 'OpenDevice'})  # lector caído 5 s
+'''
+
+from .sgfdxerrorcode import *
+import threading
+import time
+
+# Llamadas del SDK que el envoltorio intercepta
+SDK_CALLS = (
+    'Create', 'Terminate', 'Init', 'OpenDevice', 'CloseDevice', 'GetDeviceInfo', 'GetDeviceInfoParam',
+    'SetLedOn', 'GetImage', 'GetImageQuality', 'CreateSG400Template', 'CreateTemplate',
+    'MatchTemplate', 'GetMatchingScore', 'MatchTemplateEx', 'GetMatchingScoreEx',
+    'MatchAnsiTemplate', 'GetAnsiMatchingScore', 'MatchIsoTemplate', 'GetIsoMatchingScore',
+)
+
+# Llamadas que usan la sesión abierta con el lector (fallan tras una caída
+# hasta que se vuelve a abrir el dispositivo)
+DEVICE_IO_CALLS = ('GetDeviceInfo', 'GetDeviceInfoParam', 'SetLedOn', 'GetImage')
+
+
+class FaultPlan:
+    """Calendario de fallos del lector, compartido entre instancias"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.pending = {}          # llamada -> [códigos de un solo uso]
+        self.outage_until = None
+        self.outage_code = SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        self.outage_calls = set()
+        self.needs_reopen = False
+        self.first_failure_at = None
+        self.events = []           # (instante, llamada, código)
+
+    def fail(self, call, code=SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED, times=1):
+        """Las próximas `times` llamadas a `call` devuelven `code`"""
+        with self.lock:
+            self.pending.setdefault(call, []).extend([code] * times)
+
+    def outage(self, duration, code=SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED,
+               calls=DEVICE_IO_CALLS, require_reopen=True):
+        """Simula una caída del lector durante `duration` segundos.
+
+        Mientras dura, las llamadas de `calls` devuelven `code`. Con
+        require_reopen la sesión abierta queda inválida: las llamadas de E/S
+        de `calls` siguen fallando hasta que OpenDevice tenga éxito después
+        de la caída.
+        """
+        with self.lock:
+            self.outage_until = self.clock() + duration
+            self.outage_code = code
+            self.outage_calls = set(calls)
+            self.needs_reopen = require_reopen
+
+    def reenumerate(self, delay=0.0):
+        """Reset USB: la caída termina y el lector reaparece tras `delay` segundos"""
+        with self.lock:
+            self.outage_until = self.clock() + delay
+            self.outage_calls = set(DEVICE_IO_CALLS) | {'OpenDevice'}
+            self.needs_reopen = True
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.outage_until = None
+            self.outage_calls = set()
+            self.needs_reopen = False
+            self.first_failure_at = None
+            self.events = []
+
+    def check(self, call):
+        """Código a devolver para `call` en este instante (0 = sin fallo)"""
+        with self.lock:
+            now = self.clock()
+            code = SGFDxErrorCode.SGFDX_ERROR_NONE
+            pending = self.pending.get(call)
+            if pending:
+                code = pending.pop(0)
+            elif self.outage_until is not None and now < self.outage_until and call in self.outage_calls:
+                code = self.outage_code
+            elif self.needs_reopen and call in self.outage_calls and call in DEVICE_IO_CALLS:
+                code = self.outage_code
+            if code != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                if self.first_failure_at is None:
+                    self.first_failure_at = now
+                self.events.append((now, call, code))
+            return code
+
+    def device_opened(self):
+        with self.lock:
+            if self.outage_until is None or self.clock() >= self.outage_until:
+                self.needs_reopen = False
+
+
+class FaultInjectingSGFPLib:
+    """Envuelve una instancia tipo PYSGFPLib y aplica el FaultPlan a cada llamada"""
+
+    def __init__(self, inner, plan):
+        self.inner = inner
+        self.plan = plan
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if name not in SDK_CALLS:
+            return attr
+
+        def call(*args, **kwargs):
+            err = self.plan.check(name)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                return err
+            result = attr(*args, **kwargs)
+            if name == 'OpenDevice' and result == SGFDxErrorCode.SGFDX_ERROR_NONE:
+                self.plan.device_opened()
+            return result
+        return call
+
+
+def fault_injecting_factory(backend_class, plan):
+    """Callable sin argumentos que sustituye a PYSGFPLib() con fallos inyectados"""
+    def factory():
+        return FaultInjectingSGFPLib(backend_class(), plan)
+    factory.plan = plan
+    factory.backend_class = backend_class
+    return factory
@@ -0,0 +1,497 @@
+#! /usr/bin/env python
+'''
+ * gallery.py
+ * Galería de templates con instantáneas inmutables (copy-on-write).
+ *
+ * Los lectores (identificación, listado, comparación por ID) toman la
+ * versión publicada con snapshot(), sin lock, y la recorren entera aunque
+ * mientras tanto se den de alta o de baja templates. Los escritores se
+ * serializan entre sí y construyen la versión siguiente copiando solo lo que
+ * cambia:
+ *   - los templates están en trozos (chunks) de hasta chunk_size entradas en
+ *     orden de alta; un alta copia el último trozo y una baja o un reemplazo
+ *     el trozo del template (el reemplazo conserva su posición, como un dict);
+ *   - template_id -> trozo está repartido en shards por hash del ID; cada
+ *     escritura copia un shard.
+ * El coste de una escritura es O(chunk_size + N/shards + N/chunk_size) en
+ * lugar de O(N), y una lectura por ID son dos búsquedas en diccionarios.
+ *
+ * Con una TemplateArena (sdk/templatearena.py) los trozos son ArenaChunk
+ * con los handles de los huecos de la arena en lugar de GalleryEntry, y
+ * entry() da una ArenaEntry leída del hueco. Un hueco dado de baja o
+ * reemplazado no se reutiliza hasta que no queda viva ninguna instantánea
+ * que lo pueda leer.
+ *
+ *   gallery = Gallery()
+ *   gallery.put('huella_1', template, SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378, digest)
+ *   snapshot = gallery.snapshot()       # no cambia aunque haya altas o bajas
+ *   for template_id, entry in snapshot.entries(): ...
+ *   for template_id, entry in snapshot.entries(after=cursor): ...   # página siguiente
+'''
+
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from .matcherpool import SG400_TEMPLATE_SIZE
+from .sgfdxtemplateformat import *
+import threading
+import time
+import weakref
+
+DEFAULT_SHARDS = 64
+DEFAULT_CHUNK_SIZE = 1024
+ARENA_CHUNK_SIZE = 256  # posiciones de un ArenaChunk: enteros pequeños que Python no duplica
+
+
+class GalleryEntry:
+    """Template almacenado con su formato, digest y metadatos del listado (no se modifica una vez publicado)
+
+    seq es el orden de alta (un reemplazo conserva el del template al que
+    sustituye) y sirve de cursor para recorrer la galería por páginas. Con
+    un TemplateTier (sdk/templatetier.py) el template puede no estar en
+    memoria: template lo lee del disco y lo deja residente, read() lo lee
+    sin desplazar a los residentes."""
+
+    __slots__ = ('_template', 'template_format', 'digest', 'seq', 'enrolled', 'finger', 'quality',
+                 '_length', '_tier', '_offset')
+
+    def __init__(self, template, template_format, digest, seq=0, enrolled=None, finger=0, quality=None):
+        self._template = template
+        self.template_format = template_format
+        self.digest = digest
+        self.seq = seq
+        self.enrolled = enrolled    # time.time() del alta
+        self.finger = finger        # posición de dedo del template o la indicada en el alta
+        self.quality = quality      # calidad 0-100 de un template ANSI/ISO, None si no se conoce
+        self._length = len(template)
+        self._tier = None           # TemplateTier que lo guarda en disco (admit_many)
+        self._offset = None
+
+    @property
+    def template(self):
+        template = self._template
+        if self._tier is None:
+            return template
+        if template is None:
+            return self._tier.load(self)
+        self._tier.touch(self)
+        return template
+
+    def read(self):
+        """Template sin contarlo como uso (exportación, cruce N×N, instantáneas)"""
+        template = self._template
+        return self._tier.read(self) if template is None else template
+
+    def buffer(self):
+        """Template para pasarlo al SDK (match_templates); en una ArenaEntry, sin copiarlo"""
+        return self.template
+
+    def __getstate__(self):
+        # En las instantáneas siempre con el template y sin el tier (archivo de este proceso)
+        state = {name: getattr(self, name) for name in self.__slots__ if name not in ('_tier', '_offset')}
+        state['_template'] = self.read()
+        return state
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+
+
+class ArenaEntry(GalleryEntry):
+    """GalleryEntry de una galería con TemplateArena: metadatos leídos del hueco, template copiado al pedirlo
+
+    Tiene la instantánea de la que sale: mientras exista la entrada su
+    hueco no se reutiliza."""
+
+    __slots__ = ('_snapshot', '_handle')
+
+    def __init__(self, snapshot, handle):
+        self._snapshot = snapshot
+        self._handle = handle
+        (self._length, self.template_format, self.finger, self.quality, self.seq, self.enrolled,
+         self.digest) = snapshot._arena.record(handle)
+        self._template = self._tier = self._offset = None
+
+    @property
+    def template(self):
+        return self._snapshot._arena.read(self._handle, self._length)
+
+    def read(self):
+        return self._snapshot._arena.read(self._handle, self._length)
+
+    def buffer(self):
+        # Un SG400 más corto de 400 bytes se rellena con ceros en una copia (template_buffer)
+        if self.template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400 and self._length < SG400_TEMPLATE_SIZE:
+            return self.read()
+        view = self._snapshot._arena.view(self._handle)
+        view.snapshot = self._snapshot  # el hueco no se reutiliza mientras se use la vista
+        return view
+
+    def __reduce__(self):
+        return GalleryEntry, (self.read(), self.template_format, self.digest, self.seq, self.enrolled, self.finger,
+                              self.quality)
+
+
+class ArenaChunk:
+    """Trozo de una galería con arena: template_id -> posición y los handles en un array
+
+    Las posiciones no pasan de ARENA_CHUNK_SIZE, así que el diccionario
+    apunta a enteros compartidos y cada handle ocupa 8 bytes en el array en
+    lugar de un objeto int. Se usa como el dict de un trozo (get, items,
+    asignación, pop); copy() lo copia sin los huecos de las bajas."""
+
+    __slots__ = ('positions', 'handles')
+
+    def __init__(self, positions=None, handles=None):
+        self.positions = {} if positions is None else positions
+        self.handles = array('q') if handles is None else handles
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def get(self, template_id, default=None):
+        position = self.positions.get(template_id)
+        return default if position is None else self.handles[position]
+
+    def __getitem__(self, template_id):
+        return self.handles[self.positions[template_id]]
+
+    def __setitem__(self, template_id, handle):
+        position = self.positions.get(template_id)
+        if position is None:
+            self.positions[template_id] = len(self.handles)
+            self.handles.append(handle)
+        else:
+            self.handles[position] = handle
+
+    def pop(self, template_id):
+        return self.handles[self.positions.pop(template_id)]
+
+    def items(self):
+        handles = self.handles
+        return ((template_id, handles[position]) for template_id, position in self.positions.items())
+
+    def last(self):
+        return self.handles[next(reversed(self.positions.values()))]
+
+    def copy(self):
+        if len(self.handles) == len(self.positions):
+            return ArenaChunk(dict(self.positions), array('q', self.handles))
+        return ArenaChunk({template_id: position for position, template_id in enumerate(self.positions)},
+                          array('q', (self.handles[position] for position in self.positions.values())))
+
+
+class GallerySnapshot(Mapping):
+    """Versión inmutable de la galería: template_id -> template, en orden de alta"""
+
+    __slots__ = ('version', '_index', '_chunks', '_count', '_arena', '__weakref__')
+
+    def __init__(self, version, index, chunks, count, arena=None):
+        self.version = version
+        self._index = index     # tupla de shards {template_id: clave de trozo}
+        self._chunks = chunks   # {clave de trozo: {template_id: GalleryEntry} o ArenaChunk}, claves crecientes
+        self._count = count
+        self._arena = arena     # TemplateArena de los handles, o None si los trozos tienen GalleryEntry
+
+    def _entry(self, value):
+        return value if self._arena is None else ArenaEntry(self, value)
+
+    def _seq(self, value):
+        return value.seq if self._arena is None else self._arena.seq(value)
+
+    def _last_seq(self, chunk):
+        return next(reversed(chunk.values())).seq if self._arena is None else self._arena.seq(chunk.last())
+
+    def entry(self, template_id):
+        """GalleryEntry del template, o None si no está en esta versión"""
+        key = self._index[hash(template_id) % len(self._index)].get(template_id)
+        return None if key is None else self._entry(self._chunks[key][template_id])
+
+    def __getitem__(self, template_id):
+        entry = self.entry(template_id)
+        if entry is None:
+            raise KeyError(template_id)
+        return entry.template
+
+    def __contains__(self, template_id):
+        return template_id in self._index[hash(template_id) % len(self._index)]
+
+    def __iter__(self):
+        for chunk in self._chunks.values():
+            yield from chunk
+
+    def __len__(self):
+        return self._count
+
+    def entries(self, after=0):
+        """(template_id, GalleryEntry) en orden de alta, los de seq > after
+
+        Los seq crecen de un trozo al siguiente y dentro de cada trozo: los
+        trozos ya recorridos se saltan mirando solo su última entrada."""
+        for chunk in self._chunks.values():
+            if after and self._last_seq(chunk) <= after:
+                continue
+            for template_id, value in chunk.items():
+                entry = self._entry(value)
+                if entry.seq > after:
+                    yield template_id, entry
+
+    def template_format(self, template_id, default=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400):
+        entry = self.entry(template_id)
+        return default if entry is None else entry.template_format
+
+    def digest(self, template_id):
+        entry = self.entry(template_id)
+        return None if entry is None else entry.digest
+
+
+class Gallery:
+    """Galería copy-on-write: escrituras serializadas, lecturas sin lock sobre snapshot()"""
+
+    def __init__(self, shards=DEFAULT_SHARDS, chunk_size=DEFAULT_CHUNK_SIZE, tier=None, arena=None):
+        if tier is not None and arena is not None:
+            raise ValueError("Una galería con TemplateArena no usa TemplateTier")
+        self.chunk_size = chunk_size if arena is None else min(chunk_size, ARENA_CHUNK_SIZE)
+        self.tier = tier    # TemplateTier: tope de memoria de los templates, el resto en disco
+        self.arena = arena  # TemplateArena: templates en huecos de tamaño fijo en lugar de GalleryEntry
+        self.lock = threading.Lock()
+        self.next_chunk = 0
+        self.next_seq = 1
+        self.copied = 0     # entradas copiadas por las escrituras (coste del copy-on-write)
+        self.writes = 0
+        self._pending = deque()  # (versión, [handles]) liberados que una instantánea anterior aún puede leer
+        self._readers = weakref.WeakValueDictionary()  # versión -> instantánea publicada aún viva (con arena)
+        self._snapshot = self._new_snapshot(0, tuple({} for _ in range(shards)), {}, 0)
+
+    def __getstate__(self):
+        # Instantáneas de sdk/persistence.py: sin el lock
+        state = self.__dict__.copy()
+        del state['lock']
+        del state['_readers']
+        state['tier'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.tier = None  # set_tier() con el del proceso que la carga
+        self._readers = weakref.WeakValueDictionary()
+        # En el proceso que carga la instantánea nadie lee los huecos pendientes
+        for _, handles in self.__dict__.pop('_pending', ()):
+            self.arena.free(handles)
+        self._pending = deque()
+        # hash() de un str cambia de un proceso a otro: se rehacen los shards
+        snapshot = self._snapshot
+        index = tuple({} for _ in snapshot._index)
+        for key, chunk in snapshot._chunks.items():
+            for template_id in chunk:
+                index[hash(template_id) % len(index)][template_id] = key
+        self._snapshot = self._new_snapshot(snapshot.version, index, snapshot._chunks, snapshot._count)
+
+    def _new_chunk(self):
+        return {} if self.arena is None else ArenaChunk()
+
+    def _new_snapshot(self, version, index, chunks, count):
+        snapshot = GallerySnapshot(version, index, chunks, count, self.arena)
+        if self.arena is not None:
+            self._readers[version] = snapshot
+        return snapshot
+
+    def set_tier(self, tier):
+        """Pasa los templates de la galería (p. ej. recién cargada de una instantánea) a tier"""
+        if self.arena is not None:
+            raise ValueError("Una galería con TemplateArena no usa TemplateTier")
+        with self.lock:
+            self.tier = tier
+            entries = [entry for _, entry in self._snapshot.entries()]
+            for start in range(0, len(entries), self.chunk_size):
+                tier.admit_many(entries[start:start + self.chunk_size])
+
+    def relayout(self, arena=None):
+        """Galería nueva con las mismas entradas (orden, seq y metadatos) en GalleryEntry o en arena
+
+        Para adoptar una instantánea guardada con la otra representación."""
+        with self.lock:
+            return self._rebuild(self._snapshot, self.next_seq, arena)
+
+    def frozen(self, snapshot, next_seq):
+        """Galería de GalleryEntry con el contenido de snapshot, para una instantánea de sdk/persistence.py
+
+        snapshot y next_seq se toman con las escrituras paradas; esto se hace
+        después sin bloquearlas. Los trozos de GalleryEntry publicados no
+        cambian y se comparten; los de una arena se copian a GalleryEntry (y
+        quien carga la instantánea vuelve a la arena con relayout)."""
+        if snapshot._arena is not None:
+            return self._rebuild(snapshot, next_seq, None)
+        gallery = Gallery(len(snapshot._index), self.chunk_size)
+        gallery.next_chunk = next(reversed(snapshot._chunks), -1) + 1
+        gallery.next_seq = next_seq
+        gallery._snapshot = gallery._new_snapshot(snapshot.version, snapshot._index, snapshot._chunks, len(snapshot))
+        return gallery
+
+    @staticmethod
+    def _rebuild(snapshot, next_seq, arena):
+        gallery = Gallery(len(snapshot._index), arena=arena)
+        index = tuple({} for _ in snapshot._index)
+        chunks = {}
+        chunk = None
+        for template_id, entry in snapshot.entries():
+            values = (entry.read(), entry.template_format, entry.digest, entry.seq, entry.enrolled, entry.finger,
+                      entry.quality)
+            if chunk is None or len(chunk) >= gallery.chunk_size:
+                chunk = chunks[gallery.next_chunk] = gallery._new_chunk()
+                gallery.next_chunk += 1
+            chunk[template_id] = arena.store(*values) if arena is not None else GalleryEntry(*values)
+            index[hash(template_id) % len(index)][template_id] = gallery.next_chunk - 1
+        gallery.next_seq = next_seq
+        gallery._snapshot = gallery._new_snapshot(snapshot.version, index, chunks, len(snapshot))
+        return gallery
+
+    def snapshot(self):
+        """Versión publicada; una referencia, sin lock ni copia"""
+        return self._snapshot
+
+    def put(self, template_id, template, template_format, digest, finger=0, quality=None, enrolled=None):
+        """Alta o reemplazo; devuelve la GalleryEntry anterior o None"""
+        return self.put_many([(template_id, template, template_format, digest, finger, quality)], enrolled)[0]
+
+    def put_many(self, items, enrolled=None):
+        """Altas o reemplazos [(template_id, template, formato, digest, dedo, calidad)] publicados en una sola versión
+
+        Cada trozo y cada shard afectados se copian una vez por lote, no una
+        vez por template. enrolled es la hora de alta de todo el lote (por
+        defecto ahora). Devuelve la GalleryEntry anterior de cada uno."""
+        enrolled = time.time() if enrolled is None else enrolled
+        arena = self.arena
+        if arena is None:
+            entries = [(template_id, GalleryEntry(bytes(template), template_format, digest, 0, enrolled, finger,
+                                                  quality))
+                       for template_id, template, template_format, digest, finger, quality in items]
+            if self.tier is not None:
+                self.tier.admit_many([entry for _, entry in entries])
+        with self.lock:
+            if arena is not None:
+                # Los huecos se ocupan con el lock: la arena no admite escrituras concurrentes
+                self._reclaim_locked()
+                entries = []
+                try:
+                    for template_id, template, template_format, digest, finger, quality in items:
+                        entries.append((template_id, arena.store(template, template_format, digest, 0, enrolled,
+                                                                 finger, quality)))
+                except ValueError:
+                    arena.free([handle for _, handle in entries])
+                    raise
+            current = self._snapshot
+            index = list(current._index)
+            chunks = dict(current._chunks)
+            copied_shards = set()
+            copied_chunks = set()
+            count = current._count
+            previous = []
+            for template_id, entry in entries:
+                shard_number = hash(template_id) % len(index)
+                if shard_number not in copied_shards:
+                    index[shard_number] = dict(index[shard_number])
+                    copied_shards.add(shard_number)
+                shard = index[shard_number]
+                key = shard.get(template_id)
+                if key is None:
+                    key = next(reversed(chunks), None)
+                    if key is None or len(chunks[key]) >= self.chunk_size:
+                        key = self.next_chunk
+                        self.next_chunk += 1
+                        chunks[key] = self._new_chunk()
+                        copied_chunks.add(key)
+                    shard[template_id] = key
+                    count += 1
+                if key not in copied_chunks:
+                    chunks[key] = chunks[key].copy()  # reemplazo: conserva su posición
+                    copied_chunks.add(key)
+                replaced = chunks[key].get(template_id)
+                if replaced is None:
+                    seq = self.next_seq
+                    self.next_seq += 1
+                else:
+                    seq = current._seq(replaced)
+                if arena is None:
+                    entry.seq = seq
+                else:
+                    arena.set_seq(entry, seq)
+                previous.append(replaced)
+                chunks[key][template_id] = entry
+            copied = sum(len(chunks[key]) for key in copied_chunks) + \
+                sum(len(index[shard_number]) for shard_number in copied_shards) + len(chunks)
+            self._publish(current, tuple(index), chunks, count, copied,
+                          [handle for handle in previous if handle is not None])
+        if self.tier is not None:
+            self.tier.discard(previous)
+        if arena is not None:
+            # Con la versión anterior, que aún tiene sus huecos
+            previous = [None if handle is None else ArenaEntry(current, handle) for handle in previous]
+        return previous
+
+    def remove(self, template_id):
+        """Baja; devuelve la GalleryEntry eliminada o None si no existía"""
+        with self.lock:
+            current = self._snapshot
+            shard_number = hash(template_id) % len(current._index)
+            key = current._index[shard_number].get(template_id)
+            if key is None:
+                return None
+            chunks = dict(current._chunks)
+            chunk = chunks[key].copy()
+            previous = chunk.pop(template_id)
+            if chunk:
+                chunks[key] = chunk
+            else:
+                del chunks[key]
+            index = self._without(current._index, shard_number, template_id)
+            self._publish(current, index, chunks, current._count - 1,
+                          len(chunk) + len(index[shard_number]) + len(chunks), [previous])
+        if self.tier is not None:
+            self.tier.discard([previous])
+        return current._entry(previous)
+
+    @staticmethod
+    def _without(index, shard_number, template_id):
+        shard = dict(index[shard_number])
+        del shard[template_id]
+        return index[:shard_number] + (shard,) + index[shard_number + 1:]
+
+    def _publish(self, current, index, chunks, count, copied, released=()):
+        self.copied += copied
+        self.writes += 1
+        # Una asignación de atributo: los lectores ven la versión anterior o la nueva entera
+        self._snapshot = self._new_snapshot(current.version + 1, index, chunks, count)
+        if self.arena is not None and released:
+            self._pending.append((current.version + 1, released))
+
+    def _reclaim_locked(self):
+        """Libera en la arena los huecos que ya no puede leer ninguna instantánea viva"""
+        if not self._pending:
+            return
+        oldest = min(self._readers.keys())
+        while self._pending and self._pending[0][0] <= oldest:
+            self.arena.free(self._pending.popleft()[1])
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version,
+            'templates': len(snapshot),
+            'shards': len(snapshot._index),
+            'chunks': len(snapshot._chunks),
+            'chunk_size': self.chunk_size,
+            'writes': self.writes,
+            'avg_copied_per_write': self.copied / self.writes if self.writes else 0.0,
+            'layout': 'compact' if self.arena is not None else 'objects',
+            'tier': self.tier.stats() if self.tier is not None else None,
+            'arena': dict(self.arena.stats(), pending_slots=sum(len(handles) for _, handles in self._pending))
+            if self.arena is not None else None,
+        }
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+'''
+ * identities.py
+ * Modelo de identidades: una persona tiene varios dedos y cada dedo varias
+ * muestras (templates).
+ *
+ * El template sigue siendo la unidad de almacenamiento e indexado
+ * (stored_templates, índice de minucias, códigos binarios, caché de
+ * resultados); el registro solo agrupa template_ids por persona y dedo para
+ * que la identificación trabaje por persona:
+ *   - las muestras de un dedo se comparan en orden de candidato y se deja
+ *     de comparar en cuanto una supera el umbral (salida temprana);
+ *   - con sondas de varios dedos el score de la persona es la fusión de los
+ *     mejores scores de cada dedo (fuse_scores).
+ *
+ *   registry = IdentityRegistry()
+ *   registry.add('huella_1', 'persona_7', finger=2)
+ *   registry.group(['huella_9', 'huella_1'])   # {persona: [template_id]}
+'''
+
+import threading
+
+FINGER_UNKNOWN = 0     # posición de dedo ANSI/ISO: 1-10 (pulgar derecho ... meñique izquierdo)
+FUSION_METHODS = ('max', 'mean')
+
+
+def fuse_scores(scores, method='max'):
+    """Score de una persona a partir del mejor score de cada dedo sondeado
+
+    'max': el mejor dedo decide (basta con que coincida uno).
+    'mean': media de los dedos; un dedo que no coincide penaliza al resto."""
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Fusión no soportada: {method} (use {', '.join(FUSION_METHODS)})")
+    if not scores:
+        return 0
+    if method == 'max':
+        return max(scores)
+    return round(sum(scores) / len(scores))
+
+
+class IdentityRegistry:
+    """person_id -> dedo -> [template_id] y template_id -> (person_id, dedo)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.persons = {}  # person_id -> {dedo: [template_id]} (muestras en orden de alta)
+        self.owners = {}   # template_id -> (person_id, dedo)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def owners_copy(self):
+        """Copia de template_id -> (person_id, dedo): lo que guarda una instantánea (from_owners)"""
+        with self.lock:
+            return dict(self.owners)
+
+    @classmethod
+    def from_owners(cls, owners):
+        """Registro rehecho a partir de owners_copy()
+
+        owners está en orden de asignación, así que las muestras de cada dedo
+        quedan en el mismo orden que en el registro original."""
+        registry = cls()
+        for template_id, (person_id, finger) in owners.items():
+            registry.persons.setdefault(person_id, {}).setdefault(finger, []).append(template_id)
+        registry.owners = owners
+        return registry
+
+    def add(self, template_id, person_id, finger=FINGER_UNKNOWN):
+        """Asigna un template a una persona y dedo (lo reasigna si ya tenía dueño)"""
+        with self.lock:
+            self._remove_locked(template_id)
+            self.persons.setdefault(person_id, {}).setdefault(finger, []).append(template_id)
+            self.owners[template_id] = (person_id, finger)
+
+    def _remove_locked(self, template_id):
+        owner = self.owners.pop(template_id, None)
+        if owner is None:
+            return False
+        person_id, finger = owner
+        fingers = self.persons[person_id]
+        fingers[finger].remove(template_id)
+        if not fingers[finger]:
+            del fingers[finger]
+        if not fingers:
+            del self.persons[person_id]
+        return True
+
+    def remove(self, template_id):
+        with self.lock:
+            return self._remove_locked(template_id)
+
+    def remove_person(self, person_id):
+        """Quita una persona del registro; devuelve sus template_ids"""
+        with self.lock:
+            fingers = self.persons.pop(person_id, {})
+            template_ids = [template_id for samples in fingers.values() for template_id in samples]
+            for template_id in template_ids:
+                del self.owners[template_id]
+            return template_ids
+
+    def owner(self, template_id):
+        """(person_id, dedo) del template, o None si no tiene persona"""
+        return self.owners.get(template_id)
+
+    def fingers(self, person_id):
+        """{dedo: [template_id]} de una persona, o None si no existe"""
+        with self.lock:
+            fingers = self.persons.get(person_id)
+            return {finger: list(samples) for finger, samples in fingers.items()} if fingers is not None else None
+
+    def person_ids(self):
+        with self.lock:
+            return list(self.persons)
+
+    def __len__(self):
+        return len(self.persons)
+
+    def __contains__(self, person_id):
+        return person_id in self.persons
+
+    def group(self, template_ids, finger=None):
+        """Agrupa template_ids por persona respetando su orden: {persona: [template_id]}
+
+        Las personas salen en el orden de su primer template en template_ids,
+        así que un orden por candidato se conserva. Con finger, solo se
+        conservan las muestras de ese dedo o de dedo desconocido. Los
+        templates sin persona se omiten."""
+        groups = {}
+        for template_id in template_ids:
+            owner = self.owners.get(template_id)
+            if owner is None:
+                continue
+            person_id, sample_finger = owner
+            if finger not in (None, FINGER_UNKNOWN) and sample_finger not in (finger, FINGER_UNKNOWN):
+                continue
+            groups.setdefault(person_id, []).append(template_id)
+        return groups
+
+    def stats(self):
+        with self.lock:
+            return {
+                'persons': len(self.persons),
+                'templates': len(self.owners),
+                'fingers': sum(len(fingers) for fingers in self.persons.values()),
+            }
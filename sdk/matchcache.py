@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+'''
+ * matchcache.py
+ * Caché LRU acotada de resultados de comparación 1:1.
+ *
+ * La clave es el digest del contenido de ambos templates, sus formatos y el
+ * nivel de seguridad, así que un mismo par enviado por id o en base64 acierta
+ * igual. Al reemplazar o eliminar un template almacenado se invalidan todas
+ * las entradas en las que participa su digest.
+ *
+ *   cache = MatchCache(capacity=4096)
+ *   key = cache.key(digest(t1), fmt1, digest(t2), fmt2, security_level)
+ *   result = cache.get(key)
+ *   if result is None:
+ *       result = comparar(...)
+ *       cache.put(key, result)
+ *   cache.invalidate(digest(t1))
+'''
+
+from collections import OrderedDict
+from hashlib import blake2b
+import threading
+
+DEFAULT_CAPACITY = 4096
+
+
+def digest(data):
+    """Digest de 16 bytes del contenido de un template"""
+    return blake2b(bytes(data), digest_size=16).digest()
+
+
+class MatchCache:
+    """LRU de resultados de comparación con métricas de aciertos"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # clave -> resultado, de menos a más reciente
+        self.by_digest = {}           # digest -> claves en las que participa
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(digest1, format1, digest2, format2, security_level):
+        return (digest1, format1, digest2, format2, int(security_level))
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.entries[key] = result
+                return
+            self.entries[key] = result
+            for template_digest in (key[0], key[2]):
+                self.by_digest.setdefault(template_digest, set()).add(key)
+            while len(self.entries) > self.capacity:
+                old_key, _ = self.entries.popitem(last=False)
+                self._unlink_locked(old_key)
+                self.evictions += 1
+
+    def _unlink_locked(self, key):
+        for template_digest in (key[0], key[2]):
+            keys = self.by_digest.get(template_digest)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_digest[template_digest]
+
+    def invalidate(self, template_digest):
+        """Elimina las entradas de un template; devuelve cuántas"""
+        with self.lock:
+            keys = self.by_digest.pop(template_digest, ())
+            for key in list(keys):
+                if self.entries.pop(key, None) is not None:
+                    self._unlink_locked(key)
+                    self.invalidations += 1
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_digest.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'capacity': self.capacity,
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,118 @@
+#! /usr/bin/env python
+'''
+ * matcherpool.py
+ * Pool de objetos SGFPM solo para matching, para comparar muchos pares en
+ * paralelo (p.ej. POST /comparar-huellas/lote).
+ *
+ * El matching no necesita lector: cada objeto se crea con Create() + Init()
+ * del tipo de dispositivo y se usa desde un único hilo a la vez. Las
+ * llamadas a libsgfplib liberan el GIL, así que con N objetos y N hilos el
+ * coste por par se acerca al del matcher nativo dividido entre los núcleos.
+ *
+ *   pool = MatcherPool(PYSGFPMDevice, size=4)
+ *   pool.start()
+ *   futures = [pool.submit(compare, t1, t2) for t1, t2 in pairs]   # compare(sgfp, ...)
+ *   pool.close()
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import Array, byref, c_bool, c_char, c_int
+from .sgfdxerrorcode import *
+from .sgfdxtemplateformat import *
+import os
+import queue
+import threading
+
+SG_DEV_FDU03 = 0x04        # Init() sin lector: solo carga el algoritmo
+SG400_TEMPLATE_SIZE = 400
+
+
+def template_buffer(template, template_format, sg400_size=SG400_TEMPLATE_SIZE):
+    """Copia un template a un buffer ctypes (SG400 rellenado a sg400_size bytes)"""
+    data = bytes(template)
+    if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+        data = data[:sg400_size].ljust(sg400_size, b'\0')
+    return (c_char * len(data)).from_buffer_copy(data)
+
+
+def match_templates(sgfp, template1, template2, security_level,
+                    format1=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400,
+                    format2=SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400, sample2=0):
+    """(error, coinciden, score) con un objeto SGFPM
+
+    Usa las funciones de formato explícito: MatchTemplate depende de
+    SetTemplateFormat, que la extracción de templates cambia temporalmente.
+    sample2: vista de template2 a comparar si tiene varias (super-templates).
+    template1/template2 pueden ser ya buffers ctypes, que se usan sin copiar."""
+    sg400_size = getattr(sgfp, 'constant_sg400_template_size', SG400_TEMPLATE_SIZE)
+    buffer1 = template1 if isinstance(template1, Array) else template_buffer(template1, format1, sg400_size)
+    buffer2 = template2 if isinstance(template2, Array) else template_buffer(template2, format2, sg400_size)
+    matched = c_bool(False)
+    score = c_int(0)
+    if format1 == format2 == SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378:
+        result = sgfp.MatchAnsiTemplate(buffer1, 0, buffer2, sample2, security_level, byref(matched))
+        score_result = sgfp.GetAnsiMatchingScore(buffer1, 0, buffer2, sample2, byref(score))
+    elif format1 == format2 == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794:
+        result = sgfp.MatchIsoTemplate(buffer1, 0, buffer2, sample2, security_level, byref(matched))
+        score_result = sgfp.GetIsoMatchingScore(buffer1, 0, buffer2, sample2, byref(score))
+    else:
+        result = sgfp.MatchTemplateEx(buffer1, format1, 0, buffer2, format2, sample2, security_level, byref(matched))
+        score_result = sgfp.GetMatchingScoreEx(buffer1, format1, 0, buffer2, format2, sample2, byref(score))
+    return result, bool(matched.value), score.value if score_result == SGFDxErrorCode.SGFDX_ERROR_NONE else 0
+
+
+class MatcherPool:
+    """size objetos SGFPM de matching y un hilo de trabajo por objeto"""
+
+    def __init__(self, sgfp_factory, size=None, dev_name=SG_DEV_FDU03):
+        self.sgfp_factory = sgfp_factory
+        self.size = size or os.cpu_count() or 1
+        self.dev_name = dev_name
+        self.idle = queue.Queue()
+        self.executor = None
+        self.lock = threading.Lock()
+        self.handles = []
+        self.jobs = 0
+
+    def start(self):
+        """Crea los objetos SGFPM; error del SDK si alguno no se inicializa"""
+        for _ in range(self.size):
+            sgfp = self.sgfp_factory()
+            err = sgfp.Create()
+            if err == SGFDxErrorCode.SGFDX_ERROR_NONE:
+                err = sgfp.Init(self.dev_name)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                self.close()
+                return err
+            self.handles.append(sgfp)
+            self.idle.put(sgfp)
+        self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='matcher')
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def _run(self, func, args):
+        sgfp = self.idle.get()
+        try:
+            return func(sgfp, *args)
+        finally:
+            self.idle.put(sgfp)
+
+    def submit(self, func, *args):
+        """Ejecuta func(sgfp, *args) con un objeto libre; devuelve un Future"""
+        with self.lock:
+            self.jobs += 1
+        return self.executor.submit(self._run, func, args)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        for sgfp in self.handles:
+            try:
+                sgfp.Terminate()
+            except Exception:
+                pass
+        self.handles = []
+        self.idle = queue.Queue()
+
+    def status(self):
+        return {'size': len(self.handles), 'jobs': self.jobs, 'idle': self.idle.qsize()}
@@ -0,0 +1,311 @@
+#! /usr/bin/env python
+'''
+ * minutiaeindex.py
+ * Índice invertido de geometría de minucias para reducir los candidatos de
+ * una identificación 1:N antes de llamar al matcher del SDK.
+ *
+ * Cada minucia forma triángulos con sus vecinas más cercanas. Un triángulo
+ * da una clave invariante a rotación y traslación: longitud cuantizada de
+ * los tres lados, ángulo de cada minucia respecto a su lado y orientación.
+ * Los pares sueltos no bastan: con pocas celdas posibles cada template
+ * contiene una fracción grande de todas las claves y los votos no separan
+ * dedos. El índice guarda, por clave, los slots de los templates que la
+ * contienen; una sonda vota por los que comparten sus claves y solo los
+ * mejor votados pasan al SDK.
+ *
+ *   index = MinutiaeIndex()
+ *   index.add('huella_1', parse_template(data))
+ *   index.candidates(parse_template(probe), max_candidates=50)
+ *   index.remove('huella_1')
+ *
+ * Solo indexa templates ANSI-378/ISO 19794-2 (el formato SG400 es opaco).
+'''
+
+from array import array
+from .templateparser import parse_template
+import threading
+import numpy as np
+
+DEFAULT_NEIGHBOURS = 5      # vecinos por minucia para formar triángulos
+DEFAULT_DISTANCE_BIN = 8    # píxeles (~0.4 mm a 500 dpi)
+DEFAULT_ANGLE_BIN = 45      # grados; debe dividir 360
+DISTANCE_BINS = 64          # lados más largos caen en la última celda
+COMPACT_RATIO = 0.25        # compactar cuando un 25% de los slots están eliminados
+
+
+class MinutiaeIndex:
+    """Índice invertido clave de triángulo de minucias -> slots de template"""
+
+    def __init__(self, neighbours=DEFAULT_NEIGHBOURS, distance_bin=DEFAULT_DISTANCE_BIN,
+                 angle_bin=DEFAULT_ANGLE_BIN, probe_spread=True):
+        if 360 % angle_bin:
+            raise ValueError("angle_bin debe dividir 360")
+        self.neighbours = neighbours
+        self.distance_bin = distance_bin
+        self.angle_bin = angle_bin
+        self.angle_bins = 360 // angle_bin
+        # La sonda vota también en la celda de distancia vecina más cercana
+        # de cada lado, para tolerar el ruido de cuantización
+        self.probe_spread = probe_spread
+        self.lock = threading.Lock()
+        self.postings = {}            # clave -> array('I') de slots
+        self.slots = {}               # template_id -> slot
+        self.ids = []                 # slot -> template_id (None si eliminado)
+        self.key_counts = array('I')  # claves distintas por slot
+        self.removed = 0
+
+    def __getstate__(self):
+        # Las listas de slots van en un solo buffer: cientos de miles de
+        # array('I') sueltos son lo más lento de serializar en la instantánea.
+        # Se copia con el lock: la instantánea se serializa mientras hay altas
+        with self.lock:
+            state = self.__dict__.copy()
+            del state['lock']
+            postings = state.pop('postings')
+            state['slots'] = dict(self.slots)
+            state['ids'] = list(self.ids)
+            state['key_counts'] = array('I', self.key_counts)
+            state['posting_keys'] = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            state['posting_lengths'] = np.fromiter(map(len, postings.values()), dtype=np.int64, count=len(postings))
+            state['posting_slots'] = b''.join(slots.tobytes() for slots in postings.values())
+        return state
+
+    def __setstate__(self, state):
+        keys = state.pop('posting_keys').tolist()
+        ends = (np.cumsum(state.pop('posting_lengths')) * array('I').itemsize).tolist()
+        slots = state.pop('posting_slots')
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.postings = {key: array('I', slots[start:end]) for key, start, end in zip(keys, [0] + ends[:-1], ends)}
+
+    # Claves ----------------------------------------------------------------
+
+    def _triangles(self, x, y):
+        """Triángulos de cada minucia con sus vecinas en vistas de n minucias
+
+        x, y: (vistas, n). Devuelve índices (T, 3) en x.ravel(), sin repetir
+        dentro de cada vista y ordenados por vista."""
+        views, n = x.shape
+        k = min(self.neighbours, n - 1)
+        if k < 2:
+            return np.empty((0, 3), dtype=np.int64)
+        distance = np.hypot(x[:, :, None] - x[:, None, :], y[:, :, None] - y[:, None, :])
+        distance[:, np.arange(n), np.arange(n)] = np.inf
+        nearest = np.argpartition(distance, k - 1, axis=2)[:, :, :k]
+        p, q = np.triu_indices(k, 1)
+        triangles = np.stack([
+            np.broadcast_to(np.repeat(np.arange(n), len(p)), (views, n * len(p))),
+            nearest[:, :, p].reshape(views, -1),
+            nearest[:, :, q].reshape(views, -1),
+        ], axis=2)
+        triangles.sort(axis=2)
+        # Un entero por triángulo ((vista * n + a) * n + b) * n + c: unique 1-D
+        # en lugar de unique por filas, mucho más lento
+        codes = np.unique(((np.arange(views)[:, None] * n + triangles[..., 0]) * n + triangles[..., 1]) * n
+                          + triangles[..., 2])
+        first = codes // (n * n)
+        base = first - first % n
+        return np.stack([first, base + codes // n % n, base + codes % n], axis=1)
+
+    def _features(self, record):
+        """Lados (T, 3) en celdas (float), ángulos (T, 3) en celdas y orientación (T,)"""
+        sides, angles, hands, _ = self._features_many([record])
+        return sides, angles, hands
+
+    def _features_many(self, records):
+        """_features de varios templates y el número de template de cada triángulo
+
+        Las vistas con el mismo número de minucias se procesan juntas: una
+        llamada a NumPy por paso para todo el grupo en lugar de una por vista."""
+        groups = {}
+        for number, record in enumerate(records):
+            for view in record.views:
+                groups.setdefault(len(view), []).append((number, view))
+        sides, angles, hands, owners = [], [], [], []
+        for n, group in groups.items():
+            x = np.stack([view.x for _, view in group]).astype(np.float32)
+            y = np.stack([view.y for _, view in group]).astype(np.float32)
+            triangles = self._triangles(x, y)
+            if not len(triangles):
+                continue
+            x = x.ravel()
+            y = y.ravel()
+            angle = np.concatenate([view.angle for _, view in group])
+            # Vértices ordenados por el lado opuesto, de mayor a menor: el
+            # orden no depende de la rotación ni de la traslación
+            a, b, c = triangles.T
+            opposite = np.stack([np.hypot(x[b] - x[c], y[b] - y[c]),
+                                 np.hypot(x[a] - x[c], y[a] - y[c]),
+                                 np.hypot(x[a] - x[b], y[a] - y[b])], axis=1)
+            order = np.argsort(-opposite, axis=1)
+            vertices = np.take_along_axis(triangles, order, axis=1)
+            opposite = np.take_along_axis(opposite, order, axis=1)
+            v0, v1, v2 = vertices.T
+            # Con el eje Y de la imagen hacia abajo, antihorario es -dy
+            dx1, dy1 = x[v1] - x[v0], y[v0] - y[v1]
+            dx2, dy2 = x[v2] - x[v0], y[v0] - y[v2]
+            hands.append((dx1 * dy2 - dy1 * dx2 > 0).astype(np.int64))
+            # Ángulo de cada minucia respecto al lado que sale de ella
+            relative = []
+            for start, end in ((v0, v1), (v1, v2), (v2, v0)):
+                line = np.degrees(np.arctan2(y[start] - y[end], x[end] - x[start]))
+                relative.append((angle[start] - line) % 360)
+            sides.append(opposite / self.distance_bin)
+            angles.append(np.stack(relative, axis=1) / self.angle_bin)
+            owners.append(np.array([number for number, _ in group])[triangles[:, 0] // n])
+        if not sides:
+            empty = np.empty((0, 3), dtype=np.float32)
+            return empty, empty, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(sides), np.concatenate(angles), np.concatenate(hands), np.concatenate(owners)
+
+    def _keys(self, sides, angles, hands):
+        key = hands
+        for column in range(3):
+            key = key * DISTANCE_BINS + np.clip(sides[:, column], 0, DISTANCE_BINS - 1)
+        for column in range(3):
+            key = key * self.angle_bins + angles[:, column] % self.angle_bins
+        return key
+
+    def template_keys(self, record):
+        """Claves distintas de un template de la galería"""
+        return self.template_keys_many([record])[0]
+
+    def template_keys_many(self, records):
+        """template_keys de varios templates calculadas a la vez"""
+        sides, angles, hands, owners = self._features_many(records)
+        keys = self._keys(np.floor(sides).astype(np.int64), np.floor(angles).astype(np.int64), hands)
+        order = np.argsort(owners, kind='stable')
+        bounds = np.cumsum(np.bincount(owners, minlength=len(records)))[:-1]
+        return [np.unique(part) for part in np.split(keys[order], bounds)]
+
+    def probe_keys(self, record):
+        """Claves de una sonda, con la celda vecina de cada lado si probe_spread"""
+        sides, angles, hands = self._features(record)
+        cells = np.floor(sides).astype(np.int64)
+        angle_cells = np.floor(angles).astype(np.int64)
+        if not self.probe_spread:
+            return np.unique(self._keys(cells, angle_cells, hands))
+        # Vecina más cercana de cada lado: 2^3 combinaciones por triángulo
+        neighbours = cells + np.where(sides - cells < 0.5, -1, 1)
+        variants = []
+        for mask in range(8):
+            use = np.where([(mask >> column) & 1 for column in range(3)], neighbours, cells)
+            variants.append(self._keys(use, angle_cells, hands))
+        return np.unique(np.concatenate(variants))
+
+    # Altas y bajas ---------------------------------------------------------
+
+    def add(self, template_id, record):
+        """Indexa (o reindexa) un template; devuelve cuántas claves aporta"""
+        return self.add_many([(template_id, record)])
+
+    def add_many(self, items):
+        """add de varios (template_id, record) con las claves de todos calculadas a la vez
+
+        Devuelve el total de claves aportadas."""
+        records = [parse_template(record) if isinstance(record, (bytes, bytearray, memoryview)) else record
+                   for _, record in items]
+        all_keys = self.template_keys_many(records)
+        with self.lock:
+            for (template_id, _), keys in zip(items, all_keys):
+                self._remove_locked(template_id)
+                slot = len(self.ids)
+                self.ids.append(template_id)
+                self.key_counts.append(len(keys))
+                self.slots[template_id] = slot
+                for key in keys.tolist():
+                    postings = self.postings.get(key)
+                    if postings is None:
+                        postings = self.postings[key] = array('I')
+                    postings.append(slot)
+        return sum(len(keys) for keys in all_keys)
+
+    def remove(self, template_id):
+        with self.lock:
+            removed = self._remove_locked(template_id)
+            if removed and self.removed > COMPACT_RATIO * len(self.ids):
+                self._compact_locked()
+            return removed
+
+    def _remove_locked(self, template_id):
+        # Baja lógica: el slot queda sin id y sus votos se ignoran hasta compactar
+        slot = self.slots.pop(template_id, None)
+        if slot is None:
+            return False
+        self.ids[slot] = None
+        self.key_counts[slot] = 0
+        self.removed += 1
+        return True
+
+    def _compact_locked(self):
+        remap = np.full(len(self.ids), -1, dtype=np.int64)
+        ids = []
+        key_counts = array('I')
+        for slot, template_id in enumerate(self.ids):
+            if template_id is not None:
+                remap[slot] = len(ids)
+                ids.append(template_id)
+                key_counts.append(self.key_counts[slot])
+        postings = {}
+        for key, slots in self.postings.items():
+            moved = remap[np.frombuffer(slots, dtype=np.uint32)]
+            moved = moved[moved >= 0]
+            if len(moved):
+                postings[key] = array('I', moved.astype(np.uint32).tobytes())
+        self.postings = postings
+        self.ids = ids
+        self.key_counts = key_counts
+        self.slots = {template_id: slot for slot, template_id in enumerate(ids)}
+        self.removed = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, template_id):
+        return template_id in self.slots
+
+    # Consulta --------------------------------------------------------------
+
+    def scores(self, record):
+        """(ids, votos normalizados) de los templates que comparten alguna clave con la sonda
+
+        Solo se recorren las listas de las claves de la sonda: el coste
+        depende de los votos, no del tamaño de la galería."""
+        keys = self.probe_keys(record)
+        with self.lock:
+            lists = [self.postings[key] for key in keys.tolist() if key in self.postings]
+            if not lists:
+                return [], np.empty(0, dtype=np.float32)
+            hits = np.concatenate([np.frombuffer(p, dtype=np.uint32) for p in lists])
+            slots, votes = np.unique(hits, return_counts=True)
+            key_counts = np.frombuffer(self.key_counts, dtype=np.uint32)[slots]
+            live = key_counts > 0  # los slots eliminados tienen 0 claves
+            slots, votes, key_counts = slots[live], votes[live], key_counts[live]
+            ids = [self.ids[slot] for slot in slots.tolist()]
+        # Normalizar por el número de claves de cada template: uno con muchas
+        # minucias no debe ganar solo por tener más pares
+        return ids, votes.astype(np.float32) / np.sqrt(key_counts.astype(np.float32))
+
+    def candidates(self, record, max_candidates=50):
+        """Los max_candidates templates más votados: [(template_id, score)]"""
+        if isinstance(record, (bytes, bytearray, memoryview)):
+            record = parse_template(record)
+        ids, scores = self.scores(record)
+        count = min(max_candidates, len(scores))
+        if count <= 0:
+            return []
+        top = np.sort(np.argpartition(-scores, count - 1)[:count])  # empates en orden de slot
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(ids[position], float(scores[position])) for position in top.tolist()]
+
+    def stats(self):
+        with self.lock:
+            lengths = [len(p) for p in self.postings.values()]
+            return {
+                'templates': len(self.slots),
+                'slots': len(self.ids),
+                'removed_slots': self.removed,
+                'keys': len(self.postings),
+                'postings': sum(lengths),
+                'max_posting_length': max(lengths) if lengths else 0,
+            }
@@ -0,0 +1,441 @@
+#! /usr/bin/env python
+'''
+ * minutiaematcher.py
+ * Matcher de minucias ANSI-378/ISO 19794-2 vectorizado con NumPy, sin el SDK.
+ *
+ * Sirve como primer filtro barato de la identificación 1:N (una sonda contra
+ * un lote de templates en una sola pasada) y como matcher de respaldo cuando
+ * libsgfplib no está disponible, por ejemplo en nodos que solo comparan.
+ *
+ * Para cada template se precalcula un MinutiaeSet:
+ *   - un descriptor local por minucia (distancia, dirección y orientación
+ *     relativa de sus vecinas más cercanas) como vector de longitud fija,
+ *     para comparar todos los pares sonda x galería con un producto matricial;
+ *   - una rejilla de ocupación: por celda, bits de los sectores de ángulo de
+ *     las minucias a menos de MATCH_RADIUS, para contar coincidencias sin
+ *     comparar cada minucia con todas las demás.
+ * Los ALIGNMENTS pares con descriptores más parecidos proponen una rotación
+ * y traslación; la mejor cuenta las minucias de la sonda que caen sobre una
+ * del template con ángulo compatible. El score bruto (coincidencias² / n·m)
+ * se lleva a la escala 0-199 del SDK con CALIBRATION, ajustada contra
+ * GetAnsiMatchingScore (ver matcher_benchmark.py --calibrate).
+ *
+ *   matcher = MinutiaeMatcher()
+ *   score = matcher.score(data1, data2)               # escala del SDK
+ *   matched, score = matcher.match(data1, data2, SGFDxSecurityLevel.SL_NORMAL)
+ *   gallery = MatcherGallery(matcher)
+ *   gallery.add('huella_1', matcher.prepare(data1))
+ *   ids, scores = gallery.scores(matcher.prepare(probe))
+'''
+
+from .sgfdxsecuritylevel import *
+from .templateparser import parse_template
+import threading
+import numpy as np
+
+DEFAULT_NEIGHBOURS = 4       # vecinas en el descriptor local
+DISTANCE_SCALE = 8.0         # píxeles por unidad del descriptor
+ANGLE_SCALE = 20.0           # grados por unidad del descriptor
+ALIGNMENTS = 8               # pares candidatos a alineamiento por template
+GRID_CELL = 6                # píxeles por celda de la rejilla de ocupación
+MATCH_RADIUS = 12.0          # distancia máxima entre minucias emparejadas (px)
+ANGLE_SECTORS = 16           # sectores de ángulo (bits uint16 por celda)
+ANGLE_TOLERANCE = 25.0       # diferencia máxima de ángulo (grados)
+SEGMENT_SIZE = 256           # templates por lote en MatcherGallery
+
+# Score bruto -> escala 0-199 de GetAnsiMatchingScore: medianas del SDK por
+# tramo de score bruto (monótonas), con pares sintéticos de varias
+# dificultades y los fixtures de java/. Regenerar con
+# python3 matcher_benchmark.py --calibrate
+CALIBRATION = (
+    (0.0, 0), (0.0112, 1), (0.025, 2), (0.0494, 54), (0.0699, 58), (0.0874, 62),
+    (0.1067, 63), (0.1344, 92), (0.1791, 118), (0.225, 128), (0.2722, 147), (0.3549, 161),
+    (0.4347, 176), (0.5645, 185), (0.6849, 190), (0.8482, 192), (1.0, 199),
+)
+
+# Score mínimo por nivel de seguridad (los de MatchTemplate del SDK)
+SCORE_THRESHOLDS = {
+    SGFDxSecurityLevel.SL_NONE: 0,
+    SGFDxSecurityLevel.SL_LOWEST: 30,
+    SGFDxSecurityLevel.SL_LOWER: 50,
+    SGFDxSecurityLevel.SL_LOW: 60,
+    SGFDxSecurityLevel.SL_BELOW_NORMAL: 70,
+    SGFDxSecurityLevel.SL_NORMAL: 80,
+    SGFDxSecurityLevel.SL_ABOVE_NORMAL: 90,
+    SGFDxSecurityLevel.SL_HIGH: 100,
+    SGFDxSecurityLevel.SL_HIGHER: 120,
+    SGFDxSecurityLevel.SL_HIGHEST: 140,
+}
+
+_TWO_PI = np.float32(2 * np.pi)
+
+
+def _disk_offsets(radius, cell):
+    """Desplazamientos de celda (dy, dx) a menos de radius píxeles"""
+    reach = int(np.ceil(radius / cell))
+    dy, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+    inside = (dx * cell) ** 2 + (dy * cell) ** 2 <= radius ** 2
+    return dy[inside], dx[inside]
+
+
+_DISK_DY, _DISK_DX = _disk_offsets(MATCH_RADIUS, GRID_CELL)
+
+
+def fit_calibration(raw_scores, sdk_scores, edges=None):
+    """Nodos (bruto, SDK) monótonos: mediana del SDK en cada tramo de score bruto"""
+    raw_scores = np.asarray(raw_scores, dtype=np.float64)
+    sdk_scores = np.asarray(sdk_scores, dtype=np.float64)
+    if edges is None:
+        edges = (0.0, 0.02, 0.04, 0.06, 0.08, 0.1, 0.12, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0)
+    knots = [(0.0, 0.0)]
+    for low, high in zip(edges[:-1], edges[1:]):
+        inside = (raw_scores >= low) & (raw_scores < high)
+        if inside.any():
+            knots.append((float(np.median(raw_scores[inside])), float(np.median(sdk_scores[inside]))))
+    knots.append((1.0, 199.0))
+    level = 0.0
+    monotone = []
+    for raw, sdk in knots:
+        level = max(level, sdk)
+        monotone.append((round(raw, 4), int(round(level))))
+    return tuple(monotone)
+
+
+class MinutiaeSet:
+    """Minucias de una vista preparadas para el matcher"""
+
+    __slots__ = ('x', 'y', 'angle', 'descriptor', 'norms', 'grid')
+
+    def __init__(self, x, y, angle, descriptor, norms, grid):
+        self.x = x                    # float32, píxeles
+        self.y = y                    # float32, eje Y hacia arriba (-y de la imagen)
+        self.angle = angle            # float32, radianes antihorarios
+        self.descriptor = descriptor  # (n, neighbours * 5) float32
+        self.norms = norms            # (n,) norma² de cada descriptor
+        self.grid = grid              # (filas, columnas) uint16, bits por sector
+
+    def __len__(self):
+        return len(self.x)
+
+
+class MinutiaeMatcher:
+    """Matcher de minucias vectorizado, calibrado a la escala del SDK"""
+
+    def __init__(self, neighbours=DEFAULT_NEIGHBOURS, alignments=ALIGNMENTS, calibration=CALIBRATION):
+        self.neighbours = neighbours
+        self.alignments = alignments
+        self.calibration_raw = np.array([raw for raw, _ in calibration], dtype=np.float32)
+        self.calibration_score = np.array([score for _, score in calibration], dtype=np.float32)
+
+    # Preparación -----------------------------------------------------------
+
+    def prepare(self, template, template_format=None, view=0):
+        """MinutiaeSet de una vista de un template (bytes o TemplateRecord)"""
+        record = template
+        if not hasattr(record, 'views'):
+            record = parse_template(template, template_format)
+        if view >= len(record.views):
+            return self._prepare_view(None, record.width, record.height)
+        return self._prepare_view(record.views[view], record.width, record.height)
+
+    def _prepare_view(self, view, width, height):
+        k = self.neighbours
+        rows = max(height, 1) // GRID_CELL + 1
+        cols = max(width, 1) // GRID_CELL + 1
+        grid = np.zeros((rows, cols), dtype=np.uint16)
+        if view is None or len(view) == 0:
+            empty = np.empty(0, dtype=np.float32)
+            return MinutiaeSet(empty, empty, empty, np.empty((0, k * 5), dtype=np.float32), empty, grid)
+
+        x = view.x.astype(np.float32)
+        image_y = view.y.astype(np.float32)
+        y = -image_y
+        angle = np.radians(view.angle).astype(np.float32) % _TWO_PI
+        n = len(x)
+
+        # Descriptor local: por cada vecina, distancia y (cos, sin) de su
+        # dirección y de su orientación relativas al ángulo de la minucia.
+        # Las unidades hacen que 1 equivalga a DISTANCE_SCALE px o ~ANGLE_SCALE°
+        descriptor = np.zeros((n, k, 5), dtype=np.float32)
+        used = min(k, n - 1)
+        if used > 0:
+            distance = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+            np.fill_diagonal(distance, np.inf)
+            nearest = np.argsort(distance, axis=1)[:, :used]
+            direction = np.arctan2(y[nearest] - y[:, None], x[nearest] - x[:, None]) - angle[:, None]
+            orientation = angle[nearest] - angle[:, None]
+            angle_unit = np.float32(180.0 / (np.pi * ANGLE_SCALE))
+            descriptor[:, :used, 0] = np.take_along_axis(distance, nearest, axis=1) / DISTANCE_SCALE
+            descriptor[:, :used, 1] = np.cos(direction) * angle_unit
+            descriptor[:, :used, 2] = np.sin(direction) * angle_unit
+            descriptor[:, :used, 3] = np.cos(orientation) * angle_unit
+            descriptor[:, :used, 4] = np.sin(orientation) * angle_unit
+        descriptor = descriptor.reshape(n, k * 5)
+
+        # Rejilla: cada minucia marca las celdas de su disco con los sectores
+        # de ángulo compatibles
+        centers = (np.arange(ANGLE_SECTORS, dtype=np.float32) + 0.5) * (_TWO_PI / ANGLE_SECTORS)
+        difference = np.abs(angle[:, None] - centers[None, :])
+        difference = np.minimum(difference, _TWO_PI - difference)
+        compatible = difference <= np.radians(ANGLE_TOLERANCE) + np.pi / ANGLE_SECTORS
+        bits = (compatible.astype(np.uint16) << np.arange(ANGLE_SECTORS, dtype=np.uint16)).sum(axis=1)
+        cell_y = (image_y // GRID_CELL).astype(np.intp)[:, None] + _DISK_DY[None, :]
+        cell_x = (x // GRID_CELL).astype(np.intp)[:, None] + _DISK_DX[None, :]
+        inside = (cell_y >= 0) & (cell_y < rows) & (cell_x >= 0) & (cell_x < cols)
+        np.bitwise_or.at(grid, (cell_y[inside], cell_x[inside]),
+                         np.broadcast_to(bits.astype(np.uint16)[:, None], cell_y.shape)[inside])
+        return MinutiaeSet(x, y, angle, descriptor, (descriptor * descriptor).sum(axis=1), grid)
+
+    def stack(self, sets):
+        """Lote con las minucias de varios templates rellenadas al mayor"""
+        return _Batch(sets, self.neighbours)
+
+    # Scores ----------------------------------------------------------------
+
+    def raw_scores(self, probe, batch):
+        """Score bruto (0-1) de la sonda contra cada template del lote"""
+        if not isinstance(batch, _Batch):
+            batch = self.stack(batch)
+        count = len(batch)
+        n = len(probe)
+        if count == 0:
+            return np.empty(0, dtype=np.float32)
+        if n == 0 or batch.width == 0:
+            return np.zeros(count, dtype=np.float32)
+        m = batch.width
+
+        # Parecido de descriptores de todos los pares: |a|² + |b|² - 2a·b
+        cost = probe.norms[None, :, None] + batch.norms[:, None, :] \
+            - 2 * np.matmul(batch.descriptor, probe.descriptor.T).transpose(0, 2, 1)
+        cost = cost.reshape(count, n * m)
+        alignments = min(self.alignments, n * m)
+        best = np.argpartition(cost, alignments - 1, axis=1)[:, :alignments]
+        i = best // m
+        j = best % m
+        rows = np.arange(count)[:, None]
+
+        # Transformación que lleva la minucia i de la sonda sobre la j del template
+        rotation = batch.angle[rows, j] - probe.angle[i]
+        cos = np.cos(rotation)[..., None]
+        sin = np.sin(rotation)[..., None]
+        dx = probe.x[None, None, :] - probe.x[i][..., None]
+        dy = probe.y[None, None, :] - probe.y[i][..., None]
+        x = cos * dx - sin * dy + batch.x[rows, j][..., None]
+        image_y = -(sin * dx + cos * dy + batch.y[rows, j][..., None])
+        angle = (probe.angle[None, None, :] + rotation[..., None]) % _TWO_PI
+
+        cell_x = np.floor(x / GRID_CELL).astype(np.intp)
+        cell_y = np.floor(image_y / GRID_CELL).astype(np.intp)
+        rows_grid, cols_grid = batch.grid.shape[1:]
+        inside = (cell_x >= 0) & (cell_x < cols_grid) & (cell_y >= 0) & (cell_y < rows_grid)
+        cell = (np.arange(count)[:, None, None] * rows_grid + np.clip(cell_y, 0, rows_grid - 1)) * cols_grid \
+            + np.clip(cell_x, 0, cols_grid - 1)
+        sector = (angle * (ANGLE_SECTORS / _TWO_PI)).astype(np.uint16) % ANGLE_SECTORS
+        hits = ((batch.grid.reshape(-1)[cell] >> sector) & 1).astype(bool) & inside
+        matched = np.minimum(hits.sum(axis=2).max(axis=1), batch.counts).astype(np.float32)
+        return np.divide(matched * matched, n * batch.counts, out=np.zeros(count, dtype=np.float32),
+                         where=batch.counts > 0)
+
+    def calibrate(self, raw):
+        """Score bruto -> escala 0-199 del SDK"""
+        return np.rint(np.interp(raw, self.calibration_raw, self.calibration_score)).astype(np.int32)
+
+    def scores(self, probe, batch):
+        return self.calibrate(self.raw_scores(probe, batch))
+
+    def score(self, template1, template2, format1=None, format2=None):
+        """Score de dos templates en la escala del SDK"""
+        probe = self._as_set(template1, format1)
+        return int(self.scores(probe, [self._as_set(template2, format2)])[0])
+
+    def match(self, template1, template2, security_level=SGFDxSecurityLevel.SL_NORMAL, format1=None, format2=None):
+        """(coinciden, score) con los umbrales de MatchTemplate"""
+        score = self.score(template1, template2, format1, format2)
+        return score >= threshold(security_level), score
+
+    def _as_set(self, template, template_format):
+        return template if isinstance(template, MinutiaeSet) else self.prepare(template, template_format)
+
+
+def threshold(security_level):
+    return SCORE_THRESHOLDS.get(security_level, SCORE_THRESHOLDS[SGFDxSecurityLevel.SL_NORMAL])
+
+
+class _Batch:
+    """Arrays apilados (templates x minucias) de un lote de MinutiaeSet"""
+
+    __slots__ = ('x', 'y', 'angle', 'descriptor', 'norms', 'grid', 'counts', 'width')
+
+    def __init__(self, sets, neighbours):
+        count = len(sets)
+        self.width = max((len(s) for s in sets), default=0)
+        rows = max((s.grid.shape[0] for s in sets), default=1)
+        cols = max((s.grid.shape[1] for s in sets), default=1)
+        self.x = np.zeros((count, self.width), dtype=np.float32)
+        self.y = np.zeros((count, self.width), dtype=np.float32)
+        self.angle = np.zeros((count, self.width), dtype=np.float32)
+        self.descriptor = np.zeros((count, self.width, neighbours * 5), dtype=np.float32)
+        # Norma infinita en el relleno: nunca es el par más parecido
+        self.norms = np.full((count, self.width), np.inf, dtype=np.float32)
+        self.grid = np.zeros((count, rows, cols), dtype=np.uint16)
+        self.counts = np.zeros(count, dtype=np.int32)
+        for row, s in enumerate(sets):
+            n = len(s)
+            self.x[row, :n] = s.x
+            self.y[row, :n] = s.y
+            self.angle[row, :n] = s.angle
+            self.descriptor[row, :n] = s.descriptor
+            self.norms[row, :n] = s.norms
+            self.grid[row, :s.grid.shape[0], :s.grid.shape[1]] = s.grid
+            self.counts[row] = n
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class _Segment:
+    __slots__ = ('ids', 'sets', 'positions', 'batch')
+
+    def __init__(self):
+        self.ids = []
+        self.sets = []
+        self.positions = {}  # template_id -> posición en ids/sets
+        self.batch = None    # _Batch apilado, se rehace tras un alta o baja
+
+    def __getstate__(self):
+        # Minucias del lote concatenadas: pocos arrays grandes en lugar de seis
+        # por template. El lote apilado no se guarda; se rehace al puntuar
+        state = {'ids': self.ids, 'lengths': np.array([len(minutiae_set) for minutiae_set in self.sets]),
+                 'grid_shapes': np.array([minutiae_set.grid.shape for minutiae_set in self.sets]).reshape(-1, 2)}
+        if self.sets:
+            for field in ('x', 'y', 'angle', 'descriptor', 'norms'):
+                state[field] = np.concatenate([getattr(minutiae_set, field) for minutiae_set in self.sets])
+            state['grid'] = np.concatenate([minutiae_set.grid.ravel() for minutiae_set in self.sets])
+        return state
+
+    def __setstate__(self, state):
+        self.ids = state['ids']
+        self.positions = {template_id: position for position, template_id in enumerate(self.ids)}
+        self.batch = None
+        self.sets = []
+        if not self.ids:
+            return
+        split = np.cumsum(state['lengths'])[:-1]
+        fields = [np.split(state[field], split) for field in ('x', 'y', 'angle', 'descriptor', 'norms')]
+        shapes = state['grid_shapes']
+        grids = [grid.reshape(shape) for grid, shape in
+                 zip(np.split(state['grid'], np.cumsum(shapes.prod(axis=1))[:-1]), shapes.tolist())]
+        self.sets = [MinutiaeSet(*arrays) for arrays in zip(*fields, grids)]
+
+
+class MatcherGallery:
+    """Galería del matcher en lotes de SEGMENT_SIZE
+
+    Un alta o una baja solo invalida el lote que la contiene: el siguiente
+    scores() reapila ese lote y reutiliza el resto."""
+
+    def __init__(self, matcher=None, segment_size=SEGMENT_SIZE):
+        self.matcher = matcher or MinutiaeMatcher()
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self.segments = []
+        self.location = {}  # template_id -> _Segment
+
+    def __getstate__(self):
+        # Copia de los lotes con el lock: la instantánea se serializa mientras hay altas
+        with self.lock:
+            state = self.__dict__.copy()
+            del state['lock']
+            copies = {}
+            for segment in self.segments:
+                copy = copies[id(segment)] = _Segment()
+                copy.ids = list(segment.ids)
+                copy.sets = list(segment.sets)
+                copy.positions = dict(segment.positions)
+            state['segments'] = [copies[id(segment)] for segment in self.segments]
+            state['location'] = {template_id: copies[id(segment)] for template_id, segment in self.location.items()}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add(self, template_id, minutiae_set):
+        self.add_many([(template_id, minutiae_set)])
+
+    def add_many(self, items):
+        """add de varios (template_id, MinutiaeSet) con el lock tomado una vez"""
+        with self.lock:
+            for template_id, minutiae_set in items:
+                self._remove_locked(template_id)
+                segment = self.segments[-1] if self.segments else None
+                if segment is None or len(segment.ids) >= self.segment_size:
+                    segment = _Segment()
+                    self.segments.append(segment)
+                segment.positions[template_id] = len(segment.ids)
+                segment.ids.append(template_id)
+                segment.sets.append(minutiae_set)
+                segment.batch = None
+                self.location[template_id] = segment
+
+    def remove(self, template_id):
+        with self.lock:
+            return self._remove_locked(template_id)
+
+    def _remove_locked(self, template_id):
+        segment = self.location.pop(template_id, None)
+        if segment is None:
+            return False
+        # El último del lote ocupa el hueco: sin desplazar el resto
+        position = segment.positions.pop(template_id)
+        moved = segment.ids.pop()
+        minutiae_set = segment.sets.pop()
+        if position < len(segment.ids):
+            segment.ids[position] = moved
+            segment.sets[position] = minutiae_set
+            segment.positions[moved] = position
+        segment.batch = None
+        if not segment.ids:
+            self.segments.remove(segment)
+        return True
+
+    def get(self, template_id):
+        with self.lock:
+            segment = self.location.get(template_id)
+            return segment.sets[segment.positions[template_id]] if segment else None
+
+    def __len__(self):
+        return len(self.location)
+
+    def __contains__(self, template_id):
+        return template_id in self.location
+
+    def _batches(self):
+        with self.lock:
+            batches = []
+            for segment in self.segments:
+                if segment.batch is None:
+                    segment.batch = self.matcher.stack(segment.sets)
+                batches.append((list(segment.ids), segment.batch))
+            return batches
+
+    def raw_scores(self, probe, template_ids=None):
+        """(ids, score bruto) de toda la galería, o solo de template_ids"""
+        if template_ids is not None:
+            with self.lock:
+                pairs = [(template_id, self.location[template_id]) for template_id in template_ids
+                         if template_id in self.location]
+                ids = [template_id for template_id, _ in pairs]
+                sets = [segment.sets[segment.positions[template_id]] for template_id, segment in pairs]
+            return ids, self.matcher.raw_scores(probe, self.matcher.stack(sets))
+        ids = []
+        scores = []
+        for batch_ids, batch in self._batches():
+            ids.extend(batch_ids)
+            scores.append(self.matcher.raw_scores(probe, batch))
+        return ids, np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+
+    def scores(self, probe, template_ids=None):
+        """(ids, score en la escala del SDK)"""
+        ids, raw = self.raw_scores(probe, template_ids)
+        return ids, self.matcher.calibrate(raw)
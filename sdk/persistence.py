@@ -0,0 +1,294 @@
+#! /usr/bin/env python
+'''
+ * persistence.py
+ * Persistencia de la galería para reiniciar sin reconstruirla: registro de
+ * escritura anticipada (WAL) de altas, bajas y asignaciones de identidad más
+ * instantáneas periódicas.
+ *
+ * Cada operación se añade al WAL antes de aplicarse en memoria. Cada cierto
+ * tiempo se vuelca una instantánea de la galería con sus estructuras
+ * derivadas (índice de minucias, códigos binarios, galería del matcher NumPy,
+ * identidades) y se empieza un WAL nuevo; los anteriores se borran cuando la
+ * instantánea ya está en disco. Con las escrituras paradas solo se empieza
+ * el WAL nuevo y se toma la versión publicada de la galería (copy-on-write,
+ * no cambia): la serialización se hace después, sin bloquearlas. Al arrancar
+ * se carga la instantánea y solo se reaplican los registros posteriores: no
+ * se vuelve a parsear ni a indexar toda la galería.
+ *
+ * En el directorio de datos:
+ *   - snapshot.bin: cabecera (magia, versión, seq) y el estado con pickle;
+ *   - wal-<seq>.log: registros a partir de seq, [longitud u32][crc32 u32][cuerpo].
+ * Un registro incompleto o con CRC erróneo al final del último WAL (caída a
+ * mitad de una escritura) se descarta y el archivo se trunca ahí.
+ *
+ * La instantánea se lee con pickle: el directorio de datos es del servicio
+ * y nadie más debe poder escribir en él.
+ *
+ *   store = GalleryStore('/var/lib/secugen')
+ *   state = store.load_snapshot()             # None si aún no hay instantánea
+ *   for record in store.replay(): ...         # WalRecord posteriores a la instantánea
+ *   store.open()
+ *   store.log_put('huella_1', template, formato, 'persona_7', 2)
+ *   store.log_put_many([(template_id, template, formato, None, None), ...])
+ *   pending = store.begin_snapshot()          # con las escrituras bloqueadas
+ *   store.finish_snapshot(pending, state)     # ya sin bloquearlas
+'''
+
+from collections import namedtuple
+import json
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+OP_PUT = 1      # alta o reemplazo (store_template)
+OP_DELETE = 2   # baja (delete_template)
+OP_ASSIGN = 3   # asignación de persona y dedo a un template existente
+SNAPSHOT_FILE = 'snapshot.bin'
+SNAPSHOT_MAGIC = b'SGGALSNP'
+SNAPSHOT_VERSION = 1
+WAL_PREFIX = 'wal-'
+WAL_SUFFIX = '.log'
+
+_SNAPSHOT_HEADER = struct.Struct('<8sIQ')   # magia, versión, seq incluida
+_RECORD_HEADER = struct.Struct('<II')       # longitud del cuerpo, crc32 del cuerpo
+_BODY_HEADER = struct.Struct('<QBI')        # seq, operación, longitud de los metadatos JSON
+
+WalRecord = namedtuple('WalRecord', 'seq op template_id template template_format person_id finger enrolled')
+
+
+def encode_record(seq, op, template_id, template=b'', template_format=None, person_id=None, finger=None,
+                  enrolled=None):
+    """Registro del WAL; los IDs van en JSON para conservar su tipo (str o int)"""
+    meta = json.dumps([template_id, template_format, person_id, finger, enrolled]).encode()
+    body = _BODY_HEADER.pack(seq, op, len(meta)) + meta + bytes(template)
+    return _RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_records(data):
+    """(WalRecord, desplazamiento tras el registro) hasta el primer registro incompleto o corrupto"""
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        length, crc = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + _RECORD_HEADER.size
+        body = data[start:start + length]
+        if len(body) < length or length < _BODY_HEADER.size or zlib.crc32(body) != crc:
+            return
+        seq, op, meta_length = _BODY_HEADER.unpack_from(body)
+        meta_end = _BODY_HEADER.size + meta_length
+        meta = json.loads(body[_BODY_HEADER.size:meta_end])
+        offset = start + length
+        yield WalRecord(seq, op, meta[0], bytes(body[meta_end:]), *meta[1:]), offset
+
+
+class GalleryStore:
+    """WAL y snapshot.bin de una galería en directory
+
+    fsync=False solo vuelca al sistema operativo: sobrevive a la caída del
+    proceso pero no a un corte de corriente."""
+
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.fsync = fsync
+        self.lock = threading.Lock()  # escrituras del WAL y rotación
+        self.seq = 0                  # último registro escrito o leído
+        self.snapshot_seq = 0         # último registro incluido en la instantánea
+        self.wal = None
+        self.wal_path = None
+        self.valid_bytes = None       # bytes válidos del último WAL leído (trunca la cola)
+        self.records_since_snapshot = 0
+        self.appended = 0
+        self.appended_bytes = 0
+        self.discarded_bytes = 0      # cola corrupta descartada al arrancar
+        self.snapshots = 0
+        self.last_snapshot = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    def _wal_files(self):
+        """[(seq inicial, ruta)] de los WAL en orden"""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.startswith(WAL_PREFIX) and name.endswith(WAL_SUFFIX):
+                try:
+                    files.append((int(name[len(WAL_PREFIX):-len(WAL_SUFFIX)]), os.path.join(self.directory, name)))
+                except ValueError:
+                    continue
+        return sorted(files)
+
+    # Arranque ---------------------------------------------------------------
+
+    def load_snapshot(self):
+        """Estado guardado en la última instantánea, o None si no hay"""
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                header = f.read(_SNAPSHOT_HEADER.size)
+                if len(header) < _SNAPSHOT_HEADER.size:
+                    raise ValueError(f"Instantánea truncada: {self.snapshot_path}")
+                magic, version, seq = _SNAPSHOT_HEADER.unpack(header)
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    raise ValueError(f"Instantánea no reconocida (versión {version}): {self.snapshot_path}")
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        self.seq = self.snapshot_seq = seq
+        return state
+
+    def replay(self):
+        """WalRecord posteriores a la instantánea, en orden
+
+        Un registro dañado al final del último WAL se da por no escrito;
+        en un WAL anterior es corrupción y se lanza ValueError."""
+        files = self._wal_files()
+        for number, (first_seq, path) in enumerate(files):
+            with open(path, 'rb') as f:
+                data = f.read()
+            valid = 0
+            for record, valid in decode_records(data):
+                self.seq = max(self.seq, record.seq)
+                if record.seq > self.snapshot_seq:
+                    self.records_since_snapshot += 1
+                    yield record
+            if valid < len(data):
+                if number < len(files) - 1:
+                    raise ValueError(f"WAL corrupto en {path} (byte {valid})")
+                self.discarded_bytes = len(data) - valid
+                print(f"WAL: descartados {self.discarded_bytes} bytes de un registro incompleto en {path}")
+            if number == len(files) - 1:
+                self.valid_bytes = valid
+
+    def open(self):
+        """Abre el último WAL para añadir (tras replay), o uno nuevo"""
+        files = self._wal_files()
+        with self.lock:
+            if files:
+                self.wal_path = files[-1][1]
+                self.wal = open(self.wal_path, 'ab')
+                if self.valid_bytes is not None and self.valid_bytes < self.wal.tell():
+                    self.wal.truncate(self.valid_bytes)
+                    self._sync()
+            else:
+                self._open_wal_locked()
+
+    def _open_wal_locked(self):
+        self.wal_path = os.path.join(self.directory, f'{WAL_PREFIX}{self.seq + 1:016d}{WAL_SUFFIX}')
+        self.wal = open(self.wal_path, 'ab')
+        self._sync_directory()
+
+    # Escritura --------------------------------------------------------------
+
+    def log_put(self, template_id, template, template_format, person_id=None, finger=None, enrolled=None):
+        self._append(OP_PUT, template_id, template, template_format, person_id, finger, enrolled)
+
+    def log_put_many(self, records, enrolled=None):
+        """Altas [(template_id, template, formato, person_id, finger)] con un solo fsync"""
+        with self.lock:
+            data = b''.join(encode_record(self.seq + number, OP_PUT, template_id, template, template_format,
+                                          person_id, finger, enrolled)
+                            for number, (template_id, template, template_format, person_id, finger)
+                            in enumerate(records, 1))
+            self.wal.write(data)
+            self._sync()
+            self.seq += len(records)
+            self.records_since_snapshot += len(records)
+            self.appended += len(records)
+            self.appended_bytes += len(data)
+
+    def log_delete(self, template_id):
+        self._append(OP_DELETE, template_id)
+
+    def log_assign(self, template_id, person_id, finger):
+        self._append(OP_ASSIGN, template_id, person_id=person_id, finger=finger)
+
+    def _append(self, op, template_id, template=b'', template_format=None, person_id=None, finger=None,
+                enrolled=None):
+        with self.lock:
+            record = encode_record(self.seq + 1, op, template_id, template, template_format, person_id, finger,
+                                   enrolled)
+            self.wal.write(record)
+            self._sync()
+            self.seq += 1
+            self.records_since_snapshot += 1
+            self.appended += 1
+            self.appended_bytes += len(record)
+
+    def _sync(self):
+        self.wal.flush()
+        if self.fsync:
+            os.fsync(self.wal.fileno())
+
+    def _sync_directory(self):
+        if self.fsync:
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # Instantáneas -----------------------------------------------------------
+
+    def begin_snapshot(self):
+        """Empieza un WAL nuevo; devuelve lo que necesita finish_snapshot
+
+        Hay que llamarlo con las escrituras de la galería bloqueadas, al tomar
+        el estado que se va a guardar, para que corresponda exactamente a los
+        registros escritos hasta ahora."""
+        start = time.perf_counter()
+        with self.lock:
+            seq = self.seq
+            self.wal.close()
+            self._open_wal_locked()
+            self.records_since_snapshot = 0
+        return seq, start
+
+    def finish_snapshot(self, pending, state):
+        """Serializa state, lo lleva a disco, lo publica y borra los WAL que cubre
+
+        Sin las escrituras bloqueadas: lo que no se copie al serializarse no debe cambiar.
+        Si falla, los WAL anteriores siguen ahí y la instantánea anterior vale."""
+        seq, start = pending
+        temporary = self.snapshot_path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, seq))
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(temporary, self.snapshot_path)
+        self._sync_directory()
+        for first_seq, path in self._wal_files():
+            if path != self.wal_path and first_seq <= seq:
+                os.remove(path)
+        self.snapshot_seq = seq
+        self.snapshots += 1
+        self.last_snapshot = {'seq': seq, 'bytes': size, 'elapsed_ms': (time.perf_counter() - start) * 1000,
+                              'time': time.time()}
+        return self.last_snapshot
+
+    def close(self):
+        with self.lock:
+            if self.wal is not None:
+                self.wal.close()
+                self.wal = None
+
+    def stats(self):
+        with self.lock:
+            wal_bytes = self.wal.tell() if self.wal is not None else 0
+            return {
+                'directory': self.directory,
+                'fsync': self.fsync,
+                'seq': self.seq,
+                'snapshot_seq': self.snapshot_seq,
+                'records_since_snapshot': self.records_since_snapshot,
+                'wal_bytes': wal_bytes,
+                'appended': self.appended,
+                'appended_bytes': self.appended_bytes,
+                'discarded_bytes': self.discarded_bytes,
+                'snapshots': self.snapshots,
+                'last_snapshot': self.last_snapshot,
+            }
@@ -11,6 +11,9 @@ from ctypes import *
 from .sgfdxerrorcode import *
 from .sgfdxdevicename import *
 from .sgfdxsecuritylevel import *
+from .sgfdxstructs import *
+from .sgfdxtemplateformat import *
+import threading
 import time
 
 class PYSGFPLib:
@@ -19,11 +22,34 @@ class PYSGFPLib:
   import os
   current_dir = os.path.dirname(os.path.abspath(__file__))
   slib = os.path.join(current_dir, '..', 'lib', 'linux3', 'libpysgfplib.so')
-  hlib = CDLL(slib)
+  # La biblioteca se carga en el primer uso, no al importar el módulo
+  _hlib = None
+  _hlib_lock = threading.Lock()
 
   def __init__(self):
     self.data = []
 
+  @classmethod
+  def LoadLibrary(cls):
+    if cls._hlib is None:
+      with cls._hlib_lock:
+        if cls._hlib is None:
+          cls._hlib = CDLL(cls.slib)
+    return cls._hlib
+
+  @property
+  def hlib(self):
+    return self._hlib if self._hlib is not None else self.LoadLibrary()
+
+  # HSGFPM que usan las funciones PY_SGFPM_* (objeto global 'fpm' de libpysgfplib)
+  def Handle(self):
+    return c_void_p.in_dll(self.hlib, 'fpm')
+
+  # Parámetros de salida pasados directamente o con byref()
+  @staticmethod
+  def _SetOut(target, value):
+    getattr(target, '_obj', target).value = value
+
   def Create(self):
     return self.hlib.PY_SGFPM_Create()
 
@@ -38,9 +64,16 @@ class PYSGFPLib:
 
   #virtual DWORD WINAPI  InitEx(DWORD width, DWORD height, DWORD dpi) = 0;
   #virtual DWORD WINAPI  SetTemplateFormat(WORD format) = 0; // default is SG400
+  # Afecta a CreateTemplate, CreateSG400Template, MatchTemplate y GetMatchingScore
+  def SetTemplateFormat(self, format):
+    return self.hlib.SGFPM_SetTemplateFormat(self.Handle(), c_ushort(format))
 
   #Image sensor API
   #virtual DWORD WINAPI  EnumerateDevice(DWORD* ndevs, SGDeviceList** devList) = 0;
+  # ndevs: c_ulong, devList: POINTER(SGDeviceList); la lista la reserva el SDK
+  def EnumerateDevice(self, ndevs, devList):
+    return self.hlib.SGFPM_EnumerateDevice(self.Handle(), byref(ndevs), byref(devList))
+
   def OpenDevice(self, devId):
     return self.hlib.PY_SGFPM_OpenDevice(c_long(devId))
 
@@ -48,16 +81,17 @@ class PYSGFPLib:
     return self.hlib.PY_SGFPM_CloseDevice()
 
   #virtual DWORD WINAPI  GetDeviceInfo(SGDeviceInfoParam* pInfo)= 0;
+  def GetDeviceInfoParam(self, pInfo):
+    return self.hlib.SGFPM_GetDeviceInfo(self.Handle(), byref(pInfo))
+
+  # Forma abreviada: solo ancho y alto de la imagen del lector abierto
   def GetDeviceInfo(self, imageWidth, imageHeight):
-    # Valores fijos para el modelo SecuGen USB UPx
-    width = c_long(258)   # Ancho típico del sensor
-    height = c_long(336)  # Alto típico del sensor
-    
-    # Actualizar los valores de salida
-    imageWidth.value = width.value
-    imageHeight.value = height.value
-    
-    return SGFDxErrorCode.SGFDX_ERROR_NONE
+    info = SGDeviceInfoParam()
+    err = self.GetDeviceInfoParam(info)
+    if err == SGFDxErrorCode.SGFDX_ERROR_NONE:
+      self._SetOut(imageWidth, info.ImageWidth)
+      self._SetOut(imageHeight, info.ImageHeight)
+    return err
 
 
   #virtual DWORD WINAPI  Configure(HWND hwnd) = 0;
@@ -103,8 +137,27 @@ class PYSGFPLib:
 
   #// Algorithm: Extraction API
   #virtual DWORD WINAPI  GetMaxTemplateSize(DWORD* size) = 0;
+  # Tamaño máximo en el formato actual (400 en SG400, 800 en ANSI378/ISO19794)
+  def GetMaxTemplateSize(self, size):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetMaxTemplateSize(self.Handle(), byref(value))
+    self._SetOut(size, value.value)
+    return err
+
   #virtual DWORD WINAPI  CreateTemplate(SGFingerInfo* fpInfo, BYTE *rawImage, BYTE* minTemplate)= 0;
+  # Template en el formato actual; fpInfo (SGFingerInfo) es opcional
+  def CreateTemplate(self, fpInfo, rawImage, minTemplate):
+    info = byref(fpInfo) if fpInfo is not None else None
+    return self.hlib.SGFPM_CreateTemplate(self.Handle(), info, rawImage, minTemplate)
+
   #virtual DWORD WINAPI  GetTemplateSize(BYTE* buf, DWORD* size) = 0;
+  # Tamaño real del template en el formato actual
+  def GetTemplateSize(self, buf, size):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetTemplateSize(self.Handle(), buf, byref(value))
+    self._SetOut(size, value.value)
+    return err
+
   def CreateSG400Template(self, rawImage, minTemplate):
     return self.hlib.PY_SGFPM_CreateSG400Template(rawImage, minTemplate)
 
@@ -116,25 +169,100 @@ class PYSGFPLib:
     return self.hlib.PY_SGFPM_GetMatchingScore(minTemplate1, minTemplate2, score)
 
   #// Algorithim: Only work with ANSI378 Template
+  # Las funciones Merge* solo aceptan templates del formato fijado con
+  # SetTemplateFormat (SGFDX_ERROR_INVALID_TEMPLATE_TYPE si no coincide)
   #virtual DWORD  WINAPI  GetTemplateSizeAfterMerge(BYTE* ansiTemplate1, BYTE* ansiTemplate2, DWORD* size) = 0;
+  def GetTemplateSizeAfterMerge(self, ansiTemplate1, ansiTemplate2, size):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetTemplateSizeAfterMerge(self.Handle(), ansiTemplate1, ansiTemplate2, byref(value))
+    self._SetOut(size, value.value)
+    return err
+
   #virtual DWORD  WINAPI  MergeAnsiTemplate(BYTE* ansiTemplate1, BYTE* ansiTemplate2, BYTE* outTemplate) = 0;
+  def MergeAnsiTemplate(self, ansiTemplate1, ansiTemplate2, outTemplate):
+    return self.hlib.SGFPM_MergeAnsiTemplate(self.Handle(), ansiTemplate1, ansiTemplate2, outTemplate)
+
   #virtual DWORD  WINAPI  MergeMultipleAnsiTemplate(BYTE* inTemplates, DWORD nTemplates, BYTE* outTemplate) = 0;
+  # inTemplates: los nTemplates templates seguidos en un mismo buffer
+  def MergeMultipleAnsiTemplate(self, inTemplates, nTemplates, outTemplate):
+    return self.hlib.SGFPM_MergeMultipleAnsiTemplate(self.Handle(), inTemplates, c_ulong(nTemplates), outTemplate)
+
   #virtual DWORD  WINAPI  GetAnsiTemplateInfo(BYTE* ansiTemplate, SGANSITemplateInfo* templateInfo) = 0;
+  def GetAnsiTemplateInfo(self, ansiTemplate, templateInfo):
+    return self.hlib.SGFPM_GetAnsiTemplateInfo(self.Handle(), ansiTemplate, byref(templateInfo))
+
   #virtual DWORD  WINAPI  MatchAnsiTemplate(BYTE*  ansiTemplate1, DWORD  sampleNum1, BYTE*  ansiTemplate2, DWORD sampleNum2, DWORD secuLevel, BOOL*  matched) = 0;
+  # Las funciones ANSI/ISO/Ex no dependen de SetTemplateFormat
+  def MatchAnsiTemplate(self, ansiTemplate1, sampleNum1, ansiTemplate2, sampleNum2, secuLevel, matched):
+    value = c_int(0)
+    err = self.hlib.SGFPM_MatchAnsiTemplate(self.Handle(), ansiTemplate1, c_ulong(sampleNum1),
+                                            ansiTemplate2, c_ulong(sampleNum2), c_ulong(secuLevel), byref(value))
+    self._SetOut(matched, bool(value.value))
+    return err
+
   #virtual DWORD  WINAPI  GetAnsiMatchingScore(BYTE*  ansiTemplate1, DWORD    sampleNum1, BYTE* ansiTemplate2, DWORD sampleNum2, DWORD* score) = 0;
+  def GetAnsiMatchingScore(self, ansiTemplate1, sampleNum1, ansiTemplate2, sampleNum2, score):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetAnsiMatchingScore(self.Handle(), ansiTemplate1, c_ulong(sampleNum1),
+                                               ansiTemplate2, c_ulong(sampleNum2), byref(value))
+    self._SetOut(score, value.value)
+    return err
 
 
   #// Algorithim: Only work with ISO19794 Template
   #virtual DWORD  WINAPI  GetIsoTemplateSizeAfterMerge(BYTE* isoTemplate1, BYTE* isoTemplate2, DWORD* size) = 0;
+  def GetIsoTemplateSizeAfterMerge(self, isoTemplate1, isoTemplate2, size):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetIsoTemplateSizeAfterMerge(self.Handle(), isoTemplate1, isoTemplate2, byref(value))
+    self._SetOut(size, value.value)
+    return err
+
   #virtual DWORD  WINAPI  MergeIsoTemplate(BYTE* isoTemplate1, BYTE* isoTemplate2, BYTE* outTemplate) = 0;
+  def MergeIsoTemplate(self, isoTemplate1, isoTemplate2, outTemplate):
+    return self.hlib.SGFPM_MergeIsoTemplate(self.Handle(), isoTemplate1, isoTemplate2, outTemplate)
+
   #virtual DWORD  WINAPI  MergeMultipleIsoTemplate(BYTE* inTemplates, DWORD nTemplates, BYTE* outTemplate) = 0;
+  def MergeMultipleIsoTemplate(self, inTemplates, nTemplates, outTemplate):
+    return self.hlib.SGFPM_MergeMultipleIsoTemplate(self.Handle(), inTemplates, c_ulong(nTemplates), outTemplate)
+
   #virtual DWORD  WINAPI  GetIsoTemplateInfo(BYTE* isoTemplate, SGISOTemplateInfo* templateInfo) = 0;
+  def GetIsoTemplateInfo(self, isoTemplate, templateInfo):
+    return self.hlib.SGFPM_GetIsoTemplateInfo(self.Handle(), isoTemplate, byref(templateInfo))
+
   #virtual DWORD  WINAPI  MatchIsoTemplate(BYTE*  isoTemplate1, DWORD sampleNum1, BYTE*  isoTemplate2, DWORD sampleNum2, DWORD secuLevel, BOOL*  matched) = 0;
+  def MatchIsoTemplate(self, isoTemplate1, sampleNum1, isoTemplate2, sampleNum2, secuLevel, matched):
+    value = c_int(0)
+    err = self.hlib.SGFPM_MatchIsoTemplate(self.Handle(), isoTemplate1, c_ulong(sampleNum1),
+                                           isoTemplate2, c_ulong(sampleNum2), c_ulong(secuLevel), byref(value))
+    self._SetOut(matched, bool(value.value))
+    return err
+
   #virtual DWORD  WINAPI  GetIsoMatchingScore(BYTE*  isoTemplate1, DWORD sampleNum1, BYTE* isoTemplate2, DWORD sampleNum2, DWORD* score) = 0;
+  def GetIsoMatchingScore(self, isoTemplate1, sampleNum1, isoTemplate2, sampleNum2, score):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetIsoMatchingScore(self.Handle(), isoTemplate1, c_ulong(sampleNum1),
+                                              isoTemplate2, c_ulong(sampleNum2), byref(value))
+    self._SetOut(score, value.value)
+    return err
 
   #// Algorithim: 
   #virtual DWORD  WINAPI  MatchTemplateEx(BYTE*  minTemplate1, WORD tempateType1,  DWORD sampleNum1, BYTE* minTemplate2, WORD tempateType2,  DWORD sampleNum2, DWORD  secuLevel, BOOL*  matched) = 0;
+  # Templates de formatos distintos (SG400, ANSI378, ISO19794) entre sí
+  def MatchTemplateEx(self, minTemplate1, templateType1, sampleNum1, minTemplate2, templateType2, sampleNum2, secuLevel, matched):
+    value = c_int(0)
+    err = self.hlib.SGFPM_MatchTemplateEx(self.Handle(), minTemplate1, c_ushort(templateType1), c_ulong(sampleNum1),
+                                          minTemplate2, c_ushort(templateType2), c_ulong(sampleNum2),
+                                          c_ulong(secuLevel), byref(value))
+    self._SetOut(matched, bool(value.value))
+    return err
+
   #virtual DWORD  WINAPI  GetMatchingScoreEx(BYTE* minTemplate1, WORD tempateType1, DWORD sampleNum1, BYTE* minTemplate2, WORD tempateType2, DWORD sampleNum2, DWORD* score) = 0;
+  def GetMatchingScoreEx(self, minTemplate1, templateType1, sampleNum1, minTemplate2, templateType2, sampleNum2, score):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetMatchingScoreEx(self.Handle(), minTemplate1, c_ushort(templateType1), c_ulong(sampleNum1),
+                                             minTemplate2, c_ushort(templateType2), c_ulong(sampleNum2), byref(value))
+    self._SetOut(score, value.value)
+    return err
 
   #// 2006.6.5, Device Driver
   #virtual  DWORD	WINAPI  SetAutoOnIRLedTouchOn(BOOL iRLed, BOOL touchOn) = 0;
@@ -159,3 +287,81 @@ class PYSGFPLib:
   #virtual DWORD WINAPI		WriteData(unsigned char index, unsigned char data) = 0;
 
 #end class PYSGFPLib
+
+
+class PYSGFPMDevice(PYSGFPLib):
+  '''
+  PYSGFPLib con un objeto SGFPM propio (API C SGFPM_*) en lugar del objeto
+  global de libpysgfplib, para manejar varios lectores a la vez: una instancia
+  por lector, como multidev/main.cpp.
+  '''
+
+  def __init__(self):
+    PYSGFPLib.__init__(self)
+    self.hfpm = c_void_p()
+
+  def Handle(self):
+    return self.hfpm
+
+  def Create(self):
+    if self.hfpm.value:
+      self.Terminate()
+    err = self.hlib.SGFPM_Create(byref(self.hfpm))
+    if err == SGFDxErrorCode.SGFDX_ERROR_NONE:
+      # El objeto C se crea con formato ANSI378; PY_SGFPM_Create usa SG400
+      self.SetTemplateFormat(SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400)
+    return err
+
+  def Terminate(self):
+    if not self.hfpm.value:
+      return SGFDxErrorCode.SGFDX_ERROR_NONE
+    err = self.hlib.SGFPM_Terminate(self.hfpm)
+    self.hfpm = c_void_p()
+    return err
+
+  def Init(self, devName):
+    return self.hlib.SGFPM_Init(self.hfpm, c_ulong(devName))
+
+  def OpenDevice(self, devId):
+    return self.hlib.SGFPM_OpenDevice(self.hfpm, c_ulong(devId))
+
+  def CloseDevice(self):
+    return self.hlib.SGFPM_CloseDevice(self.hfpm)
+
+  def SetLedOn(self, bOn = True):
+    return self.hlib.SGFPM_SetLedOn(self.hfpm, c_int(1 if bOn else 0))
+
+  def GetImage(self, buffer):
+    buffer_type = c_ubyte * len(buffer)
+    return self.hlib.SGFPM_GetImage(self.hfpm, buffer_type.from_buffer(buffer))
+
+  # Los parámetros de salida del llamador (c_int/c_bool) no tienen el tamaño
+  # de DWORD/BOOL: se usa un temporal y se copia con _SetOut
+  def GetImageQuality(self, width, height, imgBuf, quality):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetImageQuality(self.hfpm, c_ulong(width), c_ulong(height), imgBuf, byref(value))
+    self._SetOut(quality, value.value)
+    return err
+
+  def CreateSG400Template(self, rawImage, minTemplate):
+    return self.hlib.SGFPM_CreateTemplate(self.hfpm, None, rawImage, minTemplate)
+
+  def MatchTemplate(self, minTemplate1, minTemplate2, secuLevel, matched):
+    value = c_int(0)
+    err = self.hlib.SGFPM_MatchTemplate(self.hfpm, minTemplate1, minTemplate2, c_ulong(secuLevel), byref(value))
+    self._SetOut(matched, bool(value.value))
+    return err
+
+  def GetMatchingScore(self, minTemplate1, minTemplate2, score):
+    value = c_ulong(0)
+    err = self.hlib.SGFPM_GetMatchingScore(self.hfpm, minTemplate1, minTemplate2, byref(value))
+    self._SetOut(score, value.value)
+    return err
+
+  def __del__(self):
+    try:
+      self.Terminate()
+    except Exception:
+      pass
+
+#end class PYSGFPMDevice
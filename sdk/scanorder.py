@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+'''
+ * scanorder.py
+ * Orden adaptativo de recorrido de la galería para identificaciones 1:N.
+ *
+ * En control de acceso unas pocas personas generan la mayor parte de las
+ * identificaciones. Los templates que identifican se guardan en una LRU
+ * segmentada (SLRU):
+ *   - un primer acierto entra en el segmento de prueba (probation);
+ *   - un segundo acierto lo promueve al segmento protegido, del que solo
+ *     sale degradado a prueba cuando lo desplazan aciertos más recientes.
+ * Así la frecuencia (protegido) y la recencia (orden LRU de cada segmento)
+ * deciden el orden: primero los protegidos, luego los de prueba, cada uno
+ * del más al menos reciente, y después el resto en su orden original.
+ *
+ * Solo reordena búsquedas con salida temprana; una búsqueda exhaustiva
+ * compara todos los candidatos y su resultado no depende del orden.
+ *
+ *   scan = ScanOrder(protected=64, probation=64)
+ *   for template_id in scan.order(candidatos): ...
+ *   scan.hit('huella_7')
+ *   scan.record(comparisons=3, identified=True, early_exit=True, hot=True)
+'''
+
+from collections import OrderedDict
+import threading
+
+DEFAULT_PROTECTED = 64
+DEFAULT_PROBATION = 64
+
+
+class ScanOrder:
+    """LRU segmentada de los templates que identifican y métricas de búsqueda"""
+
+    def __init__(self, protected=DEFAULT_PROTECTED, probation=DEFAULT_PROBATION):
+        self.protected_size = protected
+        self.probation_size = probation
+        self.lock = threading.Lock()
+        self.protected = OrderedDict()  # template_id -> None, de menos a más reciente
+        self.probation = OrderedDict()
+        self.identifications = 0
+        self.successes = 0
+        self.success_comparisons = 0    # comparaciones de las identificaciones con éxito
+        self.early_exits = 0
+        self.hot_hits = 0               # éxitos cuyo template ya estaba en el conjunto caliente
+
+    def hit(self, template_id):
+        """Registra que template_id identificó a alguien"""
+        with self.lock:
+            if template_id in self.protected:
+                self.protected.move_to_end(template_id)
+                return
+            if template_id in self.probation:
+                del self.probation[template_id]
+                self.protected[template_id] = None
+                if len(self.protected) > self.protected_size:
+                    demoted, _ = self.protected.popitem(last=False)
+                    self.probation[demoted] = None
+            else:
+                self.probation[template_id] = None
+            while len(self.probation) > self.probation_size:
+                self.probation.popitem(last=False)
+
+    def remove(self, template_id):
+        with self.lock:
+            self.protected.pop(template_id, None)
+            self.probation.pop(template_id, None)
+
+    def __contains__(self, template_id):
+        return template_id in self.protected or template_id in self.probation
+
+    def hot(self):
+        """Templates calientes en orden de recorrido"""
+        with self.lock:
+            return list(reversed(self.protected)) + list(reversed(self.probation))
+
+    def order(self, template_ids):
+        """template_ids con los calientes delante; el resto conserva su orden"""
+        candidates = set(template_ids)
+        hot = [template_id for template_id in self.hot() if template_id in candidates]
+        if not hot:
+            return list(template_ids)
+        first = set(hot)
+        return hot + [template_id for template_id in template_ids if template_id not in first]
+
+    def record(self, comparisons, identified, early_exit=False, hot=False):
+        """Métricas de una identificación"""
+        with self.lock:
+            self.identifications += 1
+            self.early_exits += bool(early_exit)
+            if identified:
+                self.successes += 1
+                self.success_comparisons += comparisons
+                self.hot_hits += bool(hot)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'protected': len(self.protected),
+                'probation': len(self.probation),
+                'identifications': self.identifications,
+                'successes': self.successes,
+                'avg_comparisons_per_success':
+                    self.success_comparisons / self.successes if self.successes else 0.0,
+                'early_exits': self.early_exits,
+                'hot_hit_rate': self.hot_hits / self.successes if self.successes else 0.0,
+            }
@@ -6,4 +6,12 @@ class SGFDxErrorCode:
     SGFDX_ERROR_NOT_USED = 4
     SGFDX_ERROR_DLLLOAD_FAILED = 5
     SGFDX_ERROR_DLLLOAD_FAILED_DRV = 6
-    SGFDX_ERROR_DLLLOAD_FAILED_ALGO = 7 
\ No newline at end of file
+    SGFDX_ERROR_DLLLOAD_FAILED_ALGO = 7 
+    SGFDX_ERROR_NO_LONGER_SUPPORTED = 8
+    # Errores de extracción y matching
+    SGFDX_ERROR_FEAT_NUMBER = 101
+    SGFDX_ERROR_INVALID_TEMPLATE_TYPE = 102
+    SGFDX_ERROR_INVALID_TEMPLATE1 = 103
+    SGFDX_ERROR_INVALID_TEMPLATE2 = 104
+    SGFDX_ERROR_EXTRACT_FAIL = 105
+    SGFDX_ERROR_MATCH_FAIL = 106
@@ -0,0 +1,79 @@
+from ctypes import Structure, c_ubyte, c_ulong, c_ushort
+
+# Tipos de include/sgfplib.h en Linux x86_64: DWORD = unsigned long (8 bytes),
+# WORD = unsigned short, BYTE = unsigned char
+SGDEV_SN_LEN = 15  # Longitud del número de serie del lector
+SG_MAX_TEMPLATE_SAMPLES = 225  # 15 dedos x 15 vistas por template ANSI/ISO
+
+
+class SGDeviceList(Structure):
+    """Elemento de la lista devuelta por EnumerateDevice()"""
+    _fields_ = [
+        ('DevName', c_ulong),
+        ('DevID', c_ulong),
+        ('DevType', c_ushort),
+        ('DevSN', c_ubyte * (SGDEV_SN_LEN + 1)),
+    ]
+
+    @property
+    def serial(self):
+        return bytes(self.DevSN).split(b'\0', 1)[0].decode('ascii', 'replace')
+
+
+class SGDeviceInfoParam(Structure):
+    """Información del lector abierto, rellenada por GetDeviceInfo()"""
+    _fields_ = [
+        ('DeviceID', c_ulong),
+        ('DeviceSN', c_ubyte * (SGDEV_SN_LEN + 1)),
+        ('ComPort', c_ulong),
+        ('ComSpeed', c_ulong),
+        ('ImageWidth', c_ulong),
+        ('ImageHeight', c_ulong),
+        ('Contrast', c_ulong),
+        ('Brightness', c_ulong),
+        ('Gain', c_ulong),
+        ('ImageDPI', c_ulong),
+        ('FWVersion', c_ulong),
+    ]
+
+    @property
+    def serial(self):
+        return bytes(self.DeviceSN).split(b'\0', 1)[0].decode('ascii', 'replace')
+
+    def as_dict(self):
+        return {
+            'device_id': self.DeviceID,
+            'serial': self.serial,
+            'width': self.ImageWidth,
+            'height': self.ImageHeight,
+            'dpi': self.ImageDPI,
+            'firmware': f'{self.FWVersion:04X}',
+            'contrast': self.Contrast,
+            'brightness': self.Brightness,
+            'gain': self.Gain,
+        }
+
+
+class SGFingerInfo(Structure):
+    """Datos del dedo para CreateTemplate() (cabecera de ANSI378/ISO19794)"""
+    _fields_ = [
+        ('FingerNumber', c_ushort),
+        ('ViewNumber', c_ushort),
+        ('ImpressionType', c_ushort),
+        ('ImageQuality', c_ushort),
+    ]
+
+
+class SGANSITemplateInfo(Structure):
+    """Muestras (dedo y vista) de un template ANSI378 o ISO19794"""
+    _fields_ = [
+        ('TotalSamples', c_ulong),
+        ('SampleInfo', SGFingerInfo * SG_MAX_TEMPLATE_SAMPLES),
+    ]
+
+    def samples(self):
+        return [{'finger': info.FingerNumber, 'view': info.ViewNumber, 'quality': info.ImageQuality}
+                for info in self.SampleInfo[:min(self.TotalSamples, SG_MAX_TEMPLATE_SAMPLES)]]
+
+
+SGISOTemplateInfo = SGANSITemplateInfo
@@ -0,0 +1,12 @@
+class SGFDxTemplateFormat:
+    TEMPLATE_FORMAT_ANSI378 = 0x0100
+    TEMPLATE_FORMAT_SG400 = 0x0200
+    TEMPLATE_FORMAT_ISO19794 = 0x0300
+
+# Nombres aceptados por la API REST
+TEMPLATE_FORMATS = {
+    'sg400': SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400,
+    'ansi378': SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378,
+    'iso19794': SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794,
+}
+TEMPLATE_FORMAT_NAMES = {value: name for name, value in TEMPLATE_FORMATS.items()}
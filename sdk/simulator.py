@@ -0,0 +1,712 @@
+#! /usr/bin/env python
+'''
+ * simulator.py
+ * Lector SecuGen simulado, compatible con la interfaz de PYSGFPLib.
+ *
+ * Permite ejecutar la API, las pruebas de stress y los benchmarks en
+ * máquinas sin lector ni dedo humano (CI). Se activa con la variable de
+ * entorno SECUGEN_BACKEND=simulator.
+ *
+ * Configuración (variables de entorno, leídas al crear cada instancia):
+ *   SECUGEN_SIM_DEVICE         Modelo simulado: FDU03 (260x300, por defecto),
+ *                              FDU04 (258x336), FDU05 (300x400), FDU06 (300x400)
+ *   SECUGEN_SIM_DEVICES        Lectores conectados que devuelve EnumerateDevice (1)
+ *   SECUGEN_SIM_FRAMES         Imágenes .raw separadas por ':' (por defecto las
+ *                              muestras del repositorio)
+ *   SECUGEN_SIM_FRAME_ORDER    'secuencial' (por defecto) o 'aleatorio'
+ *   SECUGEN_SIM_CAPTURE_MS     Latencia de GetImage en milisegundos (0)
+ *   SECUGEN_SIM_JITTER_MS      Variación aleatoria de la latencia (0)
+ *   SECUGEN_SIM_FAILURE_RATE   Probabilidad de fallo por llamada (0.0)
+ *   SECUGEN_SIM_FAILURE_CODES  Códigos a inyectar, p.ej. '2,3,4,5' (2)
+ *   SECUGEN_SIM_FAILURE_CALLS  Llamadas afectadas, p.ej. 'GetImage,SetLedOn'
+ *                              (GetImage)
+ *   SECUGEN_SIM_MATCHER        'auto' (por defecto), 'native' o 'builtin'
+ *   SECUGEN_SIM_SEED           Semilla para resultados reproducibles (0)
+ *
+ * Con SECUGEN_SIM_MATCHER=native/auto la extracción y el matching usan el
+ * algoritmo real de libsgfplib (SGFPM_Init con el tipo de dispositivo no
+ * necesita hardware). Si la librería no puede cargarse, 'auto' recurre a un
+ * matcher aproximado en Python puro que solo sirve para pruebas.
+'''
+
+from ctypes import *
+from .sgfdxerrorcode import *
+from .sgfdxsecuritylevel import *
+from .sgfdxstructs import *
+from .sgfdxtemplateformat import *
+import os
+import random
+import threading
+import time
+
+_current_dir = os.path.dirname(os.path.abspath(__file__))
+_repo_dir = os.path.join(_current_dir, '..')
+
+# Geometría de cada modelo y código SG_DEV_* que entiende SGFPM_Init()
+DEVICE_PROFILES = {
+    'FDU03': {'dev_name': 0x04, 'width': 260, 'height': 300, 'dpi': 500},
+    'FDU04': {'dev_name': 0x05, 'width': 258, 'height': 336, 'dpi': 500},
+    'FDU05': {'dev_name': 0x06, 'width': 300, 'height': 400, 'dpi': 500},
+    'FDU06': {'dev_name': 0x07, 'width': 300, 'height': 400, 'dpi': 500},
+}
+
+# Muestras incluidas en el repositorio, con su geometría original
+DEFAULT_FRAMES = [
+    os.path.join(_repo_dir, 'java', 'left thumb1.raw'),
+    os.path.join(_repo_dir, 'java', 'left thumb2.raw'),
+    os.path.join(_repo_dir, 'java', 'left thumb_ex.raw'),
+    os.path.join(_repo_dir, 'bin', 'linux3', 'test_auto_on_finger.raw'),
+]
+FRAME_GEOMETRY_BY_SIZE = {
+    260 * 300: (260, 300),
+    258 * 336: (258, 336),
+    300 * 400: (300, 400),
+}
+
+# Umbral de score por nivel de seguridad para el matcher aproximado
+# (escala 0-199 como GetMatchingScore del SDK)
+BUILTIN_SCORE_THRESHOLDS = {
+    SGFDxSecurityLevel.SL_NONE: 0,
+    SGFDxSecurityLevel.SL_LOWEST: 30,
+    SGFDxSecurityLevel.SL_LOWER: 50,
+    SGFDxSecurityLevel.SL_LOW: 60,
+    SGFDxSecurityLevel.SL_BELOW_NORMAL: 70,
+    SGFDxSecurityLevel.SL_NORMAL: 80,
+    SGFDxSecurityLevel.SL_ABOVE_NORMAL: 90,
+    SGFDxSecurityLevel.SL_HIGH: 100,
+    SGFDxSecurityLevel.SL_HIGHER: 120,
+    SGFDxSecurityLevel.SL_HIGHEST: 140,
+}
+
+SIMULATED_FW_VERSION = 0x0100
+BUILTIN_TEMPLATE_MAGIC = b'SIM1'
+BUILTIN_TEMPLATE_SIZE = 400  # como SG400: GetTemplateSize siempre devuelve 400
+BUILTIN_GRID = (16, 24)  # columnas x filas de la firma de la imagen
+
+
+def _env_list(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class SimulatorConfig:
+    """Parámetros del lector simulado (por defecto, desde el entorno)"""
+
+    def __init__(self):
+        device = os.environ.get('SECUGEN_SIM_DEVICE', 'FDU03').upper()
+        if device not in DEVICE_PROFILES:
+            raise ValueError(f"SECUGEN_SIM_DEVICE desconocido: {device}")
+        self.device = device
+        self.devices = max(1, int(os.environ.get('SECUGEN_SIM_DEVICES', '1')))
+        frames = os.environ.get('SECUGEN_SIM_FRAMES')
+        self.frames = frames.split(':') if frames else list(DEFAULT_FRAMES)
+        self.frame_order = os.environ.get('SECUGEN_SIM_FRAME_ORDER', 'secuencial')
+        self.capture_ms = float(os.environ.get('SECUGEN_SIM_CAPTURE_MS', '0'))
+        self.jitter_ms = float(os.environ.get('SECUGEN_SIM_JITTER_MS', '0'))
+        self.failure_rate = float(os.environ.get('SECUGEN_SIM_FAILURE_RATE', '0'))
+        self.failure_codes = [int(c) for c in _env_list('SECUGEN_SIM_FAILURE_CODES', ['2'])]
+        self.failure_calls = set(_env_list('SECUGEN_SIM_FAILURE_CALLS', ['GetImage']))
+        self.matcher = os.environ.get('SECUGEN_SIM_MATCHER', 'auto')
+        self.seed = int(os.environ.get('SECUGEN_SIM_SEED', '0'))
+
+    @property
+    def profile(self):
+        return DEVICE_PROFILES[self.device]
+
+
+def _load_frame(path, width, height):
+    """Lee una imagen .raw y la recorta/rellena (centrada) a width x height"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    src_w, src_h = FRAME_GEOMETRY_BY_SIZE.get(len(data), (width, len(data) // width))
+    if (src_w, src_h) == (width, height):
+        return bytes(data)
+
+    frame = bytearray(b'\xff' * (width * height))  # fondo blanco, como el sensor
+    off_x = (src_w - width) // 2
+    off_y = (src_h - height) // 2
+    for y in range(height):
+        sy = y + off_y
+        if sy < 0 or sy >= src_h:
+            continue
+        x0 = max(0, -off_x)
+        x1 = min(width, src_w - off_x)
+        if x1 <= x0:
+            continue
+        row = data[sy * src_w + x0 + off_x: sy * src_w + x1 + off_x]
+        frame[y * width + x0: y * width + x1] = row
+    return bytes(frame)
+
+
+class _NativeAlgorithm:
+    """Extracción y matching con el algoritmo real de libsgfplib, sin sensor"""
+
+    def __init__(self, dev_name):
+        lib_dir = os.path.join(_repo_dir, 'lib', 'linux3')
+        # libpysgfplib declara las dependencias (libsgfdu0x, libsgfpamx,
+        # libsgnfiq) que libsgfplib necesita pero no enlaza por sí misma
+        CDLL(os.path.join(lib_dir, 'libpysgfplib.so'))
+        self.clib = CDLL(os.path.join(lib_dir, 'libsgfplib.so'))
+        self.handle = c_void_p()
+        err = self.clib.SGFPM_Create(byref(self.handle))
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            raise OSError(f"SGFPM_Create falló: {err}")
+        err = self.clib.SGFPM_Init(self.handle, c_ulong(dev_name))
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            raise OSError(f"SGFPM_Init falló: {err}")
+        self.set_format(SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400)
+
+    def __del__(self):
+        if getattr(self, 'handle', None) and self.handle.value:
+            self.clib.SGFPM_Terminate(self.handle)
+            self.handle = None
+
+    def set_format(self, template_format):
+        return self.clib.SGFPM_SetTemplateFormat(self.handle, c_ushort(template_format))
+
+    def max_template_size(self):
+        size = c_ulong(0)
+        err = self.clib.SGFPM_GetMaxTemplateSize(self.handle, byref(size))
+        return err, size.value
+
+    def template_size(self, template):
+        size = c_ulong(0)
+        err = self.clib.SGFPM_GetTemplateSize(self.handle, template, byref(size))
+        return err, size.value
+
+    def create_template(self, raw_image, template, finger_info=None):
+        info = byref(finger_info) if finger_info is not None else None
+        return self.clib.SGFPM_CreateTemplate(self.handle, info, raw_image, template)
+
+    def template_info(self, template, template_format, info):
+        name = 'SGFPM_GetIsoTemplateInfo' if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794 else 'SGFPM_GetAnsiTemplateInfo'
+        return getattr(self.clib, name)(self.handle, template, byref(info))
+
+    def matching_score_ex(self, template1, type1, sample1, template2, type2, sample2):
+        score = c_ulong(0)
+        err = self.clib.SGFPM_GetMatchingScoreEx(self.handle, template1, c_ushort(type1), c_ulong(sample1),
+                                                 template2, c_ushort(type2), c_ulong(sample2), byref(score))
+        return err, score.value
+
+    def match_ex(self, template1, type1, sample1, template2, type2, sample2, secu_level):
+        matched = c_int(0)
+        err = self.clib.SGFPM_MatchTemplateEx(self.handle, template1, c_ushort(type1), c_ulong(sample1),
+                                              template2, c_ushort(type2), c_ulong(sample2),
+                                              c_ulong(secu_level), byref(matched))
+        return err, bool(matched.value)
+
+    def template_size_after_merge(self, template1, template2, template_format):
+        name = 'SGFPM_GetIsoTemplateSizeAfterMerge' if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794 else 'SGFPM_GetTemplateSizeAfterMerge'
+        size = c_ulong(0)
+        err = getattr(self.clib, name)(self.handle, template1, template2, byref(size))
+        return err, size.value
+
+    def merge(self, template1, template2, out_template, template_format):
+        name = 'SGFPM_MergeIsoTemplate' if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794 else 'SGFPM_MergeAnsiTemplate'
+        return getattr(self.clib, name)(self.handle, template1, template2, out_template)
+
+    def merge_multiple(self, templates, count, out_template, template_format):
+        name = 'SGFPM_MergeMultipleIsoTemplate' if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794 else 'SGFPM_MergeMultipleAnsiTemplate'
+        return getattr(self.clib, name)(self.handle, templates, c_ulong(count), out_template)
+
+    def matching_score(self, template1, template2):
+        score = c_ulong(0)
+        err = self.clib.SGFPM_GetMatchingScore(self.handle, template1, template2, byref(score))
+        return err, score.value
+
+    def match(self, template1, template2, secu_level):
+        matched = c_int(0)
+        err = self.clib.SGFPM_MatchTemplate(self.handle, template1, template2,
+                                            c_ulong(secu_level), byref(matched))
+        return err, bool(matched.value)
+
+    def image_quality(self, width, height, image):
+        quality = c_ulong(0)
+        err = self.clib.SGFPM_GetImageQuality(self.handle, c_ulong(width), c_ulong(height),
+                                              image, byref(quality))
+        return err, quality.value
+
+
+class _BuiltinAlgorithm:
+    """Matcher aproximado en Python puro (solo para pruebas sin librerías nativas).
+
+    El "template" es una firma de 16x24 medias de bloque de la imagen y el score
+    es su correlación normalizada escalada a 0-199. Capturas de la misma imagen
+    dan 199; no distingue dedos como el algoritmo de SecuGen.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def _signature(self, image):
+        cols, rows = BUILTIN_GRID
+        bw = self.width // cols
+        bh = self.height // rows
+        values = []
+        for r in range(rows):
+            for c in range(cols):
+                total = 0
+                for y in range(r * bh, (r + 1) * bh):
+                    start = y * self.width + c * bw
+                    total += sum(image[start:start + bw])
+                values.append(total // (bw * bh))
+        return bytes(values)
+
+    def set_format(self, template_format):
+        if template_format != SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+            return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def max_template_size(self):
+        return SGFDxErrorCode.SGFDX_ERROR_NONE, BUILTIN_TEMPLATE_SIZE
+
+    def template_size(self, template):
+        return SGFDxErrorCode.SGFDX_ERROR_NONE, BUILTIN_TEMPLATE_SIZE
+
+    def template_info(self, template, template_format, info):
+        return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE
+
+    def matching_score_ex(self, template1, type1, sample1, template2, type2, sample2):
+        if type1 != SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400 or type2 != SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+            return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE, 0
+        return self.matching_score(template1, template2)
+
+    def match_ex(self, template1, type1, sample1, template2, type2, sample2, secu_level):
+        if type1 != SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400 or type2 != SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400:
+            return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE, False
+        return self.match(template1, template2, secu_level)
+
+    # Sin templates ANSI/ISO no hay nada que fusionar
+
+    def template_size_after_merge(self, template1, template2, template_format):
+        return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE, 0
+
+    def merge(self, template1, template2, out_template, template_format):
+        return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE
+
+    def merge_multiple(self, templates, count, out_template, template_format):
+        return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE
+
+    def create_template(self, raw_image, template, finger_info=None):
+        image = _as_bytes(raw_image, self.width * self.height)
+        if len(image) < self.width * self.height:
+            return SGFDxErrorCode.SGFDX_ERROR_INVALID_PARAM
+        payload = BUILTIN_TEMPLATE_MAGIC + self._signature(image)
+        memmove(template, payload, len(payload))
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def matching_score(self, template1, template2):
+        size = len(BUILTIN_TEMPLATE_MAGIC) + BUILTIN_GRID[0] * BUILTIN_GRID[1]
+        t1 = _as_bytes(template1, size)
+        t2 = _as_bytes(template2, size)
+        magic = BUILTIN_TEMPLATE_MAGIC
+        if not t1.startswith(magic) or not t2.startswith(magic):
+            return SGFDxErrorCode.SGFDX_ERROR_INVALID_PARAM, 0
+        a = t1[len(magic):]
+        b = t2[len(magic):]
+        n = len(a)
+        mean_a = sum(a) / n
+        mean_b = sum(b) / n
+        cov = sum((x - mean_a) * (y - mean_b) for x, y in zip(a, b))
+        var_a = sum((x - mean_a) ** 2 for x in a)
+        var_b = sum((y - mean_b) ** 2 for y in b)
+        if var_a == 0 or var_b == 0:
+            ncc = 1.0 if a == b else 0.0
+        else:
+            ncc = cov / (var_a * var_b) ** 0.5
+        return SGFDxErrorCode.SGFDX_ERROR_NONE, int(round(max(0.0, ncc) * 199))
+
+    def match(self, template1, template2, secu_level):
+        err, score = self.matching_score(template1, template2)
+        threshold = BUILTIN_SCORE_THRESHOLDS.get(secu_level, BUILTIN_SCORE_THRESHOLDS[SGFDxSecurityLevel.SL_NORMAL])
+        return err, err == SGFDxErrorCode.SGFDX_ERROR_NONE and score >= threshold
+
+    def image_quality(self, width, height, image):
+        # Proporción de píxeles oscuros (crestas) como estimación de calidad
+        data = _as_bytes(image, width * height)
+        dark = sum(1 for b in data[::7] if b < 128)
+        return SGFDxErrorCode.SGFDX_ERROR_NONE, min(100, int(dark * 7 * 250 / max(1, len(data))))
+
+
+def _as_bytes(buf, size):
+    """Primeros `size` bytes de un bytes/bytearray o de un buffer ctypes"""
+    if isinstance(buf, (bytes, bytearray)):
+        return bytes(buf[:size])
+    return string_at(buf, size)
+
+
+def _set_out(target, value):
+    """Escribe en un parámetro de salida pasado con byref() o directamente"""
+    target = getattr(target, '_obj', target)
+    target.value = value
+
+
+class SimulatedSGFPLib:
+    """Sustituto de PYSGFPLib que no necesita lector físico"""
+
+    constant_sg400_template_size = 400
+
+    def __init__(self, config=None):
+        self.data = []
+        self.config = config or SimulatorConfig()
+        profile = self.config.profile
+        self.width = profile['width']
+        self.height = profile['height']
+        self.created = False
+        self.initialized = False
+        self.device_open = False
+        self.device_id = None
+        self.device_list = None  # mantiene viva la lista de EnumerateDevice
+        self.led_on = False
+        self.algorithm = None
+        self.template_format = SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400
+        self.frames = [_load_frame(path, self.width, self.height) for path in self.config.frames]
+        if not self.frames:
+            raise ValueError("El simulador necesita al menos una imagen")
+        self.frame_index = 0
+        self.random = random.Random(self.config.seed)
+        self.scripted_failures = {}  # llamada -> [códigos pendientes]
+        self.lock = threading.Lock()
+        self.stats = {'calls': {}, 'injected_failures': 0, 'frames_served': 0}
+
+    # Inyección de fallos -------------------------------------------------
+
+    def inject_failure(self, call, code=SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED, times=1):
+        """Programa que las próximas `times` llamadas a `call` devuelvan `code`"""
+        with self.lock:
+            self.scripted_failures.setdefault(call, []).extend([code] * times)
+
+    def _fault(self, call):
+        with self.lock:
+            self.stats['calls'][call] = self.stats['calls'].get(call, 0) + 1
+            pending = self.scripted_failures.get(call)
+            if pending:
+                self.stats['injected_failures'] += 1
+                return pending.pop(0)
+            if (self.config.failure_rate > 0 and call in self.config.failure_calls
+                    and self.random.random() < self.config.failure_rate):
+                self.stats['injected_failures'] += 1
+                return self.random.choice(self.config.failure_codes)
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def _load_algorithm(self):
+        mode = self.config.matcher
+        if mode in ('auto', 'native'):
+            try:
+                return _NativeAlgorithm(self.config.profile['dev_name'])
+            except OSError as e:
+                if mode == 'native':
+                    raise
+                print(f"Simulador: algoritmo nativo no disponible ({e}), usando matcher aproximado")
+        return _BuiltinAlgorithm(self.width, self.height)
+
+    # Ciclo de vida -------------------------------------------------------
+
+    def Create(self):
+        err = self._fault('Create')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        self.created = True
+        self.initialized = False
+        self.device_open = False
+        self.template_format = SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def Terminate(self):
+        self.algorithm = None
+        self.created = False
+        self.initialized = False
+        self.device_open = False
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def Init(self, devName=1):
+        err = self._fault('Init')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.created:
+            return SGFDxErrorCode.SGFDX_ERROR_CREATION_FAILED
+        if self.algorithm is None:
+            self.algorithm = self._load_algorithm()
+        self.algorithm.set_format(self.template_format)
+        self.initialized = True
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def serial_number(self, devId):
+        return f"SIM{self.config.device}{devId:07d}"
+
+    def EnumerateDevice(self, ndevs, devList):
+        err = self._fault('EnumerateDevice')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        count = self.config.devices
+        self.device_list = (SGDeviceList * count)()
+        for dev_id, entry in enumerate(self.device_list):
+            entry.DevName = self.config.profile['dev_name']
+            entry.DevID = dev_id
+            serial = self.serial_number(dev_id).encode('ascii')[:SGDEV_SN_LEN]
+            entry.DevSN[:len(serial)] = serial
+        _set_out(ndevs, count)
+        getattr(devList, '_obj', devList).contents = self.device_list[0]
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def OpenDevice(self, devId):
+        err = self._fault('OpenDevice')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        if not 0 <= devId < self.config.devices:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        self.device_open = True
+        self.device_id = devId
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def CloseDevice(self):
+        self.device_open = False
+        self.led_on = False
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    # Sensor --------------------------------------------------------------
+
+    def GetDeviceInfoParam(self, pInfo):
+        err = self._fault('GetDeviceInfoParam')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.device_open:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        info = getattr(pInfo, '_obj', pInfo)
+        info.DeviceID = self.device_id
+        serial = self.serial_number(self.device_id).encode('ascii')[:SGDEV_SN_LEN]
+        info.DeviceSN[:len(serial)] = serial
+        info.ImageWidth = self.width
+        info.ImageHeight = self.height
+        info.ImageDPI = self.config.profile['dpi']
+        info.FWVersion = SIMULATED_FW_VERSION
+        info.Contrast = 50
+        info.Brightness = 50
+        info.Gain = 1
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def GetDeviceInfo(self, imageWidth, imageHeight):
+        info = SGDeviceInfoParam()
+        err = self.GetDeviceInfoParam(info)
+        if err == SGFDxErrorCode.SGFDX_ERROR_NONE:
+            _set_out(imageWidth, info.ImageWidth)
+            _set_out(imageHeight, info.ImageHeight)
+        return err
+
+    def SetLedOn(self, bOn=True):
+        err = self._fault('SetLedOn')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.device_open:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        self.led_on = bool(bOn)
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def _next_frame(self):
+        with self.lock:
+            if self.config.frame_order == 'aleatorio':
+                frame = self.random.choice(self.frames)
+            else:
+                frame = self.frames[self.frame_index % len(self.frames)]
+                self.frame_index += 1
+            self.stats['frames_served'] += 1
+        return frame
+
+    def GetImage(self, buffer):
+        latency = self.config.capture_ms
+        if self.config.jitter_ms:
+            latency += self.random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000.0)
+
+        err = self._fault('GetImage')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.device_open:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        if len(buffer) < self.width * self.height:
+            return SGFDxErrorCode.SGFDX_ERROR_INVALID_PARAM
+
+        frame = self._next_frame()
+        buffer[:len(frame)] = frame
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def GetImageQuality(self, width, height, imgBuf, quality):
+        err = self._fault('GetImageQuality')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        err, value = self.algorithm.image_quality(width, height, imgBuf)
+        _set_out(quality, value)
+        return err
+
+    # Algoritmo -----------------------------------------------------------
+
+    def CreateSG400Template(self, rawImage, minTemplate):
+        err = self._fault('CreateSG400Template')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        return self.algorithm.create_template(rawImage, minTemplate)
+
+    def SetTemplateFormat(self, format):
+        if self.algorithm is not None:
+            err = self.algorithm.set_format(format)
+            if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+                return err
+        self.template_format = format
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def GetMaxTemplateSize(self, size):
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        err, value = self.algorithm.max_template_size()
+        _set_out(size, value)
+        return err
+
+    def CreateTemplate(self, fpInfo, rawImage, minTemplate):
+        err = self._fault('CreateTemplate')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        return self.algorithm.create_template(rawImage, minTemplate, fpInfo)
+
+    def GetTemplateSize(self, buf, size):
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        err, value = self.algorithm.template_size(buf)
+        _set_out(size, value)
+        return err
+
+    def GetAnsiTemplateInfo(self, ansiTemplate, templateInfo):
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        return self.algorithm.template_info(ansiTemplate, SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378, templateInfo)
+
+    def GetIsoTemplateInfo(self, isoTemplate, templateInfo):
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        return self.algorithm.template_info(isoTemplate, SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794, templateInfo)
+
+    def MatchTemplate(self, minTemplate1, minTemplate2, secuLevel, matched):
+        err = self._fault('MatchTemplate')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        err, value = self.algorithm.match(minTemplate1, minTemplate2, secuLevel)
+        _set_out(matched, value)
+        return err
+
+    def GetMatchingScore(self, minTemplate1, minTemplate2, score):
+        err = self._fault('GetMatchingScore')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        err, value = self.algorithm.matching_score(minTemplate1, minTemplate2)
+        _set_out(score, value)
+        return err
+
+    # ANSI378 / ISO19794 / formatos mixtos: no dependen de SetTemplateFormat
+
+    def MatchTemplateEx(self, minTemplate1, templateType1, sampleNum1, minTemplate2, templateType2, sampleNum2, secuLevel, matched):
+        err = self._fault('MatchTemplate')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        err, value = self.algorithm.match_ex(minTemplate1, templateType1, sampleNum1,
+                                             minTemplate2, templateType2, sampleNum2, secuLevel)
+        _set_out(matched, value)
+        return err
+
+    def GetMatchingScoreEx(self, minTemplate1, templateType1, sampleNum1, minTemplate2, templateType2, sampleNum2, score):
+        err = self._fault('GetMatchingScore')
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        err, value = self.algorithm.matching_score_ex(minTemplate1, templateType1, sampleNum1,
+                                                      minTemplate2, templateType2, sampleNum2)
+        _set_out(score, value)
+        return err
+
+    def MatchAnsiTemplate(self, ansiTemplate1, sampleNum1, ansiTemplate2, sampleNum2, secuLevel, matched):
+        ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+        return self.MatchTemplateEx(ansiTemplate1, ansi, sampleNum1, ansiTemplate2, ansi, sampleNum2, secuLevel, matched)
+
+    def GetAnsiMatchingScore(self, ansiTemplate1, sampleNum1, ansiTemplate2, sampleNum2, score):
+        ansi = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+        return self.GetMatchingScoreEx(ansiTemplate1, ansi, sampleNum1, ansiTemplate2, ansi, sampleNum2, score)
+
+    def MatchIsoTemplate(self, isoTemplate1, sampleNum1, isoTemplate2, sampleNum2, secuLevel, matched):
+        iso = SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794
+        return self.MatchTemplateEx(isoTemplate1, iso, sampleNum1, isoTemplate2, iso, sampleNum2, secuLevel, matched)
+
+    def GetIsoMatchingScore(self, isoTemplate1, sampleNum1, isoTemplate2, sampleNum2, score):
+        iso = SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794
+        return self.GetMatchingScoreEx(isoTemplate1, iso, sampleNum1, isoTemplate2, iso, sampleNum2, score)
+
+    # Fusión de templates: como en libsgfplib, sobre el formato de SetTemplateFormat
+
+    def _merge_format(self, template_format):
+        if not self.initialized:
+            return SGFDxErrorCode.SGFDX_ERROR_FUNCTION_FAILED
+        if self.template_format != template_format:
+            return SGFDxErrorCode.SGFDX_ERROR_INVALID_TEMPLATE_TYPE
+        return SGFDxErrorCode.SGFDX_ERROR_NONE
+
+    def GetTemplateSizeAfterMerge(self, ansiTemplate1, ansiTemplate2, size):
+        err = self._merge_format(SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        err, value = self.algorithm.template_size_after_merge(ansiTemplate1, ansiTemplate2,
+                                                              SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378)
+        _set_out(size, value)
+        return err
+
+    def MergeAnsiTemplate(self, ansiTemplate1, ansiTemplate2, outTemplate):
+        err = self._merge_format(SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        return self.algorithm.merge(ansiTemplate1, ansiTemplate2, outTemplate, SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378)
+
+    def MergeMultipleAnsiTemplate(self, inTemplates, nTemplates, outTemplate):
+        err = self._merge_format(SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        return self.algorithm.merge_multiple(inTemplates, nTemplates, outTemplate,
+                                             SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378)
+
+    def GetIsoTemplateSizeAfterMerge(self, isoTemplate1, isoTemplate2, size):
+        err = self._merge_format(SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        err, value = self.algorithm.template_size_after_merge(isoTemplate1, isoTemplate2,
+                                                              SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+        _set_out(size, value)
+        return err
+
+    def MergeIsoTemplate(self, isoTemplate1, isoTemplate2, outTemplate):
+        err = self._merge_format(SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        return self.algorithm.merge(isoTemplate1, isoTemplate2, outTemplate, SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+
+    def MergeMultipleIsoTemplate(self, inTemplates, nTemplates, outTemplate):
+        err = self._merge_format(SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+        if err != SGFDxErrorCode.SGFDX_ERROR_NONE:
+            return err
+        return self.algorithm.merge_multiple(inTemplates, nTemplates, outTemplate,
+                                             SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+
+#end class SimulatedSGFPLib
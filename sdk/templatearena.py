@@ -0,0 +1,223 @@
+#! /usr/bin/env python
+'''
+ * templatearena.py
+ * Templates de la galería empaquetados en huecos de tamaño fijo dentro de
+ * bloques NumPy, en lugar de un objeto bytes y una GalleryEntry por template.
+ *
+ * Cada hueco es un registro de tamaño fijo: cabecera de 40 bytes (longitud,
+ * formato, dedo, calidad, seq, hora de alta, digest) seguida del template.
+ * Los huecos se agrupan en clases de tamaño de SLOT_ALIGN en SLOT_ALIGN
+ * bytes (un SG400 de 400 bytes va a la clase de 400, un ANSI de 250 a la de
+ * 256), cada clase con sus propios bloques:
+ *   - el primer bloque de una clase tiene FIRST_BLOCK_ROWS huecos y cada uno
+ *     el doble hasta BLOCK_ROWS; los bloques no se mueven al crecer, así que
+ *     una vista de un hueco sigue siendo válida;
+ *   - una baja deja el hueco en la lista libre de su clase y la siguiente
+ *     alta de esa clase lo reutiliza.
+ * Un template se identifica con un handle entero: (fila << 16) | clase.
+ *
+ * view() da el template como buffer ctypes sobre el propio bloque, que se
+ * pasa al SDK sin copiarlo (sdk/matcherpool.match_templates).
+ *
+ * Las escrituras (store, set_seq, free) las serializa quien usa la arena
+ * (Gallery con su lock); las lecturas no toman lock. La arena no sabe qué
+ * lectores siguen usando un hueco: Gallery solo llama a free() cuando
+ * ninguna instantánea publicada lo puede leer.
+ *
+ *   arena = TemplateArena()
+ *   handle = arena.store(template, formato, digest, seq, time.time(), 2, 80)
+ *   arena.read(handle)           # bytes del template
+ *   arena.view(handle)           # buffer ctypes, sin copia
+ *   arena.find_digest(digest)    # handles con ese digest (NumPy por bloque)
+ *   arena.free([handle])
+'''
+
+from array import array
+from ctypes import c_char
+import math
+import struct
+import numpy as np
+
+SLOT_ALIGN = 16             # granularidad de las clases de tamaño (bytes)
+FIRST_BLOCK_ROWS = 16       # huecos del primer bloque de cada clase; se duplica hasta BLOCK_ROWS
+BLOCK_ROWS = 256
+MAX_CLASS = 0xFFFF          # 16 bits bajos del handle
+MAX_TEMPLATE_BYTES = 0xFFFF # la longitud va en 16 bits
+NO_DIGEST = bytes(16)
+
+# longitud, formato, dedo, calidad, seq, hora de alta, digest
+_HEADER = struct.Struct('<HHhhqd16s')
+_LENGTH = struct.Struct('<H')
+_SEQ = struct.Struct('<q')
+_SEQ_OFFSET = 8
+_SMALL_BLOCKS = (BLOCK_ROWS // FIRST_BLOCK_ROWS).bit_length() - 1  # bloques que van creciendo
+_SMALL_ROWS = BLOCK_ROWS - FIRST_BLOCK_ROWS                         # huecos de esos bloques
+
+
+def _locate(row):
+    """(bloque, fila dentro del bloque) de la fila row de una clase"""
+    if row < _SMALL_ROWS:
+        block = (row + FIRST_BLOCK_ROWS).bit_length() - FIRST_BLOCK_ROWS.bit_length()
+        return block, row + FIRST_BLOCK_ROWS - (FIRST_BLOCK_ROWS << block)
+    row -= _SMALL_ROWS
+    return _SMALL_BLOCKS + row // BLOCK_ROWS, row % BLOCK_ROWS
+
+
+def _block_rows(block):
+    return FIRST_BLOCK_ROWS << block if block < _SMALL_BLOCKS else BLOCK_ROWS
+
+
+def _first_row(block):
+    if block < _SMALL_BLOCKS:
+        return (FIRST_BLOCK_ROWS << block) - FIRST_BLOCK_ROWS
+    return _SMALL_ROWS + (block - _SMALL_BLOCKS) * BLOCK_ROWS
+
+
+def record_dtype(slot_bytes):
+    """dtype estructurado de los huecos de una clase (para recorrer un bloque con NumPy)"""
+    return np.dtype([('length', '<u2'), ('template_format', '<u2'), ('finger', '<i2'), ('quality', '<i2'),
+                     ('seq', '<i8'), ('enrolled', '<f8'), ('digest', 'u1', (16,)),
+                     ('template', 'u1', (slot_bytes,))])
+
+
+class SlotClass:
+    """Huecos de slot_bytes bytes de template: bloques, siguiente fila nueva y lista libre"""
+
+    __slots__ = ('slot_bytes', 'itemsize', 'blocks', 'views', 'rows', 'free')
+
+    def __init__(self, slot_bytes):
+        self.slot_bytes = slot_bytes
+        self.itemsize = _HEADER.size + slot_bytes
+        self.blocks = []    # arrays uint8 de filas * itemsize bytes
+        self.views = []     # memoryview de cada bloque (struct.pack_into / unpack_from)
+        self.rows = 0       # filas usadas alguna vez
+        self.free = array('L')
+
+    def allocate(self):
+        if self.free:
+            return self.free.pop()
+        row = self.rows
+        block, _ = _locate(row)
+        if block == len(self.blocks):
+            data = np.zeros(_block_rows(block) * self.itemsize, dtype=np.uint8)
+            self.blocks.append(data)
+            self.views.append(memoryview(data))
+        self.rows += 1
+        return row
+
+    def records(self, block):
+        """Bloque como array estructurado (record_dtype), incluidos los huecos libres (length 0)"""
+        return self.blocks[block].view(record_dtype(self.slot_bytes))
+
+    def __getstate__(self):
+        return {'slot_bytes': self.slot_bytes, 'blocks': self.blocks, 'rows': self.rows, 'free': self.free}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.itemsize = _HEADER.size + self.slot_bytes
+        self.views = [memoryview(block) for block in self.blocks]
+
+
+class TemplateArena:
+    """Templates y sus metadatos en huecos de tamaño fijo, por clases de tamaño"""
+
+    def __init__(self):
+        self.classes = {}       # clase -> SlotClass
+        self.live = 0
+        self.live_bytes = 0     # bytes de los templates guardados
+
+    def _slot(self, handle):
+        slots = self.classes[handle & MAX_CLASS]
+        block, row = _locate(handle >> 16)
+        return slots, slots.views[block], row * slots.itemsize
+
+    def store(self, template, template_format, digest, seq=0, enrolled=None, finger=0, quality=None):
+        """Guarda un template en un hueco libre de su clase; devuelve su handle"""
+        length = len(template)
+        if length > MAX_TEMPLATE_BYTES:
+            raise ValueError(f"Template de {length} bytes (máximo {MAX_TEMPLATE_BYTES})")
+        klass = max(1, -(-length // SLOT_ALIGN))
+        slots = self.classes.get(klass)
+        if slots is None:
+            slots = self.classes[klass] = SlotClass(klass * SLOT_ALIGN)
+        row = slots.allocate()
+        block, offset = _locate(row)
+        view = slots.views[block]
+        position = offset * slots.itemsize
+        _HEADER.pack_into(view, position, length, template_format, -1 if finger is None else finger,
+                          -1 if quality is None else quality, seq, math.nan if enrolled is None else enrolled,
+                          digest or NO_DIGEST)
+        start = position + _HEADER.size
+        view[start:start + length] = template
+        self.live += 1
+        self.live_bytes += length
+        return (row << 16) | klass
+
+    def set_seq(self, handle, seq):
+        _, view, position = self._slot(handle)
+        _SEQ.pack_into(view, position + _SEQ_OFFSET, seq)
+
+    def seq(self, handle):
+        _, view, position = self._slot(handle)
+        return _SEQ.unpack_from(view, position + _SEQ_OFFSET)[0]
+
+    def record(self, handle):
+        """(longitud, formato, dedo, calidad, seq, hora de alta, digest) del hueco"""
+        _, view, position = self._slot(handle)
+        length, template_format, finger, quality, seq, enrolled, digest = _HEADER.unpack_from(view, position)
+        return (length, template_format, None if finger < 0 else finger, None if quality < 0 else quality, seq,
+                None if math.isnan(enrolled) else enrolled, None if digest == NO_DIGEST else digest)
+
+    def read(self, handle, length=None):
+        """Copia del template (bytes); length si ya se conoce (ArenaEntry), para no leer la cabecera"""
+        _, view, position = self._slot(handle)
+        if length is None:
+            length = _LENGTH.unpack_from(view, position)[0]
+        start = position + _HEADER.size
+        return bytes(view[start:start + length])
+
+    def view(self, handle):
+        """El template como buffer ctypes sobre el bloque, sin copiarlo
+
+        Solo es válido mientras el hueco no se libere y reutilice: quien lo
+        pide debe tener la instantánea de la galería que lo contiene."""
+        slots, _, position = self._slot(handle)
+        block, _ = _locate(handle >> 16)
+        length = _LENGTH.unpack_from(slots.views[block], position)[0]
+        return (c_char * length).from_buffer(slots.blocks[block], position + _HEADER.size)
+
+    def find_digest(self, digest):
+        """Handles de los huecos con ese digest, comparando bloque a bloque con NumPy
+
+        Incluye los huecos liberados por la galería que aún no se han
+        reutilizado: quien busca filtra por su instantánea."""
+        probe = np.frombuffer(digest, dtype=np.uint8)
+        handles = []
+        for klass, slots in list(self.classes.items()):
+            for block in range(len(slots.blocks)):
+                rows = np.flatnonzero((slots.records(block)['digest'] == probe).all(axis=1))
+                handles.extend(((_first_row(block) + row) << 16) | klass for row in rows.tolist())
+        return handles
+
+    def free(self, handles):
+        """Devuelve huecos a la lista libre de su clase (y borra el template)"""
+        for handle in handles:
+            slots, view, position = self._slot(handle)
+            length = _LENGTH.unpack_from(view, position)[0]
+            view[position:position + slots.itemsize] = bytes(slots.itemsize)
+            slots.free.append(handle >> 16)
+            self.live -= 1
+            self.live_bytes -= length
+
+    def stats(self):
+        reserved = sum(block.nbytes for slots in self.classes.values() for block in slots.blocks)
+        return {
+            'used_slots': self.live,   # con los liberados que aún lee alguna instantánea
+            'template_bytes': self.live_bytes,
+            'reserved_bytes': reserved,
+            'fill_ratio': self.live_bytes / reserved if reserved else 0.0,
+            'size_classes': len(self.classes),
+            'blocks': sum(len(slots.blocks) for slots in self.classes.values()),
+            'free_slots': sum(len(slots.free) for slots in self.classes.values()),
+        }
@@ -0,0 +1,338 @@
+#! /usr/bin/env python
+'''
+ * templateparser.py
+ * Lectura de templates ANSI-378 (2004) e ISO/IEC 19794-2 (2005) en Python,
+ * sin el SDK: cabecera, vistas de dedo y minucias.
+ *
+ * Las minucias de cada vista son un array estructurado de NumPy que apunta al
+ * buffer original (np.frombuffer sobre un memoryview), sin copiar el payload.
+ * Los campos empaquetados (tipo y X comparten 16 bits) se decodifican solo al
+ * pedirlos con FingerView.x / .y / .kind / .angle o FingerView.minutiae().
+ *
+ *   record = parse_template(data)                 # formato detectado
+ *   record = parse_template(data, SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794)
+ *   view = record.views[0]
+ *   view.finger, view.quality, len(view), view.x, view.angle
+ *
+ * Verificación contra los fixtures de java/ (y el SDK si puede cargarse):
+ *
+ *   python3 -m sdk.templateparser --verify
+ *   python3 -m sdk.templateparser "java/left thumb1.ansi378"
+'''
+
+from struct import pack, unpack_from
+from .sgfdxtemplateformat import *
+import numpy as np
+
+FMR_MAGIC = b'FMR\0'
+FMR_VERSION_2004 = b' 20\0'  # ANSI-378:2004 e ISO 19794-2:2005 (lo que genera el SDK)
+
+ANSI_HEADER_SIZE = 26  # 30 con la longitud extendida de 4 bytes
+ISO_HEADER_SIZE = 24
+VIEW_HEADER_SIZE = 4
+MINUTIA_SIZE = 6
+
+# Minucia tal como está en el template (big endian): 2 bits de tipo + 14 de X,
+# 2 reservados + 14 de Y, ángulo y calidad
+MINUTIA_RECORD_DTYPE = np.dtype([
+    ('type_x', '>u2'),
+    ('y', '>u2'),
+    ('angle', 'u1'),
+    ('quality', 'u1'),
+])
+
+# Minucia decodificada (copia), ángulo en grados en sentido antihorario
+MINUTIA_DTYPE = np.dtype([
+    ('x', 'u2'),
+    ('y', 'u2'),
+    ('angle', 'f4'),
+    ('type', 'u1'),
+    ('quality', 'u1'),
+])
+
+MINUTIA_OTHER = 0
+MINUTIA_RIDGE_ENDING = 1
+MINUTIA_BIFURCATION = 2
+
+# Grados por unidad del byte de ángulo
+ANGLE_UNITS = {
+    SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378: 2.0,
+    SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794: 360.0 / 256.0,
+}
+
+
+class TemplateFormatError(ValueError):
+    """El buffer no es un template ANSI-378/ISO 19794-2 válido"""
+
+
+class FingerView:
+    """Una vista de dedo; `records` es una vista sin copia sobre el template"""
+
+    __slots__ = ('finger', 'view', 'impression', 'quality', 'records', 'angle_unit', 'extended')
+
+    def __init__(self, finger, view, impression, quality, records, angle_unit, extended):
+        self.finger = finger
+        self.view = view
+        self.impression = impression
+        self.quality = quality
+        self.records = records
+        self.angle_unit = angle_unit
+        self.extended = extended  # memoryview de los datos extendidos (crestas, núcleos, deltas)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def x(self):
+        return self.records['type_x'] & 0x3FFF
+
+    @property
+    def y(self):
+        return self.records['y'] & 0x3FFF
+
+    @property
+    def kind(self):
+        return (self.records['type_x'] >> 14).astype(np.uint8)
+
+    @property
+    def angle(self):
+        """Ángulo de cada minucia en grados [0, 360)"""
+        return self.records['angle'].astype(np.float32) * np.float32(self.angle_unit)
+
+    @property
+    def minutia_quality(self):
+        return self.records['quality']
+
+    def minutiae(self):
+        """Copia decodificada con MINUTIA_DTYPE"""
+        out = np.empty(len(self.records), dtype=MINUTIA_DTYPE)
+        out['x'] = self.x
+        out['y'] = self.y
+        out['angle'] = self.angle
+        out['type'] = self.kind
+        out['quality'] = self.records['quality']
+        return out
+
+
+class TemplateRecord:
+    """Cabecera y vistas de un template ANSI-378 o ISO 19794-2"""
+
+    __slots__ = ('template_format', 'length', 'product_owner', 'product_type', 'equipment',
+                 'width', 'height', 'x_resolution', 'y_resolution', 'views')
+
+    def __init__(self, template_format, length, product_owner, product_type, equipment,
+                 width, height, x_resolution, y_resolution, views):
+        self.template_format = template_format
+        self.length = length
+        self.product_owner = product_owner
+        self.product_type = product_type
+        self.equipment = equipment
+        self.width = width
+        self.height = height
+        self.x_resolution = x_resolution  # píxeles por centímetro
+        self.y_resolution = y_resolution
+        self.views = views
+
+    @property
+    def minutiae_count(self):
+        return sum(len(view) for view in self.views)
+
+    def as_dict(self):
+        return {
+            'format': TEMPLATE_FORMAT_NAMES[self.template_format],
+            'length': self.length,
+            'width': self.width,
+            'height': self.height,
+            'x_resolution': self.x_resolution,
+            'y_resolution': self.y_resolution,
+            'views': [{
+                'finger': view.finger,
+                'view': view.view,
+                'impression': view.impression,
+                'quality': view.quality,
+                'minutiae': len(view),
+            } for view in self.views],
+        }
+
+
+def _as_memoryview(data):
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')  # buffers ctypes (c_char) o de otro formato
+    return view
+
+
+def detect_format(data):
+    """ANSI378 o ISO19794 según la cabecera (ambos empiezan por 'FMR\\0')"""
+    view = _as_memoryview(data)
+    if len(view) < ISO_HEADER_SIZE or view[:4] != FMR_MAGIC:
+        raise TemplateFormatError("No es un template ANSI-378/ISO 19794-2 (falta 'FMR')")
+    if view[4:8] != FMR_VERSION_2004:
+        raise TemplateFormatError(f"Versión de template no soportada: {bytes(view[4:8])!r}")
+    # ANSI guarda la longitud en 2 bytes; ISO en 4, cuyos 2 bytes altos son 0
+    # en cualquier template de menos de 64 KiB
+    if unpack_from('>H', view, 8)[0]:
+        return SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+    if unpack_from('>I', view, 8)[0] >= ISO_HEADER_SIZE:
+        return SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794
+    return SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378  # ANSI con longitud extendida
+
+
+def parse_template(data, template_format=None):
+    """TemplateRecord de un bytes/bytearray/memoryview/buffer ctypes, sin copiarlo"""
+    view = _as_memoryview(data)
+    if template_format is None:
+        template_format = detect_format(view)
+    elif len(view) < ISO_HEADER_SIZE or view[:4] != FMR_MAGIC:
+        raise TemplateFormatError("No es un template ANSI-378/ISO 19794-2 (falta 'FMR')")
+
+    if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378:
+        length = unpack_from('>H', view, 8)[0]
+        offset = 10
+        if length == 0:
+            length = unpack_from('>I', view, 10)[0]
+            offset = 14
+        if len(view) < offset + ANSI_HEADER_SIZE - 10:
+            raise TemplateFormatError("Cabecera ANSI-378 incompleta")
+        (product_owner, product_type, equipment, width, height,
+         x_resolution, y_resolution, view_count) = unpack_from('>HHHHHHHB', view, offset)
+        offset += 16
+    elif template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794:
+        length = unpack_from('>I', view, 8)[0]
+        product_owner = product_type = 0
+        (equipment, width, height,
+         x_resolution, y_resolution, view_count) = unpack_from('>HHHHHB', view, 12)
+        offset = ISO_HEADER_SIZE
+    else:
+        raise TemplateFormatError(f"Formato de template no soportado: {template_format}")
+
+    if length > len(view):
+        raise TemplateFormatError(f"Template truncado: {len(view)} de {length} bytes")
+
+    angle_unit = ANGLE_UNITS[template_format]
+    views = []
+    for _ in range(view_count):
+        if offset + VIEW_HEADER_SIZE > length:
+            raise TemplateFormatError("Vista de dedo fuera del template")
+        finger, view_impression, quality, count = view[offset:offset + VIEW_HEADER_SIZE]
+        offset += VIEW_HEADER_SIZE
+        end = offset + count * MINUTIA_SIZE
+        if end + 2 > length:
+            raise TemplateFormatError("Minucias fuera del template")
+        records = np.frombuffer(view, dtype=MINUTIA_RECORD_DTYPE, count=count, offset=offset)
+        extended_length = unpack_from('>H', view, end)[0]
+        offset = end + 2 + extended_length
+        if offset > length:
+            raise TemplateFormatError("Datos extendidos fuera del template")
+        views.append(FingerView(finger, view_impression >> 4, view_impression & 0x0F, quality,
+                                records, angle_unit, view[end + 2:offset]))
+
+    return TemplateRecord(template_format, length, product_owner, product_type, equipment,
+                          width, height, x_resolution, y_resolution, views)
+
+
+def parse_templates(templates, template_format=None):
+    """Lote de templates; los que no se pueden leer quedan como None"""
+    records = []
+    for data in templates:
+        try:
+            records.append(parse_template(data, template_format))
+        except (TemplateFormatError, ValueError):
+            records.append(None)
+    return records
+
+
+def encode_template(minutiae, template_format=SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378,
+                    width=260, height=300, resolution=197, finger=0, quality=0):
+    """Template de una sola vista a partir de minucias MINUTIA_DTYPE (inverso de parse_template)"""
+    count = len(minutiae)
+    if count > 255:
+        raise TemplateFormatError("Una vista admite como máximo 255 minucias")
+    records = np.empty(count, dtype=MINUTIA_RECORD_DTYPE)
+    records['type_x'] = (minutiae['type'].astype(np.uint16) << 14) | (minutiae['x'] & 0x3FFF)
+    records['y'] = minutiae['y'] & 0x3FFF
+    unit = ANGLE_UNITS[template_format]
+    records['angle'] = np.round(minutiae['angle'] / unit).astype(np.int32) % int(round(360 / unit))
+    records['quality'] = minutiae['quality']
+    view = bytes([finger, 0, quality, count]) + records.tobytes() + b'\0\0'
+
+    if template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378:
+        length = ANSI_HEADER_SIZE + len(view)
+        header = pack('>4s4sHHHHHHHHBB', FMR_MAGIC, FMR_VERSION_2004, length, 0, 0, 0,
+                      width, height, resolution, resolution, 1, 0)
+    else:
+        length = ISO_HEADER_SIZE + len(view)
+        header = pack('>4s4sIHHHHHBB', FMR_MAGIC, FMR_VERSION_2004, length, 0,
+                      width, height, resolution, resolution, 1, 0)
+    return header + view
+
+
+def _verify_fixtures(fixtures_dir):
+    """Compara ANSI e ISO del mismo dedo entre sí y con GetAnsi/IsoTemplateInfo"""
+    import glob
+    import os
+    from ctypes import c_char
+
+    try:
+        from .pysgfplib import PYSGFPMDevice
+        sgfp = PYSGFPMDevice()
+        if sgfp.Create() != 0 or sgfp.Init(0x04) != 0:  # SG_DEV_FDU03: carga el algoritmo sin lector
+            sgfp = None
+    except OSError as e:
+        print(f"SDK no disponible ({e}), solo se comparan ANSI e ISO entre sí")
+        sgfp = None
+
+    from .sgfdxstructs import SGANSITemplateInfo
+    failures = 0
+    for ansi_path in sorted(glob.glob(os.path.join(fixtures_dir, '*.ansi378'))):
+        iso_path = ansi_path[:-len('.ansi378')] + '.iso19794'
+        with open(ansi_path, 'rb') as f:
+            ansi = f.read()
+        with open(iso_path, 'rb') as f:
+            iso = f.read()
+        a = parse_template(ansi)
+        i = parse_template(iso)
+        checks = {
+            'formato detectado': (a.template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+                                  and i.template_format == SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794),
+            'longitud': a.length == len(ansi) and i.length == len(iso),
+            'geometría': (a.width, a.height, a.x_resolution) == (i.width, i.height, i.x_resolution),
+            'minucias x/y/tipo': all(np.array_equal(getattr(va, f), getattr(vi, f))
+                                     for va, vi in zip(a.views, i.views) for f in ('x', 'y', 'kind')),
+            # Unidades distintas (2° frente a 1.40625°): difieren como mucho una unidad ANSI
+            'ángulos': all(np.all(np.abs((va.angle - vi.angle + 180) % 360 - 180) <= 2.0)
+                           for va, vi in zip(a.views, i.views)),
+        }
+        if sgfp is not None:
+            for record, data, name in ((a, ansi, 'GetAnsiTemplateInfo'), (i, iso, 'GetIsoTemplateInfo')):
+                info = SGANSITemplateInfo()
+                err = getattr(sgfp, name)((c_char * len(data)).from_buffer_copy(data), info)
+                parsed = [{'finger': v.finger, 'view': v.view, 'quality': v.quality} for v in record.views]
+                checks[name] = err == 0 and info.samples() == parsed
+        ok = all(checks.values())
+        failures += not ok
+        print(f"{'OK ' if ok else 'ERR'} {os.path.basename(ansi_path)}: {a.minutiae_count} minucias"
+              + ''.join(f"\n      falla: {name}" for name, passed in checks.items() if not passed))
+    return failures
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import os
+
+    parser = argparse.ArgumentParser(description='Lector de templates ANSI-378 / ISO 19794-2')
+    parser.add_argument('files', nargs='*', help='templates a mostrar')
+    parser.add_argument('--verify', action='store_true', help='verificar con los fixtures de java/')
+    args = parser.parse_args()
+
+    if args.verify:
+        fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'java')
+        raise SystemExit(1 if _verify_fixtures(fixtures) else 0)
+    for path in args.files:
+        with open(path, 'rb') as f:
+            record = parse_template(f.read())
+        print(path)
+        print(json.dumps(record.as_dict(), indent=2))
+        for view in record.views:
+            print(view.minutiae()[:5])
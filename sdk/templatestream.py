@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+'''
+ * templatestream.py
+ * Formatos de importación y exportación masiva de templates, leídos y
+ * escritos por trozos para no cargar el stream entero en memoria.
+ *
+ * NDJSON: un objeto JSON por línea con los mismos campos que la API
+ *   {"template_id": "huella_1", "template_data": "<base64>",
+ *    "template_format": "ansi378", "person_id": "ana", "finger": 2}
+ *
+ * Binario (más compacto, sin base64): cabecera BINARY_MAGIC y por template
+ *   [longitud de los metadatos u32][longitud del template u32]
+ *   [metadatos JSON: template_id, template_format, person_id, finger][template]
+ *
+ * Los lectores devuelven (número de registro, campos, error): un registro
+ * mal formado no detiene la lectura. Un stream binario que no se puede
+ * seguir leyendo (cabecera o longitudes inválidas, stream cortado) lanza
+ * TemplateStreamError.
+ *
+ *   for number, fields, error in read_ndjson(request.stream): ...
+ *   Response(write_stream(records, binary=True), mimetype=BINARY_MIMETYPE)
+'''
+
+import base64
+import binascii
+import json
+import struct
+
+CHUNK_SIZE = 64 * 1024          # bytes leídos o enviados por trozo
+MAX_RECORD_BYTES = 1024 * 1024  # línea o registro binario más largo aceptado
+BINARY_MAGIC = b'SGTPL01\n'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+BINARY_MIMETYPE = 'application/octet-stream'
+
+_BINARY_HEADER = struct.Struct('<II')  # longitud de los metadatos, longitud del template
+
+
+class TemplateStreamError(ValueError):
+    """Stream de importación que no se puede seguir leyendo"""
+
+
+def _chunks(stream, chunk_size):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _fields(item, template):
+    return {
+        'template_id': item.get('template_id'),
+        'template': template,
+        'template_format': item.get('template_format'),
+        'person_id': item.get('person_id'),
+        'finger': item.get('finger'),
+    }
+
+
+def _ndjson_fields(line):
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        return None, f"JSON no válido: {e}"
+    if not isinstance(item, dict):
+        return None, "Se esperaba un objeto JSON"
+    try:
+        template = base64.b64decode(item.get('template_data') or '', validate=True)
+    except (binascii.Error, TypeError) as e:
+        return {'template_id': item.get('template_id')}, f"template_data no es base64 válido: {e}"
+    return _fields(item, template), None
+
+
+def read_ndjson(stream, chunk_size=CHUNK_SIZE):
+    """(número de línea, campos, error) de cada línea no vacía de un stream NDJSON"""
+    number = 0
+    pending = b''
+    for chunk in _chunks(stream, chunk_size):
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        if len(pending) > MAX_RECORD_BYTES:
+            raise TemplateStreamError(f"Línea {number + len(lines) + 1} de más de {MAX_RECORD_BYTES} bytes")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield (number,) + _ndjson_fields(line)
+    if pending.strip():
+        yield (number + 1,) + _ndjson_fields(pending)
+
+
+def read_binary(stream, chunk_size=CHUNK_SIZE):
+    """(número de registro, campos, error) de cada registro de un stream binario"""
+    buffer = bytearray()
+    offset = None  # None hasta leer la cabecera
+    number = 0
+    for chunk in _chunks(stream, chunk_size):
+        buffer += chunk
+        if offset is None:
+            if len(buffer) < len(BINARY_MAGIC):
+                continue
+            if buffer[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+                raise TemplateStreamError("No es un stream binario de templates (cabecera desconocida)")
+            offset = len(BINARY_MAGIC)
+        while len(buffer) - offset >= _BINARY_HEADER.size:
+            meta_length, template_length = _BINARY_HEADER.unpack_from(buffer, offset)
+            if meta_length + template_length > MAX_RECORD_BYTES:
+                raise TemplateStreamError(f"Registro {number + 1} de más de {MAX_RECORD_BYTES} bytes")
+            meta_start = offset + _BINARY_HEADER.size
+            end = meta_start + meta_length + template_length
+            if len(buffer) < end:
+                break
+            number += 1
+            try:
+                item = json.loads(buffer[meta_start:meta_start + meta_length])
+                if not isinstance(item, dict):
+                    raise ValueError("se esperaba un objeto JSON")
+            except ValueError as e:
+                yield number, None, f"Metadatos no válidos: {e}"
+            else:
+                yield number, _fields(item, bytes(buffer[meta_start + meta_length:end])), None
+            offset = end
+        del buffer[:offset]
+        offset = 0
+    if offset is None and buffer:
+        raise TemplateStreamError("No es un stream binario de templates (cabecera incompleta)")
+    if buffer[offset or 0:]:
+        raise TemplateStreamError(f"Stream cortado a mitad del registro {number + 1}")
+
+
+def ndjson_record(template_id, template, template_format, person_id=None, finger=None):
+    """Línea NDJSON de un template (template_format por nombre: 'sg400', 'ansi378', 'iso19794')"""
+    return (json.dumps({
+        'template_id': template_id,
+        'template_data': base64.b64encode(template).decode('ascii'),
+        'template_format': template_format,
+        'person_id': person_id,
+        'finger': finger,
+    }) + '\n').encode()
+
+
+def binary_record(template_id, template, template_format, person_id=None, finger=None):
+    """Registro binario de un template (sin la cabecera del stream)"""
+    meta = json.dumps({'template_id': template_id, 'template_format': template_format,
+                       'person_id': person_id, 'finger': finger}).encode()
+    return _BINARY_HEADER.pack(len(meta), len(template)) + meta + bytes(template)
+
+
+def write_stream(records, binary=False, chunk_size=CHUNK_SIZE):
+    """Trozos de ~chunk_size bytes de la exportación de [(template_id, template, formato, person_id, finger)]"""
+    encode = binary_record if binary else ndjson_record
+    parts = [BINARY_MAGIC] if binary else []
+    size = sum(map(len, parts))
+    for record in records:
+        data = encode(*record)
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b''.join(parts)
@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+'''
+ * templatetier.py
+ * Tope de memoria para los templates de la galería: los más usados se
+ * quedan en memoria y el resto solo en un archivo del disco, de donde se
+ * vuelven a leer cuando se necesitan.
+ *
+ * Cada template se escribe en el archivo al darse de alta (solo se añade al
+ * final), así que expulsarlo de memoria no escribe nada: solo suelta la
+ * referencia. Un fallo es un pread de unos cientos de bytes.
+ *
+ * Los residentes forman un LRU segmentado:
+ *   - probation: recién dados de alta o leídos del disco;
+ *   - protected: los que se han vuelto a usar estando en memoria, hasta
+ *     protected_ratio del presupuesto.
+ * Se expulsa primero de probation: una identificación que recorre toda la
+ * galería o una exportación pasan por probation sin desplazar a las
+ * identidades que se verifican a menudo.
+ *
+ * El archivo es una caché: se vacía al abrirlo y se rellena desde la
+ * galería (instantánea y WAL) en cada arranque. Las bajas no liberan su
+ * espacio hasta entonces.
+ *
+ *   tier = TemplateTier('/var/lib/secugen/spill', 64 * 1024 * 1024)
+ *   gallery = Gallery(tier=tier)     # GalleryEntry.template pasa por el tier
+ *   tier.stats()                     # residentes, aciertos, fallos, expulsiones
+'''
+
+from collections import OrderedDict
+import os
+import threading
+import time
+
+SPILL_FILE = 'templates.spill'
+DEFAULT_PROTECTED_RATIO = 0.8
+
+
+class TemplateTier:
+    """Templates residentes hasta budget_bytes (LRU segmentado) y todos en un archivo de directory
+
+    El presupuesto cuenta los bytes de los templates; la contabilidad de
+    cada residente (~100 bytes) va aparte."""
+
+    def __init__(self, directory, budget_bytes, protected_ratio=DEFAULT_PROTECTED_RATIO):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, SPILL_FILE)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        self.budget_bytes = budget_bytes
+        self.protected_bytes_max = int(budget_bytes * protected_ratio)
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # escrituras en el archivo, fuera de self.lock
+        self.end = 0
+        self.probation = OrderedDict()  # GalleryEntry -> None, del menos al más reciente
+        self.protected = OrderedDict()
+        self.resident_bytes = 0
+        self.protected_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.page_in_time = 0.0
+
+    def admit_many(self, entries):
+        """Escribe en el archivo los templates de GalleryEntry nuevas y los deja residentes"""
+        data = b''.join(entry._template for entry in entries)
+        with self.write_lock:
+            offset = self.end
+            written = 0
+            while written < len(data):
+                written += os.pwrite(self.fd, data[written:], offset + written)
+            self.end += len(data)
+        with self.lock:
+            for entry in entries:
+                entry._tier = self
+                entry._offset = offset
+                offset += entry._length
+                self.probation[entry] = None
+                self.resident_bytes += entry._length
+            self._evict_locked()
+
+    def discard(self, entries):
+        """Deja de contar GalleryEntry dadas de baja o reemplazadas
+
+        Las instantáneas anteriores que aún las tengan las siguen leyendo
+        (de memoria o del archivo)."""
+        with self.lock:
+            for entry in entries:
+                if entry is None:
+                    continue
+                if entry in self.probation:
+                    del self.probation[entry]
+                    self.resident_bytes -= entry._length
+                elif entry in self.protected:
+                    del self.protected[entry]
+                    self.resident_bytes -= entry._length
+                    self.protected_bytes -= entry._length
+
+    def touch(self, entry):
+        """Acierto: el template estaba en memoria"""
+        with self.lock:
+            self.hits += 1
+            if entry in self.protected:
+                self.protected.move_to_end(entry)
+            elif entry in self.probation:
+                del self.probation[entry]
+                self.protected[entry] = None
+                self.protected_bytes += entry._length
+                while self.protected_bytes > self.protected_bytes_max and len(self.protected) > 1:
+                    demoted, _ = self.protected.popitem(last=False)
+                    self.protected_bytes -= demoted._length
+                    self.probation[demoted] = None
+
+    def load(self, entry):
+        """Fallo: lee el template del archivo y lo deja residente"""
+        start = time.perf_counter()
+        data = self.read(entry)
+        with self.lock:
+            self.misses += 1
+            self.page_in_time += time.perf_counter() - start
+            if entry._template is None:
+                # Una entrada ya dada de baja (leída desde una instantánea antigua) vuelve a
+                # probation y sale con la siguiente expulsión
+                entry._template = data
+                self.probation[entry] = None
+                self.resident_bytes += entry._length
+                self._evict_locked()
+            else:
+                data = entry._template  # otro hilo lo leyó a la vez
+        return data
+
+    def read(self, entry):
+        """Template del archivo sin hacerlo residente (recorridos de toda la galería)"""
+        return os.pread(self.fd, entry._length, entry._offset)
+
+    def _evict_locked(self):
+        while self.resident_bytes > self.budget_bytes and (self.probation or self.protected):
+            if self.probation:
+                victim, _ = self.probation.popitem(last=False)
+            else:
+                victim, _ = self.protected.popitem(last=False)
+                self.protected_bytes -= victim._length
+            self.resident_bytes -= victim._length
+            # Un lector que ya tenía la referencia la sigue usando; los siguientes leen del archivo
+            victim._template = None
+            self.evictions += 1
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'budget_bytes': self.budget_bytes,
+                'resident_bytes': self.resident_bytes,
+                'resident_templates': len(self.probation) + len(self.protected),
+                'protected_templates': len(self.protected),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'avg_page_in_us': self.page_in_time / self.misses * 1e6 if self.misses else 0.0,
+                'spill_bytes': self.end,
+                'spill_path': self.path,
+            }
@@ -36,13 +36,14 @@ class FingerprintStressTest:
             print(f"❌ Error al conectar con API: {e}")
             return False
     
-    def capture_reference_fingerprints(self, num_references=3):
+    def capture_reference_fingerprints(self, num_references=3, interactive=True):
         """Capturar huellas de referencia para las pruebas"""
         print(f"\n📸 Capturando {num_references} huellas de referencia...")
         
         for i in range(num_references):
             print(f"\n🔍 Capturando huella de referencia {i+1}/{num_references}")
-            input("Presiona ENTER cuando tengas el dedo en el sensor...")
+            if interactive:
+                input("Presiona ENTER cuando tengas el dedo en el sensor...")
             
             try:
                 response = self.session.post(f"{self.base_url}/capturar-huella", json={
@@ -301,6 +302,8 @@ def main():
     parser.add_argument('--save-results', action='store_true', help='Guardar resultados en archivo JSON')
     parser.add_argument('--mode', choices=['concurrent', 'sequential', 'both'], default='both', 
                         help='Modo de ejecución de las pruebas')
+    parser.add_argument('--no-interactive', action='store_true',
+                        help='No esperar ENTER al capturar (API con SECUGEN_BACKEND=simulator)')
     
     args = parser.parse_args()
     
@@ -316,7 +319,7 @@ def main():
         sys.exit(1)
     
     # Capturar huellas de referencia
-    if not stress_test.capture_reference_fingerprints(args.references):
+    if not stress_test.capture_reference_fingerprints(args.references, interactive=not args.no_interactive):
         print("❌ No se pudieron capturar las huellas de referencia")
         sys.exit(1)
     
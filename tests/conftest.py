@@ -0,0 +1,32 @@
+"""Pruebas sin lector ni libsgfplib: backend simulado y templates sintéticos"""
+
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.environ['SECUGEN_BACKEND'] = 'simulator'
+os.environ['SECUGEN_LAZY_INIT'] = '0'
+os.environ.pop('SECUGEN_DATA_DIR', None)
+
+import pytest
+
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+ISO = SGFDxTemplateFormat.TEMPLATE_FORMAT_ISO19794
+SG400 = SGFDxTemplateFormat.TEMPLATE_FORMAT_SG400
+
+
+@pytest.fixture
+def fingers():
+    return SyntheticFingers(seed=7)
+
+
+@pytest.fixture
+def make_template(fingers):
+    """Template ANSI-378 (o ISO) de un dedo sintético nuevo"""
+    def make(template_format=ANSI):
+        return fingers.encode(fingers.impression(fingers.finger()), template_format)
+    return make
@@ -0,0 +1,74 @@
+"""Galería copy-on-write (sdk/gallery.py), con GalleryEntry y con TemplateArena"""
+
+import pytest
+
+from conftest import ANSI, SG400
+from sdk.gallery import Gallery
+from sdk.matchcache import digest
+from sdk.templatearena import TemplateArena
+
+
+def item(template_id, template, template_format=ANSI, finger=0):
+    return template_id, template, template_format, digest(template), finger, None
+
+
+@pytest.fixture(params=['objects', 'compact'])
+def gallery(request):
+    return Gallery(shards=4, chunk_size=4, arena=TemplateArena() if request.param == 'compact' else None)
+
+
+def contents(snapshot):
+    return [(template_id, entry.read(), entry.seq) for template_id, entry in snapshot.entries()]
+
+
+def test_snapshot_does_not_see_later_writes(gallery):
+    gallery.put_many([item(f't{n}', bytes([n]) * (40 + n)) for n in range(10)])
+    before = gallery.snapshot()
+    expected = contents(before)
+
+    gallery.put('t3', b'\xff' * 60, ANSI, digest(b'\xff' * 60))   # reemplazo
+    gallery.remove('t5')
+    gallery.remove('t9')
+    gallery.put_many([item(f'n{n}', bytes([100 + n]) * 50) for n in range(10)])  # reutiliza huecos libres
+
+    assert contents(before) == expected
+    assert len(before) == 10 and 't5' in before and 'n0' not in before
+    assert before['t3'] == bytes([3]) * 43
+    after = gallery.snapshot()
+    assert len(after) == 18 and 't5' not in after
+    assert after['t3'] == b'\xff' * 60 and after['n9'] == bytes([109]) * 50
+
+
+def test_replacement_keeps_position_and_seq(gallery):
+    gallery.put_many([item(f't{n}', bytes([n]) * 30) for n in range(6)])
+    seqs = {template_id: entry.seq for template_id, entry in gallery.snapshot().entries()}
+    previous = gallery.put('t2', b'\x07' * 30, SG400, digest(b'\x07' * 30), finger=3)
+    assert previous.read() == bytes([2]) * 30
+    snapshot = gallery.snapshot()
+    assert list(snapshot) == [f't{n}' for n in range(6)]
+    entry = snapshot.entry('t2')
+    assert (entry.seq, entry.template_format, entry.finger) == (seqs['t2'], SG400, 3)
+
+
+def test_removed_entry_stays_readable_from_older_snapshots(gallery):
+    gallery.put_many([item(f't{n}', bytes([n]) * 30) for n in range(4)])
+    old = gallery.snapshot()
+    removed = gallery.remove('t1')
+    assert removed.read() == bytes([1]) * 30
+    assert gallery.remove('t1') is None
+    for n in range(20):
+        gallery.put(f'x{n}', bytes([200]) * 30, ANSI, digest(bytes([200]) * 30))
+    assert old.entry('t1').read() == bytes([1]) * 30
+    assert [len(old), len(gallery.snapshot())] == [4, 23]
+
+
+def test_entries_after_cursor_skips_listed_chunks(gallery):
+    gallery.put_many([item(f't{n:02d}', bytes([n]) * 30) for n in range(20)])
+    snapshot = gallery.snapshot()
+    cursor = [entry.seq for _, entry in snapshot.entries()][9]
+    gallery.remove('t02')
+    gallery.remove('t15')
+    gallery.put('nuevo', b'\x01' * 30, ANSI, digest(b'\x01' * 30))
+    assert [template_id for template_id, _ in gallery.snapshot().entries(after=cursor)] == \
+        [f't{n:02d}' for n in range(10, 20) if n != 15] + ['nuevo']
+    assert [template_id for template_id, _ in snapshot.entries(after=cursor)] == [f't{n:02d}' for n in range(10, 20)]
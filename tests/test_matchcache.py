@@ -0,0 +1,60 @@
+"""Caché de comparaciones 1:1 (sdk/matchcache.py) y su invalidación desde el controlador"""
+
+from conftest import SG400
+from sdk.matchcache import MatchCache, digest
+
+A, B, C = digest(b'a'), digest(b'b'), digest(b'c')
+RESULT = {'success': True, 'matched': True, 'score': 180, 'matcher': 'sdk', 'cached': False}
+
+
+def test_lru_eviction_keeps_recently_read_entries():
+    cache = MatchCache(capacity=2)
+    ab, ac, bc = cache.key(A, SG400, B, SG400, 5), cache.key(A, SG400, C, SG400, 5), cache.key(B, SG400, C, SG400, 5)
+    cache.put(ab, 'ab')
+    cache.put(ac, 'ac')
+    assert cache.get(ab) == 'ab'          # ab pasa a ser la más reciente
+    cache.put(bc, 'bc')
+    assert cache.get(ac) is None and cache.get(ab) == 'ab' and cache.get(bc) == 'bc'
+    assert set(cache.by_digest) == {A, B, C} and cache.by_digest[A] == {ab}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate_drops_every_pair_of_a_digest():
+    cache = MatchCache()
+    for other in (B, C):
+        cache.put(cache.key(A, SG400, other, SG400, 5), 'a')
+        cache.put(cache.key(other, SG400, A, SG400, 7), 'a')
+    cache.put(cache.key(B, SG400, C, SG400, 5), 'bc')
+    assert cache.invalidate(A) == 4
+    assert list(cache.entries) == [cache.key(B, SG400, C, SG400, 5)]
+    assert set(cache.by_digest) == {B, C}
+    assert cache.invalidate(A) == 0 and cache.stats()['invalidations'] == 4
+
+
+def test_zero_capacity_stores_nothing():
+    cache = MatchCache(capacity=0)
+    cache.put(cache.key(A, SG400, B, SG400, 5), 'ab')
+    assert len(cache) == 0 and cache.by_digest == {}
+
+
+def test_replacing_or_deleting_a_template_invalidates_its_results():
+    import app
+    controller = app.SecugenController()
+    first, second, third = (bytearray([n]) * 400 for n in (1, 2, 3))
+    controller.store_templates([('t1', first, SG400, None, None), ('t2', second, SG400, None, None)])
+
+    def cache(template1, template2):
+        key = MatchCache.key(digest(template1), SG400, digest(template2), SG400, 5)
+        controller.match_cache.put(key, RESULT)
+        return key
+
+    key12 = cache(first, second)
+    assert controller.compare_templates(first, second, 5, SG400, SG400)['cached']
+    controller.store_templates([('t1', third, SG400, None, None)])          # reemplazo con otro contenido
+    assert controller.match_cache.get(key12) is None
+
+    key23 = cache(second, third)
+    controller.store_templates([('t1', third, SG400, None, None)])          # mismo contenido: se conserva
+    assert controller.match_cache.get(key23) == RESULT
+    assert controller.delete_template('t2')
+    assert len(controller.match_cache) == 0
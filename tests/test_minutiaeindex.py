@@ -0,0 +1,39 @@
+"""Índice de minucias (sdk/minutiaeindex.py)"""
+
+from sdk.minutiaeindex import MinutiaeIndex
+from sdk.templateparser import parse_template
+
+
+def build_index(fingers, count):
+    bases = [fingers.finger() for _ in range(count)]
+    index = MinutiaeIndex()
+    index.add_many([(f'g{n}', parse_template(fingers.encode(fingers.impression(base))))
+                    for n, base in enumerate(bases)])
+    return index, bases
+
+
+def test_candidates_rank_the_mate_first(fingers):
+    index, bases = build_index(fingers, 200)
+    for n in (3, 50, 199):
+        probe = parse_template(fingers.encode(fingers.impression(bases[n])))
+        candidates = index.candidates(probe, max_candidates=10)
+        assert candidates[0][0] == f'g{n}'
+        assert [score for _, score in candidates] == sorted((score for _, score in candidates), reverse=True)
+
+
+def test_removed_templates_are_not_candidates(fingers):
+    index, bases = build_index(fingers, 100)
+    for n in range(0, 100, 2):
+        index.remove(f'g{n}')
+    probe = parse_template(fingers.encode(fingers.impression(bases[4])))
+    candidates = index.candidates(probe, max_candidates=100)
+    assert candidates and all(int(template_id[1:]) % 2 for template_id, _ in candidates)
+    assert len(index) == 50
+
+
+def test_scores_only_cover_templates_sharing_keys(fingers):
+    index, bases = build_index(fingers, 50)
+    ids, scores = index.scores(parse_template(fingers.encode(fingers.impression(bases[0]))))
+    assert len(ids) == len(scores) == len(set(ids))
+    assert (scores > 0).all()
+    assert index.candidates(parse_template(fingers.encode(fingers.finger())), max_candidates=0) == []
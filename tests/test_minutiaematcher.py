@@ -0,0 +1,35 @@
+"""Galería del matcher NumPy (sdk/minutiaematcher.py)"""
+
+import pickle
+
+from sdk.minutiaematcher import MatcherGallery, MinutiaeMatcher
+from sdk.templateparser import parse_template
+
+
+def test_gallery_lookup_after_removals_and_pickle(fingers):
+    matcher = MinutiaeMatcher()
+    gallery = MatcherGallery(matcher, segment_size=8)
+    sets = {f'g{n}': matcher.prepare(parse_template(fingers.encode(fingers.finger()))) for n in range(30)}
+    gallery.add_many(list(sets.items()))
+    for template_id in ('g0', 'g7', 'g8', 'g29', 'g13'):
+        gallery.remove(template_id)
+        del sets[template_id]
+    gallery.add('g7', sets['g1'])
+    sets['g7'] = sets['g1']
+
+    for copy in (gallery, pickle.loads(pickle.dumps(gallery))):
+        copy.matcher = matcher
+        assert len(copy) == len(sets)
+        assert all(copy.get(template_id) is not None for template_id in sets)
+        assert copy.get('g0') is None
+        for segment in copy.segments:
+            assert segment.positions == {template_id: n for n, template_id in enumerate(segment.ids)}
+
+    probe = matcher.prepare(parse_template(fingers.encode(fingers.finger())))
+    wanted = ['g5', 'g7', 'g0', 'g20']
+    ids, raw = gallery.raw_scores(probe, wanted)
+    assert ids == ['g5', 'g7', 'g20']
+    full_ids, full_raw = gallery.raw_scores(probe)
+    full = dict(zip(full_ids, full_raw.tolist()))
+    assert sorted(full_ids) == sorted(sets)
+    assert raw.tolist() == [full[template_id] for template_id in ids]
@@ -0,0 +1,161 @@
+"""WAL e instantáneas de la galería (sdk/persistence.py, SecugenController.open_store)"""
+
+import os
+
+import pytest
+
+from conftest import ANSI, SG400
+from sdk.persistence import OP_ASSIGN, OP_DELETE, OP_PUT, GalleryStore, decode_records, encode_record
+
+
+def test_record_round_trip_keeps_id_types():
+    data = (encode_record(1, OP_PUT, 'huella_1', b'\x01\x02\x03', ANSI, 'persona_7', 2, 1760000000.5)
+            + encode_record(2, OP_ASSIGN, 42, person_id=7, finger=3)
+            + encode_record(3, OP_DELETE, 'huella_1'))
+    records = [record for record, _ in decode_records(data)]
+    assert [(r.seq, r.op, r.template_id) for r in records] == [(1, OP_PUT, 'huella_1'), (2, OP_ASSIGN, 42),
+                                                                (3, OP_DELETE, 'huella_1')]
+    put, assign, _ = records
+    assert (put.template, put.template_format, put.person_id, put.finger, put.enrolled) == \
+        (b'\x01\x02\x03', ANSI, 'persona_7', 2, 1760000000.5)
+    assert (assign.person_id, assign.finger, assign.template, assign.enrolled) == (7, 3, b'', None)
+
+
+def test_decode_stops_at_truncated_or_corrupt_record():
+    first = encode_record(1, OP_PUT, 'a', b'x' * 50, ANSI)
+    second = encode_record(2, OP_PUT, 'b', b'y' * 50, ANSI)
+    for tail in (second[:5], second[:-1], second[:-1] + bytes([second[-1] ^ 0xFF])):
+        decoded = list(decode_records(first + tail))
+        assert [record.template_id for record, _ in decoded] == ['a']
+        assert decoded[-1][1] == len(first)
+
+
+def test_replay_truncates_a_torn_tail_of_the_last_wal(tmp_path):
+    store = GalleryStore(str(tmp_path), fsync=False)
+    store.open()
+    store.log_put('a', b'x' * 40, ANSI, 'p1', 1, 1.0)
+    store.log_put_many([('b', b'y' * 40, ANSI, None, None), ('c', b'z' * 40, ANSI, None, None)], 2.0)
+    store.log_delete('b')
+    store.wal.close()
+    size = os.path.getsize(store.wal_path)
+    with open(store.wal_path, 'ab') as f:
+        f.write(encode_record(5, OP_PUT, 'd', b'w' * 40, ANSI)[:-7])
+
+    reopened = GalleryStore(str(tmp_path), fsync=False)
+    assert reopened.load_snapshot() is None
+    assert [(r.seq, r.op, r.template_id) for r in reopened.replay()] == \
+        [(1, OP_PUT, 'a'), (2, OP_PUT, 'b'), (3, OP_PUT, 'c'), (4, OP_DELETE, 'b')]
+    assert reopened.discarded_bytes > 0 and reopened.seq == 4
+    reopened.open()
+    assert os.path.getsize(reopened.wal_path) == size
+    reopened.log_delete('a')  # sigue con la seq 5 tras la cola descartada
+    reopened.wal.close()
+    last = GalleryStore(str(tmp_path), fsync=False)
+    assert [(r.seq, r.template_id) for r in last.replay()][-1] == (5, 'a')
+
+
+def test_corrupt_record_in_an_older_wal_is_an_error(tmp_path):
+    store = GalleryStore(str(tmp_path), fsync=False)
+    store.open()
+    store.log_put('a', b'x' * 40, ANSI)
+    older = store.wal_path
+    store.begin_snapshot()  # empieza otro WAL; sin finish_snapshot el anterior se queda
+    store.log_put('b', b'y' * 40, ANSI)
+    store.wal.close()
+    with open(older, 'r+b') as f:
+        f.seek(-3, os.SEEK_END)
+        f.write(b'\0\0\0')
+    with pytest.raises(ValueError):
+        list(GalleryStore(str(tmp_path), fsync=False).replay())
+
+
+def test_snapshot_covers_the_records_before_it(tmp_path):
+    store = GalleryStore(str(tmp_path), fsync=False)
+    store.open()
+    store.log_put('a', b'x' * 40, ANSI)
+    store.log_put('b', b'y' * 40, ANSI)
+    pending = store.begin_snapshot()
+    store.log_delete('a')
+    store.finish_snapshot(pending, {'templates': ['a', 'b']})
+    store.wal.close()
+
+    reopened = GalleryStore(str(tmp_path), fsync=False)
+    assert reopened.load_snapshot() == {'templates': ['a', 'b']}
+    assert reopened.snapshot_seq == 2
+    assert [(r.seq, r.op, r.template_id) for r in reopened.replay()] == [(3, OP_DELETE, 'a')]
+
+
+@pytest.fixture
+def controller_in(monkeypatch):
+    """SecugenController que recupera (y persiste) la galería de un directorio"""
+    import app
+
+    def start(directory, layout='objects'):
+        monkeypatch.setenv('SECUGEN_DATA_DIR', str(directory))
+        monkeypatch.setenv('SECUGEN_SNAPSHOT_INTERVAL', '0')
+        monkeypatch.setenv('SECUGEN_WAL_FSYNC', '0')
+        monkeypatch.setenv('SECUGEN_GALLERY_LAYOUT', layout)
+        return app.SecugenController()
+    return start
+
+
+def persisted_state(controller):
+    """Galería, dueños y estructuras derivadas de cada template, comparables entre procesos"""
+    gallery = {template_id: (entry.read(), entry.template_format, entry.digest)
+               for template_id, entry in controller.gallery.snapshot().entries()}
+    index = controller.template_index
+    keys = {}
+    for key, slots in index.postings.items():
+        for slot in slots:
+            if index.ids[slot] is not None:
+                keys.setdefault(index.ids[slot], set()).add(key)
+    codes = controller.binary_codes
+    matcher = sorted((template_id, tuple(getattr(minutiae_set, field).tobytes() for field in ('x', 'y', 'angle')))
+                     for segment in controller.matcher_gallery.segments
+                     for template_id, minutiae_set in zip(segment.ids, segment.sets))
+    return {
+        'gallery': gallery,
+        'owners': dict(controller.identities.owners),
+        'index': keys,
+        'codes': sorted((template_id, codes.codes[row].tobytes()) for row, template_id in enumerate(codes.ids)),
+        'matcher': matcher,
+    }
+
+
+@pytest.mark.parametrize('layout', ['objects', 'compact'])
+def test_snapshot_with_concurrent_writes_restores_consistent_state(tmp_path, controller_in, make_template, layout):
+    # Las altas y bajas que entran mientras se serializa la instantánea quedan
+    # en el índice, los códigos y la galería del matcher guardados pero no en
+    # su galería: al cargarla, la cola del WAL las reaplica y todo coincide
+    first = controller_in(tmp_path, layout)
+    first.store_templates([(f'a{n}', bytearray(make_template()), ANSI, f'p{n % 5}', n % 3 + 1) for n in range(40)]
+                          + [(f's{n}', bytearray(bytes([n]) * 400), SG400, 'p9', 1) for n in range(2)])
+
+    finish_snapshot = first.store.finish_snapshot
+
+    def writes_during_serialization(pending, state):
+        first.store_templates([('w1', bytearray(make_template()), ANSI, 'p1', 2),
+                               ('w2', bytearray(make_template()), ANSI, None, None),
+                               ('a3', bytearray(make_template()), ANSI, 'p3', 1)])  # reemplazo
+        first.delete_template('a5')
+        first.store_templates([('w3', bytearray(make_template()), ANSI, None, None)])
+        first.delete_template('w3')
+        first._assign_identity('a7', 'p8', 4)
+        return finish_snapshot(pending, state)
+
+    first.store.finish_snapshot = writes_during_serialization
+    first.save_snapshot()
+    first.store_templates([('t1', bytearray(make_template()), ANSI, 'p2', 1)])
+    first.delete_template('a8')
+    expected = persisted_state(first)
+
+    saved = first.store.load_snapshot()
+    assert 'w1' not in saved['gallery'].snapshot() and 'w1' in saved['binary_codes'].rows
+    assert 'a5' in saved['gallery'].snapshot() and 'a5' not in saved['binary_codes'].rows
+
+    second = controller_in(tmp_path, layout)
+    assert second.restore_stats['reindexed'] is False
+    restored = persisted_state(second)
+    for part in expected:
+        assert restored[part] == expected[part], part
+    assert set(restored['index']) == set(restored['gallery']) - {'s0', 's1'}
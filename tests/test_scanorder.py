@@ -0,0 +1,55 @@
+"""Orden de recorrido SLRU (sdk/scanorder.py)"""
+
+from sdk.scanorder import ScanOrder
+
+
+def test_second_hit_promotes_and_order_is_most_recent_first():
+    scan = ScanOrder(protected=4, probation=4)
+    for template_id in ('a', 'b', 'c', 'b', 'd', 'a'):
+        scan.hit(template_id)
+    assert list(scan.protected) == ['b', 'a'] and list(scan.probation) == ['c', 'd']
+    assert scan.hot() == ['a', 'b', 'd', 'c']
+    scan.hit('b')                        # acierto en protegido: solo recencia
+    assert scan.hot() == ['b', 'a', 'd', 'c']
+
+
+def test_full_protected_segment_demotes_to_probation():
+    scan = ScanOrder(protected=2, probation=2)
+    for template_id in ('a', 'a', 'b', 'b', 'c', 'c'):
+        scan.hit(template_id)
+    assert list(scan.protected) == ['b', 'c'] and list(scan.probation) == ['a']
+    scan.hit('x')
+    scan.hit('y')                        # desborda probation: sale el degradado, el menos reciente
+    assert list(scan.probation) == ['x', 'y'] and 'a' not in scan
+    scan.hit('x')                        # promovido; degrada a 'b' por delante de 'y'
+    assert list(scan.protected) == ['c', 'x'] and list(scan.probation) == ['y', 'b']
+
+
+def test_one_off_hits_do_not_displace_protected_entries():
+    scan = ScanOrder(protected=2, probation=2)
+    for template_id in ('a', 'a', 'b', 'b'):
+        scan.hit(template_id)
+    for n in range(10):
+        scan.hit(f'escaneo{n}')
+    assert list(scan.protected) == ['a', 'b'] and list(scan.probation) == ['escaneo8', 'escaneo9']
+
+
+def test_order_puts_hot_candidates_first_and_keeps_the_rest():
+    scan = ScanOrder()
+    for template_id in ('t5', 't5', 't2', 'fuera'):
+        scan.hit(template_id)
+    candidates = [f't{n}' for n in range(7)]
+    assert scan.order(candidates) == ['t5', 't2', 't0', 't1', 't3', 't4', 't6']
+    scan.remove('t5')
+    assert scan.order(candidates) == ['t2', 't0', 't1', 't3', 't4', 't5', 't6']
+    assert ScanOrder().order(candidates) == candidates
+
+
+def test_stats_average_comparisons_over_successes():
+    scan = ScanOrder()
+    scan.record(comparisons=3, identified=True, early_exit=True, hot=True)
+    scan.record(comparisons=9, identified=True, early_exit=True)
+    scan.record(comparisons=40, identified=False)
+    stats = scan.stats()
+    assert (stats['identifications'], stats['successes'], stats['early_exits']) == (3, 2, 2)
+    assert stats['avg_comparisons_per_success'] == 6.0 and stats['hot_hit_rate'] == 0.5
@@ -0,0 +1,76 @@
+"""Lectura de templates ANSI-378 / ISO 19794-2 (sdk/templateparser.py) con los fixtures de java/"""
+
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ANSI, ISO, REPO_DIR, SG400
+from sdk.templateparser import (MINUTIA_DTYPE, TemplateFormatError, detect_format, encode_template,
+                                parse_template, parse_templates)
+
+FIXTURES = os.path.join(REPO_DIR, 'java')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('finger', ['left thumb1', 'left thumb2'])
+def test_ansi_and_iso_fixtures_agree(finger):
+    ansi = fixture(f'{finger}.ansi378')
+    iso = fixture(f'{finger}.iso19794')
+    a = parse_template(ansi)
+    i = parse_template(iso)
+    assert (a.template_format, i.template_format) == (ANSI, ISO)
+    assert (a.length, i.length) == (len(ansi), len(iso))
+    assert (a.width, a.height, a.x_resolution) == (i.width, i.height, i.x_resolution)
+    assert a.minutiae_count > 0 and len(a.views) == len(i.views)
+    for va, vi in zip(a.views, i.views):
+        for field in ('x', 'y', 'kind'):
+            assert np.array_equal(getattr(va, field), getattr(vi, field))
+        # 2° por unidad en ANSI, 360/256 en ISO
+        assert np.all(np.abs((va.angle - vi.angle + 180) % 360 - 180) <= 2.0)
+        assert va.angle.min() >= 0 and va.angle.max() < 360
+
+
+def test_minutiae_are_a_view_over_the_buffer():
+    data = bytearray(fixture('left thumb1.ansi378'))
+    view = parse_template(data).views[0]
+    x = int(view.x[0])
+    offset = view.records.ctypes.data - np.frombuffer(data, dtype=np.uint8).ctypes.data
+    data[offset + 1] ^= 0x01  # byte bajo de type_x de la primera minucia
+    assert int(view.x[0]) == x ^ 0x01
+
+
+@pytest.mark.parametrize('template_format', [ANSI, ISO])
+def test_encode_round_trip(template_format):
+    minutiae = np.zeros(3, dtype=MINUTIA_DTYPE)
+    minutiae['x'] = [10, 120, 250]
+    minutiae['y'] = [20, 150, 290]
+    minutiae['angle'] = [0, 90, 358]
+    minutiae['type'] = [1, 2, 1]
+    minutiae['quality'] = [60, 70, 80]
+    data = encode_template(minutiae, template_format, finger=2, quality=75)
+    record = parse_template(data)
+    assert record.template_format == template_format and record.length == len(data)
+    view = record.views[0]
+    assert (view.finger, view.quality, len(view)) == (2, 75, 3)
+    decoded = view.minutiae()
+    for field in ('x', 'y', 'type', 'quality'):
+        assert decoded[field].tolist() == minutiae[field].tolist()
+    assert np.all(np.abs((decoded['angle'] - minutiae['angle'] + 180) % 360 - 180) <= 1.0)
+
+
+def test_invalid_templates_raise():
+    ansi = fixture('left thumb1.ansi378')
+    with pytest.raises(TemplateFormatError):
+        parse_template(fixture('left thumb1.sg400'))
+    with pytest.raises(TemplateFormatError):
+        parse_template(ansi[:len(ansi) // 2])
+    with pytest.raises(TemplateFormatError):
+        detect_format(ansi[:4] + b' 30\0' + ansi[8:])
+    with pytest.raises(TemplateFormatError):
+        parse_template(ansi, SG400)  # formato opaco
+    assert parse_templates([ansi, b'basura'])[1] is None
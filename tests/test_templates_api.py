@@ -0,0 +1,106 @@
+"""Endpoints de /templates con el cliente de pruebas de Flask y el lector simulado"""
+
+import pytest
+
+from conftest import ANSI, SG400
+from sdk.templatestream import ndjson_record
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """(cliente de pruebas, controlador nuevo con la galería vacía)"""
+    import app
+    controller = app.SecugenController()
+    monkeypatch.setattr(app, 'controller', controller)
+    return app.app.test_client(), controller
+
+
+def sg400(n):
+    return bytearray(n.to_bytes(2, 'big') * 200)
+
+
+def page(client, query):
+    """Respuesta JSON de GET /templates?query"""
+    response = client.get(f'/templates?{query}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_cursor_survives_writes_between_pages(api):
+    client, controller = api
+    controller.store_templates([(f't{n:02d}', sg400(n), SG400, None, None) for n in range(25)])
+
+    first = page(client, 'limit=10')
+    assert first['templates'] == [f't{n:02d}' for n in range(10)] and first['count'] == 25
+    controller.delete_template('t03')                                 # ya listado
+    controller.delete_template('t12')                                 # aún no listado
+    controller.store_templates([('t15', sg400(99), SG400, None, None),  # reemplazo: conserva su sitio
+                                ('nuevo', sg400(100), SG400, None, None)])
+
+    second = page(client, f"limit=10&cursor={first['next_cursor']}")
+    third = page(client, f"limit=10&cursor={second['next_cursor']}")
+    assert second['templates'] == [f't{n:02d}' for n in range(10, 21) if n != 12]
+    assert third['templates'] == [f't{n:02d}' for n in range(21, 25)] + ['nuevo']
+    assert third['next_cursor'] is None
+
+
+def test_without_limit_or_cursor_lists_everything(api, monkeypatch):
+    import app
+    client, controller = api
+    monkeypatch.setattr(app, 'LIST_PAGE_SIZE', 5)
+    controller.store_templates([(f't{n}', sg400(n), SG400, f'p{n % 2}', 1) for n in range(12)])
+    everything = page(client, '')
+    assert len(everything['templates']) == everything['count'] == 12 and everything['next_cursor'] is None
+    assert len(page(client, 'cursor=0')['templates']) == 5
+    assert page(client, 'person_id=p1')['templates'] == [f't{n}' for n in range(1, 12, 2)]
+
+
+def test_invalid_page_parameters(api):
+    client, _ = api
+    assert client.get('/templates?cursor=abc').status_code == 400
+    assert client.get('/templates?limit=0').status_code == 400
+
+
+def test_ndjson_listing_streams_every_match(api, make_template):
+    client, controller = api
+    controller.store_templates([(f'a{n}', bytearray(make_template()), ANSI, None, None) for n in range(3)]
+                               + [('s0', sg400(0), SG400, None, None)])
+    lines = client.get('/templates?format=ndjson&template_format=ansi378').get_data(as_text=True).splitlines()
+    assert len(lines) == 4 and '"summary"' in lines[-1] and '"s0"' not in ''.join(lines)
+
+
+@pytest.mark.parametrize('export_format', ['ndjson', 'binary'])
+def test_export_then_import_round_trip(api, monkeypatch, make_template, export_format):
+    import app
+    client, controller = api
+    controller.store_templates([(f'a{n}', bytearray(make_template()), ANSI, f'p{n}', n % 3 + 1) for n in range(5)]
+                               + [('s0', sg400(0), SG400, None, None)])
+    exported = client.get(f'/templates/exportar?format={export_format}')
+    assert exported.headers['X-Template-Count'] == '6'
+
+    target = app.SecugenController()
+    monkeypatch.setattr(app, 'controller', target)
+    mimetype = app.BINARY_MIMETYPE if export_format == 'binary' else app.NDJSON_MIMETYPE
+    result = client.post('/templates/importar?batch_size=2', data=exported.get_data(), content_type=mimetype)
+    assert result.status_code == 200 and result.get_json()['imported'] == 6
+
+    def stored(c):
+        return [(template_id, entry.read(), entry.template_format, c.identities.owner(template_id))
+                for template_id, entry in c.gallery.snapshot().entries()]
+    assert stored(target) == stored(controller)
+
+
+def test_import_rejects_invalid_records_with_their_line(api):
+    client, controller = api
+    body = b''.join([
+        ndjson_record('ok', sg400(1), 'sg400'),
+        ndjson_record('corto', bytes(10), 'sg400'),     # SG400 de menos de 400 bytes
+        b'no es json\n',
+        ndjson_record(5, sg400(2), 'sg400'),
+    ])
+    result = client.post('/templates/importar', data=body, content_type='application/x-ndjson')
+    payload = result.get_json()
+    assert result.status_code == 400 and not payload['success']
+    assert (payload['imported'], payload['rejected']) == (2, 2)
+    assert payload['errors'][0]['record'] == 2 and 'registro 2' in payload['error']
+    assert sorted(controller.gallery.snapshot()) == ['5', 'ok']
@@ -0,0 +1,59 @@
+"""Formatos de importación y exportación masiva (sdk/templatestream.py)"""
+
+import io
+
+import pytest
+
+from sdk.templatestream import (BINARY_MAGIC, TemplateStreamError, binary_record, read_binary, read_ndjson,
+                                write_stream)
+
+RECORDS = [
+    ('huella_1', b'\x00\x01\x02' * 90, 'ansi378', 'ana', 2),
+    (7, b'\xff' * 400, 'sg400', None, None),
+    ('vacío', b'', 'iso19794', 42, 0),
+]
+
+
+def fields(record):
+    template_id, template, template_format, person_id, finger = record
+    return {'template_id': template_id, 'template': template, 'template_format': template_format,
+            'person_id': person_id, 'finger': finger}
+
+
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_round_trip_in_chunks(binary, chunk_size):
+    data = b''.join(write_stream(RECORDS, binary, chunk_size=50))
+    read = read_binary if binary else read_ndjson
+    parsed = list(read(io.BytesIO(data), chunk_size=chunk_size))
+    assert [number for number, _, _ in parsed] == [1, 2, 3]
+    assert [error for _, _, error in parsed] == [None, None, None]
+    assert [item for _, item, _ in parsed] == [fields(record) for record in RECORDS]
+
+
+def test_bad_ndjson_lines_do_not_stop_the_stream():
+    data = b''.join(write_stream(RECORDS[:1])) + b'no es json\n\n[1, 2]\n{"template_id": "x", "template_data": "@@"}\n' \
+        + b''.join(write_stream(RECORDS[1:2]))
+    parsed = list(read_ndjson(io.BytesIO(data), chunk_size=5))
+    assert [(number, error is None) for number, _, error in parsed] == \
+        [(1, True), (2, False), (4, False), (5, False), (6, True)]
+    assert parsed[3][1] == {'template_id': 'x'}
+    assert parsed[4][1]['template_id'] == 7
+
+
+def test_bad_binary_metadata_skips_one_record():
+    data = BINARY_MAGIC + binary_record(*RECORDS[0]) + b'\x04\0\0\0\x01\0\0\0' + b'nope' + b'\x00' \
+        + binary_record(*RECORDS[1])
+    parsed = list(read_binary(io.BytesIO(data)))
+    assert [(number, error is None) for number, _, error in parsed] == [(1, True), (2, False), (3, True)]
+
+
+@pytest.mark.parametrize('data', [
+    b'NOTMAGIC' + binary_record(*RECORDS[0]),        # cabecera desconocida
+    BINARY_MAGIC[:4],                                # cabecera incompleta
+    BINARY_MAGIC + binary_record(*RECORDS[0])[:-1],  # cortado a mitad de registro
+    BINARY_MAGIC + b'\xff\xff\xff\xff\0\0\0\0',      # registro de más de MAX_RECORD_BYTES
+])
+def test_unreadable_binary_stream_raises(data):
+    with pytest.raises(TemplateStreamError):
+        list(read_binary(io.BytesIO(data)))
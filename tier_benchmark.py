@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la galería con tope de memoria (sdk/templatetier.py)
+
+Llena una galería sintética (sdk/syntheticminutiae.py) con cada presupuesto
+de memoria (--budgets, % de los bytes de los templates; 0 = sin tope, todo
+en memoria) y repite la misma carga de verificaciones 1:1 por ID:
+
+  - --hot-share de los accesos van a --hot-fraction de las identidades
+    (las que se verifican a diario), el resto a cualquiera;
+  - a mitad de la carga se recorre toda la galería como una identificación
+    1:N sin índice, para ver si expulsa a las identidades habituales.
+
+Mide la memoria de la galería (tracemalloc), la latencia de leer el
+template (aciertos y fallos) y la de la verificación completa con el SDK
+para las identidades habituales, y la tasa de aciertos del tier.
+
+    python3 tier_benchmark.py
+    python3 tier_benchmark.py --gallery 50000 --budgets 0,50,10,2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmark_results')
+
+sys.path.insert(0, REPO_DIR)
+os.environ['SECUGEN_MATCH_CACHE_SIZE'] = '0'  # cada verificación llega al SDK
+os.environ['SECUGEN_CONSOLIDATE'] = '0'
+os.environ.setdefault('SECUGEN_LAZY_INIT', '0')
+
+from sdk.gallery import Gallery
+from sdk.matchcache import digest as template_digest
+from sdk.sgfdxtemplateformat import SGFDxTemplateFormat
+from sdk.syntheticminutiae import SyntheticFingers
+from sdk.templatetier import TemplateTier
+
+ANSI = SGFDxTemplateFormat.TEMPLATE_FORMAT_ANSI378
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def build(templates, budget_bytes, directory):
+    """(galería, tier, bytes de memoria que ocupa la galería) con todos los templates"""
+    tier = TemplateTier(directory, budget_bytes) if budget_bytes else None
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    gallery = Gallery(tier=tier)
+    for start in range(0, len(templates), 1000):
+        gallery.put_many([(template_id, template, ANSI, template_digest(template), 0, None)
+                          for template_id, template in templates[start:start + 1000]])
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return gallery, tier, memory
+
+
+def run(controller, templates, probes, budget_bytes, directory, args):
+    gallery, tier, memory = build(templates, budget_bytes, directory)
+    rng = random.Random(args.seed)
+    hot_count = max(1, int(len(templates) * args.hot_fraction))
+    hot_ids = [template_id for template_id, _ in templates[:hot_count]]
+    all_ids = [template_id for template_id, _ in templates]
+    fetch_hot = []
+    fetch_cold = []
+    verify_hot = []
+    for n in range(args.accesses):
+        if n == args.accesses // 2:
+            snapshot = gallery.snapshot()
+            for template_id in snapshot:  # identificación 1:N sin índice
+                snapshot[template_id]
+        hot = rng.random() < args.hot_share
+        template_id = rng.choice(hot_ids) if hot else rng.choice(all_ids)
+        entry = gallery.snapshot().entry(template_id)
+        resident = entry._template is not None
+        start = time.perf_counter()
+        template = entry.template
+        elapsed = (time.perf_counter() - start) * 1e6
+        (fetch_hot if resident else fetch_cold).append(elapsed)
+        if hot and n % args.verify_every == 0:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                result = controller.compare_templates(probes[template_id], template, 5, ANSI, ANSI)
+            verify_hot.append((time.perf_counter() - start) * 1000)
+            if not result.get('success'):
+                raise RuntimeError(f"Verificación fallida: {result}")
+    stats = tier.stats() if tier else None
+    if tier:
+        tier.close()
+    return {
+        'budget_percent': None,
+        'budget_bytes': budget_bytes,
+        'gallery_memory_bytes': memory,
+        'memory_per_template': memory / len(templates),
+        'fetch_hit_us_p50': percentile(fetch_hot, 50),
+        'fetch_hit_us_p99': percentile(fetch_hot, 99),
+        'fetch_miss_us_p50': percentile(fetch_cold, 50),
+        'fetch_miss_us_p99': percentile(fetch_cold, 99),
+        'verify_hot_ms_p50': percentile(verify_hot, 50),
+        'verify_hot_ms_mean': statistics.mean(verify_hot) if verify_hot else 0.0,
+        'verify_hot_ms_p95': percentile(verify_hot, 95),
+        'hit_ratio': len(fetch_hot) / (len(fetch_hot) + len(fetch_cold)),  # de la carga, sin el recorrido
+        'tier_hit_ratio': stats['hit_ratio'] if stats else 1.0,
+        'evictions': stats['evictions'] if stats else 0,
+        'resident_templates': stats['resident_templates'] if stats else len(templates),
+    }
+
+
+def print_results(results):
+    print(f"\n{'tope':>6} {'memoria MB':>11} {'B/template':>11} {'aciertos':>9} {'leer µs p50/p99':>16} "
+          f"{'fallo µs p50/p99':>17} {'verificar ms p50/p95':>21}")
+    for row in results['rows']:
+        budget = f"{row['budget_percent']}%" if row['budget_percent'] else 'sin'
+        print(f"{budget:>6} {row['gallery_memory_bytes'] / 1e6:>11.1f} {row['memory_per_template']:>11.0f} "
+              f"{row['hit_ratio']:>9.1%} {row['fetch_hit_us_p50']:>7.2f}/{row['fetch_hit_us_p99']:<8.2f} "
+              f"{row['fetch_miss_us_p50']:>8.2f}/{row['fetch_miss_us_p99']:<8.2f} "
+              f"{row['verify_hot_ms_p50']:>10.2f}/{row['verify_hot_ms_p95']:<10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Galería con tope de memoria frente a todo en memoria')
+    parser.add_argument('--gallery', type=int, default=20000, help='Templates en la galería')
+    parser.add_argument('--budgets', default='0,50,10', help='Topes en %% de los bytes de los templates (0 = sin tope)')
+    parser.add_argument('--accesses', type=int, default=20000, help='Verificaciones por ID de la carga')
+    parser.add_argument('--hot-fraction', type=float, default=0.05, help='Fracción de identidades habituales')
+    parser.add_argument('--hot-share', type=float, default=0.9, help='Fracción de accesos a las habituales')
+    parser.add_argument('--verify-every', type=int, default=10, help='Verificar con el SDK uno de cada N accesos')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto benchmark_results/)')
+    parser.add_argument('--no-save', action='store_true', help='No guardar el resultado')
+    args = parser.parse_args()
+
+    print("🗄️ GALERÍA CON TOPE DE MEMORIA")
+    print("=" * 50)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app
+    controller = app.controller
+
+    fingers = SyntheticFingers(seed=args.seed)
+    templates = []
+    probes = {}
+    for n in range(args.gallery):
+        finger = fingers.finger()
+        template_id = f'tier_{n}'
+        templates.append((template_id, bytearray(fingers.encode(fingers.impression(finger)))))  # como llegan a la API
+        if n < max(1, int(args.gallery * args.hot_fraction)):
+            probes[template_id] = bytearray(fingers.encode(fingers.impression(finger)))
+    total_bytes = sum(len(template) for _, template in templates)
+    results = {'gallery': args.gallery, 'template_bytes': total_bytes, 'hot_fraction': args.hot_fraction,
+               'hot_share': args.hot_share, 'rows': []}
+
+    work_dir = tempfile.mkdtemp(prefix='secugen_tier_')
+    try:
+        for percent in parse_list(args.budgets):
+            row = run(controller, templates, probes, total_bytes * percent // 100, os.path.join(work_dir, str(percent)),
+                      args)
+            row['budget_percent'] = percent
+            results['rows'].append(row)
+            print(f"tope {percent or 'sin'}{'%' if percent else ''}: {row['gallery_memory_bytes'] / 1e6:.1f} MB, "
+                  f"aciertos {row['hit_ratio']:.1%}, verificar p50 {row['verify_hot_ms_p50']:.2f} ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+
+    if not args.no_save:
+        output = args.output
+        if not output:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"tier_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump({'meta': {'timestamp': datetime.now().isoformat(), 'seed': args.seed}, 'results': results},
+                      f, indent=2, default=str)
+        print(f"\nResultados guardados en {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())